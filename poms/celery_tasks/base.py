@@ -9,6 +9,8 @@ logger = get_task_logger(__name__)
 
 class BaseTask(_Task):
     finmars_task = None
+    # CeleryTask is finished by another task, e.g. callback of chord, see finish_by_other_task
+    finished_by_other_task = False
 
     def _generate_file(self, verbose_name, file_name, text):
         from poms.file_reports.models import FileReport
@@ -50,6 +52,7 @@ class BaseTask(_Task):
         return task
 
     def before_start(self, task_id, args, kwargs):
+        self.finished_by_other_task = False
         if kwargs:
             self.finmars_task = self._update_celery_task_with_run_info(kwargs)
 
@@ -102,8 +105,12 @@ class BaseTask(_Task):
         self.finmars_task.mark_task_as_finished()
         self.finmars_task.save()
 
+    def finish_by_other_task(self):
+        """CeleryTask stays pending after the task returns, its status and result are set by another task"""
+        self.finished_by_other_task = True
+
     def on_success(self, retval, task_id, args, kwargs):
-        if self.finmars_task:
+        if self.finmars_task and not self.finished_by_other_task:
             self._update_celery_task_with_success(retval, task_id)
 
         super().on_success(retval, task_id, args, kwargs)
@@ -1,8 +1,10 @@
 import json
 import logging
+import time
 from datetime import timedelta
 
 from celery.result import AsyncResult
+from django.conf import settings
 from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.utils.timezone import now
@@ -241,9 +243,43 @@ class CeleryTask(TimeStampedModel):
     def mark_task_as_finished(self):
         self.finished_at = now()
 
-    def update_progress(self, progress):
+    def update_progress(self, progress, force=False):
+        """
+        Progress is written to the database at most every TASK_PROGRESS_FLUSH_INTERVAL seconds
+        or TASK_PROGRESS_FLUSH_PERCENT percents, updates in between are kept only in memory
+        and written by the next flush or save of the task
+        """
         self.progress_object = progress
-        self.save()
+
+        if force or self.is_progress_flush_due(progress):
+            self.flush_progress()
+
+    def is_progress_flush_due(self, progress) -> bool:
+        flushed_at = getattr(self, "_progress_flushed_at", None)
+        if flushed_at is None or time.monotonic() - flushed_at >= settings.TASK_PROGRESS_FLUSH_INTERVAL:
+            return True
+
+        percent = progress.get("percent") if isinstance(progress, dict) else None
+        if not isinstance(percent, int | float) or self._progress_flushed_percent is None:
+            return False
+
+        return percent >= 100 or abs(percent - self._progress_flushed_percent) >= settings.TASK_PROGRESS_FLUSH_PERCENT
+
+    def flush_progress(self):
+        """
+        Write progress and status columns only, other fields of the task are written by save.
+        Status is written too, as tasks set status before update of progress and rely on it to save status.
+        """
+        if self.pk is None:
+            self.save()
+        else:
+            CeleryTask.objects.filter(pk=self.pk).update(progress=self.progress, status=self.status)
+
+        progress = self.progress_object
+        percent = progress.get("percent") if isinstance(progress, dict) else None
+
+        self._progress_flushed_at = time.monotonic()
+        self._progress_flushed_percent = percent if isinstance(percent, int | float) else None
 
     def save(self, *args, **kwargs):
         super().save(*args, **kwargs)
@@ -251,12 +287,6 @@ class CeleryTask(TimeStampedModel):
         if self.ttl and not self.expiry_at:
             self.expiry_at = self.created_at + timedelta(seconds=self.ttl)
 
-        if CeleryTask.objects.exclude(type__in=["calculate_balance_report", "calculate_pl_report"]).count() > 3000:
-            _l.warning(f"{log} tasks amount > 1000, delete oldest task")
-            CeleryTask.objects.exclude(type__in=["calculate_balance_report", "calculate_pl_report"]).order_by("id")[
-                0
-            ].delete()
-
 
 class CeleryTaskAttachment(models.Model):
     celery_task = models.ForeignKey(
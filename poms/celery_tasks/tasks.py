@@ -4,6 +4,7 @@ import traceback
 from datetime import UTC, datetime, timedelta
 
 from celery.utils.log import get_task_logger
+from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 from django.utils.timezone import now
 
@@ -51,6 +52,23 @@ def remove_old_tasks(self, *args, **kwargs):
         _l.error(f"remove_old_tasks.exception {repr(e)} {traceback.format_exc()}")
 
 
+@finmars_task(name="celery_tasks.limit_tasks_amount", bind=True)
+def limit_tasks_amount(self, *args, **kwargs):
+    """Delete the oldest tasks over TASKS_MAX_AMOUNT, tasks of reports are not limited"""
+    try:
+        tasks = CeleryTask.objects.exclude(type__in=["calculate_balance_report", "calculate_pl_report"])
+        ids = list(tasks.order_by("-id").values_list("id", flat=True)[settings.TASKS_MAX_AMOUNT :])
+
+        if ids:
+            _l.warning(
+                f"limit_tasks_amount tasks amount > {settings.TASKS_MAX_AMOUNT}, delete {len(ids)} oldest tasks"
+            )
+            CeleryTask.objects.filter(id__in=ids).delete()
+
+    except Exception as e:
+        _l.error(f"limit_tasks_amount.exception {repr(e)} {traceback.format_exc()}")
+
+
 @finmars_task(name="celery_tasks.auto_cancel_task_by_ttl")
 def auto_cancel_task_by_ttl(*args, **kwargs):
     try:
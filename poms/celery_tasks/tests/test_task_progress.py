@@ -0,0 +1,78 @@
+from django.test import override_settings
+
+from poms.celery_tasks.models import CeleryTask
+from poms.celery_tasks.tasks import limit_tasks_amount
+from poms.common.common_base_test import BaseTestCase
+
+
+def get_progress(percent):
+    return {"current": percent, "total": 100, "percent": percent, "description": f"Row {percent} processed"}
+
+
+@override_settings(TASK_PROGRESS_FLUSH_INTERVAL=3600, TASK_PROGRESS_FLUSH_PERCENT=10)
+class TaskProgressTest(BaseTestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        super().setUp()
+        self.init_test_case()
+        self.task = CeleryTask.objects.create(master_user=self.master_user, member=self.member)
+
+    def get_saved_progress(self):
+        return CeleryTask.objects.get(pk=self.task.pk).progress_object
+
+    def test_progress_updates_are_coalesced(self):
+        self.task.update_progress(get_progress(1))
+        self.task.update_progress(get_progress(5))
+
+        self.assertEqual(self.get_saved_progress(), get_progress(1))
+        self.assertEqual(self.task.progress_object, get_progress(5))
+
+        self.task.update_progress(get_progress(11))
+        self.assertEqual(self.get_saved_progress(), get_progress(11))
+
+        self.task.update_progress(get_progress(12))
+        self.task.update_progress(get_progress(100))
+        self.assertEqual(self.get_saved_progress(), get_progress(100))
+
+    def test_progress_is_written_by_force_and_save(self):
+        self.task.update_progress(get_progress(1))
+        self.task.update_progress(get_progress(2), force=True)
+        self.assertEqual(self.get_saved_progress(), get_progress(2))
+
+        self.task.update_progress(get_progress(3))
+        self.task.save()
+        self.assertEqual(self.get_saved_progress(), get_progress(3))
+
+    def test_progress_update_writes_progress_and_status(self):
+        self.task.status = CeleryTask.STATUS_REQUEST_SENT
+        self.task.verbose_result = "Not saved yet"
+        self.task.update_progress(get_progress(1))
+
+        saved_task = CeleryTask.objects.get(pk=self.task.pk)
+        self.assertEqual(saved_task.progress_object, get_progress(1))
+        self.assertEqual(saved_task.status, CeleryTask.STATUS_REQUEST_SENT)
+        self.assertIsNone(saved_task.verbose_result)
+
+
+class LimitTasksAmountTest(BaseTestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        super().setUp()
+        self.init_test_case()
+
+    def test_oldest_tasks_are_deleted(self):
+        CeleryTask.objects.all().delete()
+        tasks = [CeleryTask.objects.create(master_user=self.master_user, member=self.member) for _ in range(5)]
+        report_task = CeleryTask.objects.create(
+            master_user=self.master_user, member=self.member, type="calculate_balance_report"
+        )
+
+        with override_settings(TASKS_MAX_AMOUNT=3):
+            limit_tasks_amount()
+
+        self.assertEqual(
+            set(CeleryTask.objects.values_list("id", flat=True)),
+            {task.id for task in tasks[2:]} | {report_task.id},
+        )
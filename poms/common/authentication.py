@@ -1,3 +1,4 @@
+import hashlib
 import logging
 import random
 import string
@@ -5,6 +6,7 @@ import time
 from datetime import timedelta
 
 import jwt
+import requests
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import User
@@ -12,10 +14,15 @@ from django.utils.translation import gettext_lazy as _
 from rest_framework import exceptions
 from rest_framework.authentication import TokenAuthentication, get_authorization_header
 
+from poms.common.db import get_current_schema_name
 from poms.common.keycloak import KeycloakConnect
+from poms.common.local_cache import LocalCache, get_model_from_values, get_model_values
 
 _l = logging.getLogger("poms.common")
 
+_tokens = LocalCache(max_size=settings.AUTH_CACHE_SIZE)  # (kind, token hash) -> data of token from Keycloak
+_users = LocalCache(max_size=settings.AUTH_CACHE_SIZE)  # (schema, username) -> values of user
+
 
 def generate_random_string(N):
     return "".join(random.choice(string.ascii_lowercase + string.digits) for _ in range(N))
@@ -33,6 +40,56 @@ def get_access_token(request):
     return token
 
 
+def get_token_data(keycloak: KeycloakConnect, token: str, kind: str, fetch) -> dict:
+    """
+    Data of token from Keycloak (userinfo or introspection), cached until expiration of token,
+    but not longer than KEYCLOAK_TOKEN_CACHE_TTL seconds, so revoked tokens are rejected after it.
+    Token is verified locally before, expired and forged tokens are rejected without request to Keycloak.
+    Only successful results are cached, failed requests to Keycloak are made again for the next request.
+    """
+    key = (kind, hashlib.sha256(token.encode()).hexdigest())
+    data = _tokens.get(key)
+    if data is not None:
+        return data
+
+    try:
+        claims = keycloak.verify_token(token)
+    except jwt.PyJWTError as e:
+        raise exceptions.AuthenticationFailed(_("Invalid or expired token.")) from e
+    except requests.RequestException as e:
+        _l.warning(f"get_token_data: keys of realm are not available {repr(e)}")
+        claims = None
+
+    data = fetch(token)
+
+    # empty data is returned when request to Keycloak failed, inactive tokens can be activated by new session
+    if data and data.get("active", True):
+        _tokens.set(key, data, ttl=settings.KEYCLOAK_TOKEN_CACHE_TTL, expires_at=claims.get("exp") if claims else None)
+
+    return data
+
+
+def get_user_by_username(username: str) -> User:
+    """
+    User of the current schema, its values are cached for AUTH_USER_CACHE_TTL seconds.
+    New instance is returned for each request, as views set member and master user of request.user
+    """
+    key = (get_current_schema_name(), username)
+    values = _users.get(key)
+    if values is not None:
+        return get_model_from_values(User, values)
+
+    user = User.objects.get(username=username)
+    _users.set(key, get_model_values(user), ttl=settings.AUTH_USER_CACHE_TTL)
+
+    return user
+
+
+def clear_auth_caches():
+    _tokens.clear()
+    _users.clear()
+
+
 class KeycloakAuthentication(TokenAuthentication):
     """
 
@@ -110,15 +167,17 @@ class KeycloakAuthentication(TokenAuthentication):
         #     msg = _('Invalid or expired token.')
         #     raise exceptions.AuthenticationFailed(msg)
         try:
-            userinfo = self.keycloak.userinfo(key)
-        except Exception:
+            userinfo = get_token_data(self.keycloak, key, "userinfo", self.keycloak.userinfo)
+        except exceptions.AuthenticationFailed:
+            raise
+        except Exception as e:
             msg = _("Invalid or expired token.")
-            raise exceptions.AuthenticationFailed(msg) from e  # noqa: F821
+            raise exceptions.AuthenticationFailed(msg) from e
 
         logging.info(f"userinfo: {userinfo}")
 
         try:
-            user = User.objects.get(username=userinfo["preferred_username"])
+            user = get_user_by_username(userinfo["preferred_username"])
         except Exception as e:
             if settings.EDITION_TYPE != "community" or userinfo["preferred_username"] != settings.ADMIN_USERNAME:
                 _l.error("User not found %s", e)
@@ -244,7 +303,7 @@ class JWTAuthentication(TokenAuthentication):
             raise exceptions.AuthenticationFailed(str(e)) from e
 
         try:
-            user = User.objects.get(username=payload["username"])
+            user = get_user_by_username(payload["username"])
         except Exception as e:
             # _l.error("User not found %s" % e)
 
@@ -2,10 +2,15 @@ import logging
 from threading import local
 
 from celery.signals import task_postrun, task_prerun
-from django.db import DatabaseError, InterfaceError, connection
+from django.db import DatabaseError, InterfaceError
 from django_celery_beat.schedulers import DatabaseScheduler
 
-from poms.common.db import get_all_tenant_schemas
+from poms.common.db import (
+    get_all_tenant_schemas,
+    install_content_types_cache,
+    is_known_schema,
+    set_search_path,
+)
 
 celery_state = local()
 
@@ -69,26 +74,12 @@ def cancel_existing_procedures(celery_app):
     _l.info(f"Canceled {len(procedures)} procedures ")
 
 
-def schema_exists(schema_name):
-    with connection.cursor() as cursor:
-        cursor.execute(
-            """
-            SELECT schema_name
-            FROM information_schema.schemata
-            WHERE schema_name = %s;
-        """,
-            [schema_name],
-        )
-        return cursor.fetchone() is not None
-
-
 def set_schema_from_context(context):
     if context:
         if context.get("space_code"):
-            if schema_exists(space_code := context.get("space_code")):
+            if is_known_schema(space_code := context.get("space_code")):
                 # space_code = context.get('space_code')
-                with connection.cursor() as cursor:
-                    cursor.execute(f"SET search_path TO {space_code};")
+                set_search_path(space_code)
 
             else:
                 raise Exception("No space_code in database schemas")
@@ -103,20 +94,24 @@ def set_schema_from_context(context):
 # IT SETS CONTEXT FOR SHARED WORKERS TO WORK WITH DIFFERENT SCHEMAS
 # 2024-03-24 szhitenev
 # ALL TASKS MUST BE PROVIDED WITH CONTEXT WITH space_code
+# existence of schemas is cached by worker and SET search_path is skipped
+# if the connection of worker is already pinned to the schema, see poms.common.db
 @task_prerun.connect
 def set_task_context(task_id, task, kwargs=None, **unused):
     context = kwargs.get("context")
 
     _l.info(f"task_prerun.task {task} context: {context}")
 
+    # cache might return data from another schema, it is kept per schema
+    install_content_types_cache()
+
     if context:
         if context.get("space_code"):
             space_code = context.get("space_code")
 
-            if schema_exists(space_code):
-                with connection.cursor() as cursor:
-                    cursor.execute(f"SET search_path TO {space_code};")
-                    _l.info(f"task_prerun.context {space_code}")
+            if is_known_schema(space_code):
+                set_search_path(space_code)
+                _l.info(f"task_prerun.context {space_code}")
             else:
                 raise Exception("No scheme in database")
         else:
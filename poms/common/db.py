@@ -1,4 +1,16 @@
-from django.db import connection
+import threading
+import time
+import weakref
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.signals import post_migrate
+
+_schemas_lock = threading.Lock()
+_schemas_expire_at = {}  # schema name -> time until which the schema is known to exist
+
+_current = threading.local()  # schema of the search_path set by the current thread
+_commit_callbacks = threading.local()  # key -> OnceCallback of the current transaction
 
 
 def get_all_tenant_schemas():
@@ -20,3 +32,135 @@ def get_all_tenant_schemas():
         tenant_schemas = [row[0] for row in cursor.fetchall()]
 
     return tenant_schemas
+
+
+def schema_exists(schema_name):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT schema_name
+            FROM information_schema.schemata
+            WHERE schema_name = %s;
+            """,
+            [schema_name],
+        )
+        return cursor.fetchone() is not None
+
+
+def is_known_schema(schema_name) -> bool:
+    """
+    Cached schema_exists: existing schemas are known for TENANT_SCHEMA_CACHE_TTL seconds,
+    missing schemas are not cached, so new spaces are available at once
+    """
+    now = time.monotonic()
+    with _schemas_lock:
+        if _schemas_expire_at.get(schema_name, 0) > now:
+            return True
+
+    if not schema_exists(schema_name):
+        return False
+
+    with _schemas_lock:
+        _schemas_expire_at[schema_name] = now + settings.TENANT_SCHEMA_CACHE_TTL
+
+    return True
+
+
+def invalidate_schemas_cache(**kwargs):
+    with _schemas_lock:
+        _schemas_expire_at.clear()
+
+
+def unpin_connection(**kwargs):
+    connection.pinned_schema = None
+
+
+# schemas are created and migrated by migrate command, which can also SET search_path
+post_migrate.connect(invalidate_schemas_cache, dispatch_uid="invalidate_schemas_cache")
+post_migrate.connect(unpin_connection, dispatch_uid="unpin_connection")
+
+
+def get_current_schema_name():
+    return getattr(_current, "schema_name", None)
+
+
+def set_search_path(schema_name: str):
+    """
+    SET search_path of the connection to the schema, skipped if the connection is already pinned to it.
+    Connection is pinned only outside of transaction, as rollback of transaction resets search_path.
+    """
+    _current.schema_name = schema_name
+
+    connection.ensure_connection()
+    pinned = getattr(connection, "pinned_schema", None)
+    if pinned and pinned[0] is connection.connection and pinned[1] == schema_name:
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"SET search_path TO {schema_name};")
+
+    connection.pinned_schema = None if connection.in_atomic_block else (connection.connection, schema_name)
+
+
+class SchemaContentTypesCache:
+    """
+    ContentTypeManager._cache of the schema of the current thread.
+    Content types of different schemas have different ids, so they are cached per schema
+    instead of clearing the cache when the schema is changed.
+    """
+
+    def __init__(self):
+        self._caches = {}  # schema name -> database alias -> key -> content type
+
+    def _get_cache(self) -> dict:
+        return self._caches.setdefault(get_current_schema_name(), {})
+
+    def __getitem__(self, using):
+        return self._get_cache()[using]
+
+    def setdefault(self, using, default):
+        return self._get_cache().setdefault(using, default)
+
+    def clear(self):
+        self._caches.clear()
+
+
+def install_content_types_cache():
+    from django.contrib.contenttypes.models import ContentType
+
+    if not isinstance(ContentType.objects._cache, SchemaContentTypesCache):
+        ContentType.objects._cache = SchemaContentTypesCache()
+
+
+class OnceCallback:
+    """Callback of on_commit_once, it is kept only by transaction, so it is gone after it is run or rolled back"""
+
+    def __init__(self, func, savepoint_ids: tuple):
+        self.func = func
+        self.savepoint_ids = savepoint_ids
+        self.done = False
+
+    def __call__(self):
+        self.done = True
+        self.func()
+
+
+def on_commit_once(key, func):
+    """
+    transaction.on_commit, which registers func of the same key only once in one transaction and savepoint,
+    e.g. one invalidation of cache after many saved objects. Func is run at once outside of transaction.
+    """
+    conn = transaction.get_connection()
+    if not conn.in_atomic_block:
+        func()
+        return
+
+    callbacks = getattr(_commit_callbacks, "callbacks", None)
+    if callbacks is None:
+        callbacks = _commit_callbacks.callbacks = weakref.WeakValueDictionary()
+
+    savepoint_ids = tuple(conn.savepoint_ids)
+    callback = callbacks.get(key)
+    if callback is None or callback.done or callback.savepoint_ids != savepoint_ids:
+        callback = callbacks[key] = OnceCallback(func, savepoint_ids)
+        transaction.on_commit(callback)
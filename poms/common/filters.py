@@ -19,6 +19,14 @@ from poms.obj_attrs.models import GenericAttributeType
 
 _l = logging.getLogger("poms.common")
 
+# value_type of GenericAttributeType -> field of its value in GenericAttribute
+ATTRIBUTE_VALUE_FIELDS = {
+    10: "value_string",
+    20: "value_float",
+    30: "classifier",
+    40: "value_date",
+}
+
 
 def _get_master_user():
     request = get_request()
@@ -147,17 +155,10 @@ def get_q_obj_for_attribute_type(attribute_type, group_value):
 
     q = Q()
 
-    if attribute_type.value_type in {10, 20, 30, 40}:
+    if attribute_type.value_type in ATTRIBUTE_VALUE_FIELDS:
         q = Q(attributes__attribute_type=attribute_type)
 
-        value_type_to_field_map = {
-            10: "attributes__value_string",
-            20: "attributes__value_float",
-            30: "attributes__classifier",
-            40: "attributes__value_date",
-        }
-
-        field_key = value_type_to_field_map[attribute_type.value_type]
+        field_key = f"attributes__{ATTRIBUTE_VALUE_FIELDS[attribute_type.value_type]}"
         q = q & Q(**{f"{field_key}": group_value})
 
     else:
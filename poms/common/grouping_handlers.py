@@ -2,11 +2,11 @@ import logging
 import time
 
 from django.apps import apps
-from django.db.models import F, Q
+from django.db.models import Count, F, FilteredRelation, Q
 from rest_framework.exceptions import ValidationError
 
 from poms.common.filtering_handlers import handle_filters, handle_global_table_search
-from poms.common.filters import filter_items_for_group, get_q_obj_for_attribute_type
+from poms.common.filters import ATTRIBUTE_VALUE_FIELDS, filter_items_for_group
 from poms.common.utils import attr_is_relation
 from poms.obj_attrs.models import GenericAttributeType
 
@@ -250,7 +250,71 @@ def handle_groups(
     return query_set
 
 
-def count_groups(  # noqa: PLR0912, PLR0915
+def get_count_queryset(Model, master_user, content_type, ev_options):
+    """
+    Entities of master_user, which are counted in groups, filtered by entity_filters of ev_options
+    """
+    if content_type.model in {"currencyhistory", "currencyhistoryerror"}:
+        q = Q(currency__master_user_id=master_user.pk)
+    elif content_type.model in {"pricehistory", "pricehistoryerror"}:
+        q = Q(instrument__master_user_id=master_user.pk)
+    else:
+        q = Q(master_user_id=master_user.pk)
+
+        if (
+            content_type.model
+            not in {
+                "portfolioregisterrecord",
+                "portfoliohistory",
+                "portfolioreconcilehistory",
+            }
+            and ev_options["entity_filters"]
+        ):
+            if (
+                content_type.model not in {"objecthistory4entry", "generatedevent"}
+                and "deleted" not in ev_options["entity_filters"]
+            ):
+                q = q & Q(is_deleted=False)
+
+            if content_type.model in ["instrument"]:
+                if "active" in ev_options["entity_filters"] and "inactive" not in ev_options["entity_filters"]:
+                    q = q & Q(is_active=True)
+
+                if "inactive" in ev_options["entity_filters"] and "active" not in ev_options["entity_filters"]:
+                    q = q & Q(is_active=False)
+
+            if content_type.model not in ["complextransaction"] and "disabled" not in ev_options["entity_filters"]:
+                q = q & Q(is_enabled=True)
+
+    if content_type.model in ["complextransaction"]:
+        q = q & Q(is_deleted=False)
+
+    return Model.objects.filter(q)
+
+
+def get_group_key(qs, group_type, content_type_key):
+    """
+    Returns queryset and lookup of group_identifier of group_type,
+    dynamic attribute is joined separately from attributes used in filters of parent groups
+    """
+    if is_digit_attribute(group_type):
+        attribute_type = GenericAttributeType.objects.get(id__exact=group_type)
+        if attribute_type.value_type not in ATTRIBUTE_VALUE_FIELDS:
+            raise ValidationError(f"Invalid value_type {attribute_type.value_type} of attribute type {group_type}")
+
+        qs = qs.alias(
+            group_attribute=FilteredRelation("attributes", condition=Q(attributes__attribute_type=attribute_type))
+        ).filter(group_attribute__isnull=False)
+
+        return qs, f"group_attribute__{ATTRIBUTE_VALUE_FIELDS[attribute_type.value_type]}"
+
+    if attr_is_relation(content_type_key, group_type):
+        return qs, f"{group_type}__user_code"
+
+    return qs, group_type
+
+
+def count_groups(
     query_set,
     groups_types,
     group_values,
@@ -260,97 +324,39 @@ def count_groups(  # noqa: PLR0912, PLR0915
     ev_options,
     global_table_search,
 ):
+    """
+    Set items_count_raw (without filter_settings and global_table_search) and items_count
+    of groups of query_set, all groups are counted by one GROUP BY query
+    """
     start_time = time.time()
 
     Model = apps.get_model(app_label=content_type.app_label, model_name=content_type.model)
     content_type_key = f"{content_type.app_label}.{content_type.model}"
+    groups_types = [format_groups(groups_type, master_user, content_type) for groups_type in groups_types]
 
-    for item in query_set:
-        q = Q()
-        index = 0
-        for groups_type in groups_types:
-            has_attribute_prefix = has_attribute(groups_type)
-            attribute_code = groups_type.split(ATTRIBUTE_PREFIX)[1] if has_attribute_prefix else None
-            if has_attribute_prefix:
-                if not attribute_code:
-                    raise ValidationError(f"Invalid attribute code {groups_type} for attribute type")
-
-                attribute_type = GenericAttributeType.objects.get(
-                    user_code__exact=attribute_code,
-                    master_user=master_user,
-                    content_type=content_type,
-                )
-
-                if len(group_values) and index < len(group_values):
-                    value = group_values[index]
-                else:
-                    value = item["group_identifier"]
-
-                attr_type_q = get_q_obj_for_attribute_type(attribute_type, value)
-
-                result = []
-                if attr_type_q != Q():
-                    result = Model.objects.filter(q & attr_type_q).values_list("id", flat=True)
-
-                key = "id__in"
-                if len(result):
-                    q = q & Q(**{f"{key}": result})
-
-            else:
-                key = groups_type
-
-                if attr_is_relation(content_type_key, key):
-                    key = f"{key}__user_code"
-
-                if len(group_values) and index < len(group_values):
-                    q = q & Q(**{f"{key}": group_values[index]})
-                else:
-                    q = q & Q(**{f"{key}": item["group_identifier"]})
-
-            index = index + 1
-
-        if content_type.model in {"currencyhistory", "currencyhistoryerror"}:
-            q = q & Q(currency__master_user_id=master_user.pk)
-        elif content_type.model in {"pricehistory", "pricehistoryerror"}:
-            q = q & Q(instrument__master_user_id=master_user.pk)
-        else:
-            q = q & Q(master_user_id=master_user.pk)
-
-            if (
-                content_type.model
-                not in {
-                    "portfolioregisterrecord",
-                    "portfoliohistory",
-                    "portfolioreconcilehistory",
-                }
-                and ev_options["entity_filters"]
-            ):
-                if (
-                    content_type.model not in {"objecthistory4entry", "generatedevent"}
-                    and "deleted" not in ev_options["entity_filters"]
-                ):
-                    q = q & Q(is_deleted=False)
-
-                if content_type.model in ["instrument"]:
-                    if "active" in ev_options["entity_filters"] and "inactive" not in ev_options["entity_filters"]:
-                        q = q & Q(is_active=True)
+    count_qs = get_count_queryset(Model, master_user, content_type, ev_options)
 
-                    if "inactive" in ev_options["entity_filters"] and "active" not in ev_options["entity_filters"]:
-                        q = q & Q(is_active=False)
+    filtered_q = None
+    if filter_settings or global_table_search:
+        filtered_qs = handle_filters(count_qs, filter_settings, master_user, content_type)
+        if global_table_search:
+            filtered_qs = handle_global_table_search(filtered_qs, global_table_search, Model, content_type)
 
-                if content_type.model not in ["complextransaction"] and "disabled" not in ev_options["entity_filters"]:
-                    q = q & Q(is_enabled=True)
+        filtered_q = Q(pk__in=filtered_qs.values("pk"))
 
-        if content_type.model in ["complextransaction"]:
-            q = q & Q(is_deleted=False)
+    # parent groups are filtered by their values, items are grouped by the last group
+    count_qs = filter_items_for_group(count_qs, groups_types, group_values, content_type_key, Model)
+    count_qs, group_key = get_group_key(count_qs, groups_types[-1], content_type_key)
 
-        count_cs = Model.objects.filter(q)
+    groups_counts = (
+        count_qs.values(group_identifier=F(group_key))
+        .annotate(items_count_raw=Count("pk"), items_count=Count("pk", filter=filtered_q))
+        .order_by()
+    )
+    counts = {group["group_identifier"]: (group["items_count_raw"], group["items_count"]) for group in groups_counts}
 
-        item["items_count_raw"] = count_cs.count()
-        count_cs = handle_filters(count_cs, filter_settings, master_user, content_type)
-        if global_table_search:
-            count_cs = handle_global_table_search(count_cs, global_table_search, Model, content_type)
-        item["items_count"] = count_cs.count()
+    for item in query_set:
+        item["items_count_raw"], item["items_count"] = counts.get(item["group_identifier"], (0, 0))
 
     _l.info(f"count_groups {groups_types} took {str(time.time() - start_time)} secs")
 
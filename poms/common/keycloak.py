@@ -17,14 +17,26 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import contextlib
 import logging
+import threading
+import time
 
+import jwt
 import requests
 
 from poms_app import settings
 
 LOGGER = logging.getLogger(__name__)
 
+# asymmetric algorithms of realm keys, tokens signed by shared secrets are not verified locally
+SIGNING_ALGORITHMS = ["RS256", "RS384", "RS512", "PS256", "PS384", "PS512", "ES256", "ES384", "ES512"]
+# keys are fetched again on unknown kid (keys rotation), but not more often than N seconds
+JWKS_MIN_REFRESH_INTERVAL = 30
+
+_jwks = {}  # certs endpoint -> (fetched at, kid -> PyJWK)
+_jwks_lock = threading.Lock()
+
 
 class KeycloakConnect:
     def __init__(self, server_url, realm_name, client_id, client_secret_key=None):
@@ -59,6 +71,7 @@ class KeycloakConnect:
             self.server_url + "/realms/" + self.realm_name + "/protocol/openid-connect/token/introspect"
         )
         self.userinfo_endpoint = self.server_url + "/realms/" + self.realm_name + "/protocol/openid-connect/userinfo"
+        self.certs_endpoint = self.server_url + "/realms/" + self.realm_name + "/protocol/openid-connect/certs"
 
     def well_known(self):
         """Lists endpoints and other configuration options
@@ -152,8 +165,18 @@ class KeycloakConnect:
         Returns:
             list: List of roles.
         """
-        token_decoded = self.introspect(token)
+        return self.roles_from_introspection(self.introspect(token))
+
+    def roles_from_introspection(self, token_decoded):
+        """
+        Get roles from introspected token
+
+        Args:
+            token_decoded (dict): The introspect token.
 
+        Returns:
+            list: List of roles.
+        """
         realm_access = token_decoded.get("realm_access", None)
         resource_access = token_decoded.get("resource_access", None)
         client_access = resource_access.get(self.client_id, None) if resource_access is not None else None
@@ -187,3 +210,74 @@ class KeycloakConnect:
             )
             return {}
         return response.json()
+
+    def certs(self):
+        """JSON Web Key Set of realm, public keys to verify signatures of tokens
+
+        Returns:
+            json: key set
+        """
+        response = requests.request("GET", self.certs_endpoint, verify=settings.VERIFY_SSL)
+        error = response.raise_for_status()
+        if error:
+            LOGGER.error(f"Error obtaining keys from endpoint: {self.certs_endpoint}, response error {error}")
+            return {}
+        return response.json()
+
+    def get_signing_key(self, kid):
+        """Signing key of realm from key set, which is cached for KEYCLOAK_JWKS_CACHE_TTL seconds
+
+        Args:
+            kid (str): Key ID from header of token
+
+        Returns:
+            PyJWK: key or None if realm has no such key
+        """
+        now = time.monotonic()
+        with _jwks_lock:
+            fetched_at, keys = _jwks.get(self.certs_endpoint, (None, {}))
+
+        is_expired = fetched_at is None or fetched_at + settings.KEYCLOAK_JWKS_CACHE_TTL < now
+        is_unknown = kid not in keys and fetched_at is not None and fetched_at + JWKS_MIN_REFRESH_INTERVAL < now
+
+        if is_expired or is_unknown:
+            keys = {}
+            for jwk_data in self.certs().get("keys", []):
+                if jwk_data.get("use", "sig") != "sig" or "kid" not in jwk_data:
+                    continue
+
+                with contextlib.suppress(jwt.PyJWKError, jwt.InvalidKeyError):
+                    keys[jwk_data["kid"]] = jwt.PyJWK(jwk_data)
+
+            with _jwks_lock:
+                _jwks[self.certs_endpoint] = (now, keys)
+
+        return keys.get(kid)
+
+    def verify_token(self, token):
+        """Verify signature and expiration of token locally by cached keys of realm
+
+        Args:
+            token (str): The string value of the token.
+
+        Raises:
+            jwt.InvalidTokenError: token is malformed, expired or its signature is invalid
+
+        Returns:
+            dict: claims of token or None if token is not signed by keys of realm
+        """
+        header = jwt.get_unverified_header(token)
+        if header.get("alg") not in SIGNING_ALGORITHMS:
+            return None
+
+        signing_key = self.get_signing_key(header.get("kid"))
+        if signing_key is None:
+            return None
+
+        return jwt.decode(
+            token,
+            signing_key.key,
+            algorithms=SIGNING_ALGORITHMS,
+            options={"verify_aud": False},
+            leeway=5,
+        )
@@ -0,0 +1,55 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LocalCache:
+    """
+    Cache of the worker process, values expire after ttl seconds or at their own expiration time,
+    least recently used values are removed when there are more than max_size values
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._values = OrderedDict()  # key -> (expires_at, value), least recently used first
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            cached = self._values.get(key)
+            if cached is None:
+                return default
+
+            if cached[0] <= time.time():
+                del self._values[key]
+                return default
+
+            self._values.move_to_end(key)
+            return cached[1]
+
+    def set(self, key, value, ttl: float, expires_at: float = None):
+        expires_at = min(time.time() + ttl, expires_at or float("inf"))
+
+        with self._lock:
+            self._values[key] = (expires_at, value)
+            self._values.move_to_end(key)
+
+            while len(self._values) > self.max_size:
+                self._values.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def __len__(self):
+        return len(self._values)
+
+
+def get_model_values(instance) -> dict:
+    """Values of concrete fields of model instance, which are cached instead of the shared instance"""
+    return {field.attname: getattr(instance, field.attname) for field in instance._meta.concrete_fields}
+
+
+def get_model_from_values(model, values: dict):
+    """New instance of model from cached values, as if it was loaded from database"""
+    return model.from_db(model.objects.db, list(values), list(values.values()))
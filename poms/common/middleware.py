@@ -9,7 +9,6 @@ from threading import local
 
 from django.conf import settings
 from django.contrib.gis.geoip2 import GeoIP2
-from django.db import connection
 from django.http.response import JsonResponse
 from django.utils.cache import add_never_cache_headers, get_max_age, patch_cache_control
 from django.utils.deprecation import MiddlewareMixin
@@ -25,6 +24,7 @@ from rest_framework.exceptions import (
     PermissionDenied,
 )
 
+from .db import install_content_types_cache, is_known_schema, set_search_path
 from .keycloak import KeycloakConnect
 
 _l = logging.getLogger("poms.common")
@@ -191,6 +191,8 @@ class KeycloakMiddleware:
         return response
 
     def process_view(self, request, view_func, view_args, view_kwargs):
+        from poms.common.authentication import get_token_data
+
         # for now there is no role assigned yet
         request.roles = []
         # Measure the time taken to authenticate with Keycloak
@@ -223,13 +225,14 @@ class KeycloakMiddleware:
         auth_header = request.META.get("HTTP_AUTHORIZATION").split()
         token = auth_header[1] if len(auth_header) == 2 else auth_header[0]
 
-        # Checks token is active
-        if not self.keycloak.is_token_active(token):
+        # Checks token is active, introspection is cached, see get_token_data
+        introspection = get_token_data(self.keycloak, token, "introspect", self.keycloak.introspect)
+        if not introspection.get("active"):
             msg = _("Invalid or expired token. Verify your Keycloak configuration.")
             raise exceptions.AuthenticationFailed(msg)
 
             # Get roles from access token
-        token_roles = self.keycloak.roles_from_token(token)
+        token_roles = self.keycloak.roles_from_introspection(introspection)
         if token_roles is None:
             return JsonResponse(
                 {
@@ -250,7 +253,7 @@ class KeycloakMiddleware:
         request.roles = token_roles
 
         # Add to userinfo to the view
-        request.userinfo = self.keycloak.userinfo(token)
+        request.userinfo = get_token_data(self.keycloak, token, "userinfo", self.keycloak.userinfo)
 
         # Record authentication time
         request.keycloak_auth_time = int((time.perf_counter() - auth_start_time) * 1000)
@@ -330,19 +333,6 @@ class ResponseTimeMiddleware(MiddlewareMixin):
         return response
 
 
-def schema_exists(schema_name):
-    with connection.cursor() as cursor:
-        cursor.execute(
-            """
-            SELECT schema_name
-            FROM information_schema.schemata
-            WHERE schema_name = %s;
-            """,
-            [schema_name],
-        )
-        return cursor.fetchone() is not None
-
-
 # Very Important Middleware
 # It sets the PostgreSQL search path to the tenant's schema
 # Do not modify this code
@@ -351,9 +341,10 @@ class RealmAndSpaceMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
 
-    def __call__(self, request):
-        from django.contrib.contenttypes.models import ContentType
+        # fix PLAT-1001: cache might return data from another schema, it is kept per schema
+        install_content_types_cache()
 
+    def __call__(self, request):
         # Example URL pattern: /realm0abcd/space0xyzv/
 
         request.realm_code = None
@@ -365,30 +356,24 @@ class RealmAndSpaceMiddleware:
             request.realm_code = path_parts[1]
             request.space_code = path_parts[2]
 
-            if not schema_exists(request.space_code):
+            if not is_known_schema(request.space_code):
                 # Uncomment in 1.9.0 when there is no more legacy Spaces
                 # Handle the error (e.g., log it, return a 400 Bad Request, etc.)
                 # For demonstration, returning a simple HttpResponseBadRequest
                 # return HttpResponseBadRequest("Invalid space code.")
 
-                with connection.cursor() as cursor:
-                    cursor.execute("SET search_path TO public;")
+                set_search_path("public")
 
             else:  # REMOVE IN 1.9.0, PROBABLY SECURITY ISSUE
                 # Setting the PostgreSQL search path to the tenant's schema
-                with connection.cursor() as cursor:
-                    cursor.execute(f"SET search_path TO {request.space_code};")
-
-            # fix PLAT-1001: cache might return data from another schema, clear it
-            ContentType.objects.clear_cache()
+                set_search_path(request.space_code)
 
         else:
             # If we do not have realm_code, we suppose its legacy Space which do not need scheme changing
             request.space_code = path_parts[1]
 
             # Remain in public scheme
-            with connection.cursor() as cursor:
-                cursor.execute("SET search_path TO public;")
+            set_search_path("public")
 
         response = self.get_response(request)
 
@@ -397,11 +382,8 @@ class RealmAndSpaceMiddleware:
             if "location" in response:
                 response["location"] = response["location"].replace("spacexxxxx", request.space_code)
 
-        # Optionally, reset the search path to default after the request is processed
-        # This can be important in preventing "leakage" of the schema setting across requests
-        with connection.cursor() as cursor:
-            cursor.execute("SET search_path TO public;")
-
+        # search path is not reset after the request, as every request sets it,
+        # connection stays pinned to the schema and the next request of the same schema skips SET
         return response
 
 
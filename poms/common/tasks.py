@@ -3,15 +3,15 @@ from io import StringIO
 
 from celery import shared_task
 from django.core.management import call_command
-from django.db import connection
+
+from poms.common.db import set_search_path
 
 _l = logging.getLogger("poms.common")
 
 
 @shared_task(bind=True)
 def apply_migration_to_space(self, realm_code, space_code):
-    with connection.cursor() as cursor:
-        cursor.execute(f"SET search_path TO {space_code};")
+    set_search_path(space_code)
 
     # Create StringIO buffers to capture the output
     out_buffer = StringIO()
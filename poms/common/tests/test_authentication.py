@@ -0,0 +1,151 @@
+import json
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+from django.conf import settings
+from rest_framework.exceptions import AuthenticationFailed
+
+from poms.common import keycloak
+from poms.common.authentication import KeycloakAuthentication, clear_auth_caches, get_user_by_username
+from poms.common.common_base_test import BaseTestCase
+from poms.users.utils import clear_members_cache, get_master_user_and_member
+
+KID = "stub-key"
+
+
+def generate_key():
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+def get_key_set(private_key, kid=KID) -> dict:
+    jwk_data = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(private_key.public_key()))
+    jwk_data.update({"kid": kid, "use": "sig", "alg": "RS256"})
+    return {"keys": [jwk_data]}
+
+
+def get_token(private_key, username, expires_in=300, kid=KID) -> str:
+    claims = {"preferred_username": username, "exp": int(time.time()) + expires_in}
+    return jwt.encode(claims, private_key, algorithm="RS256", headers={"kid": kid})
+
+
+class KeycloakAuthenticationTest(BaseTestCase):
+    databases = "__all__"
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.private_key = generate_key()
+
+    def setUp(self):
+        super().setUp()
+        self.init_test_case()
+
+        keycloak._jwks.clear()
+        clear_auth_caches()
+        clear_members_cache()
+        self.addCleanup(keycloak._jwks.clear)
+        self.addCleanup(clear_auth_caches)
+        self.addCleanup(clear_members_cache)
+
+        certs_patcher = mock.patch.object(
+            keycloak.KeycloakConnect, "certs", return_value=get_key_set(self.private_key)
+        )
+        userinfo_patcher = mock.patch.object(
+            keycloak.KeycloakConnect, "userinfo", return_value={"preferred_username": self.user.username}
+        )
+        self.mock_certs = certs_patcher.start()
+        self.mock_userinfo = userinfo_patcher.start()
+        self.addCleanup(certs_patcher.stop)
+        self.addCleanup(userinfo_patcher.stop)
+
+    def authenticate(self, token):
+        return KeycloakAuthentication().authenticate_credentials(token)
+
+    def test_token_is_verified_once(self):
+        token = get_token(self.private_key, self.user.username)
+
+        user, _ = self.authenticate(token)
+        self.assertEqual(user, self.user)
+
+        with self.assertNumQueries(0):
+            cached_user, _ = self.authenticate(token)
+
+        self.assertEqual(cached_user, self.user)
+        self.assertIsNot(cached_user, user)
+        self.mock_certs.assert_called_once()
+        self.mock_userinfo.assert_called_once()
+
+    def test_expired_token_is_rejected_locally(self):
+        token = get_token(self.private_key, self.user.username, expires_in=-60)
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+        self.mock_userinfo.assert_not_called()
+
+    def test_forged_token_is_rejected_locally(self):
+        token = get_token(generate_key(), self.user.username)
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+        self.mock_userinfo.assert_not_called()
+
+    def test_token_of_unknown_key_is_verified_by_keycloak(self):
+        token = get_token(generate_key(), self.user.username, kid="unknown-key")
+
+        user, _ = self.authenticate(token)
+
+        self.assertEqual(user, self.user)
+        self.mock_userinfo.assert_called_once()
+
+    def test_user_is_reloaded_after_change(self):
+        get_user_by_username(self.user.username)
+
+        self.user.first_name = "Changed"
+        self.user.save()
+
+        self.assertEqual(get_user_by_username(self.user.username).first_name, "Changed")
+
+    def test_member_is_cached(self):
+        request = SimpleNamespace(user=self.user)
+
+        member, master_user = get_master_user_and_member(request)
+        with self.assertNumQueries(0):
+            cached_member, cached_master_user = get_master_user_and_member(request)
+
+        self.assertEqual(cached_member, member)
+        self.assertEqual(cached_master_user, master_user)
+        self.assertIsNot(cached_member, member)
+
+        member.is_deleted = True
+        member.save()
+
+        with self.assertRaises(Exception):  # noqa: B017
+            get_master_user_and_member(request)
+
+    def test_token_is_cached_not_longer_than_ttl(self):
+        token = get_token(self.private_key, self.user.username)
+
+        with mock.patch("poms.common.local_cache.time.time", return_value=time.time()) as mock_time:
+            self.authenticate(token)
+            mock_time.return_value += settings.KEYCLOAK_TOKEN_CACHE_TTL + 1
+            self.authenticate(token)
+
+        self.assertEqual(self.mock_userinfo.call_count, 2)
+
+    def test_failed_userinfo_is_not_cached(self):
+        token = get_token(self.private_key, self.user.username)
+        self.mock_userinfo.return_value = {}
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+        self.mock_userinfo.return_value = {"preferred_username": self.user.username}
+        user, _ = self.authenticate(token)
+
+        self.assertEqual(user, self.user)
+        self.assertEqual(self.mock_userinfo.call_count, 2)
@@ -0,0 +1,28 @@
+from unittest import mock
+
+from poms.common.celery import celery_state, set_task_context
+from poms.common.common_base_test import BaseTestCase
+from poms.common.db import invalidate_schemas_cache, schema_exists
+
+
+class SetTaskContextTest(BaseTestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        super().setUp()
+        invalidate_schemas_cache()
+        self.addCleanup(invalidate_schemas_cache)
+        self.addCleanup(setattr, celery_state, "celery_task_id", None)
+        self.addCleanup(setattr, celery_state, "task", None)
+
+    @mock.patch("poms.common.db.schema_exists", wraps=schema_exists)
+    def test_schema_is_checked_once_per_worker(self, mock_schema_exists):
+        for task_id in ("task_1", "task_2"):
+            set_task_context(task_id, mock.Mock(), kwargs={"context": {"space_code": "public"}})
+
+        self.assertEqual(mock_schema_exists.call_count, 1)
+        self.assertEqual(celery_state.celery_task_id, "task_2")
+
+    def test_missing_schema_is_rejected(self):
+        with self.assertRaises(Exception):  # noqa: B017
+            set_task_context("task_1", mock.Mock(), kwargs={"context": {"space_code": "space_missing"}})
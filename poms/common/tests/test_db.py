@@ -0,0 +1,114 @@
+from unittest import mock
+
+from django.db import connection, transaction
+from django.test import override_settings
+
+from poms.common.common_base_test import BaseTestCase
+from poms.common.db import (
+    SchemaContentTypesCache,
+    invalidate_schemas_cache,
+    is_known_schema,
+    on_commit_once,
+    schema_exists,
+    set_search_path,
+)
+
+
+class TenantSchemaTest(BaseTestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        super().setUp()
+        invalidate_schemas_cache()
+        self.addCleanup(invalidate_schemas_cache)
+
+    @mock.patch("poms.common.db.schema_exists", wraps=schema_exists)
+    def test_existing_schema_is_cached(self, mock_schema_exists):
+        self.assertTrue(is_known_schema("public"))
+        self.assertTrue(is_known_schema("public"))
+        self.assertEqual(mock_schema_exists.call_count, 1)
+
+        invalidate_schemas_cache()
+        self.assertTrue(is_known_schema("public"))
+        self.assertEqual(mock_schema_exists.call_count, 2)
+
+    @override_settings(TENANT_SCHEMA_CACHE_TTL=0)
+    @mock.patch("poms.common.db.schema_exists", wraps=schema_exists)
+    def test_schema_cache_is_expired(self, mock_schema_exists):
+        self.assertTrue(is_known_schema("public"))
+        self.assertTrue(is_known_schema("public"))
+        self.assertEqual(mock_schema_exists.call_count, 2)
+
+    @mock.patch("poms.common.db.schema_exists", wraps=schema_exists)
+    def test_missing_schema_is_not_cached(self, mock_schema_exists):
+        self.assertFalse(is_known_schema("space_missing"))
+        self.assertFalse(is_known_schema("space_missing"))
+        self.assertEqual(mock_schema_exists.call_count, 2)
+
+    def test_search_path_of_pinned_connection_is_not_set(self):
+        self.addCleanup(setattr, connection, "pinned_schema", None)
+
+        # test case runs in transaction, in which connection is not pinned
+        with self.assertNumQueries(1):
+            set_search_path("public")
+        with self.assertNumQueries(1):
+            set_search_path("public")
+
+        with mock.patch.object(connection, "in_atomic_block", False):
+            set_search_path("public")
+
+        with self.assertNumQueries(0):
+            set_search_path("public")
+
+    @mock.patch("poms.common.db.get_current_schema_name")
+    def test_content_types_are_cached_per_schema(self, mock_schema_name):
+        cache = SchemaContentTypesCache()
+
+        mock_schema_name.return_value = "space00001"
+        cache.setdefault("default", {})["content_type_key"] = "content type of space00001"
+
+        mock_schema_name.return_value = "space00002"
+        with self.assertRaises(KeyError):
+            cache["default"]  # noqa: B018
+
+        mock_schema_name.return_value = "space00001"
+        self.assertEqual(cache["default"]["content_type_key"], "content type of space00001")
+
+        cache.clear()
+        with self.assertRaises(KeyError):
+            cache["default"]  # noqa: B018
+
+
+class OnCommitOnceTest(BaseTestCase):
+    databases = "__all__"
+
+    def test_func_is_run_once_after_commit(self):
+        func = mock.Mock()
+        other_func = mock.Mock()
+
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            on_commit_once("key", func)
+            on_commit_once("key", func)
+            on_commit_once("other_key", other_func)
+
+            func.assert_not_called()
+
+        func.assert_called_once()
+        other_func.assert_called_once()
+
+    def test_func_of_rolled_back_savepoint_is_not_run(self):
+        func = mock.Mock()
+        rolled_back_func = mock.Mock()
+
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            on_commit_once("key", func)
+
+            try:
+                with transaction.atomic():
+                    on_commit_once("rolled_back_key", rolled_back_func)
+                    raise ValueError("rollback")
+            except ValueError:
+                pass
+
+        func.assert_called_once()
+        rolled_back_func.assert_not_called()
@@ -979,8 +979,9 @@ def attr_is_relation(content_type_key: str, attribute_key: str) -> bool:
 
 
 def set_schema(space_code):
-    with connection.cursor() as cursor:
-        cursor.execute(f"SET search_path TO {space_code};")
+    from poms.common.db import set_search_path
+
+    set_search_path(space_code)
 
 
 def get_current_schema():
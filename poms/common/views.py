@@ -305,10 +305,14 @@ class AbstractModelViewSet(
             # so its broke default relation group counting, and now we need to get group name separately
             # maybe we need to refactor this whole module, or just provide user_codes and frontend app will
 
+            groups_names = dict(
+                TransactionTypeGroup.objects.filter(
+                    user_code__in=[item["group_identifier"] for item in page]
+                ).values_list("user_code", "short_name")
+            )
             for item in page:
-                ttype_group = TransactionTypeGroup.objects.filter(user_code=item["group_identifier"]).first()
-                if ttype_group:
-                    item["group_name"] = ttype_group.short_name
+                if item["group_identifier"] in groups_names:
+                    item["group_name"] = groups_names[item["group_identifier"]]
 
         if page is not None:
             return self.get_paginated_response(page)
@@ -152,6 +152,7 @@ def import_configuration(self, task_id: int, *args, **kwargs) -> None:  # noqa:
             task.notes = ""
 
         task.notes = task.notes = "Manifest is not found ⚠️"
+        task.save()
 
     json_files = list_json_files(output_directory)
 
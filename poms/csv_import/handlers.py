@@ -6,6 +6,7 @@ import re
 import traceback
 from datetime import date, datetime
 from functools import reduce
+from graphlib import CycleError, TopologicalSorter
 from logging import getLogger
 from operator import or_
 from tempfile import NamedTemporaryFile
@@ -14,6 +15,7 @@ from typing import Any
 from dateutil.parser import parse
 from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
 from django.db.models import Q
 from django.utils.dateparse import parse_date
 from django.utils.timezone import now
@@ -47,9 +49,11 @@ from poms.instruments.models import (
     InstrumentType,
     PaymentSizeDetail,
     Periodicity,
+    PriceHistory,
     PricingCondition,
     PricingPolicy,
 )
+from poms.instruments.price_histories import bulk_save_prices
 from poms.obj_attrs.models import GenericAttributeType, GenericClassifier
 from poms.portfolios.models import PortfolioType
 from poms.procedures.models import RequestDataFileProcedureInstance
@@ -576,6 +580,48 @@ def handler_instrument_object(source_data, instrument_type, master_user, ecosyst
     return object_data
 
 
+FAILED = object()  # value of expression, which could not be evaluated
+
+
+def eval_batch(expr, items_names: list, context: dict) -> list:
+    """Values of expression for names of each item, FAILED for items where expression failed"""
+    try:
+        return formula.safe_eval_batch(expr, items_names, context=context, default=FAILED)
+    except Exception:
+        return [FAILED] * len(items_names)
+
+
+def sort_calculated_inputs(calculated_inputs: list, csv_fields: list) -> list | None:
+    """
+    Calculated inputs in order of their dependencies on each other, so each input is evaluated
+    once after inputs it refers to. None if the order can't be found, e.g. inputs refer to each
+    other in cycle, refer to all names by locals() or shadow csv fields of the scheme.
+    """
+    names = {calculated_input.name for calculated_input in calculated_inputs}
+    if len(names) != len(calculated_inputs) or names & {csv_field.name for csv_field in csv_fields}:
+        return None
+
+    graph = {}
+    for calculated_input in calculated_inputs:
+        try:
+            referenced_names = formula.get_referenced_names(calculated_input.name_expr)
+        except Exception:
+            return None
+
+        if referenced_names & {"locals", "globals"}:
+            return None
+
+        graph[calculated_input.name] = referenced_names & names
+
+    try:
+        order = list(TopologicalSorter(graph).static_order())
+    except CycleError:
+        return None
+
+    calculated_inputs_by_name = {calculated_input.name: calculated_input for calculated_input in calculated_inputs}
+    return [calculated_inputs_by_name[name] for name in order]
+
+
 class SimpleImportProcess:
     def __init__(self, task_id, procedure_instance_id=None):
         self.task = CeleryTask.objects.get(pk=task_id)
@@ -618,6 +664,11 @@ class SimpleImportProcess:
         # `self.attribute_types` are set inside `self.get_attribute_types()`
         self.get_attribute_types()
 
+        # fields of scheme are loaded once for all rows
+        self.csv_fields = list(self.scheme.csv_fields.all())
+        self.calculated_inputs = list(self.scheme.calculated_inputs.all())
+        self.sorted_calculated_inputs = sort_calculated_inputs(self.calculated_inputs, self.csv_fields)
+
         self.file_items = []  # items from provider  (json, csv, excel)
         self.raw_items = []  # items from provider  (json, csv, excel)
         self.conversion_items = []  # items with applied converions
@@ -975,7 +1026,7 @@ class SimpleImportProcess:
         try:
             for file_item in self.file_items:
                 item = {}
-                for scheme_input in self.scheme.csv_fields.all():
+                for scheme_input in self.csv_fields:
                     try:
                         item[scheme_input.name] = file_item[scheme_input.column_name]
                     except Exception:
@@ -996,22 +1047,22 @@ class SimpleImportProcess:
             raise e
 
     def apply_conversion_to_raw_items(self):
+        """Expression of each csv field is evaluated for all rows at once"""
+        conversion_inputs = [{} for _ in self.raw_items]
+
+        for scheme_input in self.csv_fields:
+            values = eval_batch(scheme_input.name_expr, self.raw_items, self.context)
+
+            for inputs, value in zip(conversion_inputs, values, strict=True):
+                inputs[scheme_input.name] = None if value is FAILED else value
+
         for row_number, raw_item in enumerate(self.raw_items, start=1):
             conversion_item = SimpleImportConversionItem()
             conversion_item.file_inputs = self.file_items[row_number - 1]
             conversion_item.raw_inputs = raw_item
-            conversion_item.conversion_inputs = {}
+            conversion_item.conversion_inputs = conversion_inputs[row_number - 1]
             conversion_item.row_number = row_number
 
-            for scheme_input in self.scheme.csv_fields.all():
-                try:
-                    names = raw_item
-                    conversion_item.conversion_inputs[scheme_input.name] = formula.safe_eval(
-                        scheme_input.name_expr, names=names, context=self.context
-                    )
-                except Exception:
-                    conversion_item.conversion_inputs[scheme_input.name] = None
-
             self.conversion_items.append(conversion_item)
 
     # We have formulas that lookup for rows
@@ -1031,7 +1082,7 @@ class SimpleImportProcess:
 
         for preprocess_item in self.preprocessed_items:
             # CREATE SCHEME INPUTS
-            for scheme_input in self.scheme.csv_fields.all():
+            for scheme_input in self.csv_fields:
                 key_column_name = scheme_input.column_name
 
                 try:
@@ -1049,7 +1100,7 @@ class SimpleImportProcess:
                         )
 
             # CREATE CALCULATED INPUTS
-            for scheme_calculated_input in self.scheme.calculated_inputs.all():
+            for scheme_calculated_input in self.calculated_inputs:
                 try:
                     names = preprocess_item.inputs
 
@@ -1078,10 +1129,52 @@ class SimpleImportProcess:
         if current_level < deep:
             self.recursive_preprocess(deep, current_level + 1)
 
+    def sorted_preprocess(self):
+        """
+        Calculated inputs are evaluated once in order of their dependencies,
+        each of them for all rows at once
+        """
+        context = {
+            "master_user": self.master_user,
+            "member": self.member,
+            "request": self.proxy_request,
+            "transaction_import": {"items": self.preprocessed_items},
+        }
+
+        for row_number, conversion_item in enumerate(self.conversion_items, start=1):
+            preprocess_item = SimpleImportProcessPreprocessItem()
+            preprocess_item.file_inputs = conversion_item.file_inputs
+            preprocess_item.raw_inputs = conversion_item.raw_inputs
+            preprocess_item.conversion_inputs = conversion_item.conversion_inputs
+            preprocess_item.row_number = row_number
+            preprocess_item.inputs = {
+                scheme_input.name: conversion_item.conversion_inputs.get(scheme_input.name)
+                for scheme_input in self.csv_fields
+            }
+
+            self.preprocessed_items.append(preprocess_item)
+
+        items_inputs = [preprocess_item.inputs for preprocess_item in self.preprocessed_items]
+
+        for scheme_calculated_input in self.sorted_calculated_inputs:
+            values = eval_batch(scheme_calculated_input.name_expr, items_inputs, context)
+
+            for inputs, value in zip(items_inputs, values, strict=True):
+                inputs[scheme_calculated_input.name] = None if value is FAILED else value
+
+            if failed_count := sum(value is FAILED for value in values):
+                _l.error(
+                    f"SimpleImportProcess.Task {self.task} sorted_preprocess calculated_input "
+                    f"{scheme_calculated_input} failed in {failed_count} rows"
+                )
+
     def preprocess(self):
         _l.info(f"SimpleImportProcess.Task {self.task}. preprocess INIT")
 
-        self.recursive_preprocess(deep=2)
+        if self.sorted_calculated_inputs is None:
+            self.recursive_preprocess(deep=2)
+        else:
+            self.sorted_preprocess()
 
         for preprocessed_item in self.preprocessed_items:
             item = SimpleImportProcessItem()
@@ -1301,32 +1394,36 @@ class SimpleImportProcess:
         return result_item
 
     def get_final_inputs(self, item, all_entity_fields_models=None):
-        result = {}
+        return self.get_items_final_inputs([item], all_entity_fields_models)[0]
+
+    def get_items_final_inputs(self, items, all_entity_fields_models=None) -> list:
+        """Final inputs of items, expression of each entity field is evaluated for all items at once"""
+        results = [{} for _ in items]
 
         if not all_entity_fields_models:
             all_entity_fields_models = self.scheme.entity_fields.all()
 
-        for entity_field in all_entity_fields_models:
-            if entity_field.expression:
-                try:
-                    value = formula.safe_eval(entity_field.expression, names=item.inputs, context=self.context)
+        items_inputs = [item.inputs for item in items]
 
-                    if entity_field.system_property_key:
-                        result[entity_field.system_property_key] = value
+        for entity_field in all_entity_fields_models:
+            key = entity_field.system_property_key or entity_field.attribute_user_code
 
-                    elif entity_field.attribute_user_code:
-                        result[entity_field.attribute_user_code] = value
+            if not entity_field.expression:
+                values = [None] * len(items)
+            else:
+                values = eval_batch(entity_field.expression, items_inputs, self.context)
 
-                except Exception as e:
-                    _l.warning(f"get_final_inputs.error {repr(e)}")
+                if failed_count := sum(value is FAILED for value in values):
+                    _l.warning(f"get_final_inputs.error {entity_field.expression} failed in {failed_count} rows")
 
-            elif entity_field.system_property_key:
-                result[entity_field.system_property_key] = None
+            if not key:
+                continue
 
-            elif entity_field.attribute_user_code:
-                result[entity_field.attribute_user_code] = None
+            for result, value in zip(results, values, strict=True):
+                if value is not FAILED:
+                    result[key] = value
 
-        return result
+        return results
 
     def import_item(self, item: dict[str, Any]):  # noqa: PLR0912, PLR0915
         from poms.instruments.handlers import InstrumentTypeProcess
@@ -1537,10 +1634,12 @@ class SimpleImportProcess:
     def import_items_by_batch_indexes(self, batch_indexes, filter_for_async_functions_eval):  # noqa: PLR0912, PLR0915
         all_entity_fields_models = self.scheme.entity_fields.all()
         relation_models_user_codes = {}
-        for item_index in batch_indexes:
-            self.items[item_index].final_inputs = self.get_final_inputs(
-                self.items[item_index], all_entity_fields_models
-            )
+
+        batch_final_inputs = self.get_items_final_inputs(
+            [self.items[item_index] for item_index in batch_indexes], all_entity_fields_models
+        )
+        for item_index, final_inputs in zip(batch_indexes, batch_final_inputs, strict=True):
+            self.items[item_index].final_inputs = final_inputs
             # dict for getting relation models at the next step
             relation_models_user_codes = self.__get_relation_to_convert(
                 self.items[item_index].final_inputs,  # self.items[item_index],
@@ -1725,10 +1824,11 @@ class SimpleImportProcess:
             _l.info(f"SimpleImportProcess.Task bulk_insert count. {len(models_for_bulk_insert.values())} ")
 
         if models_for_bulk_update:
-            for model_obj in models_for_bulk_update.values():
-                model_obj.save()
-            # todo: by bulk update
-            # model.objects.bulk_update(models_for_bulk_update)
+            if self.scheme.content_type.model == "pricehistory":
+                bulk_save_prices(list(models_for_bulk_update.values()))
+            else:
+                for model_obj in models_for_bulk_update.values():
+                    model_obj.save()
             batch_rows_count = batch_rows_count + len(models_for_bulk_update.values())
             _l.info(f"SimpleImportProcess.Task bulk_update count. {len(models_for_bulk_update.values())} ")
 
@@ -2033,6 +2133,17 @@ class SimpleImportFinalUpdatesProcess:
                     conditions = reduce(or_, models_q_filter_list)
                     model_objects_for_update = self.model.objects.filter(conditions)
 
+                    if self.model is PriceHistory:
+                        model_objects_for_update = list(model_objects_for_update)
+                        try:
+                            with transaction.atomic():
+                                bulk_save_prices(model_objects_for_update)
+                            success_models_updates_count = success_models_updates_count + len(model_objects_for_update)
+                            model_objects_for_update = []
+                        except Exception as e:
+                            # retry row by row, so only failed prices are counted as errors
+                            _l.error(f"SimpleImportFinalUpdatesProcess.Task {self.task}. bulk save error {repr(e)}")
+
                     for model_object in model_objects_for_update:
                         try:
                             model_object.save()
@@ -41,7 +41,8 @@ def simple_import(self, task_id, procedure_instance_id=None, *args, **kwargs):
                 "total": len(import_process.raw_items),
                 "percent": 0,
                 "description": "Going to parse raw items",
-            }
+            },
+            force=True,
         )
 
         import_process.fill_with_file_items()
@@ -65,7 +66,8 @@ def simple_import(self, task_id, procedure_instance_id=None, *args, **kwargs):
                 "total": len(import_process.raw_items),
                 "percent": 0,
                 "description": "Parse raw items",
-            }
+            },
+            force=True,
         )
 
         import_process.apply_conversion_to_raw_items()
@@ -76,7 +78,8 @@ def simple_import(self, task_id, procedure_instance_id=None, *args, **kwargs):
                 "total": len(import_process.conversion_items),
                 "percent": 0,
                 "description": "Apply Conversion",
-            }
+            },
+            force=True,
         )
 
         import_process.preprocess()
@@ -87,7 +90,8 @@ def simple_import(self, task_id, procedure_instance_id=None, *args, **kwargs):
                 "total": len(import_process.raw_items),
                 "percent": 0,
                 "description": "Preprocess items",
-            }
+            },
+            force=True,
         )
         import_process.process()
 
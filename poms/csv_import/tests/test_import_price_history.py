@@ -9,7 +9,7 @@ from django.test import override_settings
 
 from poms.celery_tasks.models import CeleryTask
 from poms.common.common_base_test import BaseTestCase
-from poms.csv_import.handlers import SimpleImportProcess
+from poms.csv_import.handlers import SimpleImportFinalUpdatesProcess, SimpleImportProcess
 from poms.csv_import.models import CsvField, CsvImportScheme, EntityField
 from poms.csv_import.tasks import simple_import
 from poms.csv_import.tests.common_test_data import (
@@ -280,3 +280,49 @@ class ImportPriceHistoryTest(BaseTestCase):
 
         with self.assertRaises(ValueError):
             process.fill_with_file_items()
+
+    @mock.patch("poms.csv_import.handlers.send_system_message")
+    @mock.patch("poms.csv_import.handlers.bulk_save_prices", side_effect=ValueError("bulk save error"))
+    def test__final_updates_failed_chunk_is_saved_row_by_row(self, mock_bulk_save_prices, mock_send_message):
+        prices = [
+            PriceHistory.objects.create(
+                instrument=self.instrument,
+                pricing_policy=self.pricing_policy,
+                date=self.random_future_date(),
+                principal_price=i + 1,
+            )
+            for i in range(3)
+        ]
+        options_object = {
+            "scheme_id": self.scheme_20.id,
+            "filter_for_async_functions_eval": [{"id": price.id} for price in prices],
+        }
+        task = CeleryTask.objects.create(
+            master_user=self.master_user,
+            member=self.member,
+            options_object=options_object,
+            verbose_name="Simple Import Final Updates",
+            type="simple_import_final_updates",
+        )
+        original_save = PriceHistory.save
+
+        def save(price, *args, **kwargs):
+            if price.id == prices[1].id:
+                raise ValueError("save error")
+
+            return original_save(price, *args, **kwargs)
+
+        with mock.patch.object(PriceHistory, "save", autospec=True, side_effect=save):
+            SimpleImportFinalUpdatesProcess(task_id=task.id).process()
+
+        mock_bulk_save_prices.assert_called_once()
+        task.refresh_from_db()
+        self.assertEqual(
+            task.result_object,
+            {
+                "total_models_for_update": 3,
+                "success_models_updates_count": 2,
+                "error_models_updates_count": 1,
+                "not_found_models": 0,
+            },
+        )
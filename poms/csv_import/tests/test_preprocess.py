@@ -0,0 +1,81 @@
+from types import SimpleNamespace
+from unittest import mock
+
+from poms.common.common_base_test import BaseTestCase
+from poms.csv_import.handlers import SimpleImportProcess, sort_calculated_inputs
+from poms.csv_import.models import CsvImportSchemeCalculatedInput
+from poms.csv_import.tests import test_import_price_history
+
+
+def calculated_input(name, name_expr):
+    return SimpleNamespace(name=name, name_expr=name_expr)
+
+
+class SortCalculatedInputsTest(BaseTestCase):
+    databases = "__all__"
+
+    create_scheme_20 = test_import_price_history.ImportPriceHistoryTest.create_scheme_20
+    create_task = test_import_price_history.ImportPriceHistoryTest.create_task
+
+    def setUp(self):
+        super().setUp()
+        self.init_test_case()
+        self.scheme_20 = self.create_scheme_20()
+
+    def test_inputs_are_sorted_by_dependencies(self):
+        inputs = [
+            calculated_input("total", "price_x2 + price_x3"),
+            calculated_input("price_x2", "price * 2"),
+            calculated_input("price_x3", "price_x2 + price"),
+        ]
+
+        sorted_inputs = sort_calculated_inputs(inputs, [SimpleNamespace(name="price")])
+
+        self.assertEqual([i.name for i in sorted_inputs], ["price_x2", "price_x3", "total"])
+
+    @BaseTestCase.cases(
+        ("cycle", [calculated_input("a", "b + 1"), calculated_input("b", "a + 1")]),
+        ("self_reference", [calculated_input("a", "a + 1")]),
+        ("shadows_csv_field", [calculated_input("price", "price * 2")]),
+        ("duplicated_name", [calculated_input("a", "1"), calculated_input("a", "2")]),
+        ("locals", [calculated_input("a", "locals()")]),
+        ("invalid_expression", [calculated_input("a", "1 +")]),
+    )
+    def test_inputs_are_not_sorted(self, inputs):
+        self.assertIsNone(sort_calculated_inputs(inputs, [SimpleNamespace(name="price")]))
+
+    @mock.patch("poms.csv_import.handlers.send_system_message")
+    def test_sorted_preprocess_is_equal_to_recursive_preprocess(self, mock_send_message):
+        for column, (name, name_expr) in enumerate(
+            (
+                ("total", "price_x2 + price_x3"),
+                ("price_x2", "principal_price * 2"),
+                ("price_x3", "price_x2 + principal_price"),
+                ("invalid", "unknown_name"),
+            ),
+            start=1,
+        ):
+            CsvImportSchemeCalculatedInput.objects.create(
+                scheme=self.scheme_20,
+                name=name,
+                column=column,
+                name_expr=name_expr,
+            )
+
+        def get_inputs(sorted_preprocess):
+            import_process = SimpleImportProcess(task_id=self.create_task(amount=2).id)
+            if not sorted_preprocess:
+                import_process.sorted_calculated_inputs = None
+
+            import_process.fill_with_file_items()
+            import_process.fill_with_raw_items()
+            import_process.apply_conversion_to_raw_items()
+            import_process.preprocess()
+
+            return [item.inputs for item in import_process.items]
+
+        inputs = get_inputs(sorted_preprocess=True)
+
+        self.assertEqual(inputs, get_inputs(sorted_preprocess=False))
+        self.assertAlmostEqual(inputs[0]["total"], inputs[0]["principal_price"] * 5)
+        self.assertIsNone(inputs[0]["invalid"])
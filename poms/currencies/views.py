@@ -31,6 +31,7 @@ from poms.currencies.serializers import (
 )
 from poms.obj_attrs.utils import get_attributes_prefetch
 from poms.obj_attrs.views import GenericAttributeTypeViewSet
+from poms.reports.report_results import invalidate_report_results
 from poms.users.filters import OwnerByMasterUserFilter
 
 _l = logging.getLogger("poms.currencies")
@@ -251,6 +252,9 @@ class CurrencyHistoryViewSet(AbstractModelViewSet):
             update_fields=["fx_rate"],
         )
 
+        # bulk_create does not send signals
+        invalidate_report_results(request.user.master_user, fx_rates_dates=[fx_rate.date for fx_rate in valid_data])
+
         if errors:
             _l.info(f"CurrencyHistoryViewSet.bulk_create.errors {errors}")
         #     # Here we just return the errors as part of the response.
@@ -1,5 +1,7 @@
 import ast
+import copy
 import datetime
+import functools
 import logging
 import time
 import types
@@ -104,9 +106,11 @@ OPERATORS = {
 
 
 class _UserDef:
-    def __init__(self, parent, node):
+    def __init__(self, parent, node, body, defaults):
         self.parent = parent
         self.node = node
+        self.body = body
+        self.defaults = defaults
 
     def __str__(self):
         return f"<def {self.node.name}>"
@@ -123,7 +127,7 @@ class _UserDef:
         offset = len(self.node.args.args) - len(self.node.args.defaults)
         for i, arg in enumerate(self.node.args.args):
             if arg.arg not in kwargs:
-                val = self.parent._eval(self.node.args.defaults[i - offset])
+                val = self.defaults[i - offset](self.parent)
                 kwargs[arg.arg] = val
 
         save_table = self.parent._table
@@ -131,7 +135,7 @@ class _UserDef:
             self.parent._table = save_table.copy()
             self.parent._table.update(kwargs)
             try:
-                ret = self.parent._eval(self.node.body)
+                ret = self.body(self.parent)
             except _Return as e:
                 ret = e.value
         finally:
@@ -142,6 +146,8 @@ class _UserDef:
 
 FUNCTIONS = FINMARS_FUNCTIONS
 
+FUNCTIONS_TABLE = {f.name: f for f in FUNCTIONS}
+
 
 empty = object()
 
@@ -187,7 +193,7 @@ class SimpleEval2:
         self.expr_ast = None
         self.result = None
 
-        _globals = {f.name: f for f in FUNCTIONS}
+        _globals = FUNCTIONS_TABLE.copy()
         if callable(now):
             _globals["now"] = SimpleEval2Def("now", now)
         elif isinstance(now, datetime.date):
@@ -230,7 +236,7 @@ class SimpleEval2:
     @staticmethod
     def is_valid(expr):
         try:
-            SimpleEval2.try_parse(expr)
+            compile_expression(expr)
             return True
         except Exception:
             return False
@@ -272,9 +278,58 @@ class SimpleEval2:
         if not expr:
             raise InvalidExpression("Empty expression")
 
+        compiled = compile_expression(expr)
+        self.expr = expr
+        self.expr_ast = compiled.tree
+
+        return self._run(compiled.code, names)
+
+    def eval_batch(self, expr, items, default=empty):
+        """
+        Evaluate one expression for every names dict in items and return the list of results.
+        Names passed to the evaluator itself are shared by the whole batch: model objects they
+        refer to are serialized once, and subexpressions built only from constants and shared
+        names are evaluated once and folded into constants.
+        If default is given, it is returned for items whose evaluation raised InvalidExpression.
+        """
+        if not expr:
+            raise InvalidExpression("Empty expression")
+
+        compiled = compile_expression(expr)
         self.expr = expr
-        self.expr_ast = SimpleEval2.try_parse(expr)
+        self.expr_ast = compiled.tree
+
+        item_names = set().union(*(item.keys() for item in items if item))
+        assigned_names, mutated_names = _get_assigned_names(compiled.tree)
+        variant_names = item_names | assigned_names | mutated_names
+
+        for name in _get_referenced_names(compiled.tree) - variant_names:
+            self.get_var(name, None)
+
+        mutated_shared_names = [name for name in mutated_names - item_names if self.has_var(name)]
+
+        self.start_time = time.time()
+        folder = _BatchInvariantFolder(self, variant_names)
+        code = _compile(folder.visit(copy.deepcopy(compiled.tree)).body)
+
+        results = []
+        for item in items:
+            names = item
+            if mutated_shared_names:
+                names = dict(item or {})
+                for name in mutated_shared_names:
+                    names[name] = copy.deepcopy(self._table[name])
+
+            try:
+                results.append(self._run(code, names))
+            except InvalidExpression:
+                if default is empty:
+                    raise
+                results.append(default)
 
+        return results
+
+    def _run(self, code, names=None):
         save_table = self._table
         self._table = save_table.copy()
         if names:
@@ -282,7 +337,7 @@ class SimpleEval2:
                 self._table[k] = v
         try:
             self.start_time = time.time()
-            self.result = self._eval(self.expr_ast.body)
+            self.result = code(self)
             return self.result
         except _Return as e:
             return e.value
@@ -295,282 +350,628 @@ class SimpleEval2:
         finally:
             self._table = save_table
 
-    def _eval(self, node):
-        # _l.debug('%s - %s - %s', node, type(node), node.__class__)
-        # self.tik_time = time.time()
-        # if self.tik_time - self.start_time > self.max_time:
-        #     raise InvalidExpression("Execution exceeded time limit, max runtime is %s" % self.max_time)
-        self.check_time()
 
-        if isinstance(node, list | tuple):
-            return self._on_many(node)
+# Expression compiler.
+#
+# Every expression is parsed once and turned into a tree of pre-bound closures
+# ``code(evaluator)``. Compiled expressions are kept in a process-wide LRU keyed by
+# the expression text, so evaluating the same formula again skips both ``ast.parse``
+# and per-node method dispatch. Closures hold no evaluator state, so one compiled
+# expression is shared by all evaluators and threads.
+
+EXPRESSION_CACHE_SIZE = 4096
+
+LIST_METHODS = ("append", "pop", "remove")
+
+
+class CompiledExpression:
+    __slots__ = ("expr", "tree", "code")
+
+    def __init__(self, expr, tree, code):
+        self.expr = expr
+        self.tree = tree
+        self.code = code
+
+    def __repr__(self):
+        return f"<compiled {self.expr!r}>"
+
+    def __call__(self, evaluator):
+        return self.code(evaluator)
+
 
-        op = f"_on_ast_{type(node).__name__}"
-        if hasattr(self, op):
-            return getattr(self, op)(node)
+def _compile(node):
+    if isinstance(node, list | tuple):
+        return _compile_many(node)
 
-        raise InvalidExpression(f"Sorry, {type(node).__name__} is not available in this evaluator")
+    compiler = _COMPILERS.get(type(node))
+    if compiler is None:
+        return _compile_unsupported(node)
 
-    def _on_many(self, node):
+    return compiler(node)
+
+
+def _compile_unsupported(node):
+    message = f"Sorry, {type(node).__name__} is not available in this evaluator"
+
+    def code(evaluator):
+        raise InvalidExpression(message)
+
+    return code
+
+
+def _compile_many(nodes):
+    codes = tuple(_compile(n) for n in nodes)
+
+    def code(evaluator):
         ret = None
-        for n in node:
-            ret = self._eval(n)
+        for c in codes:
+            evaluator.check_time()
+            ret = c(evaluator)
         return ret
 
-    def _on_ast_Assign(self, node):
-        if not self.allow_assign:
-            raise InvalidExpression(f"Sorry, {type(node).__name__} is not available in this evaluator")
-
-        ret = self._eval(node.value)
-        for t in node.targets:
-            if isinstance(t, ast.Name):
-                self._table[t.id] = ret
-            elif isinstance(t, ast.Subscript):
-                obj = self._eval(t.value)
-                obj[self._eval(t.slice)] = ret
-            elif isinstance(t, ast.Attribute):
-                # TODO: check security
-                obj = self._eval(t.value)
-                if isinstance(obj, dict | OrderedDict):
-                    obj[t.attr] = ret
-                else:
-                    raise ExpressionSyntaxError("Invalid assign")
-                    # raise ExpressionSyntaxError('Invalid assign')
+    return code
+
+
+def _compile_assign_target(target):
+    if isinstance(target, ast.Name):
+        name = target.id
+
+        def assign(evaluator, ret):
+            evaluator._table[name] = ret
+
+    elif isinstance(target, ast.Subscript):
+        obj_code = _compile(target.value)
+        key_code = _compile(target.slice)
+
+        def assign(evaluator, ret):
+            obj = obj_code(evaluator)
+            obj[key_code(evaluator)] = ret
+
+    elif isinstance(target, ast.Attribute):
+        # TODO: check security
+        obj_code = _compile(target.value)
+        attr = target.attr
+
+        def assign(evaluator, ret):
+            obj = obj_code(evaluator)
+            if isinstance(obj, dict | OrderedDict):
+                obj[attr] = ret
             else:
                 raise ExpressionSyntaxError("Invalid assign")
+
+    else:
+
+        def assign(evaluator, ret):
+            raise ExpressionSyntaxError("Invalid assign")
+
+    return assign
+
+
+def _compile_assign(node):
+    message = f"Sorry, {type(node).__name__} is not available in this evaluator"
+    value = _compile(node.value)
+    targets = tuple(_compile_assign_target(t) for t in node.targets)
+
+    def code(evaluator):
+        if not evaluator.allow_assign:
+            raise InvalidExpression(message)
+
+        ret = value(evaluator)
+        for assign in targets:
+            assign(evaluator, ret)
         return ret
 
-    def _on_ast_If(self, node):
-        return self._eval(node.body) if self._eval(node.test) else self._eval(node.orelse)
+    return code
 
-    def _on_ast_For(self, node):
+
+def _compile_if(node):
+    test = _compile(node.test)
+    body = _compile(node.body)
+    orelse = _compile(node.orelse)
+
+    def code(evaluator):
+        return body(evaluator) if test(evaluator) else orelse(evaluator)
+
+    return code
+
+
+def _compile_for(node):
+    iter_code = _compile(node.iter)
+    body = _compile(node.body)
+    target = getattr(node.target, "id", None)
+
+    def code(evaluator):
         ret = None
-        for val in self._eval(node.iter):
-            self._table[node.target.id] = val
+        for val in iter_code(evaluator):
+            if target is None:
+                raise ExpressionSyntaxError("Invalid assign")
+
+            evaluator._table[target] = val
             try:
-                ret = self._eval(node.body)
+                ret = body(evaluator)
             except _Break:
                 break
         return ret
 
-    def _on_ast_While(self, node):
+    return code
+
+
+def _compile_while(node):
+    test = _compile(node.test)
+    body = _compile(node.body)
+
+    def code(evaluator):
         ret = None
-        while self._eval(node.test):
+        while test(evaluator):
             try:
-                ret = self._eval(node.body)
+                ret = body(evaluator)
             except _Break:
                 break
         return ret
 
-    def _on_ast_Break(self, node):
+    return code
+
+
+def _compile_break(node):
+    def code(evaluator):
         raise _Break()
 
-    def _on_ast_FunctionDef(self, node):
-        # self.local_functions[node.name] = node
-        self._table[node.name] = _UserDef(self, node)
+    return code
+
+
+def _compile_function_def(node):
+    name = node.name
+    body = _compile(node.body)
+    defaults = tuple(_compile(d) for d in node.args.defaults)
+
+    def code(evaluator):
+        evaluator._table[name] = _UserDef(evaluator, node, body, defaults)
+
+    return code
 
-    def _on_ast_Pass(self, node):
+
+def _compile_pass(node):
+    def code(evaluator):
         return None
 
-    def _on_ast_Try(self, node):
+    return code
+
+
+def _compile_try(node):
+    body = _compile(node.body)
+    handlers = tuple(_compile(h.body) for h in node.handlers if h.body)
+    orelse = _compile(node.orelse) if node.orelse else None
+    finalbody = _compile(node.finalbody) if node.finalbody else None
+
+    def code(evaluator):
         ret = None
         try:
-            ret = self._eval(node.body)
+            ret = body(evaluator)
         except Exception:
-            if node.handlers:
-                for n in node.handlers:
-                    # ast.ExceptHandler
-                    if n.body:
-                        ret = self._eval(n.body)
+            for handler in handlers:
+                ret = handler(evaluator)
         else:
-            if node.orelse:
-                ret = self._eval(node.orelse)
+            if orelse is not None:
+                ret = orelse(evaluator)
         finally:
-            if node.finalbody:
-                ret = self._eval(node.finalbody)
+            if finalbody is not None:
+                ret = finalbody(evaluator)
 
         return ret
 
-    def _on_ast_Num(self, node):
-        return node.n
+    return code
+
 
-    def _on_ast_Str(self, node):
-        if len(node.s) > MAX_STR_LEN:
-            raise ExpressionEvalError(
-                f"String Literal in statement is too long! ({len(node.s)}, when {MAX_STR_LEN} is max)"
-            )
-        return node.s
+def _compile_constant(node):
+    value = node.value
 
-    def _on_ast_NameConstant(self, node):
-        return node.value
+    def code(evaluator):
+        return value
 
-    def _on_ast_Constant(self, node):
-        return node.value
+    return code
 
-    def _on_ast_Dict(self, node):
+
+def _compile_dict(node):
+    items = tuple((_compile(k), _compile(v)) for k, v in zip(node.keys, node.values, strict=False))
+
+    def code(evaluator):
         d = {}
-        for k, v in zip(node.keys, node.values, strict=False):
-            k = self._eval(k)  # noqa: PLW2901
-            v = self._eval(v)  # noqa: PLW2901
-            d[k] = v
+        for k, v in items:
+            d[k(evaluator)] = v(evaluator)
             if len(d) > MAX_LEN:
                 raise ExpressionEvalError("Max dict length.")
         return d
 
-    def _on_ast_List(self, node):
+    return code
+
+
+def _compile_list(node):
+    elts = tuple(_compile(e) for e in node.elts)
+
+    def code(evaluator):
         d = []
-        for v in node.elts:
-            v = self._eval(v)  # noqa: PLW2901
-            d.append(v)
+        for e in elts:
+            d.append(e(evaluator))
             if len(d) > MAX_LEN:
                 raise ExpressionEvalError("Max list/tuple/set length.")
         return d
 
-    def _on_ast_Tuple(self, node):
-        return tuple(self._on_ast_List(node))
+    return code
+
+
+def _compile_tuple(node):
+    elts = _compile_list(node)
+
+    def code(evaluator):
+        return tuple(elts(evaluator))
+
+    return code
+
+
+def _compile_set(node):
+    elts = _compile_list(node)
+
+    def code(evaluator):
+        return set(elts(evaluator))
+
+    return code
+
+
+def _compile_unary_op(node):
+    op = OPERATORS.get(type(node.op))
+    if op is None:
+        return _compile_unsupported(node.op)
+
+    operand = _compile(node.operand)
+
+    def code(evaluator):
+        return op(operand(evaluator))
+
+    return code
+
+
+def _compile_bin_op(node):
+    op = OPERATORS.get(type(node.op))
+    if op is None:
+        return _compile_unsupported(node.op)
+
+    left = _compile(node.left)
+    right = _compile(node.right)
+
+    def code(evaluator):
+        return op(left(evaluator), right(evaluator))
 
-    def _on_ast_Set(self, node):
-        return set(self._on_ast_List(node))
+    return code
 
-    def _on_ast_UnaryOp(self, node):
-        return OPERATORS[type(node.op)](self._eval(node.operand))
 
-    def _on_ast_BinOp(self, node):
-        return OPERATORS[type(node.op)](self._eval(node.left), self._eval(node.right))
+def _compile_bool_op(node):
+    values = tuple(_compile(v) for v in node.values)
 
-    def _on_ast_BoolOp(self, node):
-        if isinstance(node.op, ast.And):
-            # return all((self._eval(v) for v in node.values))
+    if isinstance(node.op, ast.And):
+
+        def code(evaluator):
             res = False
-            for v in node.values:
-                res = self._eval(v)
+            for v in values:
+                res = v(evaluator)
                 if not res:
                     return False
             return res
-        elif isinstance(node.op, ast.Or):
-            # return any((self._eval(v) for v in node.values))
+
+    else:
+
+        def code(evaluator):
             res = True
-            for v in node.values:
-                res = self._eval(v)
+            for v in values:
+                res = v(evaluator)
                 if res:
                     return res
             return res
 
-    def _on_ast_Compare(self, node):
-        return OPERATORS[type(node.ops[0])](self._eval(node.left), self._eval(node.comparators[0]))
+    return code
+
+
+def _compile_compare(node):
+    op = OPERATORS.get(type(node.ops[0]))
+    if op is None:
+        return _compile_unsupported(node.ops[0])
 
-    def _on_ast_IfExp(self, node):
-        return self._eval(node.body) if self._eval(node.test) else self._eval(node.orelse)
+    left = _compile(node.left)
+    right = _compile(node.comparators[0])
 
-    def _on_ast_Call(self, node):
-        f = self._eval(node.func)
+    def code(evaluator):
+        return op(left(evaluator), right(evaluator))
+
+    return code
+
+
+def _compile_call(node):
+    func = _compile(node.func)
+    args = tuple(_compile(a) for a in node.args)
+    kwargs = tuple((k.arg, _compile(k.value)) for k in node.keywords)
+    is_list_method = isinstance(node.func, ast.Attribute) and node.func.attr in LIST_METHODS
+
+    def code(evaluator):
+        f = func(evaluator)
         if not callable(f):
             raise FunctionNotDefined(node.func.id)
 
-        f_args = [self._eval(a) for a in node.args]
-        f_kwargs = {k.arg: self._eval(k.value) for k in node.keywords}
+        f_args = [a(evaluator) for a in args]
+        f_kwargs = {k: v(evaluator) for k, v in kwargs}
 
-        try:
-            if node.func.attr in ["append", "pop", "remove"]:
+        if is_list_method:
+            try:
                 return f(*f_args)
-        except Exception:
-            pass
-            # TODO check why error is occuring
-            # _l.error("append do not work %s" % e)
+            except Exception:
+                pass
+                # TODO check why error is occuring
+
+        return f(evaluator, *f_args, **f_kwargs)
+
+    return code
+
+
+def _compile_return(node):
+    value = _compile(node.value)
+
+    def code(evaluator):
+        raise _Return(value(evaluator))
+
+    return code
+
+
+def _compile_name(node):
+    name = node.id
+
+    def code(evaluator):
+        return evaluator._find_name(name)
 
-        return f(self, *f_args, **f_kwargs)
+    return code
 
-    def _on_ast_Return(self, node):
-        val = self._eval(node.value)
-        raise _Return(val)
 
-    def _on_ast_Name(self, node):
-        return self._find_name(node.id)
+def _compile_subscript(node):
+    value = _compile(node.value)
+    index_or_key = _compile(node.slice)
 
-    def _on_ast_Subscript(self, node):
-        val = self._eval(node.value)
-        index_or_key = self._eval(node.slice)
+    def code(evaluator):
+        val = value(evaluator)
+        key = index_or_key(evaluator)
         try:
-            val = val[index_or_key]
-            return self._check_value(val)
+            return evaluator._check_value(val[key])
         except (IndexError, KeyError, TypeError):
             return None
 
-    def _on_ast_Attribute(self, node, val=empty):
-        if val is empty:
-            val = self._eval(node.value)
+    return code
+
+
+def _get_attribute(val, attr):
+    if isinstance(val, dict | OrderedDict):
+        try:
+            return val[attr]
+        except (IndexError, KeyError, TypeError) as e:
+            raise AttributeDoesNotExist(attr) from e
+
+    elif isinstance(val, list):
+        if attr in LIST_METHODS:
+            return getattr(val, attr)
+
+    elif isinstance(val, datetime.date):
+        if attr in ["year", "month", "day"]:
+            return getattr(val, attr)
+
+    elif isinstance(val, datetime.timedelta):
+        if attr in ["days"]:
+            return getattr(val, attr)
+
+    elif isinstance(val, relativedelta.relativedelta):
+        if attr in [
+            "years",
+            "months",
+            "days",
+            "leapdays",
+            "year",
+            "month",
+            "day",
+            "weekday",
+        ]:
+            return getattr(val, attr)
+
+    raise AttributeDoesNotExist(attr)
+
+
+def _compile_attribute(node):
+    value = _compile(node.value)
+    attr = node.attr
+
+    def code(evaluator):
+        val = value(evaluator)
         if val is None:
             return None
 
         if isinstance(val, types.FunctionType):
-            val = self._eval(node.value)
+            val = value(evaluator)
+
+        return _get_attribute(val, attr)
+
+    return code
+
+
+def _compile_expr(node):
+    return _compile(node.value)
+
+
+def _compile_slice(node):
+    lower = _compile(node.lower) if node.lower is not None else None
+    upper = _compile(node.upper) if node.upper is not None else None
+    step = _compile(node.step) if node.step is not None else None
+
+    def code(evaluator):
+        return slice(
+            lower(evaluator) if lower is not None else None,
+            upper(evaluator) if upper is not None else None,
+            step(evaluator) if step is not None else None,
+        )
+
+    return code
+
+
+_COMPILERS = {
+    ast.Assign: _compile_assign,
+    ast.If: _compile_if,
+    ast.For: _compile_for,
+    ast.While: _compile_while,
+    ast.Break: _compile_break,
+    ast.FunctionDef: _compile_function_def,
+    ast.Pass: _compile_pass,
+    ast.Try: _compile_try,
+    ast.Constant: _compile_constant,
+    ast.Dict: _compile_dict,
+    ast.List: _compile_list,
+    ast.Tuple: _compile_tuple,
+    ast.Set: _compile_set,
+    ast.UnaryOp: _compile_unary_op,
+    ast.BinOp: _compile_bin_op,
+    ast.BoolOp: _compile_bool_op,
+    ast.Compare: _compile_compare,
+    ast.IfExp: _compile_if,
+    ast.Call: _compile_call,
+    ast.Return: _compile_return,
+    ast.Name: _compile_name,
+    ast.Subscript: _compile_subscript,
+    ast.Attribute: _compile_attribute,
+    ast.Expr: _compile_expr,
+    ast.Slice: _compile_slice,
+}
+
+
+# Batch evaluation support.
+#
+# Subexpressions that depend only on constants and on names shared by the whole batch
+# are evaluated once per batch and replaced with constants. Calls are never folded,
+# functions may have side effects or depend on the evaluator context.
+
+INVARIANT_NODES = (
+    ast.Attribute,
+    ast.BinOp,
+    ast.BoolOp,
+    ast.Compare,
+    ast.IfExp,
+    ast.Slice,
+    ast.Subscript,
+    ast.Tuple,
+    ast.UnaryOp,
+)
+
+FOLDABLE_TYPES = (
+    bool,
+    int,
+    float,
+    str,
+    datetime.date,
+    datetime.timedelta,
+    type(None),
+)
+
+
+def _get_referenced_names(tree):
+    return {node.id for node in ast.walk(tree) if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load)}
+
+
+def _get_assigned_names(tree):
+    """
+    Return names assigned by the expression and names of objects mutated by it
+    (``obj[key] = value``, ``obj.attr = value`` or ``obj.append(value)``)
+    """
+    assigned = set()
+    mutated = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store):
+            assigned.add(node.id)
+        elif isinstance(node, ast.FunctionDef):
+            assigned.add(node.name)
+            assigned.update(arg.arg for arg in node.args.args)
+        elif (isinstance(node, ast.Subscript | ast.Attribute) and isinstance(node.ctx, ast.Store)) or (
+            isinstance(node, ast.Attribute) and node.attr in LIST_METHODS
+        ):
+            mutated.add(_get_root_name(node))
+
+    mutated.discard(None)
+    return assigned, mutated
 
-        if isinstance(val, dict | OrderedDict):
+
+def _get_root_name(node):
+    while isinstance(node, ast.Subscript | ast.Attribute):
+        node = node.value
+    return node.id if isinstance(node, ast.Name) else None
+
+
+class _BatchInvariantFolder(ast.NodeTransformer):
+    def __init__(self, evaluator, variant_names):
+        self.evaluator = evaluator
+        self.variant_names = variant_names
+
+    def is_invariant(self, node):
+        if isinstance(node, ast.Constant):
+            return True
+
+        if not isinstance(getattr(node, "ctx", None) or ast.Load(), ast.Load):
+            return False
+
+        if isinstance(node, ast.Name):
+            return node.id not in self.variant_names and self.evaluator.has_var(node.id)
+
+        if isinstance(node, INVARIANT_NODES):
+            return all(self.is_invariant(child) for child in ast.iter_child_nodes(node) if isinstance(child, ast.expr))
+
+        return False
+
+    def visit(self, node):
+        if isinstance(node, ast.expr) and not isinstance(node, ast.Constant) and self.is_invariant(node):
             try:
-                return val[node.attr]
-            except (IndexError, KeyError, TypeError) as e:
-                # _l.debug('AttributeDoesNotExist.node %s' % node)
-                # _l.debug('AttributeDoesNotExist.node.attr %s' % node.attr)
-                # _l.debug('AttributeDoesNotExist.node.value %s' % node.value)
-                # _l.debug('AttributeDoesNotExist.val %s' % val)
-
-                raise AttributeDoesNotExist(node.attr) from e
-
-        elif isinstance(val, list):
-            # _l.debug("list here? %s" % val)
-            # _l.debug("list here? node.value %s" % node.value)
-            # _l.debug("list here? node.attr %s" % node.attr)
-            if node.attr in ["append", "pop", "remove"]:
-                return getattr(val, node.attr)
-        elif isinstance(val, datetime.date):
-            if node.attr in ["year", "month", "day"]:
-                return getattr(val, node.attr)
-
-        elif isinstance(val, datetime.timedelta):
-            if node.attr in ["days"]:
-                return getattr(val, node.attr)
-
-        elif isinstance(val, relativedelta.relativedelta):
-            if node.attr in [
-                "years",
-                "months",
-                "days",
-                "leapdays",
-                "year",
-                "month",
-                "day",
-                "weekday",
-            ]:
-                return getattr(val, node.attr)
-
-        # _l.info('AttributeDoesNotExist.val %s' % val)
-        # _l.info('AttributeDoesNotExist.node %s' % node.__dict__)
-
-        raise AttributeDoesNotExist(node.attr)
-
-    def _on_ast_Index(self, node):
-        return self._eval(node.value)
-
-    def _on_ast_Expr(self, node):
-        return self._eval(node.value)
-
-    def _on_ast_Slice(self, node):
-        lower = upper = step = None
-        if node.lower is not None:
-            lower = self._eval(node.lower)
-        if node.upper is not None:
-            upper = self._eval(node.upper)
-        if node.step is not None:
-            step = self._eval(node.step)
-        return slice(lower, upper, step)
+                value = _compile(node)(self.evaluator)
+            except Exception:
+                value = empty
+
+            if value is not empty and isinstance(value, FOLDABLE_TYPES):
+                return ast.copy_location(ast.Constant(value=value), node)
+
+        return super().visit(node)
+
+
+def _compile_expression(expr):
+    tree = SimpleEval2.try_parse(expr)
+    return CompiledExpression(expr, tree, _compile(tree.body))
+
+
+@functools.lru_cache(maxsize=EXPRESSION_CACHE_SIZE)
+def _compile_expression_cached(expr):
+    return _compile_expression(expr)
+
+
+def compile_expression(expr):
+    """
+    Parse and compile expression, reusing the process-wide cache for string expressions.
+    Raises ExpressionSyntaxError/InvalidExpression for invalid expressions (never cached).
+    """
+    if isinstance(expr, str):
+        return _compile_expression_cached(expr)
+
+    return _compile_expression(expr)
+
+
+def clear_expressions_cache():
+    _compile_expression_cached.cache_clear()
+
+
+def get_referenced_names(expr) -> set:
+    """Names, which are read by expression, e.g. its inputs and functions"""
+    return _get_referenced_names(compile_expression(expr).tree)
 
 
 def validate(expr):
     from rest_framework.exceptions import ValidationError
 
     try:
-        SimpleEval2.try_parse(expr)
-        # try_parse(expr)
+        compile_expression(expr)
     except InvalidExpression as e:
         raise ValidationError(f"Invalid expression: {repr(e)}") from e
 
@@ -601,6 +1002,32 @@ def safe_eval(
     return result
 
 
+def safe_eval_batch(
+    s,
+    items,
+    names=None,
+    max_time=None,
+    add_print=False,
+    allow_assign=True,
+    now=None,
+    context=None,
+    default=empty,
+):
+    """
+    Evaluate expression s once for every names dict in items, names are shared by all items.
+    See SimpleEval2.eval_batch.
+    """
+    e = SimpleEval2(
+        names=names,
+        max_time=max_time,
+        add_print=add_print,
+        allow_assign=allow_assign,
+        now=now,
+        context=context,
+    )
+    return e.eval_batch(s, items, default=default)
+
+
 def safe_eval_with_logs(
     s,
     names=None,
@@ -643,13 +1070,14 @@ def register_fun(name, callback):
         raise InvalidExpression("Bad function callback")
     if name is None:
         raise InvalidExpression("Invalid function name")
-    if name is FUNCTIONS:
+    if name in FUNCTIONS_TABLE:
         raise InvalidExpression("Function with this name already registered")
 
-    if isinstance(callback, SimpleEval2Def):
-        FUNCTIONS[name] = callback
-    else:
-        FUNCTIONS[name] = SimpleEval2Def(name, callback)
+    if not isinstance(callback, SimpleEval2Def):
+        callback = SimpleEval2Def(name, callback)
+
+    FUNCTIONS.append(callback)
+    FUNCTIONS_TABLE[name] = callback
 
 
 def value_prepare(orig):
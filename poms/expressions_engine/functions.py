@@ -21,6 +21,7 @@ from poms.common.utils import (
     isclose,
 )
 from poms.expressions_engine.exceptions import ExpressionEvalError, InvalidExpression
+from poms.expressions_engine.market_data import get_market_data_cache
 
 _l = logging.getLogger("poms.formula")
 
@@ -1155,18 +1156,13 @@ def _get_mapping_key_by_value(evaluator, user_code, value, **kwargs):
 
         master_user = get_master_user_from_context(context)
 
-        from poms.integrations.models import MappingTable
+        from poms.integrations.mapping_tables import get_mapping_table_index
 
-        mapping_table = MappingTable.objects.get(master_user=master_user, user_code=user_code)
-
-        result = None
-
-        for item in mapping_table.items.all():
-            if item.value == value:
-                result = item.key
-                break
+        index = get_mapping_table_index(master_user, user_code)
+        if index is None:
+            return None
 
-        return result
+        return index.key_by_value.get(value)
     except Exception as e:
         _l.error("_get_mapping_key_by_value.exception %s", e)
         return None
@@ -1182,18 +1178,13 @@ def _get_mapping_value_by_key(evaluator, user_code, key, **kwargs):
 
         master_user = get_master_user_from_context(context)
 
-        from poms.integrations.models import MappingTable
-
-        mapping_table = MappingTable.objects.get(master_user=master_user, user_code=user_code)
-
-        result = None
+        from poms.integrations.mapping_tables import get_mapping_table_index
 
-        for item in mapping_table.items.all():
-            if item.key == key:
-                result = item.value
-                break
+        index = get_mapping_table_index(master_user, user_code)
+        if index is None:
+            return None
 
-        return result
+        return index.value_by_key.get(key)
     except Exception as e:
         _l.error("_get_mapping_value_by_key.exception %s", e)
         return None
@@ -1209,16 +1200,13 @@ def _get_mapping_keys(evaluator, user_code, **kwargs):
 
         master_user = get_master_user_from_context(context)
 
-        from poms.integrations.models import MappingTable
-
-        mapping_table = MappingTable.objects.get(master_user=master_user, user_code=user_code)
+        from poms.integrations.mapping_tables import get_mapping_table_index
 
-        result = []
-
-        for item in mapping_table.items.all():
-            result.append(item.key)
+        index = get_mapping_table_index(master_user, user_code)
+        if index is None:
+            return None
 
-        return result
+        return list(index.keys)
     except Exception as e:
         _l.error("_get_mapping_keys.exception %s", e)
         return None
@@ -1234,17 +1222,13 @@ def _get_mapping_key_values(evaluator, user_code, key, **kwargs):
 
         master_user = get_master_user_from_context(context)
 
-        from poms.integrations.models import MappingTable
+        from poms.integrations.mapping_tables import get_mapping_table_index
 
-        mapping_table = MappingTable.objects.get(master_user=master_user, user_code=user_code)
-
-        result = []
-
-        for item in mapping_table.items.all():
-            if item.key == key:
-                result.append(item.value)
+        index = get_mapping_table_index(master_user, user_code)
+        if index is None:
+            return None
 
-        return result
+        return list(index.values_by_key.get(key, []))
     except Exception as e:
         _l.error("_get_mapping_key_values.exception %s", e)
         return None
@@ -1337,7 +1321,6 @@ _generate_user_code.evaluator = True
 
 
 def _get_fx_rate(evaluator, date, currency, pricing_policy, default_value=0):
-    from poms.currencies.models import CurrencyHistory
     from poms.users.utils import get_master_user_from_context
 
     context = evaluator.context
@@ -1349,10 +1332,7 @@ def _get_fx_rate(evaluator, date, currency, pricing_policy, default_value=0):
 
     # TODO need master user check, security hole
 
-    try:
-        result = CurrencyHistory.objects.get(date=date, currency=currency, pricing_policy=pricing_policy)
-    except (CurrencyHistory.DoesNotExist, KeyError):
-        result = None
+    result = get_market_data_cache(context).get_fx_rate(currency, pricing_policy, date)
 
     if result:
         return result.fx_rate
@@ -1393,6 +1373,8 @@ def _add_fx_rate(evaluator, date, currency, pricing_policy, fx_rate=0, overwrite
 
         result.save()
 
+    get_market_data_cache(context).set_fx_rate(result)
+
     return True
 
 
@@ -1462,6 +1444,8 @@ def _add_price_history(
 
         result.save()
 
+    get_market_data_cache(evaluator.context).set_price(result)
+
     return True
 
 
@@ -1470,7 +1454,6 @@ _add_price_history.evaluator = True
 
 def _get_latest_principal_price(evaluator, date_from, date_to, instrument, pricing_policy, default_value=None):
     try:
-        from poms.instruments.models import PriceHistory
         from poms.users.utils import get_master_user_from_context
 
         context = evaluator.context
@@ -1484,21 +1467,14 @@ def _get_latest_principal_price(evaluator, date_from, date_to, instrument, prici
         _l.info("_get_latest_principal_price instrument %s", instrument)
         _l.info("_get_latest_principal_price  pricing_policy %s", pricing_policy)
 
-        results = (
-            PriceHistory.objects.exclude(principal_price=0)
-            .filter(
-                date__gte=date_from,
-                date__lte=date_to,
-                instrument=instrument,
-                pricing_policy=pricing_policy,
-            )
-            .order_by("-date")
+        result = get_market_data_cache(context).get_latest_principal_price(
+            instrument, pricing_policy, date_from, date_to
         )
 
-        _l.info("_get_latest_principal_price results %s", results)
+        _l.info("_get_latest_principal_price result %s", result)
 
-        if list(results):
-            return results[0].principal_price
+        if result:
+            return result.principal_price
 
         return default_value
     except Exception as e:
@@ -1546,7 +1522,6 @@ _get_latest_principal_price_date.evaluator = True
 
 def _get_latest_fx_rate(evaluator, date_from, date_to, currency, pricing_policy, default_value=None):
     try:
-        from poms.currencies.models import CurrencyHistory
         from poms.users.utils import get_master_user_from_context
 
         context = evaluator.context
@@ -1560,16 +1535,11 @@ def _get_latest_fx_rate(evaluator, date_from, date_to, currency, pricing_policy,
         _l.info("_get_latest_fx_rate instrument %s", currency)
         _l.info("_get_latest_fx_rate  pricing_policy %s", pricing_policy)
 
-        results = CurrencyHistory.objects.filter(
-            date__gte=date_from,
-            date__lte=date_to,
-            currency=currency,
-            pricing_policy=pricing_policy,
-        ).order_by("-date")
+        result = get_market_data_cache(context).get_latest_fx_rate(currency, pricing_policy, date_from, date_to)
 
-        _l.info("_get_latest_fx_rate results %s", results)
+        _l.info("_get_latest_fx_rate result %s", result)
 
-        return results[0].fx_rate if list(results) else default_value
+        return result.fx_rate if result else default_value
 
     except Exception as e:
         _l.info("_get_latest_fx_rate exception %s", e)
@@ -1580,7 +1550,6 @@ _get_latest_fx_rate.evaluator = True
 
 
 def _get_price_history_principal_price(evaluator, date, instrument, pricing_policy, default_value=0):
-    from poms.instruments.models import PriceHistory
     from poms.users.utils import get_master_user_from_context
 
     context = evaluator.context
@@ -1592,13 +1561,11 @@ def _get_price_history_principal_price(evaluator, date, instrument, pricing_poli
     instrument = _safe_get_instrument(evaluator, instrument)
     pricing_policy = _safe_get_pricing_policy(evaluator, pricing_policy)
 
-    try:
-        result = PriceHistory.objects.get(date=date, instrument=instrument, pricing_policy=pricing_policy)
-
+    result = get_market_data_cache(context).get_price(instrument, pricing_policy, date)
+    if result:
         return result.principal_price
 
-    except PriceHistory.DoesNotExist:
-        print("Price history is not found")
+    print("Price history is not found")
 
     return default_value
 
@@ -1644,13 +1611,9 @@ def _get_price_history_accrued_price(
         raise ExpressionEvalError("Invalid Pricing Policy")
 
     if days_to_look_back == 0:
-        try:
-            result = PriceHistory.objects.get(date=date, instrument=instrument, pricing_policy_id=pricing_policy_pk)
+        result = get_market_data_cache(context).get_price(instrument, pricing_policy_pk, date)
 
-            return result.accrued_price
-
-        except PriceHistory.DoesNotExist:
-            return default_value
+        return result.accrued_price if result else default_value
 
     else:
         if days_to_look_back < 0:
@@ -1712,15 +1675,7 @@ def _get_price_history(evaluator, date, instrument, pricing_policy, default_valu
         raise ExpressionEvalError("Invalid Pricing Policy")
 
     if days_to_look_back == 0:
-        try:
-            return PriceHistory.objects.get(
-                date=date,
-                instrument=instrument,
-                pricing_policy_id=pricing_policy_pk,
-            )
-
-        except PriceHistory.DoesNotExist:
-            return None
+        return get_market_data_cache(context).get_price(instrument, pricing_policy_pk, date)
 
     else:
         if days_to_look_back < 0:
@@ -1782,13 +1737,9 @@ def _get_factor_from_price(evaluator, date, instrument, pricing_policy, default_
         raise ExpressionEvalError("Invalid Pricing Policy")
 
     if days_to_look_back == 0:
-        try:
-            result = PriceHistory.objects.get(date=date, instrument=instrument, pricing_policy_id=pricing_policy_pk)
-
-            return result.factor
+        result = get_market_data_cache(context).get_price(instrument, pricing_policy_pk, date)
 
-        except PriceHistory.DoesNotExist:
-            return 1
+        return result.factor if result else 1
 
     else:
         if days_to_look_back < 0:
@@ -2154,6 +2105,10 @@ def _safe_get_pricing_policy(evaluator, pricing_policy):
     if id is None and user_code is None:
         raise ExpressionEvalError("Invalid pricing policy")
 
+    cached = context.get(("_safe_get_pricing_policy", pk, user_code), None)
+    if cached is not None:
+        return cached
+
     master_user = get_master_user_from_context(context)
     member = get_member_from_context(context)  # noqa: F841
 
@@ -2172,6 +2127,10 @@ def _safe_get_pricing_policy(evaluator, pricing_policy):
     except PricingPolicy.DoesNotExist as e:
         raise ExpressionEvalError() from e
 
+    if isinstance(pricing_policy, PricingPolicy):
+        context[("_safe_get_pricing_policy", pricing_policy.pk, None)] = pricing_policy
+        context[("_safe_get_pricing_policy", None, pricing_policy.user_code)] = pricing_policy
+
     return pricing_policy
 
 
@@ -2202,6 +2161,10 @@ def _safe_get_currency(evaluator, currency):
     if id is None and user_code is None:
         raise ExpressionEvalError("Invalid currency")
 
+    cached = context.get(("_safe_get_currency", pk, user_code), None)
+    if cached is not None:
+        return cached
+
     master_user = get_master_user_from_context(context)
     member = get_member_from_context(context)  # noqa: F841
 
@@ -2220,6 +2183,10 @@ def _safe_get_currency(evaluator, currency):
     except Currency.DoesNotExist as e:
         raise ExpressionEvalError() from e
 
+    if isinstance(currency, Currency):
+        context[("_safe_get_currency", currency.pk, None)] = currency
+        context[("_safe_get_currency", None, currency.user_code)] = currency
+
     return currency
 
 
@@ -3646,23 +3613,16 @@ def _get_rt_value(evaluator, key, table_name, default=None):
 
     master_user = get_master_user_from_context(context)
 
-    from poms.reference_tables.models import ReferenceTable, ReferenceTableRow
+    rows = get_market_data_cache(context).get_reference_table(master_user, table_name)
 
-    try:
-        table = ReferenceTable.objects.get(master_user=master_user, name=table_name)
-
-        try:
-            row = ReferenceTableRow.objects.get(reference_table=table, key=key)
-
-            return row.value
-
-        except ReferenceTableRow.DoesNotExist:
-            return default
-
-    except ReferenceTable.DoesNotExist:
+    if rows is None:
         print("_get_rt_value error")
+        return default
 
-    return default
+    if key is None:
+        return default
+
+    return rows.get(str(key), default)
 
 
 _get_rt_value.evaluator = True
@@ -0,0 +1,207 @@
+import datetime
+
+MARKET_DATA_CACHE_KEY = "market_data_cache"
+
+
+def _pk(obj):
+    return getattr(obj, "pk", obj)
+
+
+class MarketDataCache:
+    """
+    Memoizes FX rates, prices and reference table rows requested by expression functions.
+    The cache is stored in the evaluator context, so it lives as long as the context does
+    (one request, report or import run). Missing records are cached as None too.
+    """
+
+    def __init__(self):
+        self.fx_rates = {}  # (currency_id, pricing_policy_id, date) -> CurrencyHistory | None
+        self.prices = {}  # (instrument_id, pricing_policy_id, date) -> PriceHistory | None
+        self.latest_fx_rates = {}  # (currency_id, pricing_policy_id, date_from, date_to) -> CurrencyHistory | None
+        self.latest_prices = {}  # (instrument_id, pricing_policy_id, date_from, date_to) -> PriceHistory | None
+        self.reference_tables = {}  # (master_user_id, table_name) -> {key: value} | None
+        self._fx_rates_windows = []  # (currency_ids, pricing_policy_ids, date_from, date_to)
+        self._prices_windows = []  # (instrument_ids, pricing_policy_ids, date_from, date_to)
+
+    @staticmethod
+    def _in_windows(windows, obj_id, pricing_policy_id, date_from, date_to=None):
+        date_to = date_to or date_from
+        return any(
+            obj_id in obj_ids
+            and (pricing_policy_ids is None or pricing_policy_id in pricing_policy_ids)
+            and window_from <= date_from
+            and date_to <= window_to
+            for obj_ids, pricing_policy_ids, window_from, window_to in windows
+        )
+
+    def prefetch(self, date_from, date_to, currencies=None, instruments=None, pricing_policies=None):
+        """
+        Load FX rates of currencies and prices of instruments for the whole date window,
+        one query per model. Later lookups inside the window never hit the database.
+        """
+        from poms.currencies.models import CurrencyHistory
+        from poms.instruments.models import PriceHistory
+
+        pricing_policy_ids = {_pk(p) for p in pricing_policies} if pricing_policies is not None else None
+
+        if currencies:
+            currency_ids = {_pk(c) for c in currencies}
+            qs = CurrencyHistory.objects.filter(currency_id__in=currency_ids, date__gte=date_from, date__lte=date_to)
+            if pricing_policy_ids is not None:
+                qs = qs.filter(pricing_policy_id__in=pricing_policy_ids)
+
+            for record in qs:
+                self.fx_rates[(record.currency_id, record.pricing_policy_id, record.date)] = record
+
+            self._fx_rates_windows.append((currency_ids, pricing_policy_ids, date_from, date_to))
+
+        if instruments:
+            instrument_ids = {_pk(i) for i in instruments}
+            qs = PriceHistory.objects.filter(instrument_id__in=instrument_ids, date__gte=date_from, date__lte=date_to)
+            if pricing_policy_ids is not None:
+                qs = qs.filter(pricing_policy_id__in=pricing_policy_ids)
+
+            for record in qs:
+                self.prices[(record.instrument_id, record.pricing_policy_id, record.date)] = record
+
+            self._prices_windows.append((instrument_ids, pricing_policy_ids, date_from, date_to))
+
+    def get_fx_rate(self, currency, pricing_policy, date):
+        from poms.currencies.models import CurrencyHistory
+
+        key = (_pk(currency), _pk(pricing_policy), date)
+        if key in self.fx_rates:
+            return self.fx_rates[key]
+
+        record = None
+        if not self._in_windows(self._fx_rates_windows, *key):
+            record = CurrencyHistory.objects.filter(
+                currency_id=key[0],
+                pricing_policy_id=key[1],
+                date=date,
+            ).first()
+
+        self.fx_rates[key] = record
+        return record
+
+    def get_price(self, instrument, pricing_policy, date):
+        from poms.instruments.models import PriceHistory
+
+        key = (_pk(instrument), _pk(pricing_policy), date)
+        if key in self.prices:
+            return self.prices[key]
+
+        record = None
+        if not self._in_windows(self._prices_windows, *key):
+            record = PriceHistory.objects.filter(
+                instrument_id=key[0],
+                pricing_policy_id=key[1],
+                date=date,
+            ).first()
+
+        self.prices[key] = record
+        return record
+
+    def _get_latest(self, records, windows, obj_id, pricing_policy_id, date_from, date_to, is_valid):
+        if not self._in_windows(windows, obj_id, pricing_policy_id, date_from, date_to):
+            return None, False
+
+        date = date_to
+        while date >= date_from:
+            record = records.get((obj_id, pricing_policy_id, date))
+            if record is not None and is_valid(record):
+                return record, True
+            date -= datetime.timedelta(days=1)
+
+        return None, True
+
+    def get_latest_fx_rate(self, currency, pricing_policy, date_from, date_to):
+        """Return the most recent FX rate record within [date_from, date_to]"""
+        from poms.currencies.models import CurrencyHistory
+
+        key = (_pk(currency), _pk(pricing_policy), date_from, date_to)
+        if key in self.latest_fx_rates:
+            return self.latest_fx_rates[key]
+
+        record, found = self._get_latest(self.fx_rates, self._fx_rates_windows, *key, is_valid=lambda r: True)
+        if not found:
+            record = (
+                CurrencyHistory.objects.filter(
+                    currency_id=key[0],
+                    pricing_policy_id=key[1],
+                    date__gte=date_from,
+                    date__lte=date_to,
+                )
+                .order_by("-date")
+                .first()
+            )
+
+        self.latest_fx_rates[key] = record
+        return record
+
+    def get_latest_principal_price(self, instrument, pricing_policy, date_from, date_to):
+        """Return the most recent price record with non zero principal price within [date_from, date_to]"""
+        from poms.instruments.models import PriceHistory
+
+        key = (_pk(instrument), _pk(pricing_policy), date_from, date_to)
+        if key in self.latest_prices:
+            return self.latest_prices[key]
+
+        record, found = self._get_latest(
+            self.prices,
+            self._prices_windows,
+            *key,
+            is_valid=lambda r: r.principal_price != 0,
+        )
+        if not found:
+            record = (
+                PriceHistory.objects.exclude(principal_price=0)
+                .filter(
+                    instrument_id=key[0],
+                    pricing_policy_id=key[1],
+                    date__gte=date_from,
+                    date__lte=date_to,
+                )
+                .order_by("-date")
+                .first()
+            )
+
+        self.latest_prices[key] = record
+        return record
+
+    def get_reference_table(self, master_user, table_name):
+        """Return rows of reference table as {key: value}, None if table does not exist"""
+        from poms.reference_tables.models import ReferenceTable, ReferenceTableRow
+
+        key = (_pk(master_user), table_name)
+        if key in self.reference_tables:
+            return self.reference_tables[key]
+
+        try:
+            table = ReferenceTable.objects.get(master_user=master_user, name=table_name)
+            rows = dict(ReferenceTableRow.objects.filter(reference_table=table).values_list("key", "value"))
+        except ReferenceTable.DoesNotExist:
+            rows = None
+
+        self.reference_tables[key] = rows
+        return rows
+
+    def set_fx_rate(self, record):
+        self.fx_rates[(record.currency_id, record.pricing_policy_id, record.date)] = record
+        self.latest_fx_rates.clear()
+
+    def set_price(self, record):
+        self.prices[(record.instrument_id, record.pricing_policy_id, record.date)] = record
+        self.latest_prices.clear()
+
+
+def get_market_data_cache(context):
+    """Return market data cache of evaluator context, creating it on first use"""
+    if context is None:
+        return MarketDataCache()
+
+    cache = context.get(MARKET_DATA_CACHE_KEY)
+    if cache is None:
+        cache = context[MARKET_DATA_CACHE_KEY] = MarketDataCache()
+
+    return cache
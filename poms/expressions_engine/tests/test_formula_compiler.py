@@ -0,0 +1,106 @@
+from poms.common.common_base_test import BaseTestCase
+from poms.expressions_engine import formula
+from poms.expressions_engine.exceptions import (
+    AttributeDoesNotExist,
+    ExpressionSyntaxError,
+    InvalidExpression,
+    NameNotDefined,
+)
+
+
+class FormulaCompilerTest(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        formula.clear_expressions_cache()
+
+    @BaseTestCase.cases(
+        ("arithmetic", "1 + 2 * 3 - 4 / 2", 5.0),
+        ("compare", "3 >= 2", True),
+        ("bool_and", "1 and 0", False),
+        ("bool_or", "0 or 'a'", "a"),
+        ("if_exp", "'yes' if x > 1 else 'no'", "yes"),
+        ("subscript", "d['a'][1]", 2),
+        ("missing_subscript", "d['missing']", None),
+        ("attribute", "d.b", "c"),
+        ("slice", "'abcdef'[1:4]", "bcd"),
+        ("containers", "len([1, 2]) + len((3,)) + len({4}) + len({'k': 5})", 5),
+        ("function", "str(x) + upper('a')", "10A"),
+        ("list_method", "items = [1]\nitems.append(2)\nitems", [1, 2]),
+        ("for_break", "s = 0\nfor i in [1, 2, 3, 4]:\n    if i > 3:\n        break\n    s = s + i\ns", 6),
+        ("while", "n = 0\nwhile n < 5:\n    n = n + 1\nn", 5),
+        ("def_return", "def f(a, b=2):\n    return a * b\nf(4)", 8),
+        ("try_except", "try:\n    r = 1 / 0\nexcept:\n    r = -1\nr", -1),
+    )
+    def test_compiled_eval(self, expr, expected):
+        names = {"x": 10, "d": {"a": [1, 2], "b": "c"}}
+
+        self.assertEqual(formula.safe_eval(expr, names=names), expected)
+
+    def test_compiled_expression_is_cached(self):
+        first = formula.compile_expression("a + 1")
+        second = formula.compile_expression("a + 1")
+
+        self.assertIs(first, second)
+        self.assertEqual(formula.safe_eval("a + 1", names={"a": 1}), 2)
+        self.assertEqual(formula.safe_eval("a + 1", names={"a": 41}), 42)
+
+    def test_syntax_error_is_not_cached(self):
+        with self.assertRaises(ExpressionSyntaxError):
+            formula.compile_expression("a +")
+
+        self.assertEqual(formula._compile_expression_cached.cache_info().currsize, 0)
+
+    def test_assign_not_allowed(self):
+        with self.assertRaises(InvalidExpression):
+            formula.safe_eval("a = 1", allow_assign=False)
+
+    def test_unsupported_node(self):
+        with self.assertRaises(InvalidExpression):
+            formula.safe_eval("[i for i in [1, 2]]")
+
+    def test_errors(self):
+        with self.assertRaises(NameNotDefined):
+            formula.safe_eval("unknown_name")
+
+        with self.assertRaises(AttributeDoesNotExist):
+            formula.safe_eval("d.missing", names={"d": {}})
+
+    def test_assignments_do_not_leak_between_evaluations(self):
+        evaluator = formula.SimpleEval2(allow_assign=True)
+
+        self.assertEqual(evaluator.eval("a = 5\na"), 5)
+        self.assertFalse(evaluator.has_var("a"))
+
+    def test_safe_eval_batch(self):
+        items = [{"x": 1}, {"x": 2}, {"x": 0}]
+        names = {"rate": 2, "ccy": {"code": "USD"}}
+
+        self.assertEqual(
+            formula.safe_eval_batch("x * rate + len(ccy.code)", items, names=names),
+            [5, 7, 3],
+        )
+        self.assertEqual(
+            formula.safe_eval_batch("1 / x", items, default="invalid"),
+            [1.0, 0.5, "invalid"],
+        )
+        with self.assertRaises(InvalidExpression):
+            formula.safe_eval_batch("1 / x", items)
+
+    def test_safe_eval_batch_does_not_share_mutations(self):
+        items = [{"x": 1}, {"x": 2}]
+
+        self.assertEqual(
+            formula.safe_eval_batch("values.append(x)\nvalues", items, names={"values": []}),
+            [[1], [2]],
+        )
+
+    def test_safe_eval_batch_item_names_override_shared(self):
+        items = [{"x": 1}, {"x": 2, "rate": 10}]
+
+        self.assertEqual(formula.safe_eval_batch("x * rate", items, names={"rate": 2}), [2, 20])
+
+    def test_get_referenced_names(self):
+        self.assertEqual(
+            formula.get_referenced_names("a = x + y\nstr(a) + upper(z)"),
+            {"x", "y", "a", "str", "upper", "z"},
+        )
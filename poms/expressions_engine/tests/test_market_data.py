@@ -0,0 +1,109 @@
+from datetime import timedelta
+
+from poms.common.common_base_test import BaseTestCase
+from poms.currencies.models import CurrencyHistory
+from poms.expressions_engine import formula
+from poms.expressions_engine.market_data import MARKET_DATA_CACHE_KEY, get_market_data_cache
+from poms.instruments.models import PriceHistory
+
+
+class MarketDataCacheTest(BaseTestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        super().setUp()
+        self.init_test_case()
+        self.pricing_policy = self.create_pricing_policy()
+        self.instrument = self.create_instrument()
+        self.date = self.yesterday()
+        self.context = {"master_user": self.master_user, "member": self.member}
+
+    def create_fx_rate(self, date, fx_rate) -> CurrencyHistory:
+        return CurrencyHistory.objects.create(
+            currency=self.eur,
+            pricing_policy=self.pricing_policy,
+            fx_rate=fx_rate,
+            date=date,
+        )
+
+    def create_price(self, date, principal_price) -> PriceHistory:
+        price = PriceHistory(
+            instrument=self.instrument,
+            pricing_policy=self.pricing_policy,
+            principal_price=principal_price,
+            accrued_price=0,
+            date=date,
+        )
+        PriceHistory.objects.bulk_create([price])
+        return price
+
+    def test__get_fx_rate_is_memoized_in_context(self):
+        self.create_fx_rate(self.date, 1.25)
+        expr = f"get_fx_rate('{self.date}', 'EUR', '{self.pricing_policy.user_code}')"
+
+        self.assertEqual(formula.safe_eval(expr, context=self.context), 1.25)
+        self.assertIn(MARKET_DATA_CACHE_KEY, self.context)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(formula.safe_eval(expr, context=self.context), 1.25)
+
+    def test__missing_fx_rate_is_memoized(self):
+        cache = get_market_data_cache(self.context)
+
+        self.assertIsNone(cache.get_fx_rate(self.eur, self.pricing_policy, self.date))
+        with self.assertNumQueries(0):
+            self.assertIsNone(cache.get_fx_rate(self.eur, self.pricing_policy, self.date))
+
+    def test__prefetch(self):
+        self.create_fx_rate(self.date, 1.1)
+        self.create_fx_rate(self.date - timedelta(days=2), 1.2)
+        self.create_price(self.date - timedelta(days=3), 101)
+        self.create_price(self.date - timedelta(days=1), 0)
+
+        cache = get_market_data_cache(self.context)
+        with self.assertNumQueries(2):
+            cache.prefetch(
+                self.date - timedelta(days=5),
+                self.date,
+                currencies=[self.eur],
+                instruments=[self.instrument],
+                pricing_policies=[self.pricing_policy],
+            )
+
+        with self.assertNumQueries(0):
+            self.assertEqual(cache.get_fx_rate(self.eur, self.pricing_policy, self.date).fx_rate, 1.1)
+            self.assertIsNone(cache.get_fx_rate(self.eur, self.pricing_policy, self.date - timedelta(days=1)))
+            self.assertEqual(
+                cache.get_latest_fx_rate(
+                    self.eur,
+                    self.pricing_policy,
+                    self.date - timedelta(days=5),
+                    self.date - timedelta(days=1),
+                ).fx_rate,
+                1.2,
+            )
+            self.assertEqual(
+                cache.get_latest_principal_price(
+                    self.instrument,
+                    self.pricing_policy,
+                    self.date - timedelta(days=5),
+                    self.date,
+                ).principal_price,
+                101,
+            )
+
+        # outside of prefetched window
+        with self.assertNumQueries(1):
+            cache.get_price(self.instrument, self.pricing_policy, self.date + timedelta(days=1))
+
+    def test__add_fx_rate_updates_cache(self):
+        expr = f"get_fx_rate('{self.date}', 'EUR', '{self.pricing_policy.user_code}', -1)"
+
+        self.assertEqual(formula.safe_eval(expr, context=self.context), -1)
+
+        formula.safe_eval(
+            f"add_fx_rate('{self.date}', 'EUR', '{self.pricing_policy.user_code}', 1.5)",
+            context=self.context,
+        )
+
+        self.assertEqual(formula.safe_eval(expr, context=self.context), 1.5)
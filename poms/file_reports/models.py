@@ -2,7 +2,7 @@ import json
 from logging import getLogger
 
 from django.conf import settings
-from django.core.files.base import ContentFile
+from django.core.files.base import ContentFile, File
 from django.core.mail import EmailMessage
 from django.db import models
 from django.utils.translation import gettext_lazy
@@ -75,6 +75,23 @@ class FileReport(models.Model):
         self.file_url = file_url
         return file_url
 
+    def upload_local_file(self, file_name, local_file, master_user):
+        """Upload content of opened local file, without reading it in memory"""
+        file_url = self._get_path(file_name)
+        try:
+            if storage:
+                storage.save(f"/{master_user.space_code}{file_url}", File(local_file, name=file_name))
+
+            else:  # local/test mode
+                print(f"file '{file_name}' saved to storage '{file_url}'")
+
+        except Exception as e:
+            _l.error(f"upload_local_file {file_name} {file_url} error {repr(e)}")
+            return ""
+
+        self.file_url = file_url
+        return file_url
+
     def upload_json_as_local_file(self, file_name, dict_to_json, master_user):
         file_url = self._get_path(file_name)
         try:
@@ -0,0 +1,373 @@
+import json
+import logging
+import traceback
+import weakref
+from collections import defaultdict
+from threading import local
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import DEFERRED
+from django.forms.models import model_to_dict
+
+from poms.common.celery import get_active_celery_task, get_active_celery_task_id
+from poms.common.middleware import get_request
+from poms.history.models import (
+    HistoricalRecord,
+    get_diff_and_notes,
+    get_model_content_type_as_text,
+    get_serialized_data,
+    get_user_code_from_instance,
+)
+
+_l = logging.getLogger("poms.history")
+
+# action of saved object, it is create or change depending on existing records of the object
+JOURNAL_ACTION_SAVE = "save"
+
+JOURNAL_POLICY_FULL = "full"
+JOURNAL_POLICY_SUMMARY = "summary"
+JOURNAL_POLICY_SKIP = "skip"
+
+RECYCLE_BIN_NOTES = {"message": "User moved object to Recycle Bin"}
+
+_journal = local()
+
+
+def get_journal_policy(content_type_key: str) -> str:
+    return settings.HISTORY_JOURNAL_MODEL_POLICIES.get(content_type_key, JOURNAL_POLICY_FULL)
+
+
+def get_record_context_keys() -> dict:
+    """
+    Ids of master user, member and celery task of the current request or celery task,
+    resolved into objects by the journal worker, see resolve_record_context
+    """
+    from poms.common.models import ProxyRequest
+
+    result = {
+        "member_id": None,
+        "user_id": None,
+        "celery_task_id": None,
+        "context_url": "Unknown",
+    }
+
+    request = get_request()
+    if request:
+        if isinstance(request, ProxyRequest):
+            result["member_id"] = request.user.member.id
+        else:
+            result["user_id"] = request.user.id
+            result["context_url"] = request.path
+
+    else:
+        lib_celery_task = get_active_celery_task()
+        result["celery_task_id"] = get_active_celery_task_id()
+        result["context_url"] = lib_celery_task.name if lib_celery_task else "Shell"
+
+    return result
+
+
+def send_journal_entries(entries: list):
+    """Journal entries are sent to the journal worker by tasks of HISTORY_JOURNAL_BATCH_SIZE entries"""
+    from poms.history.tasks import write_historical_records
+    from poms.users.models import MasterUser
+
+    try:
+        master_user = MasterUser.objects.first()
+        if not master_user or master_user.journal_status == MasterUser.JOURNAL_STATUS_DISABLED:
+            return
+
+        context = {
+            "space_code": master_user.space_code,
+            "realm_code": master_user.realm_code,
+        }
+        batch_size = settings.HISTORY_JOURNAL_BATCH_SIZE
+        for start in range(0, len(entries), batch_size):
+            write_historical_records.apply_async(
+                kwargs={
+                    "entries": entries[start : start + batch_size],
+                    "context": context,
+                }
+            )
+
+    except Exception as e:
+        _l.error(f"send_journal_entries: could not send {len(entries)} entries {repr(e)} {traceback.format_exc()}")
+
+
+class JournalBatch:
+    """
+    Journal entries of one database transaction and savepoint, they are sent to the journal worker
+    after the transaction is committed and are discarded with the rolled back transaction or savepoint
+    """
+
+    def __init__(self, savepoint_ids: tuple):
+        self.entries = []
+        self.savepoint_ids = savepoint_ids
+        self.sent = False
+
+    def add(self, entry: dict):
+        self.entries.append(entry)
+
+        if len(self.entries) == 1:
+            transaction.on_commit(self)
+
+    def __call__(self):
+        self.sent = True
+        send_journal_entries(self.entries)
+
+
+def get_journal_batch() -> JournalBatch:
+    """
+    Batch of the current transaction and savepoint. Only its on commit callback keeps the batch,
+    so a new batch is created after the previous one is sent or discarded by rollback.
+    """
+    batch_ref = getattr(_journal, "batch_ref", None)
+    batch = batch_ref() if batch_ref else None
+    savepoint_ids = tuple(transaction.get_connection().savepoint_ids)
+
+    if batch is None or batch.sent or batch.savepoint_ids != savepoint_ids:
+        batch = JournalBatch(savepoint_ids)
+        _journal.batch_ref = weakref.ref(batch)
+
+    return batch
+
+
+def to_json_data(data: dict) -> dict:
+    return json.loads(json.dumps(data, cls=DjangoJSONEncoder))
+
+
+def get_instance_from_fields(model, fields: dict):
+    """Instance in the state captured by add_journal_entry, relations are loaded by their ids"""
+    concrete_fields = model._meta.concrete_fields
+    values = [
+        field.to_python(fields[field.attname]) if field.attname in fields else DEFERRED for field in concrete_fields
+    ]
+
+    return model.from_db(None, [field.attname for field in concrete_fields], values)
+
+
+def add_journal_entry(sender, instance, action: str):
+    content_type_key = get_model_content_type_as_text(sender)
+    if get_journal_policy(content_type_key) == JOURNAL_POLICY_SKIP:
+        return
+
+    entry = {
+        "content_type_id": ContentType.objects.get_for_model(sender).id,
+        "object_id": str(instance.pk),
+        "user_code": get_user_code_from_instance(instance, content_type_key),
+        "action": action,
+        "data": None,
+        "context": get_record_context_keys(),
+    }
+
+    if action == HistoricalRecord.ACTION_DELETE:
+        # object is not available for the worker, so its own fields are captured
+        fields = [field.name for field in instance._meta.concrete_fields]
+        entry["data"] = to_json_data(model_to_dict(instance, fields=fields))
+
+    elif action != HistoricalRecord.ACTION_RECYCLE_BIN:
+        # object can be changed again before the worker runs, so its saved state is captured
+        entry["fields"] = to_json_data(
+            {field.attname: field.value_from_object(instance) for field in instance._meta.concrete_fields}
+        )
+
+    if transaction.get_connection().in_atomic_block:
+        get_journal_batch().add(entry)
+    else:  # autocommit, the object is already saved
+        send_journal_entries([entry])
+
+
+def resolve_record_context(keys: dict, master_user, cache: dict) -> dict:
+    from poms.celery_tasks.models import CeleryTask
+    from poms.users.models import Member
+
+    cache_key = json.dumps(keys, sort_keys=True)
+    if cache_key in cache:
+        return cache[cache_key]
+
+    result = {"master_user": master_user, "member": None, "context_url": keys["context_url"]}
+
+    if keys["member_id"]:
+        result["member"] = Member.objects.filter(id=keys["member_id"]).first()
+
+    elif keys["user_id"]:
+        result["member"] = Member.objects.filter(user_id=keys["user_id"]).first()
+
+    else:
+        celery_task = None
+        if keys["celery_task_id"]:
+            celery_task = (
+                CeleryTask.objects.filter(celery_task_id=keys["celery_task_id"]).select_related("member").first()
+            )
+
+        if celery_task:
+            result["member"] = celery_task.member
+            result["context_url"] = f"{celery_task.type} [{str(celery_task.id)}]"
+        else:
+            result["member"] = Member.objects.filter(username="finmars_bot").first()
+
+    cache[cache_key] = result
+    return result
+
+
+def get_summary_record(content_type_id: int, action: str, entries: list, record_context: dict) -> HistoricalRecord:
+    if action == JOURNAL_ACTION_SAVE:
+        action = HistoricalRecord.ACTION_CHANGE
+
+    return HistoricalRecord(
+        master_user=record_context["master_user"],
+        member=record_context["member"],
+        action=action,
+        context_url=record_context["context_url"],
+        data={"user_codes": [entry["user_code"] for entry in entries]},
+        notes=f"Bulk operation: {len(entries)} objects, action {action}",
+        content_type_id=content_type_id,
+    )
+
+
+class JournalWriter:
+    """
+    Creates historical records of journal entries: objects are restored from their
+    captured state, serialized and compared with their last records by content types,
+    records are created by one insert. Entries of model with summary policy, or more entries
+    of one model and action than HISTORY_JOURNAL_BULK_THRESHOLD if it is set,
+    are written as one summary record.
+    """
+
+    def __init__(self, master_user):
+        self.master_user = master_user
+        self.contexts_cache = {}
+        self.records = []
+
+    def get_record_context(self, entry: dict) -> dict:
+        return resolve_record_context(entry["context"], self.master_user, self.contexts_cache)
+
+    def write(self, entries: list) -> list[HistoricalRecord]:
+        entries = self.coalesce(entries)
+
+        groups = defaultdict(list)
+        for entry in entries:
+            groups[(entry["content_type_id"], entry["action"])].append(entry)
+
+        full_entries = defaultdict(list)
+        for (content_type_id, action), group in groups.items():
+            content_type = ContentType.objects.get_for_id(content_type_id)
+            policy = get_journal_policy(f"{content_type.app_label}.{content_type.model}")
+            threshold = settings.HISTORY_JOURNAL_BULK_THRESHOLD
+
+            if len(group) > 1 and (policy == JOURNAL_POLICY_SUMMARY or (threshold and len(group) > threshold)):
+                record_context = self.get_record_context(group[0])
+                self.records.append(get_summary_record(content_type_id, action, group, record_context))
+            else:
+                full_entries[content_type_id].extend(group)
+
+        for content_type_id, content_type_entries in full_entries.items():
+            self.add_records(ContentType.objects.get_for_id(content_type_id), content_type_entries)
+
+        return HistoricalRecord.objects.bulk_create(self.records)
+
+    @staticmethod
+    def coalesce(entries: list) -> list:
+        """Only the last save of object is written, it has the latest state of the object"""
+        last_saves = {}
+        for index, entry in enumerate(entries):
+            if entry["action"] == JOURNAL_ACTION_SAVE:
+                last_saves[(entry["content_type_id"], entry["object_id"])] = index
+
+        return [
+            entry
+            for index, entry in enumerate(entries)
+            if entry["action"] != JOURNAL_ACTION_SAVE
+            or last_saves[(entry["content_type_id"], entry["object_id"])] == index
+        ]
+
+    def add_records(self, content_type: ContentType, entries: list):
+        model = content_type.model_class()
+
+        deleted_ids = {entry["object_id"] for entry in entries if entry["action"] == HistoricalRecord.ACTION_DELETE}
+        # entries without captured state are written with the current state of objects
+        loaded_ids = {
+            entry["object_id"]
+            for entry in entries
+            if "fields" not in entry
+            and entry["action"] not in (HistoricalRecord.ACTION_DELETE, HistoricalRecord.ACTION_RECYCLE_BIN)
+        }
+        instances = {}
+        if loaded_ids:
+            instances = {str(instance.pk): instance for instance in model._base_manager.filter(pk__in=loaded_ids)}
+
+        user_codes = {entry["user_code"] for entry in entries}
+        existing_user_codes = set(
+            HistoricalRecord.objects.filter(content_type=content_type, user_code__in=user_codes).values_list(
+                "user_code", flat=True
+            )
+        )
+        last_data = {
+            record.user_code: record.data
+            for record in HistoricalRecord.objects.filter(
+                content_type=content_type,
+                user_code__in=user_codes,
+                action__in=[
+                    HistoricalRecord.ACTION_CREATE,
+                    HistoricalRecord.ACTION_CHANGE,
+                    HistoricalRecord.ACTION_DELETE,
+                    HistoricalRecord.ACTION_DANGER,
+                ],
+            )
+            .order_by("user_code", "-created_at")
+            .distinct("user_code")
+        }
+
+        for entry in entries:
+            user_code = entry["user_code"]
+            action = entry["action"]
+            record_context = self.get_record_context(entry)
+            data = diff = None
+
+            if action == HistoricalRecord.ACTION_RECYCLE_BIN:
+                notes = RECYCLE_BIN_NOTES
+
+            elif action == HistoricalRecord.ACTION_DELETE:
+                data = entry["data"]
+                notes = None
+
+            else:
+                if entry["object_id"] in deleted_ids:  # its delete entry is written instead
+                    continue
+
+                if "fields" in entry:
+                    instance = get_instance_from_fields(model, entry["fields"])
+                else:
+                    instance = instances.get(entry["object_id"])
+                    if instance is None:
+                        continue
+
+                if action == JOURNAL_ACTION_SAVE:
+                    action = (
+                        HistoricalRecord.ACTION_CHANGE
+                        if user_code in existing_user_codes
+                        else HistoricalRecord.ACTION_CREATE
+                    )
+
+                data = get_serialized_data(model, instance, record_context=record_context)
+                diff, notes = get_diff_and_notes(last_data.get(user_code), data)
+                last_data[user_code] = data
+
+            existing_user_codes.add(user_code)
+
+            self.records.append(
+                HistoricalRecord(
+                    master_user=record_context["master_user"],
+                    member=record_context["member"],
+                    action=action,
+                    context_url=record_context["context_url"],
+                    data=data,
+                    diff=diff,
+                    notes=notes,
+                    user_code=user_code,
+                    content_type=content_type,
+                )
+            )
@@ -233,7 +233,7 @@ def get_model_content_type_as_text(sender):
     return f"{content_type.app_label}.{content_type.model}"
 
 
-def get_serialized_data(sender, instance):
+def get_serialized_data(sender, instance, record_context=None):
     from poms.accounts.serializers import AccountSerializer, AccountTypeSerializer
     from poms.counterparties.serializers import (
         CounterpartySerializer,
@@ -302,7 +302,8 @@ def get_serialized_data(sender, instance):
         "schedules.schedule": ScheduleSerializer,
     }
 
-    record_context = get_record_context()
+    if record_context is None:
+        record_context = get_record_context()
     context = {
         "master_user": record_context["master_user"],
         "member": record_context["member"],
@@ -355,35 +356,29 @@ def deepdiff_to_human_readable(diff):
     return "\n".join(messages)
 
 
-def get_notes_for_history_record(user_code, content_type, serialized_data):
+def to_json_object(data):
+    if isinstance(data, str):
+        return json.loads(data)
+
+    # because deep diff counts different Dict and Ordered dict
+    return json.loads(json.dumps(data, cls=DjangoJSONEncoder))
+
+
+def get_diff_and_notes(last_data, data):
     diff = None
     notes = None
-    with contextlib.suppress(Exception):
-        last_record = HistoricalRecord.objects.filter(
-            user_code=user_code,
-            content_type=content_type,
-            action__in=[
-                HistoricalRecord.ACTION_CREATE,
-                HistoricalRecord.ACTION_CHANGE,
-                HistoricalRecord.ACTION_DELETE,
-                HistoricalRecord.ACTION_DANGER,
-            ],
-        ).order_by("-created_at")[0]
-
-        everything_is_dict = json.loads(
-            json.dumps(serialized_data)
-        )  # because deep diff counts different Dict and Ordered dict
+    if last_data is None:
+        return diff, notes
 
+    with contextlib.suppress(Exception):
         result = DeepDiff(
-            json.loads(last_record.data),
-            json.loads(everything_is_dict),
+            to_json_object(last_data),
+            to_json_object(data),
             ignore_string_type_changes=True,
             ignore_order=True,
             ignore_type_subclasses=True,
         )
 
-        # _l.info('result %s' % result)
-
         diff = result.to_json()
         notes = deepdiff_to_human_readable(result)
 
@@ -446,139 +441,69 @@ def update_result_with_celery_task_data(celery_task_id, result):
     result["context_url"] = f"{celery_task.type} [{str(celery_task.id)}]"
 
 
-def post_save(sender, instance, created, using=None, update_fields=None, **kwargs):
-    try:
-        # _l.info('post_save.sender %s' % sender)
-        # _l.info('post_save.update_fields %s' % update_fields)
+def record_journal_disabled(sender, instance):
+    record_context = get_record_context()
+    content_type = ContentType.objects.get_for_model(sender)
 
-        from poms.users.models import MasterUser
+    already_disabled = False
 
-        master_user = MasterUser.objects.all().first()
+    with contextlib.suppress(Exception):
+        last_record = HistoricalRecord.objects.filter(
+            user_code=instance.name,
+            content_type=content_type,
+        ).order_by("-created_at")[0]
+
+        _l.info(f"last_record {last_record.data}")
 
-        if sender == MasterUser and instance.journal_status == "disabled":
-            record_context = get_record_context()
-            content_type = ContentType.objects.get_for_model(sender)
+        if last_record.data["journal_status"] == "disabled":
+            already_disabled = True
 
-            already_disabled = False
+    if not already_disabled:
+        data = get_serialized_data(sender, instance, record_context=record_context)
 
-            with contextlib.suppress(Exception):
-                last_record = HistoricalRecord.objects.filter(
-                    user_code=master_user.name,
-                    content_type=content_type,
-                ).order_by("-created_at")[0]
+        HistoricalRecord.objects.create(
+            master_user=record_context["master_user"],
+            member=record_context["member"],
+            action=HistoricalRecord.ACTION_DANGER,
+            user_code=instance.name,
+            data=data,
+            notes="JOURNAL IS DISABLED. OBJECTS ARE NOT TRACKED",
+            content_type=content_type,
+        )
 
-                _l.info(f"last_record {last_record.data}")
 
-                if last_record.data["journal_status"] == "disabled":
-                    already_disabled = True
+def post_save(sender, instance, created, using=None, update_fields=None, **kwargs):
+    """
+    Only minimal state of saved object is added to the journal of the current transaction,
+    it is serialized and compared with its last record by the journal worker, see poms.history.journal
+    """
+    from poms.history.journal import JOURNAL_ACTION_SAVE, add_journal_entry
+    from poms.users.models import MasterUser
 
-            if not already_disabled:
-                data = get_serialized_data(sender, instance)
+    try:
+        if sender is MasterUser and instance.journal_status == MasterUser.JOURNAL_STATUS_DISABLED:
+            record_journal_disabled(sender, instance)
 
-                HistoricalRecord.objects.create(
-                    master_user=record_context["master_user"],
-                    member=record_context["member"],
-                    action=HistoricalRecord.ACTION_DANGER,
-                    user_code=master_user.name,
-                    data=data,
-                    notes="JOURNAL IS DISABLED. OBJECTS ARE NOT TRACKED",
-                    content_type=content_type,
-                )
+        action = JOURNAL_ACTION_SAVE
+        if update_fields and "is_deleted" in update_fields:
+            if instance.is_deleted:
+                action = HistoricalRecord.ACTION_RECYCLE_BIN
+            else:
+                action = HistoricalRecord.ACTION_CHANGE
 
-        if master_user.journal_status != MasterUser.JOURNAL_STATUS_DISABLED:
-            user_code = None
-            content_type_key = None
-            try:
-                record_context = get_record_context()
-                content_type = ContentType.objects.get_for_model(sender)
-                content_type_key = get_model_content_type_as_text(sender)
-                user_code = get_user_code_from_instance(instance, content_type_key)
-
-                exist = bool(HistoricalRecord.objects.filter(user_code=user_code, content_type=content_type).count())
-                if exist:
-                    action = HistoricalRecord.ACTION_CHANGE
-                else:
-                    action = HistoricalRecord.ACTION_CREATE
-
-                # _l.info('created %s' % created)
-                # _l.info('update_fields %s' % update_fields)
-
-                if update_fields and "is_deleted" in update_fields:
-                    if instance.is_deleted:
-                        action = HistoricalRecord.ACTION_RECYCLE_BIN
-                    else:
-                        action = HistoricalRecord.ACTION_CHANGE
-
-                # TODO think about better performance
-                # if HistoricalRecord.ACTION_RECYCLE_BIN:
-                #     data = {"is_deleted": True}
-                #     notes = {"is_deleted": True}
-                # else:
-
-                if action != HistoricalRecord.ACTION_RECYCLE_BIN:
-                    data = get_serialized_data(sender, instance)
-                    diff, notes = get_notes_for_history_record(user_code, content_type, data)
-                else:
-                    data = None
-                    diff = None
-                    notes = {"message": "User moved object to Recycle Bin"}
-
-                HistoricalRecord.objects.create(
-                    master_user=record_context["master_user"],
-                    member=record_context["member"],
-                    action=action,
-                    context_url=record_context["context_url"],
-                    data=data,
-                    diff=diff,
-                    notes=notes,
-                    user_code=user_code,
-                    content_type=content_type,
-                )
-
-            except Exception as e:
-                _l.error(
-                    f"Could not save history user_code={user_code} "
-                    f"content_type_key={content_type_key}  exception {e}\n "
-                    f"traceback {traceback.format_exc()}"
-                )
+        add_journal_entry(sender, instance, action)
 
     except Exception as e:
         _l.error(f"history.post_save error {repr(e)} {traceback.format_exc()}")
 
 
 def post_delete(sender, instance, using=None, **kwargs):
-    from poms.users.models import MasterUser
-
-    master_user = MasterUser.objects.all().first()
-
-    if master_user.journal_status != MasterUser.JOURNAL_STATUS_DISABLED:
-        try:
-            post_delete_action(sender, instance)
-        except Exception as e:
-            _l.error(f"Could not save history record exception {repr(e)} traceback {traceback.format_exc()} ")
+    from poms.history.journal import add_journal_entry
 
-
-def post_delete_action(sender, instance):
-    record_context = get_record_context()
-
-    action = HistoricalRecord.ACTION_DELETE
-
-    content_type = ContentType.objects.get_for_model(sender)
-    content_type_key = get_model_content_type_as_text(sender)
-
-    user_code = get_user_code_from_instance(instance, content_type_key)
-
-    data = get_serialized_data(sender, instance)
-
-    HistoricalRecord.objects.create(
-        master_user=record_context["master_user"],
-        member=record_context["member"],
-        context_url=record_context["context_url"],
-        action=action,
-        data=data,
-        user_code=user_code,
-        content_type=content_type,
-    )
+    try:
+        add_journal_entry(sender, instance, HistoricalRecord.ACTION_DELETE)
+    except Exception as e:
+        _l.error(f"Could not save history record exception {repr(e)} traceback {traceback.format_exc()} ")
 
 
 def add_history_listeners(sender, **kwargs):
@@ -15,6 +15,7 @@ from poms.celery_tasks import finmars_task
 from poms.celery_tasks.models import CeleryTask
 from poms.common.storage import get_storage
 from poms.common.utils import str_to_date
+from poms.history.journal import JournalWriter
 from poms.history.models import HistoricalRecord
 from poms.history.utils import (
     get_local_path,
@@ -126,6 +127,20 @@ def clear_old_journal_records(*args, **kwargs):
         start = end
 
 
+@finmars_task(name="history.write_historical_records")
+def write_historical_records(entries: list, *args, **kwargs):
+    """
+    Write historical records of journal entries, collected by post_save and post_delete signals
+    """
+    master_user = MasterUser.objects.first()
+    if not master_user or master_user.journal_status == MasterUser.JOURNAL_STATUS_DISABLED:
+        return
+
+    records = JournalWriter(master_user).write(entries)
+
+    _l.info(f"write_historical_records: {len(records)} records of {len(entries)} entries")
+
+
 # Generate days range
 def daterange(start_date, end_date):
     for n in range(int((end_date - start_date).days) + 1):
@@ -0,0 +1,188 @@
+from unittest import mock
+
+from django.db import transaction
+from django.test import TransactionTestCase, override_settings
+
+from poms.accounts.models import Account
+from poms.common.common_base_test import BaseTestCase
+from poms.history.journal import JournalWriter, get_journal_batch
+from poms.history.models import HistoricalRecord, post_delete, post_save, to_json_object
+from poms.history.tasks import write_historical_records
+from poms.users.models import MasterUser
+
+
+class JournalTest(BaseTestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        super().setUp()
+        self.init_test_case()
+        self.master_user = MasterUser.objects.first()
+        self.master_user.journal_status = MasterUser.JOURNAL_STATUS_FULL
+        self.master_user.save(update_fields=["journal_status"])
+        HistoricalRecord.objects.all().delete()
+
+    @staticmethod
+    def save_accounts(accounts: list) -> list:
+        # test transaction is not committed, so entries are taken from the batch of savepoint
+        with transaction.atomic():
+            for account in accounts:
+                account.save()
+                post_save(Account, account, created=False)
+
+            return list(get_journal_batch().entries)
+
+    def write(self, entries: list) -> list[HistoricalRecord]:
+        return JournalWriter(self.master_user).write(entries)
+
+    @mock.patch("poms.history.tasks.write_historical_records.apply_async")
+    def test_entries_are_sent_after_commit(self, mock_apply_async):
+        account = self.create_account()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                account.save()
+                post_save(Account, account, created=False)
+                post_save(Account, account, created=False)
+
+            mock_apply_async.assert_not_called()
+
+        mock_apply_async.assert_called_once()
+        entries = mock_apply_async.call_args.kwargs["kwargs"]["entries"]
+        self.assertEqual(len(entries), 2)
+        self.assertEqual(entries[0]["user_code"], account.user_code)
+
+    @mock.patch("poms.history.tasks.write_historical_records.apply_async")
+    def test_entries_of_rolled_back_savepoint_are_not_sent(self, mock_apply_async):
+        account = self.create_account()
+        rolled_back_account = self.create_account()
+
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            post_save(Account, account, created=False)
+
+            try:
+                with transaction.atomic():
+                    post_save(Account, rolled_back_account, created=False)
+                    raise ValueError("rollback")
+            except ValueError:
+                pass
+
+            with transaction.atomic():
+                post_save(Account, account, created=False)
+
+        # entries of savepoints are sent by their own batches
+        user_codes = [
+            entry["user_code"]
+            for call in mock_apply_async.call_args_list
+            for entry in call.kwargs["kwargs"]["entries"]
+        ]
+        self.assertEqual(user_codes, [account.user_code, account.user_code])
+
+    def test_records_are_created_and_changed(self):
+        account = self.create_account()
+
+        records = self.write(self.save_accounts([account, account]))
+
+        self.assertEqual(len(records), 1)  # only the last save of object is written
+        self.assertEqual(records[0].action, HistoricalRecord.ACTION_CREATE)
+        self.assertEqual(records[0].user_code, account.user_code)
+        self.assertEqual(to_json_object(records[0].data)["id"], account.id)
+
+        account.short_name = "changed short name"
+        records = self.write(self.save_accounts([account]))
+
+        self.assertEqual(records[0].action, HistoricalRecord.ACTION_CHANGE)
+        self.assertIn("changed short name", records[0].notes)
+
+    def test_records_have_state_of_their_transactions(self):
+        account = self.create_account()
+        account.short_name = "first short name"
+        first_entries = self.save_accounts([account])
+        account.short_name = "second short name"
+        second_entries = self.save_accounts([account])
+
+        account.short_name = "third short name"
+        account.save()
+
+        first_record = self.write(first_entries)[0]
+        second_record = self.write(second_entries)[0]
+
+        self.assertEqual(first_record.action, HistoricalRecord.ACTION_CREATE)
+        self.assertEqual(to_json_object(first_record.data)["short_name"], "first short name")
+        self.assertEqual(second_record.action, HistoricalRecord.ACTION_CHANGE)
+        self.assertEqual(to_json_object(second_record.data)["short_name"], "second short name")
+        self.assertTrue(second_record.diff)
+        self.assertIn("second short name", second_record.notes)
+
+    def test_deleted_object_is_written(self):
+        account = self.create_account()
+        account_id = account.id
+        entries = self.save_accounts([account])
+
+        with transaction.atomic():
+            post_delete(Account, account)  # signal is sent before pk of deleted object is cleared
+            account.delete()
+            entries.extend(get_journal_batch().entries)
+
+        records = self.write(entries)
+
+        self.assertEqual([record.action for record in records], [HistoricalRecord.ACTION_DELETE])
+        self.assertEqual(records[0].data["id"], account_id)
+
+    def test_bulk_entries_are_not_summarized_by_default(self):
+        accounts = [self.create_account() for _ in range(3)]
+
+        records = self.write(self.save_accounts(accounts))
+
+        self.assertEqual([record.user_code for record in records], [account.user_code for account in accounts])
+
+    @override_settings(HISTORY_JOURNAL_BULK_THRESHOLD=2)
+    def test_bulk_entries_are_summarized(self):
+        accounts = [self.create_account() for _ in range(3)]
+
+        records = self.write(self.save_accounts(accounts))
+
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0].action, HistoricalRecord.ACTION_CHANGE)
+        self.assertEqual(records[0].data["user_codes"], [account.user_code for account in accounts])
+
+    @override_settings(HISTORY_JOURNAL_MODEL_POLICIES={"accounts.account": "skip"})
+    def test_skipped_model_is_not_journaled(self):
+        self.assertEqual(self.save_accounts([self.create_account()]), [])
+
+    @mock.patch("poms.history.tasks.JournalWriter")
+    def test_task_without_master_user(self, mock_writer):
+        with mock.patch.object(MasterUser.objects, "first", return_value=None):
+            write_historical_records(entries=[])
+
+        mock_writer.assert_not_called()
+
+
+class JournalAutocommitTest(TransactionTestCase):
+    available_apps = ["poms.history"]
+
+    def setUp(self):
+        super().setUp()
+        self.master_user = MasterUser(journal_status=MasterUser.JOURNAL_STATUS_FULL)
+        self.account = Account(id=1, user_code="journal-account")
+
+    @mock.patch("poms.history.tasks.write_historical_records.apply_async")
+    def test_entries_are_sent_in_autocommit(self, mock_apply_async):
+        with mock.patch.object(MasterUser.objects, "first", return_value=self.master_user):
+            post_save(Account, self.account, created=False)
+            post_save(Account, self.account, created=False)
+
+            self.assertEqual(mock_apply_async.call_count, 2)
+
+            with transaction.atomic():
+                post_save(Account, self.account, created=False)
+                post_save(Account, self.account, created=False)
+
+                self.assertEqual(mock_apply_async.call_count, 2)
+
+            post_save(Account, self.account, created=False)
+
+        self.assertEqual(
+            [len(call.kwargs["kwargs"]["entries"]) for call in mock_apply_async.call_args_list],
+            [1, 1, 2, 1],
+        )
@@ -9,9 +9,12 @@ from pyparsing import infixNotation, opAssoc
 from rest_framework import permissions
 
 from .exceptions import AccessPolicyException
-from .models import ResourceGroup
 from .parsing import BoolAnd, BoolNot, BoolOperand, BoolOr, ConditionOperand
-from .utils import action_statement_into_object
+from .utils import (
+    action_statement_into_object,
+    expand_resources,
+    get_resource_groups_resources,
+)
 
 _l = logging.getLogger("poms.iam")
 
@@ -313,32 +316,17 @@ class AccessPolicy(permissions.BasePermission):
         # Construct the unique resource identifier for the object
         object_resource_identifier = f"frn:finmars:{content_type}:{obj.user_code}"
 
+        # ResourceGroups of all statements are expanded by one query
+        groups_resources = get_resource_groups_resources(
+            [resource for statement in statements for resource in statement.get("Resource", [])]
+        )
+
         for statement in statements:
             resources = statement.get("Resource", [])
 
             # Check if the resource list contains a `ResourceGroup`, and if so, expand it
             expanded_resources = set(resources)  # Start with a copy of original resources
-
-            for resource in resources:
-                if resource.startswith("frn:finmars:iam:resourcegroup:"):
-                    # Extract the `user_code` for the ResourceGroup from the resource identifier
-                    resource_group_code = resource.split(":")[-1]
-
-                    try:
-                        # Fetch the ResourceGroup and its assignments
-                        resource_group = ResourceGroup.objects.get(user_code=resource_group_code)
-                        assignments = resource_group.assignments.all()
-
-                        # Add each assigned object's user_code to the expanded resources list
-                        expanded_resources.update(
-                            f"frn:finmars:{assignment.content_type.app_label}:{assignment.content_type.model}:{assignment.object_user_code}"
-                            for assignment in assignments
-                            if assignment.object_user_code
-                        )
-
-                    except ResourceGroup.DoesNotExist:
-                        _l.warning(f"ResourceGroup with user_code {resource_group_code} does not exist.")
-                        continue
+            expanded_resources.update(expand_resources(resources, groups_resources))
 
             # Allow all if the original or expanded resource list contains "*"
             if "*" in expanded_resources:
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class FinmarsIAMConfig(AppConfig):
     name = "poms.iam"
+
+    def ready(self):
+        # noinspection PyUnresolvedReferences
+        import poms.iam.signals  # noqa: F401
@@ -38,8 +38,7 @@ class IamProtectedSerializer(serializers.ModelSerializer):
         abstract = True
 
     def to_representation(self, instance):
-        from poms.iam.models import ResourceGroup
-        from poms.iam.utils import get_allowed_resources
+        from poms.iam.utils import is_resource_allowed
 
         member = self.context["request"].user.member
 
@@ -51,42 +50,8 @@ class IamProtectedSerializer(serializers.ModelSerializer):
         to view the protected field. If not, hide the field.
         """
 
-        queryset = self.Meta.model.objects.filter(pk=instance.pk)
-
-        # Get initial allowed resources for the member and model
-        allowed_resources = get_allowed_resources(member, self.Meta.model, queryset)
-        expanded_resources = set()
-
-        # Parse and expand resources if ResourceGroups are present
-        for resource in allowed_resources:
-            prefix, app, content_type, user_code = resource.split(":", 3)
-            if resource.startswith("frn:finmars:iam:resourcegroup:"):
-                # Handle ResourceGroup resource
-                resource_group_code = user_code
-                try:
-                    # Fetch the ResourceGroup and its assignments
-                    resource_group = ResourceGroup.objects.get(user_code=resource_group_code)
-                    assignments = resource_group.assignments.all()
-
-                    # Add each assigned object's user_code as an expanded resource
-                    expanded_resources.update(
-                        f"frn:finmars:{assignment.content_type.app_label}:{assignment.content_type.model}:{assignment.object_user_code}"
-                        for assignment in assignments
-                        if assignment.object_user_code
-                    )
-                except ResourceGroup.DoesNotExist:
-                    _l.warning(f"ResourceGroup with user_code {resource_group_code} does not exist.")
-                    continue
-            else:
-                expanded_resources.add(resource)
-
-        # Check permission against expanded resources
-        has_permission = False
-        model_content_type = f"{self.Meta.model._meta.app_label}:{self.Meta.model.__name__.lower()}"
-        instance_identifier = f"frn:finmars:{model_content_type}:{instance.user_code}"
-
-        if instance_identifier in expanded_resources:
-            has_permission = True
+        # Check permission against allowed resources of compiled member policies
+        has_permission = is_resource_allowed(member, self.Meta.model, instance.user_code)
 
         # Return the appropriate representation based on permission
         if has_permission:
@@ -1,51 +1,40 @@
 import logging
 
-from django.core.cache import cache
-from django.db.models.signals import post_delete, post_save
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
 
-from poms.iam.models import AccessPolicy, Group, Role
+from poms.iam.models import AccessPolicy, Group, ResourceGroup, ResourceGroupAssignment, Role
+from poms.iam.utils import invalidate_compiled_policies
 
 _l = logging.getLogger("poms.iam")
 
 
 """
-Performance improvement, save member access policies in cache,
-code below just clears the cache when access policy is updated 
+Performance improvement, compiled access policies of members are saved in cache,
+code below changes version of policies of the space when anything they are compiled from is changed,
+new version is set after commit, so policies are not compiled again from not committed data
 """
 
 
-def clear_member_access_policies_cache(member):
-    cache_key = f"member_access_policies_{member.id}"
-    _l.debug("clear_member_access_policies_cache.going to clear cache for %s", member)
-    cache.delete(cache_key)
-
-
 @receiver(post_save, sender=AccessPolicy)
 @receiver(post_delete, sender=AccessPolicy)
-def clear_access_policy_cache(sender, instance, **kwargs):
-    # Clear cache for all related users
-    for member in instance.members.all():
-        clear_member_access_policies_cache(member)
-    for role in instance.iam_roles.all():
-        for member in role.members.all():
-            clear_member_access_policies_cache(member)
-    for group in instance.iam_groups.all():
-        for member in group.members.all():
-            clear_member_access_policies_cache(member)
-
-
 @receiver(post_save, sender=Role)
 @receiver(post_delete, sender=Role)
-def clear_role_cache(sender, instance, **kwargs):
-    # Clear cache for all related users
-    for member in instance.members.all():
-        clear_member_access_policies_cache(member)
-
-
 @receiver(post_save, sender=Group)
 @receiver(post_delete, sender=Group)
-def clear_group_cache(sender, instance, **kwargs):
-    # Clear cache for all related users
-    for member in instance.members.all():
-        clear_member_access_policies_cache(member)
+@receiver(post_save, sender=ResourceGroup)
+@receiver(post_delete, sender=ResourceGroup)
+@receiver(post_save, sender=ResourceGroupAssignment)
+@receiver(post_delete, sender=ResourceGroupAssignment)
+@receiver(m2m_changed, sender=AccessPolicy.members.through)
+@receiver(m2m_changed, sender=Role.members.through)
+@receiver(m2m_changed, sender=Role.access_policies.through)
+@receiver(m2m_changed, sender=Group.members.through)
+@receiver(m2m_changed, sender=Group.access_policies.through)
+def clear_compiled_policies_cache(sender, action=None, **kwargs):
+    if action and action.startswith("pre_"):
+        return
+
+    _l.debug("clear_compiled_policies_cache.%s is changed", sender.__name__)
+    transaction.on_commit(invalidate_compiled_policies)
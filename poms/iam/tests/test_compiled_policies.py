@@ -0,0 +1,135 @@
+from poms.common.common_base_test import BaseTestCase
+from poms.iam.models import AccessPolicy, ResourceGroup
+from poms.iam.utils import (
+    filter_queryset_with_access_policies,
+    get_allowed_queryset,
+    get_compiled_policies,
+    invalidate_compiled_policies,
+    is_resource_allowed,
+)
+from poms.portfolios.models import Portfolio
+
+
+class PortfolioViewSet:
+    pass
+
+
+class CompiledPoliciesTest(BaseTestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        super().setUp()
+        self.init_test_case()
+        self.member.is_admin = False
+
+        # compiled policies of previous tests are in cache for the same member id
+        invalidate_compiled_policies()
+
+        self.view = PortfolioViewSet()
+        for user_code in ("Fund-A", "fund-b", "other-fund-a", "bond-1", "bond-2"):
+            Portfolio.objects.create(
+                master_user=self.master_user,
+                owner=self.member,
+                user_code=user_code,
+                name=user_code,
+                short_name=user_code,
+            )
+
+    def create_policy(self, resources: list, actions: list = None, effect: str = "Allow") -> AccessPolicy:
+        with self.captureOnCommitCallbacks(execute=True):
+            access_policy = AccessPolicy.objects.create(
+                name=self.random_string(),
+                user_code=self.random_string(),
+                configuration_code=self.random_string(),
+                owner=self.member,
+                policy={
+                    "Version": "2023-01-01",
+                    "Statement": [
+                        {
+                            "Effect": effect,
+                            "Action": actions or ["finmars:portfolio:list"],
+                            "Resource": resources,
+                            "Principal": "*",
+                        }
+                    ],
+                },
+            )
+            access_policy.members.add(self.member)
+
+        return access_policy
+
+    def get_allowed_user_codes(self) -> set:
+        queryset = filter_queryset_with_access_policies(self.member, Portfolio.objects.all(), self.view)
+
+        return set(queryset.values_list("user_code", flat=True))
+
+    def test_user_codes_and_wildcards(self):
+        self.create_policy(
+            [
+                "frn:finmars:portfolios:portfolio:FUND-A",
+                "frn:finmars:portfolios:portfolio:bond-*",
+                "frn:finmars:accounts:account:fund-b",
+            ]
+        )
+
+        self.assertEqual(self.get_allowed_user_codes(), {"Fund-A", "other-fund-a", "bond-1", "bond-2"})
+
+    def test_all_resources(self):
+        self.create_policy(["*"])
+
+        self.assertEqual(
+            filter_queryset_with_access_policies(self.member, Portfolio.objects.all(), self.view).count(),
+            Portfolio.objects.count(),
+        )
+
+    def test_no_resources_of_view(self):
+        self.assertEqual(self.get_allowed_user_codes(), set())
+
+        self.create_policy(["*"], actions=["finmars:account:list"])
+        self.create_policy(["frn:finmars:portfolios:portfolio:fund-b"], effect="Deny")
+
+        self.assertEqual(self.get_allowed_user_codes(), set())
+
+    def test_resource_group_is_expanded(self):
+        resource_group = ResourceGroup.objects.create(
+            name="funds",
+            user_code="funds",
+            configuration_code="funds",
+            owner=self.member,
+        )
+        for user_code in ("fund-b", "bond-2"):
+            ResourceGroup.objects.add_object(resource_group.user_code, Portfolio.objects.get(user_code=user_code))
+
+        self.create_policy(["frn:finmars:iam:resourcegroup:funds", "frn:finmars:iam:resourcegroup:missing"])
+
+        self.assertEqual(self.get_allowed_user_codes(), {"fund-b", "bond-2"})
+        self.assertTrue(is_resource_allowed(self.member, Portfolio, "bond-2"))
+        self.assertFalse(is_resource_allowed(self.member, Portfolio, "bond-1"))
+
+    def test_policies_are_compiled_once(self):
+        self.create_policy(["frn:finmars:portfolios:portfolio:fund-b"])
+
+        compiled = get_compiled_policies(self.member)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_compiled_policies(self.member), compiled)
+
+    def test_policies_are_compiled_again_after_change(self):
+        access_policy = self.create_policy(["frn:finmars:portfolios:portfolio:fund-b"])
+        self.assertEqual(self.get_allowed_user_codes(), {"fund-b"})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            access_policy.policy["Statement"][0]["Resource"] = ["frn:finmars:portfolios:portfolio:bond-1"]
+            access_policy.save()
+            access_policy.members.remove(self.member)
+            access_policy.members.add(self.member)
+
+        self.assertEqual(self.get_allowed_user_codes(), {"bond-1"})
+
+    def test_allowed_queryset(self):
+        queryset = Portfolio.objects.all()
+        self.assertEqual(get_allowed_queryset(self.member, queryset).count(), queryset.count())
+
+        self.create_policy(["frn:finmars:portfolios:portfolio:fund-a"])
+
+        allowed_user_codes = set(get_allowed_queryset(self.member, queryset).values_list("user_code", flat=True))
+        self.assertEqual(allowed_user_codes, {"Fund-A", "other-fund-a"})
@@ -1,14 +1,20 @@
 import logging
+import uuid
+from collections.abc import Iterator
+from dataclasses import dataclass, field
 
 from django.conf import settings
 from django.core.cache import cache
 from django.db.models import Q, QuerySet
 
+from poms.common.db import get_current_schema_name
 from poms.iam.models import AccessPolicy, ResourceGroup
 from poms.users.models import Member
 
 _l = logging.getLogger("poms.iam")
 
+RESOURCE_GROUP_PREFIX = "frn:finmars:iam:resourcegroup:"
+
 
 def add_to_list_if_not_exists(string, my_list):
     if string not in my_list:
@@ -92,25 +98,207 @@ parse_resource_attribute
 
 def get_member_access_policies(member: Member) -> QuerySet:
     """
-    Get all AccessPolicy objects for the member from cache or db
+    Get all AccessPolicy objects of the member, granted directly, by roles or by groups
     Args:
         member:
     Returns:
-        list of AccessPolicy objects
+        queryset of AccessPolicy objects
+    """
+
+    return AccessPolicy.objects.filter(
+        Q(members=member) | Q(iam_roles__members=member) | Q(iam_groups__members=member)
+    ).distinct()
+
+
+@dataclass
+class ResourceFilter:
+    """
+    Resources of one content type, allowed by statements, objects are matched if their user_code
+    contains lowercase user_code of any resource, or its part before "*" for wildcard resources.
+    """
+
+    user_codes: set[str] = field(default_factory=set)
+
+    def add(self, user_code: str):
+        self.user_codes.add(user_code.split("*")[0] if "*" in user_code else user_code)
+
+    def filter(self, queryset: QuerySet) -> QuerySet:
+        if not self.user_codes:
+            return queryset.none()
+
+        # TODO szhitenev
+        # in future release enforce user_code to asci lowercase only
+        q = Q()
+        for user_code in sorted(self.user_codes):
+            q |= Q(user_code__icontains=user_code)
+
+        return queryset.filter(q)
+
+
+@dataclass
+class AllowedResources:
+    """Resources allowed by "allow" statements, ResourceGroups are expanded into resources assigned to them"""
+
+    is_all: bool = False
+    resources: set[str] = field(default_factory=set)
+    content_types: dict[str, ResourceFilter] = field(default_factory=dict)  # "app_label.model" -> ResourceFilter
+
+    def add(self, resources: list[str], groups_resources: dict):
+        if "*" in resources:
+            self.is_all = True
+
+        for resource in expand_resources(resources, groups_resources):
+            if resource == "*":
+                continue
+
+            self.resources.add(resource)
+
+            try:
+                parsed_resource = parse_resource_into_object(resource)
+            except IndexError:
+                _l.warning(f"Resource {resource} is invalid")
+                continue
+
+            content_type_key = f"{parsed_resource['app_label']}.{parsed_resource['model']}"
+            self.content_types.setdefault(content_type_key, ResourceFilter()).add(parsed_resource["user_code"])
+
+
+@dataclass
+class CompiledPolicies:
+    """
+    Effective access policies of the member:
+    statements for AccessPolicy permission checks and allowed resources for querysets filtering
+    """
+
+    statements: list[dict] = field(default_factory=list)
+    # viewset name -> resources of "allow" statements with actions of the viewset
+    viewsets: dict[str, AllowedResources] = field(default_factory=dict)
+    # viewset name -> resources of "allow" statements of policies with actions of the viewset
+    policies_viewsets: dict[str, AllowedResources] = field(default_factory=dict)
+
+
+def get_resource_groups_resources(resources: list[str]) -> dict[str, list[str]]:
+    """
+    Expand ResourceGroups of resources into assigned objects by one query
+    Returns:
+        dict of ResourceGroup user_code -> list of resources of assigned objects
+    """
+    group_codes = {resource.split(":")[-1] for resource in resources if resource.startswith(RESOURCE_GROUP_PREFIX)}
+    if not group_codes:
+        return {}
+
+    groups_resources = {}
+
+    # groups without assignments are selected too, with None values of assignments
+    assignments = ResourceGroup.objects.filter(user_code__in=group_codes).values_list(
+        "user_code",
+        "assignments__content_type__app_label",
+        "assignments__content_type__model",
+        "assignments__object_user_code",
+    )
+    for group_code, app_label, model, object_user_code in assignments:
+        group_resources = groups_resources.setdefault(group_code, [])
+        if object_user_code:
+            group_resources.append(f"frn:finmars:{app_label}:{model}:{object_user_code}")
+
+    for group_code in group_codes - groups_resources.keys():
+        _l.warning(f"ResourceGroup with user_code {group_code} does not exist.")
+
+    return groups_resources
+
+
+def expand_resources(resources: list[str], groups_resources: dict) -> Iterator[str]:
+    """
+    Yields resources, ResourceGroups are replaced by resources of objects assigned to them
+    """
+    for resource in resources:
+        if resource.startswith(RESOURCE_GROUP_PREFIX):
+            yield from groups_resources.get(resource.split(":")[-1], [])
+        else:
+            yield resource
+
+
+def compile_policies(member: Member) -> CompiledPolicies:
+    """
+    Parse statements of all AccessPolicy objects of the member and expand their ResourceGroups
     """
+    compiled = CompiledPolicies()
+    policies_statements = []
+    for item in get_member_access_policies(member):
+        policy = lowercase_keys_and_values(item.policy)
+
+        statements = [lowercase_keys_and_values(statement) for statement in policy["statement"]]
+        compiled.statements.extend(statements)
+        policies_statements.append(statements)
+
+    groups_resources = get_resource_groups_resources(
+        [
+            resource
+            for statement in compiled.statements
+            if statement.get("effect") == "allow"
+            for resource in statement.get("resource", [])
+        ]
+    )
+
+    for statements in policies_statements:
+        policy_viewsets = set()
+        policy_allowed = AllowedResources()
+
+        for statement in statements:
+            viewsets = {action_statement_into_object(action)["viewset"] for action in statement.get("action", [])}
+            policy_viewsets.update(viewsets)
+
+            if statement.get("effect") != "allow":
+                continue
+
+            resources = statement.get("resource", [])
+            policy_allowed.add(resources, groups_resources)
+
+            for viewset_name in viewsets:
+                compiled.viewsets.setdefault(viewset_name, AllowedResources()).add(resources, groups_resources)
+
+        for viewset_name in policy_viewsets:
+            allowed = compiled.policies_viewsets.setdefault(viewset_name, AllowedResources())
+            allowed.is_all = allowed.is_all or policy_allowed.is_all
+            allowed.resources.update(policy_allowed.resources)
 
-    cache_key = f"member_access_policies_{member.id}"
-    access_policies = cache.get(cache_key)
+    return compiled
 
-    if access_policies is None:
-        access_policies = AccessPolicy.objects.filter(
-            Q(members=member) | Q(iam_roles__members=member) | Q(iam_groups__members=member)
-        ).distinct()
 
-        # Cache the result for a specific duration (e.g., 5 minutes)
-        cache.set(cache_key, access_policies, settings.ACCESS_POLICY_CACHE_TTL)
+def get_policies_version_key() -> str:
+    return f"iam_policies_version_{get_current_schema_name()}"
+
+
+def get_policies_version() -> str:
+    key = get_policies_version_key()
+
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, timeout=None)
+        version = cache.get(key)
+
+    return version
+
+
+def invalidate_compiled_policies():
+    """New version of policies of the space, compiled policies of previous versions are not used anymore"""
+    cache.set(get_policies_version_key(), uuid.uuid4().hex, timeout=None)
+
+
+def get_compiled_policies(member: Member) -> CompiledPolicies:
+    """
+    Get CompiledPolicies of the member from cache or compile them,
+    cache key contains version of policies of the space, which is changed when policies, roles, groups
+    or ResourceGroups are changed (see poms.iam.signals)
+    """
+    cache_key = f"iam_compiled_policies_{get_current_schema_name()}_{member.id}_{get_policies_version()}"
+
+    compiled = cache.get(cache_key)
+    if compiled is None:
+        compiled = compile_policies(member)
+        cache.set(cache_key, compiled, settings.ACCESS_POLICY_CACHE_TTL)
 
-    return access_policies
+    return compiled
 
 
 def get_statements(member: Member) -> list:
@@ -122,111 +310,42 @@ def get_statements(member: Member) -> list:
         list of AccessPolicy json fields (statements)
     """
 
-    statements = []
-    for item in get_member_access_policies(member):
-        policy = lowercase_keys_and_values(item.policy)
-
-        statements.extend(lowercase_keys_and_values(statement) for statement in policy["statement"])
+    return get_compiled_policies(member).statements
 
-    return statements
 
-
-def filter_queryset_with_access_policies(member, queryset, view):  # noqa: PLR0912
+def filter_queryset_with_access_policies(member, queryset, view):
     if not member:
         return queryset.none()
 
     if member.is_admin:
         return queryset
 
-    statements = get_statements(member)
+    compiled = get_compiled_policies(member)
 
     """
     Important clause:
     We will not grant access to objects if Access Policy is not configured.
     """
-    if not len(statements):
+    if not compiled.statements:
         return queryset.none()
 
-    _l.debug("filter_queryset_with_access_policies.statements %s", len(statements))
-
-    app_label = queryset.model._meta.app_label
-    model_name = queryset.model._meta.model_name
-    content_type_key = f"{app_label}.{model_name}"
-
-    q = Q()
-    view_related_statements = []
     viewset_name = view.__class__.__name__.replace("ViewSet", "").lower()
-
-    # Filter statements related to the current view
-    for statement in statements:
-        if any(viewset_name == action_statement_into_object(act)["viewset"] for act in statement["action"]):
-            view_related_statements.append(statement)
-
-    _l.debug("filter_queryset_with_access_policies.view_related_statements %s", len(view_related_statements))
-
-    for statement in view_related_statements:
-        if statement["effect"] == "allow":
-            resources = statement.get("resource", [])
-
-            # Handle '*' resource (no restrictions)
-            if "*" in resources:
-                q |= Q(id__isnull=False)
-                continue
-
-            # Parse and expand resources if there are ResourceGroups
-            expanded_resources = set()
-            for resource in resources:
-                if resource.startswith("frn:finmars:iam:resourcegroup:"):
-                    # Handle ResourceGroup resource
-                    resource_group_code = resource.split(":")[-1]
-                    try:
-                        resource_group = ResourceGroup.objects.get(user_code=resource_group_code)
-                        assignments = resource_group.assignments.all()
-
-                        # Add each assigned object's user_code as a resource
-                        expanded_resources.update(
-                            f"frn:finmars:{assignment.content_type.app_label}:{assignment.content_type.model}:{assignment.object_user_code}"
-                            for assignment in assignments
-                            if assignment.object_user_code
-                        )
-                    except ResourceGroup.DoesNotExist:
-                        _l.warning(f"ResourceGroup with user_code {resource_group_code} does not exist.")
-                        continue
-                else:
-                    expanded_resources.add(resource)
-
-            # Apply the filters for expanded resources
-            for resource in expanded_resources:
-                parsed_resource = parse_resource_into_object(resource)
-                _l.info("filter_queryset_with_access_policies.parsed_resource %s", parsed_resource)
-
-                # Match the content type and apply filters
-                if f"{parsed_resource['app_label']}.{parsed_resource['model']}" == content_type_key:
-                    user_code_val = parsed_resource["user_code"]
-                    if "*" in user_code_val:
-                        # Apply wildcard match
-                        base_code = user_code_val.split("*")[0]
-                        q |= Q(user_code__icontains=base_code)
-                    else:
-                        # TODO szhitenev
-                        # in future release enforce user_code to asci lowercase only
-                        q |= Q(user_code__icontains=user_code_val)
-
-    _l.debug("filter_queryset_with_access_policies.q %s", len(q))
+    allowed = compiled.viewsets.get(viewset_name)
 
     """
     Important clause:
     If Access Statements do not grant access, we deny access to objects.
     """
-    if not q:
+    if allowed is None:
         return queryset.none()
 
-    _l.debug("ObjectPermissionBackend.filter_queryset before access filter: %s", queryset.count())
+    # '*' resource (no restrictions)
+    if allowed.is_all:
+        return queryset
 
-    result = queryset.filter(q)
-    _l.info("ObjectPermissionBackend.filter_queryset q %s", q)
+    content_type_key = f"{queryset.model._meta.app_label}.{queryset.model._meta.model_name}"
 
-    return result
+    return allowed.content_types.get(content_type_key, ResourceFilter()).filter(queryset)
 
 
 """
@@ -277,87 +396,30 @@ def get_allowed_queryset(member, queryset):
     if member.is_admin:
         return queryset
 
-    # Get allowed resources for the member and model
-    allowed_resources = get_allowed_resources(member, queryset.model, queryset)
-    allowed_user_codes = []
-
-    _l.debug("get_allowed_queryset.allowed_resources %s", allowed_resources)
-
-    # Extract user codes from allowed resources
-    for resource in allowed_resources:
-        parsed_resource = parse_resource_into_object(resource)
-        allowed_user_codes.append(parsed_resource["user_code"])
-
-    _l.debug("get_allowed_queryset.allowed_user_codes %s", allowed_user_codes)
+    # viewset is compared with the model name, as in Field filter we do not have access to view
+    allowed = get_compiled_policies(member).policies_viewsets.get(queryset.model.__name__.lower())
+    if allowed is None or allowed.is_all:
+        return queryset
 
     # Filter queryset based on allowed user codes
     # Build a Q object for filtering using icontains for each user_code
     q_filter = Q()
-    for user_code in allowed_user_codes:
-        q_filter |= Q(user_code__icontains=user_code)
+    for resource in sorted(allowed.resources):
+        q_filter |= Q(user_code__icontains=parse_resource_into_object(resource)["user_code"])
 
     # Apply the Q filter to the queryset
     return queryset.filter(q_filter)
 
 
-def get_allowed_resources(member, model, queryset):
+def is_resource_allowed(member, model, user_code: str | None) -> bool:
     """
-    Returns a list of allowed resources for a user based on their access policies for the given model and action.
+    Check if the member is allowed to see the resource of model with user_code
     """
-    # Get all AccessPolicy objects for the user
-    access_policies = get_member_access_policies(member)
-    allowed_resources = []
-    related_access_policies = []
-
-    # Filter access policies related to the current model
-    for access_policy in access_policies:
-        policy = lowercase_keys_and_values(access_policy.policy)
-        is_related = False
-
-        for statement in policy["statement"]:
-            for action in statement.get("action", []):
-                action_object = action_statement_into_object(action)
-
-                # Ensure viewset matches the model name (case-insensitive)
-                if model.__name__.lower() == action_object["viewset"]:
-                    is_related = True
-
-        if is_related:
-            related_access_policies.append(policy)
-
-    for policy in related_access_policies:
-        for statement in policy.get("statement", []):
-            if statement.get("effect") == "allow":
-                resources = statement.get("resource", [])
-
-                # Expand resources for ResourceGroups
-                expanded_resources = set()
-                for resource in resources:
-                    if resource == "*":
-                        # Allow access to all resources in queryset if wildcard is used
-                        for obj in queryset:
-                            expanded_resources.add(
-                                f"frn:finmars:{model._meta.app_label.lower()}:{model.__name__.lower()}:{obj.user_code}"
-                            )
-                    elif resource.startswith("frn:finmars:iam:resourcegroup:"):
-                        # Handle ResourceGroup resource
-                        resource_group_code = resource.split(":")[-1]
-                        try:
-                            resource_group = ResourceGroup.objects.get(user_code=resource_group_code)
-                            assignments = resource_group.assignments.all()
-
-                            # Add each assigned object's user_code to the expanded resources list
-                            expanded_resources.update(
-                                f"frn:finmars:{assignment.content_type.app_label}:{assignment.content_type.model}:{assignment.object_user_code}"
-                                for assignment in assignments
-                                if assignment.object_user_code
-                            )
-                        except ResourceGroup.DoesNotExist:
-                            _l.warning(f"ResourceGroup with user_code {resource_group_code} does not exist.")
-                            continue
-                    else:
-                        expanded_resources.add(resource)
-
-                allowed_resources.extend(expanded_resources)
-
-    return list(allowed_resources)
+    allowed = get_compiled_policies(member).policies_viewsets.get(model.__name__.lower())
+    if allowed is None:
+        return False
+
+    # Check permission against expanded resources
+    model_content_type = f"{model._meta.app_label}:{model.__name__.lower()}"
+
+    return allowed.is_all or f"frn:finmars:{model_content_type}:{user_code}" in allowed.resources
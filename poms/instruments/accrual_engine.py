@@ -0,0 +1,85 @@
+from datetime import date, datetime
+
+import numpy as np
+
+from poms.common.formula_accruals import calculate_accrual_event_factor, calculate_accrual_schedule_factor
+from poms.instruments.models import DATE_FORMAT, Instrument
+
+
+def to_dates_array(days) -> np.ndarray:
+    return np.array(list(days), dtype="datetime64[D]")
+
+
+class AccrualEngine:
+    """
+    Accrued prices of instrument for many dates, the same as Instrument.get_accrued_price.
+    Accrual events and schedules are sorted and their dates are parsed once, events and schedules
+    of all dates are found by one vectorized search, accrual factor is calculated once per date.
+    """
+
+    def __init__(self, instrument: Instrument):
+        self.instrument = instrument
+
+        self.events = sorted(instrument.accrual_events.all(), key=lambda event: event.end_date)
+        self.events_end_dates = to_dates_array(event.end_date for event in self.events)
+
+        self.schedules = instrument.get_accrual_calculation_schedules_all()
+        self.schedules_start_dates = [
+            datetime.strptime(schedule.accrual_start_date, DATE_FORMAT).date() for schedule in self.schedules
+        ]
+
+    def get_events_indexes(self, days: np.ndarray) -> np.ndarray:
+        """Index of the nearest future accrual event of each date, -1 if there is no such event"""
+        if not self.events:
+            return np.full(len(days), -1)
+
+        indexes = np.searchsorted(self.events_end_dates, days, side="left")
+        # dates must be within dates of accrual events
+        found = (days >= np.datetime64(self.events[0].start_date, "D")) & (indexes < len(self.events))
+
+        return np.where(found, indexes, -1)
+
+    def get_schedules_indexes(self, days: np.ndarray) -> np.ndarray:
+        """Index of the last started accrual schedule of each date, -1 if there is no such schedule"""
+        if not self.schedules:
+            return np.full(len(days), -1)
+
+        return np.searchsorted(to_dates_array(self.schedules_start_dates), days, side="right") - 1
+
+    def get_accrued_price(self, day: date, event_index: int, schedule_index: int) -> float:
+        if event_index >= 0:
+            event = self.events[event_index]
+            return event.accrual_size * calculate_accrual_event_factor(event, day)
+
+        if schedule_index < 0:
+            return 0
+
+        schedule = self.schedules[schedule_index]
+        factor = calculate_accrual_schedule_factor(
+            accrual_calculation_schedule=schedule,
+            dt1=self.schedules_start_dates[schedule_index],
+            dt2=day,
+            dt3=datetime.strptime(schedule.first_payment_date, DATE_FORMAT).date(),
+        )
+        return float(schedule.accrual_size) * factor
+
+    def get_accrued_prices(self, days) -> dict[date, float]:
+        """Accrued prices of unique dates: date -> accrued price"""
+        days = sorted(set(days))
+        if not days:
+            return {}
+
+        days_array = to_dates_array(days)
+        events_indexes = self.get_events_indexes(days_array)
+        schedules_indexes = self.get_schedules_indexes(days_array)
+
+        # target date must be less that maturity date
+        if self.instrument.maturity_date:
+            is_valid = days_array < np.datetime64(self.instrument.maturity_date, "D")
+            events_indexes = np.where(is_valid, events_indexes, -1)
+            schedules_indexes = np.where(is_valid, schedules_indexes, -1)
+
+        return {
+            day: self.get_accrued_price(day, int(event_index), int(schedule_index))
+            for day, event_index, schedule_index in zip(days, events_indexes, schedules_indexes, strict=True)
+        }
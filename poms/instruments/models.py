@@ -38,6 +38,7 @@ from poms.configuration.models import ConfigurationModel
 from poms.currencies.models import CurrencyHistory
 from poms.expressions_engine import formula
 from poms.instruments.finmars_quantlib import Actual365A, Actual365L
+from poms.instruments.quantlib_bonds import cache_bond, get_bond_signature, get_cached_bond
 from poms.obj_attrs.models import GenericAttribute
 from poms.users.models import EcosystemDefault, MasterUser
 
@@ -1780,6 +1781,28 @@ class Instrument(NamedModel, FakeDeletableModel, TimeStampedModel, ObjectStateMo
         return accruals[0] if len(accruals) else None
 
     def get_quantlib_bond(self):
+        """
+        QuantLib bond of instrument. Built bonds are reused in the process until maturity date,
+        first accrual or factor schedules of instrument change, evaluation date and price
+        are set by the caller.
+        """
+        first_accrual = self.get_first_accrual()
+        factor_schedules = self.get_factors()
+
+        if not self.pk:
+            return self.build_quantlib_bond(first_accrual, factor_schedules)
+
+        key = (self.master_user.space_code, self.pk)
+        signature = get_bond_signature(self, first_accrual, factor_schedules)
+
+        found, bond = get_cached_bond(key, signature)
+        if not found:
+            bond = self.build_quantlib_bond(first_accrual, factor_schedules)
+            cache_bond(key, signature, bond)
+
+        return bond
+
+    def build_quantlib_bond(self, first_accrual, factor_schedules):
         def active_factor(day, factors, factor_dates):
             tmp_list = {idate for idate in factor_dates if idate <= day}
             factor = 1
@@ -1801,16 +1824,12 @@ class Instrument(NamedModel, FakeDeletableModel, TimeStampedModel, ObjectStateMo
 
             maturity = ql.Date(str(self.maturity_date), self.date_pattern)
 
-            if self.has_factor_schedules():
-                factor_schedules = self.get_factors()
-
+            if factor_schedules:
                 factor_dates = [ql.Date(str(item.effective_date), self.date_pattern) for item in factor_schedules]
                 factor_values = [item.factor_value for item in factor_schedules]
 
                 # TODO OG commented: we need issue date
 
-                first_accrual = self.get_first_accrual()
-
                 business_convention = ql.Following
 
                 periodicity = Periodicity.get_quantlib_periodicity(first_accrual.periodicity)
@@ -1845,7 +1864,6 @@ class Instrument(NamedModel, FakeDeletableModel, TimeStampedModel, ObjectStateMo
                 bond = ql.AmortizingFixedRateBond(0, notionals, schedule, [float_accrual_size], day_count)
 
             else:
-                first_accrual = self.get_first_accrual()
                 settlementDays = 0
 
                 if first_accrual:
@@ -2142,7 +2160,8 @@ class Instrument(NamedModel, FakeDeletableModel, TimeStampedModel, ObjectStateMo
         if not self._price_date_is_valid(day=price_date):
             return None
 
-        sorted_accrual_events = list(self.accrual_events.order_by("end_date").all())
+        # sorted in python, so prefetched accrual events are used
+        sorted_accrual_events = sorted(self.accrual_events.all(), key=lambda event: event.end_date)
         if not sorted_accrual_events:
             return None
 
@@ -2196,42 +2215,42 @@ class Instrument(NamedModel, FakeDeletableModel, TimeStampedModel, ObjectStateMo
         return accrual_size
 
     def calculate_prices_accrued_price(self, begin_date=None, end_date=None) -> None:
+        from poms.instruments.accrual_engine import AccrualEngine
+        from poms.instruments.price_histories import bulk_upsert_prices
+        from poms.reports.report_results import invalidate_report_results
+
         existed_prices = PriceHistory.objects.filter(instrument=self, date__range=(begin_date, end_date))
 
+        prices = []
+        new_prices = []
         if begin_date is None and end_date is None:
-            for price in existed_prices:
-                if price.date >= self.maturity_date:
-                    continue
-                accrued_price = self.get_accrued_price(price.date)
-                if accrued_price is None:
-                    accrued_price = 0
-                price.accrued_price = accrued_price
-                price.save(update_fields=["accrued_price"])
+            prices = [price for price in existed_prices if price.date < self.maturity_date]
 
         else:
             existed_prices = {(p.pricing_policy_id, p.date): p for p in existed_prices}
+            days = [
+                dt.date()
+                for dt in rrule.rrule(rrule.DAILY, dtstart=begin_date, until=end_date)
+                if dt.date() < self.maturity_date
+            ]
             for pp in PricingPolicy.objects.filter(master_user=self.master_user):
-                for dt in rrule.rrule(rrule.DAILY, dtstart=begin_date, until=end_date):
-                    day = dt.date()
-                    if day >= self.maturity_date:
-                        continue
-
-                    accrued_price = self.get_accrued_price(day)
-
+                for day in days:
                     price = existed_prices.get((pp.id, day))
                     if price is None:
-                        if accrued_price is not None:
-                            price = PriceHistory()
-                            price.instrument = self
-                            price.pricing_policy = pp
-                            price.date = day
-                            price.accrued_price = accrued_price
-                            price.save()
+                        new_prices.append(PriceHistory(instrument=self, pricing_policy=pp, date=day))
                     else:
-                        if accrued_price is None:
-                            accrued_price = 0
-                        price.accrued_price = accrued_price
-                        price.save(update_fields=["accrued_price"])
+                        prices.append(price)
+
+        accrued_prices = AccrualEngine(self).get_accrued_prices(price.date for price in prices + new_prices)
+
+        for price in prices + new_prices:
+            price.accrued_price = accrued_prices[price.date] or 0
+
+        PriceHistory.objects.bulk_update(prices, ["accrued_price"], batch_size=1000)
+        if prices:
+            invalidate_report_results(self.master_user, prices_dates=[price.date for price in prices])
+
+        bulk_upsert_prices(new_prices)
 
     def get_accrual_schedule_factor(self, price_date: date):
         from poms.common.formula_accruals import calculate_accrual_schedule_factor
@@ -2960,7 +2979,26 @@ class PriceHistory(TimeStampedModel):
     def calculate_duration(self, day, ytm):
         return self.instrument.calculate_quantlib_modified_duration(day=day, ytm=ytm)
 
-    def run_auto_calculation(self, recalculate_inputs=None):  # noqa: PLR0912
+    def get_fx_rate(self, currency_id: int, fx_rates: dict | None = None) -> float:
+        """
+        Fx rate of currency on the date of price, fx_rates are preloaded rates of the batch of prices:
+        (currency_id, date) -> list of fx rates of all pricing policies
+        """
+        if fx_rates is None:
+            return CurrencyHistory.objects.get(date=self.date, currency_id=currency_id).fx_rate
+
+        # the same errors as CurrencyHistory.objects.get raises
+        rates = fx_rates.get((currency_id, self.date), [])
+        if not rates:
+            raise CurrencyHistory.DoesNotExist("CurrencyHistory matching query does not exist.")
+        if len(rates) > 1:
+            raise CurrencyHistory.MultipleObjectsReturned(
+                f"get() returned more than one CurrencyHistory -- it returned {len(rates)}!"
+            )
+
+        return rates[0]
+
+    def run_auto_calculation(self, recalculate_inputs=None, fx_rates=None):  # noqa: PLR0912
         from poms.instruments.fields import AUTO_CALCULATE
 
         if recalculate_inputs is None:
@@ -2969,7 +3007,7 @@ class PriceHistory(TimeStampedModel):
         if not self.procedure_modified_datetime:
             self.procedure_modified_datetime = date_now()
 
-        ecosystem_default = EcosystemDefault.cache.get_cache(master_user_pk=self.instrument.master_user.pk)
+        ecosystem_default = EcosystemDefault.cache.get_cache(master_user_pk=self.instrument.master_user_id)
 
         try:
             if self.instrument.accrued_currency_id == self.instrument.pricing_currency_id:
@@ -2980,16 +3018,12 @@ class PriceHistory(TimeStampedModel):
                 if ecosystem_default.currency_id == self.instrument.accrued_currency_id:
                     self.instr_accrued_ccy_cur_fx = 1
                 else:
-                    self.instr_accrued_ccy_cur_fx = CurrencyHistory.objects.get(
-                        date=self.date, currency=self.instrument.accrued_currency
-                    ).fx_rate
+                    self.instr_accrued_ccy_cur_fx = self.get_fx_rate(self.instrument.accrued_currency_id, fx_rates)
 
                 if ecosystem_default.currency_id == self.instrument.pricing_currency_id:
                     self.instr_pricing_ccy_cur_fx = 1
                 else:
-                    self.instr_pricing_ccy_cur_fx = CurrencyHistory.objects.get(
-                        date=self.date, currency=self.instrument.pricing_currency
-                    ).fx_rate
+                    self.instr_pricing_ccy_cur_fx = self.get_fx_rate(self.instrument.pricing_currency_id, fx_rates)
 
             if "ytm" in recalculate_inputs or self.ytm == 0:
                 self.ytm = self.calculate_ytm(self.date)
@@ -0,0 +1,139 @@
+import logging
+import time
+from collections import defaultdict
+
+from django.db.models import Q
+from django.utils import timezone
+
+from poms.currencies.models import CurrencyHistory
+from poms.instruments.models import Instrument, PriceHistory
+
+_l = logging.getLogger("poms.instruments")
+
+# fields of existing price histories, which are updated by bulk_upsert_prices
+UPSERT_FIELDS = [
+    "principal_price",
+    "accrued_price",
+    "long_delta",
+    "short_delta",
+    "ytm",
+    "nav",
+    "factor",
+    "cash_flow",
+    "modified_duration",
+    "procedure_modified_datetime",
+    "is_temporary_price",
+    "error_message",
+    "modified_at",
+]
+
+
+def load_instruments(prices: list[PriceHistory]):
+    """
+    Set instruments of prices with their factor schedules and accruals,
+    which are used in auto calculation, loaded once for all prices
+    """
+    instruments_ids = {price.instrument_id for price in prices}
+    instruments = (
+        Instrument.objects.filter(id__in=instruments_ids)
+        .select_related("master_user")
+        .prefetch_related(
+            "factor_schedules",
+            "accrual_calculation_schedules",
+            "accrual_events",
+        )
+    )
+    instruments = {instrument.id: instrument for instrument in instruments}
+
+    for price in prices:
+        price.instrument = instruments[price.instrument_id]
+
+
+def load_fx_rates(prices: list[PriceHistory]) -> dict:
+    """Fx rates of currencies of instruments on dates of prices: (currency_id, date) -> list of fx rates"""
+    currencies_dates = defaultdict(set)
+    for price in prices:
+        instrument = price.instrument
+        if instrument.accrued_currency_id != instrument.pricing_currency_id:
+            currencies_dates[instrument.accrued_currency_id].add(price.date)
+            currencies_dates[instrument.pricing_currency_id].add(price.date)
+
+    if not currencies_dates:
+        return {}
+
+    conditions = Q()
+    for currency_id, dates in currencies_dates.items():
+        conditions |= Q(currency_id=currency_id, date__in=dates)
+
+    fx_rates = defaultdict(list)
+    for currency_id, day, fx_rate in CurrencyHistory.objects.filter(conditions).values_list(
+        "currency_id", "date", "fx_rate"
+    ):
+        fx_rates[(currency_id, day)].append(fx_rate)
+
+    return fx_rates
+
+
+def calculate_prices(prices: list[PriceHistory], recalculate_inputs=None):
+    """
+    Run auto calculation of prices as PriceHistory.save does, but with instruments, schedules
+    and fx rates loaded once for the whole batch. QuantLib bonds are built once per instrument.
+    """
+    if not prices:
+        return
+
+    st = time.perf_counter()
+
+    load_instruments(prices)
+    fx_rates = load_fx_rates(prices)
+
+    for price in prices:
+        price.run_auto_calculation(recalculate_inputs=recalculate_inputs, fx_rates=fx_rates)
+
+    _l.info(f"calculate_prices: {len(prices)} prices done: {time.perf_counter() - st:3.3f}")
+
+
+def bulk_upsert_prices(prices: list[PriceHistory], update_fields=None, batch_size=1000) -> list[PriceHistory]:
+    """
+    Calculate prices and create them or update existing ones of the same instrument, pricing policy and date
+    """
+    from poms.reports.report_results import invalidate_report_results
+
+    if not prices:
+        return prices
+
+    calculate_prices(prices)
+
+    PriceHistory.objects.bulk_create(
+        prices,
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=["instrument", "pricing_policy", "date"],
+        update_fields=update_fields or UPSERT_FIELDS,
+    )
+
+    # bulk_create does not send signals
+    invalidate_report_results(prices[0].instrument.master_user, prices_dates=[price.date for price in prices])
+
+    return prices
+
+
+def bulk_save_prices(prices: list[PriceHistory], batch_size=1000) -> list[PriceHistory]:
+    """Calculate and update existing prices"""
+    from poms.reports.report_results import invalidate_report_results
+
+    if not prices:
+        return prices
+
+    calculate_prices(prices)
+
+    # bulk_update does not set auto_now fields
+    now = timezone.now()
+    for price in prices:
+        price.modified_at = now
+
+    PriceHistory.objects.bulk_update(prices, UPSERT_FIELDS, batch_size=batch_size)
+
+    invalidate_report_results(prices[0].instrument.master_user, prices_dates=[price.date for price in prices])
+
+    return prices
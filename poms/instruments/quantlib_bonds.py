@@ -0,0 +1,50 @@
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+_bonds = OrderedDict()  # (space_code, instrument_id) -> (signature, bond), least recently used first
+_bonds_lock = threading.Lock()
+
+
+def get_bond_signature(instrument, first_accrual, factors) -> tuple:
+    """Values of instrument and its schedules, which are used to build QuantLib bond"""
+    accrual = None
+    if first_accrual:
+        accrual = (
+            first_accrual.accrual_start_date,
+            first_accrual.accrual_size,
+            first_accrual.periodicity_id,
+            first_accrual.accrual_calculation_model_id,
+        )
+
+    return (
+        str(instrument.maturity_date),
+        accrual,
+        tuple((factor.effective_date, factor.factor_value) for factor in factors),
+    )
+
+
+def get_cached_bond(key: tuple, signature: tuple) -> tuple:
+    """Return (found, bond), bond is found only if it was built with the same signature"""
+    with _bonds_lock:
+        cached = _bonds.get(key)
+        if cached is None or cached[0] != signature:
+            return False, None
+
+        _bonds.move_to_end(key)
+        return True, cached[1]
+
+
+def cache_bond(key: tuple, signature: tuple, bond):
+    with _bonds_lock:
+        _bonds[key] = (signature, bond)
+        _bonds.move_to_end(key)
+
+        while len(_bonds) > settings.QUANTLIB_BOND_CACHE_SIZE:
+            _bonds.popitem(last=False)
+
+
+def clear_bonds():
+    with _bonds_lock:
+        _bonds.clear()
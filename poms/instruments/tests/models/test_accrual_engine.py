@@ -0,0 +1,90 @@
+from datetime import date, timedelta
+
+from poms.common.common_base_test import BaseTestCase
+from poms.common.factories import AccrualCalculationScheduleFactory, AccrualEventFactory
+from poms.instruments.accrual_engine import AccrualEngine
+from poms.instruments.models import AccrualCalculationModel, Instrument, Periodicity, PriceHistory
+
+DAYS = [date(2023, 12, 1) + timedelta(days=i * 7) for i in range(60)]
+
+
+class AccrualEngineTest(BaseTestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        super().setUp()
+        self.init_test_case()
+        self.pricing_policy = self.create_pricing_policy()
+        self.accrual_calculation_model = AccrualCalculationModel.objects.get(
+            id=AccrualCalculationModel.DAY_COUNT_ACT_365
+        )
+        self.instrument = Instrument.objects.last()
+        self.instrument.maturity_date = date(2024, 12, 31)
+        self.instrument.save()
+        self.instrument.accrual_calculation_schedules.all().delete()
+
+        for start_date, first_payment_date, accrual_size in (
+            ("2024-03-01", "2024-09-01", 4),
+            ("2023-06-01", "2023-12-01", 5),
+        ):
+            AccrualCalculationScheduleFactory(
+                instrument=self.instrument,
+                accrual_start_date=start_date,
+                first_payment_date=first_payment_date,
+                accrual_size=accrual_size,
+                periodicity=Periodicity.objects.get(id=Periodicity.SEMI_ANNUALLY),
+                accrual_calculation_model=self.accrual_calculation_model,
+            )
+
+    def get_instrument(self):
+        return Instrument.objects.get(id=self.instrument.id)
+
+    def get_expected(self):
+        instrument = self.get_instrument()
+        return {day: instrument.get_accrued_price(day) for day in DAYS}
+
+    def test_schedules_are_equal_to_get_accrued_price(self):
+        expected = self.get_expected()
+
+        accrued_prices = AccrualEngine(self.get_instrument()).get_accrued_prices(DAYS + DAYS[:3])
+
+        self.assertEqual(accrued_prices, expected)
+        self.assertEqual(accrued_prices[DAYS[-1]], 0)  # after maturity
+        self.assertNotEqual(accrued_prices[DAYS[1]], 0)
+
+    def test_events_are_equal_to_get_accrued_price(self):
+        for end_date in (date(2024, 7, 1), date(2024, 1, 1), date(2024, 4, 1)):
+            AccrualEventFactory(
+                instrument=self.instrument,
+                end_date=end_date,
+                periodicity_n=91,
+                accrual_calculation_model=self.accrual_calculation_model,
+            )
+        expected = self.get_expected()
+
+        accrued_prices = AccrualEngine(self.get_instrument()).get_accrued_prices(DAYS)
+
+        self.assertEqual(accrued_prices, expected)
+
+    def test_calculate_prices_accrued_price(self):
+        day = DAYS[10]
+        PriceHistory.objects.create(
+            instrument=self.instrument,
+            pricing_policy=self.pricing_policy,
+            date=day,
+            principal_price=100,
+            accrued_price=0,
+        )
+        expected = self.get_expected()
+
+        self.get_instrument().calculate_prices_accrued_price(day, day + timedelta(days=3))
+
+        prices = PriceHistory.objects.filter(instrument=self.instrument, pricing_policy=self.pricing_policy)
+        self.assertEqual(prices.count(), 4)
+        self.assertEqual(prices.get(date=day).principal_price, 100)
+        self.assertEqual(prices.get(date=day).accrued_price, expected[day])
+        self.assertNotEqual(expected[day], 0)
+        self.assertEqual(
+            prices.get(date=day + timedelta(days=3)).accrued_price,
+            self.get_instrument().get_accrued_price(day + timedelta(days=3)),
+        )
@@ -0,0 +1,132 @@
+from datetime import date, timedelta
+
+from poms.common.common_base_test import BaseTestCase
+from poms.common.factories import AccrualCalculationScheduleFactory
+from poms.currencies.models import CurrencyHistory
+from poms.instruments.fields import AUTO_CALCULATE
+from poms.instruments.models import (
+    AccrualCalculationModel,
+    Instrument,
+    InstrumentFactorSchedule,
+    Periodicity,
+    PriceHistory,
+    PricingPolicy,
+)
+from poms.instruments.price_histories import bulk_save_prices, bulk_upsert_prices
+
+CALCULATED_FIELDS = ("principal_price", "accrued_price", "factor", "ytm", "modified_duration", "error_message")
+
+
+class PriceHistoriesTest(BaseTestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        super().setUp()
+        self.init_test_case()
+        self.eur = self.get_currency("EUR")
+        self.pricing_policy = self.create_pricing_policy()
+        self.bulk_pricing_policy = PricingPolicy.objects.create(
+            master_user=self.master_user,
+            owner=self.member,
+            user_code="bulk_pricing_policy",
+            name="bulk_pricing_policy",
+        )
+
+        self.instrument = Instrument.objects.last()
+        self.instrument.maturity_date = date(2030, 6, 30)
+        self.instrument.pricing_currency = self.db_data.usd
+        self.instrument.accrued_currency = self.eur
+        self.instrument.save()
+        self.instrument.factor_schedules.all().delete()
+        self.instrument.accrual_calculation_schedules.all().delete()
+        AccrualCalculationScheduleFactory(
+            instrument=self.instrument,
+            accrual_start_date="2020-06-30",
+            first_payment_date="2020-12-31",
+            accrual_size=5,
+            periodicity=Periodicity.objects.get(id=Periodicity.SEMI_ANNUALLY),
+            accrual_calculation_model=AccrualCalculationModel.objects.get(
+                id=AccrualCalculationModel.DAY_COUNT_ACT_365_FIXED
+            ),
+        )
+        InstrumentFactorSchedule.objects.create(
+            instrument=self.instrument,
+            effective_date=date(2024, 1, 3),
+            factor_value=0.5,
+        )
+
+        self.days = [date(2024, 1, 1) + timedelta(days=i) for i in range(5)]
+        for day in self.days:
+            CurrencyHistory.objects.create(
+                currency=self.eur,
+                pricing_policy=self.pricing_policy,
+                date=day,
+                fx_rate=1.1,
+            )
+
+    def create_prices(self, pricing_policy):
+        return [
+            PriceHistory(
+                instrument_id=self.instrument.id,
+                pricing_policy=pricing_policy,
+                date=day,
+                principal_price=95 + i,
+                accrued_price=AUTO_CALCULATE,
+                factor=AUTO_CALCULATE,
+            )
+            for i, day in enumerate(self.days)
+        ]
+
+    def get_values(self, pricing_policy):
+        return list(
+            PriceHistory.objects.filter(instrument=self.instrument, pricing_policy=pricing_policy)
+            .order_by("date")
+            .values_list(*CALCULATED_FIELDS)
+        )
+
+    def test_bulk_upsert_is_equal_to_save(self):
+        for price in self.create_prices(self.pricing_policy):
+            price.save()
+        expected = self.get_values(self.pricing_policy)
+
+        bulk_upsert_prices(self.create_prices(self.bulk_pricing_policy))
+
+        values = self.get_values(self.bulk_pricing_policy)
+        self.assertEqual(values, expected)
+        self.assertNotEqual(values[0][2], values[-1][2])  # factor is changed
+        self.assertNotEqual(values[0][3], 0)  # ytm is calculated
+
+    def test_bulk_upsert_updates_existing_prices(self):
+        bulk_upsert_prices(self.create_prices(self.pricing_policy))
+
+        prices = self.create_prices(self.pricing_policy)
+        for price in prices:
+            price.principal_price = 100
+
+        bulk_upsert_prices(prices)
+
+        self.assertEqual(PriceHistory.objects.filter(instrument=self.instrument).count(), len(self.days))
+        self.assertEqual({values[0] for values in self.get_values(self.pricing_policy)}, {100})
+
+    def test_fx_rate_errors_are_the_same_as_of_save(self):
+        CurrencyHistory.objects.create(
+            currency=self.eur,
+            pricing_policy=self.bulk_pricing_policy,
+            date=self.days[0],
+            fx_rate=1.2,
+        )
+        CurrencyHistory.objects.filter(date=self.days[1]).delete()
+
+        for price in self.create_prices(self.pricing_policy):
+            price.save()
+        for price in PriceHistory.objects.filter(pricing_policy=self.pricing_policy):
+            price.save()
+        expected = self.get_values(self.pricing_policy)
+
+        bulk_upsert_prices(self.create_prices(self.bulk_pricing_policy))
+        bulk_save_prices(list(PriceHistory.objects.filter(pricing_policy=self.bulk_pricing_policy)))
+
+        values = self.get_values(self.bulk_pricing_policy)
+        self.assertEqual(values, expected)
+        self.assertIn("MultipleObjectsReturned", values[0][5])
+        self.assertIn("DoesNotExist", values[1][5])
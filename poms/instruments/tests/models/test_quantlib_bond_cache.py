@@ -0,0 +1,74 @@
+from datetime import date
+
+import QuantLib as ql
+
+from poms.common.common_base_test import BaseTestCase
+from poms.common.factories import AccrualCalculationScheduleFactory
+from poms.instruments.models import AccrualCalculationModel, Instrument, InstrumentFactorSchedule, Periodicity
+from poms.instruments.quantlib_bonds import clear_bonds
+
+
+class QuantLibBondCacheTest(BaseTestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        super().setUp()
+        self.init_test_case()
+        clear_bonds()
+        self.addCleanup(clear_bonds)
+
+        self.instrument = Instrument.objects.last()
+        self.instrument.maturity_date = date(2030, 6, 30)
+        self.instrument.save()
+        self.accrual = AccrualCalculationScheduleFactory(
+            instrument=self.instrument,
+            accrual_start_date="2020-06-30",
+            first_payment_date="2020-12-31",
+            accrual_size=5,
+            periodicity=Periodicity.objects.get(id=Periodicity.SEMI_ANNUALLY),
+            accrual_calculation_model=AccrualCalculationModel.objects.get(
+                id=AccrualCalculationModel.DAY_COUNT_ACT_365_FIXED
+            ),
+        )
+
+    def get_bond(self):
+        return Instrument.objects.get(id=self.instrument.id).get_quantlib_bond()
+
+    def test_bond_is_reused(self):
+        bond = self.get_bond()
+
+        self.assertIsInstance(bond, ql.FixedRateBond)
+        self.assertIs(self.get_bond(), bond)
+
+    def test_ytm_is_the_same_as_of_new_bond(self):
+        instrument = Instrument.objects.get(id=self.instrument.id)
+        days_prices = ((date(2024, 1, 15), 98), (date(2024, 6, 3), 101), (date(2024, 1, 15), 98))
+
+        ytms = [instrument.calculate_quantlib_ytm(day, price) for day, price in days_prices]
+
+        clear_bonds()
+        expected = []
+        for day, price in days_prices:
+            clear_bonds()
+            expected.append(instrument.calculate_quantlib_ytm(day, price))
+
+        self.assertNotEqual(ytms[0], ytms[1])
+        self.assertEqual(ytms, expected)
+
+    def test_bond_is_rebuilt_when_schedules_change(self):
+        bond = self.get_bond()
+
+        self.accrual.accrual_size = 6
+        self.accrual.save()
+        accrual_bond = self.get_bond()
+
+        InstrumentFactorSchedule.objects.create(
+            instrument=self.instrument,
+            effective_date=date(2025, 6, 30),
+            factor_value=0.5,
+        )
+        factor_bond = self.get_bond()
+
+        self.assertIsNot(accrual_bond, bond)
+        self.assertIsNot(factor_bond, accrual_bond)
+        self.assertIs(self.get_bond(), factor_bond)
@@ -1,5 +1,10 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
 from poms.common.common_base_test import BaseTestCase
 from poms.instruments.models import Instrument
+from poms.obj_attrs.models import GenericAttributeType
 
 
 class InstrumentViewSetTest(BaseTestCase):
@@ -19,17 +24,40 @@ class InstrumentViewSetTest(BaseTestCase):
 
         self.expected_names = {"United States of America", "Turkey", None}
 
-    def test__post_ev_group(self):
-        post_data = {
-            "groups_values": [],
+    def get_post_data(self, groups_types: list, groups_values: list = None, filter_settings: list = None) -> dict:
+        return {
+            "groups_values": groups_values or [],
             "page": 1,
             "page_size": 60,
             "is_enabled": "any",
-            "groups_types": ["country"],
+            "groups_types": groups_types,
             "ev_options": {"entity_filters": ["disabled", "inactive", "active"]},
-            "filter_settings": [],
+            "filter_settings": filter_settings or [],
             "global_table_search": "",
         }
+
+    def get_groups_counts(self, post_data: dict) -> dict:
+        response = self.client.post(self.url, data=post_data, format="json")
+        self.assertEqual(response.status_code, 200, response.content)
+
+        return {
+            group["group_identifier"]: (group["items_count_raw"], group["items_count"])
+            for group in response.json()["results"]
+        }
+
+    def create_instruments_attribute(self) -> GenericAttributeType:
+        content_type = ContentType.objects.get_for_model(Instrument)
+        attribute_type = self.create_attribute_type(content_type, value_type=GenericAttributeType.STRING)
+        for instrument in Instrument.objects.all():
+            self.create_attribute(attribute_type, instrument.id, content_type)
+
+        instrument = Instrument.objects.first()
+        instrument.attributes.update(value_string="first")
+
+        return attribute_type
+
+    def test__post_ev_group(self):
+        post_data = self.get_post_data(["country"])
         response = self.client.post(self.url, data=post_data, format="json")
         self.assertEqual(response.status_code, 200, response.content)
 
@@ -39,3 +67,74 @@ class InstrumentViewSetTest(BaseTestCase):
         self.assertEqual(len(response_json["results"]), 3)
         names = {group["group_name"] for group in response_json["results"]}
         self.assertEqual(names, self.expected_names)
+
+    def test__groups_counts(self):
+        instruments = Instrument.objects.filter(is_deleted=False)
+        instruments.filter(country__isnull=True).update(is_enabled=False)
+
+        counts = self.get_groups_counts(self.get_post_data(["country"]))
+
+        self.assertEqual(len(counts), 3)
+        for user_code, (items_count_raw, items_count) in counts.items():
+            self.assertEqual(items_count_raw, instruments.filter(country__user_code=user_code).count())
+            self.assertEqual(items_count, items_count_raw)
+
+    def test__groups_counts_with_filters(self):
+        instrument = Instrument.objects.filter(country__isnull=False).first()
+        filter_settings = [
+            {
+                "key": "user_code",
+                "filter_type": "contains",
+                "exclude_empty_cells": False,
+                "value_type": 10,
+                "value": [instrument.user_code],
+            }
+        ]
+
+        counts = self.get_groups_counts(self.get_post_data(["country"], filter_settings=filter_settings))
+
+        self.assertEqual(counts, {instrument.country.user_code: (1, 1)})
+
+    def test__groups_counts_of_attribute(self):
+        attribute_type = self.create_instruments_attribute()
+
+        counts = self.get_groups_counts(self.get_post_data([f"attributes.{attribute_type.user_code}"]))
+
+        self.assertEqual(counts["first"], (1, 1))
+        self.assertEqual(sum(items_count_raw for items_count_raw, _ in counts.values()), Instrument.objects.count())
+
+    def test__groups_counts_of_nested_group(self):
+        attribute_type = self.create_instruments_attribute()
+        instrument = Instrument.objects.first()
+
+        counts = self.get_groups_counts(
+            self.get_post_data([f"attributes.{attribute_type.user_code}", "country"], groups_values=["first"])
+        )
+
+        self.assertEqual(counts, {instrument.country.user_code: (1, 1)})
+
+        nested_attribute_type = self.create_instruments_attribute()
+        counts = self.get_groups_counts(
+            self.get_post_data(
+                [f"attributes.{attribute_type.user_code}", f"attributes.{nested_attribute_type.user_code}"],
+                groups_values=["first"],
+            )
+        )
+
+        self.assertEqual(counts, {"first": (1, 1)})
+
+    def test__groups_are_counted_by_one_query(self):
+        post_data = self.get_post_data(["user_code"])
+        self.get_groups_counts(post_data)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.get_groups_counts(post_data)
+
+        for _ in range(5):
+            self.create_instrument()
+
+        with CaptureQueriesContext(connection) as more_groups_queries:
+            counts = self.get_groups_counts(post_data)
+
+        self.assertEqual(len(counts), Instrument.objects.count())
+        self.assertEqual(len(more_groups_queries), len(queries))
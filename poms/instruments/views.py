@@ -118,6 +118,7 @@ from poms.instruments.tasks import (
 from poms.obj_attrs.models import GenericAttributeType
 from poms.obj_attrs.utils import get_attributes_prefetch
 from poms.obj_attrs.views import GenericAttributeTypeViewSet, GenericClassifierViewSet
+from poms.reports.report_results import invalidate_report_results
 from poms.reports.sql_builders.helpers import dictfetchall
 from poms.strategies.models import Strategy3
 from poms.transactions.models import NotificationClass, Transaction
@@ -1619,6 +1620,9 @@ class PriceHistoryViewSet(AbstractModelViewSet):
             update_fields=["principal_price", "accrued_price"],
         )
 
+        # bulk_create does not send signals
+        invalidate_report_results(request.user.master_user, prices_dates=[price.date for price in valid_data])
+
         if errors:
             _l.info(f"PriceHistoryViewSet.bulk_create.errors {errors}")
             # Here we just return the errors as part of the response.
@@ -1,6 +1,6 @@
 from django.apps import AppConfig
 from django.db import DEFAULT_DB_ALIAS
-from django.db.models.signals import post_migrate
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_save
 from django.utils.translation import gettext_lazy
 
 
@@ -12,6 +12,19 @@ class IntegrationsConfig(AppConfig):
         post_migrate.connect(self.update_transaction_classes, sender=self)
         post_migrate.connect(self.update_data_providers, sender=self)
 
+        from .mapping_tables import (
+            mapping_table_key_value_post_save,
+            mapping_table_post_save,
+            mapping_table_pre_save,
+        )
+        from .models import MappingTable, MappingTableKeyValue
+
+        pre_save.connect(mapping_table_pre_save, sender=MappingTable)
+        post_save.connect(mapping_table_post_save, sender=MappingTable)
+        post_delete.connect(mapping_table_post_save, sender=MappingTable)
+        post_save.connect(mapping_table_key_value_post_save, sender=MappingTableKeyValue)
+        post_delete.connect(mapping_table_key_value_post_save, sender=MappingTableKeyValue)
+
         # noinspection PyUnresolvedReferences
         # import poms.integrations.handlers
 
@@ -0,0 +1,141 @@
+import logging
+import threading
+import uuid
+from functools import partial
+
+from django.core.cache import cache
+
+from poms.common.db import on_commit_once
+
+_l = logging.getLogger("poms.integrations")
+
+MAPPING_TABLE_VERSION_TIMEOUT = 60 * 60 * 24 * 7
+
+
+class MappingTableIndex:
+    """
+    Lookup dicts of MappingTable items in both directions.
+    Items are kept in their model ordering (by key), so first match
+    semantics of the old linear scan over mapping_table.items.all() are preserved.
+    """
+
+    __slots__ = ("version", "keys", "value_by_key", "key_by_value", "values_by_key")
+
+    def __init__(self, version, items):
+        self.version = version
+        self.keys = []
+        self.value_by_key = {}
+        self.key_by_value = {}
+        self.values_by_key = {}
+
+        for key, value in items:
+            self.keys.append(key)
+            self.value_by_key.setdefault(key, value)
+            self.key_by_value.setdefault(value, key)
+            self.values_by_key.setdefault(key, []).append(value)
+
+
+_indexes = {}  # (space_code, master_user_id, user_code) -> MappingTableIndex | None
+_indexes_lock = threading.Lock()
+
+
+def get_mapping_table_version_cache_key(space_code, master_user_id, user_code):
+    return f"{space_code}_mapping_table_version_{master_user_id}_{user_code}"
+
+
+def invalidate_mapping_table(mapping_table, user_code=None):
+    """
+    Bump version of mapping table after commit, so every process rebuilds its index on next lookup.
+    Version is not bumped before commit, as index rebuilt from not committed items would be used until next change.
+    """
+    master_user = mapping_table.master_user
+
+    cache_key = get_mapping_table_version_cache_key(
+        master_user.space_code,
+        master_user.id,
+        user_code or mapping_table.user_code,
+    )
+    on_commit_once(cache_key, partial(_bump_version, cache_key))
+
+    _l.debug("invalidate_mapping_table.cache_key %s", cache_key)
+
+
+def _bump_version(cache_key):
+    cache.set(cache_key, uuid.uuid4().hex, MAPPING_TABLE_VERSION_TIMEOUT)
+
+
+def _invalidate_mapping_table_by_id(mapping_table_id):
+    from poms.integrations.models import MappingTable
+
+    mapping_table = MappingTable.objects.select_related("master_user").filter(pk=mapping_table_id).first()
+    if mapping_table is not None:  # deleted table is invalidated by its own signal
+        invalidate_mapping_table(mapping_table)
+
+
+def _get_version(cache_key):
+    version = cache.get(cache_key)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(cache_key, version, MAPPING_TABLE_VERSION_TIMEOUT):
+            version = cache.get(cache_key, version)
+
+    return version
+
+
+def get_mapping_table_index(master_user, user_code):
+    """
+    Return MappingTableIndex of mapping table, None if table does not exist.
+    Index is rebuilt with one query when version of the table in the shared cache changes.
+    """
+    from poms.integrations.models import MappingTable, MappingTableKeyValue
+
+    space_code = master_user.space_code
+    version = _get_version(get_mapping_table_version_cache_key(space_code, master_user.id, user_code))
+    index_key = (space_code, master_user.id, user_code)
+
+    index = _indexes.get(index_key)
+    if index is not None and index.version == version:
+        return index
+
+    try:
+        mapping_table = MappingTable.objects.get(master_user=master_user, user_code=user_code)
+    except MappingTable.DoesNotExist:
+        with _indexes_lock:
+            _indexes.pop(index_key, None)
+        return None
+
+    items = MappingTableKeyValue.objects.filter(mapping_table=mapping_table).values_list("key", "value")
+    index = MappingTableIndex(version, items)
+
+    with _indexes_lock:
+        _indexes[index_key] = index
+
+    return index
+
+
+def clear_mapping_table_indexes():
+    with _indexes_lock:
+        _indexes.clear()
+
+
+def mapping_table_pre_save(sender, instance, **kwargs):
+    """Keep user_code of saved table, index of the old user_code is invalidated if table is renamed"""
+    if instance.pk:
+        instance._saved_user_code = sender.objects.filter(pk=instance.pk).values_list("user_code", flat=True).first()
+
+
+def mapping_table_post_save(sender, instance, **kwargs):
+    invalidate_mapping_table(instance)
+
+    saved_user_code = getattr(instance, "_saved_user_code", None)
+    if saved_user_code and saved_user_code != instance.user_code:
+        invalidate_mapping_table(instance, user_code=saved_user_code)
+
+
+def mapping_table_key_value_post_save(sender, instance, **kwargs):
+    """Table of saved items is invalidated once per transaction, it is loaded after commit"""
+    mapping_table_id = instance.mapping_table_id
+    on_commit_once(
+        ("mapping_table", mapping_table_id),
+        partial(_invalidate_mapping_table_by_id, mapping_table_id),
+    )
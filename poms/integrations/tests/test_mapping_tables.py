@@ -0,0 +1,88 @@
+from poms.common.common_base_test import BaseTestCase
+from poms.expressions_engine import formula
+from poms.integrations.mapping_tables import clear_mapping_table_indexes, get_mapping_table_index
+from poms.integrations.models import MappingTable, MappingTableKeyValue
+
+
+class MappingTableIndexTest(BaseTestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        super().setUp()
+        self.init_test_case()
+        clear_mapping_table_indexes()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.mapping_table = MappingTable.objects.create(
+                master_user=self.master_user,
+                owner=self.member,
+                user_code="local.poms.space00000:counterparties",
+                name="counterparties",
+            )
+            for key, value in (("a", "1"), ("b", "2"), ("b", "3")):
+                MappingTableKeyValue.objects.create(mapping_table=self.mapping_table, key=key, value=value)
+
+        self.context = {"master_user": self.master_user, "member": self.member}
+
+    def eval(self, expr):
+        return formula.safe_eval(expr, context=self.context)
+
+    def test_lookups(self):
+        user_code = self.mapping_table.user_code
+
+        self.assertEqual(self.eval(f"get_mapping_value_by_key('{user_code}', 'b')"), "2")
+        self.assertEqual(self.eval(f"get_mapping_key_by_value('{user_code}', '3')"), "b")
+        self.assertEqual(self.eval(f"get_mapping_keys('{user_code}')"), ["a", "b", "b"])
+        self.assertEqual(self.eval(f"get_mapping_key_values('{user_code}', 'b')"), ["2", "3"])
+        self.assertIsNone(self.eval(f"get_mapping_value_by_key('{user_code}', 'missing')"))
+        self.assertIsNone(self.eval("get_mapping_value_by_key('missing', 'a')"))
+
+    def test_index_is_reused(self):
+        index = get_mapping_table_index(self.master_user, self.mapping_table.user_code)
+
+        with self.assertNumQueries(0):
+            self.assertIs(get_mapping_table_index(self.master_user, self.mapping_table.user_code), index)
+
+    def test_index_is_invalidated_on_commit(self):
+        user_code = self.mapping_table.user_code
+        expr = f"get_mapping_value_by_key('{user_code}', 'c')"
+
+        self.assertIsNone(self.eval(expr))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            item = MappingTableKeyValue.objects.create(mapping_table=self.mapping_table, key="c", value="4")
+            self.assertIsNone(self.eval(expr))
+        self.assertEqual(self.eval(expr), "4")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            item.value = "5"
+            item.save()
+        self.assertEqual(self.eval(expr), "5")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            item.delete()
+        self.assertIsNone(self.eval(expr))
+
+    def test_index_of_old_user_code_is_invalidated_on_rename(self):
+        old_user_code = self.mapping_table.user_code
+        self.assertEqual(self.eval(f"get_mapping_value_by_key('{old_user_code}', 'a')"), "1")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.mapping_table.user_code = "local.poms.space00000:renamed"
+            self.mapping_table.save()
+
+        self.assertIsNone(self.eval(f"get_mapping_value_by_key('{old_user_code}', 'a')"))
+        self.assertEqual(self.eval("get_mapping_value_by_key('local.poms.space00000:renamed', 'a')"), "1")
+
+    def test_items_invalidate_table_once(self):
+        user_code = self.mapping_table.user_code
+
+        with self.captureOnCommitCallbacks() as callbacks, self.assertNumQueries(3):
+            for key in ("c", "d", "e"):
+                MappingTableKeyValue.objects.create(mapping_table=self.mapping_table, key=key, value=key)
+
+        self.assertEqual(len(callbacks), 1)
+
+        with self.assertNumQueries(1):  # table is loaded after commit
+            callbacks[0]()
+
+        self.assertEqual(self.eval(f"get_mapping_keys('{user_code}')"), ["a", "b", "b", "c", "d", "e"])
@@ -0,0 +1,340 @@
+import logging
+from collections import defaultdict
+from datetime import date, timedelta
+
+from django.db import connection
+
+from poms.currencies.models import CurrencyHistory
+from poms.instruments.models import Instrument, InstrumentClass, PriceHistory
+from poms.portfolios.models import PortfolioRegister, PortfolioRegisterRecord
+from poms.reports.sql_builders.helpers import dictfetchall
+from poms.transactions.models import Transaction, TransactionClass
+from poms.users.models import EcosystemDefault
+
+_l = logging.getLogger("poms.portfolios")
+
+# transactions are taken from the same views as in BalanceReportBuilderSql
+TRANSACTIONS_QUERY = """
+    select
+        transaction_class_id, instrument_id, settlement_currency_id,
+        position_size_with_sign, cash_consideration, accounting_date, cash_date
+    from (
+        select
+            master_user_id, portfolio_id, transaction_class_id, instrument_id, settlement_currency_id,
+            position_size_with_sign, cash_consideration, accounting_date, cash_date
+        from pl_transactions_with_ttype
+        union all
+        select
+            master_user_id, portfolio_id, transaction_class_id, instrument_id, settlement_currency_id,
+            (0) as position_size_with_sign, cash_consideration, accounting_date, cash_date
+        from pl_cash_fx_trades_transactions_with_ttype
+        union all
+        select
+            master_user_id, portfolio_id, transaction_class_id, instrument_id, settlement_currency_id,
+            position_size_with_sign, cash_consideration, accounting_date, cash_date
+        from pl_cash_fx_variations_transactions_with_ttype
+        union all
+        select
+            master_user_id, portfolio_id, transaction_class_id, instrument_id, settlement_currency_id,
+            position_size_with_sign, cash_consideration, accounting_date, cash_date
+        from pl_cash_transaction_pl_transactions_with_ttype
+    ) as t
+    where master_user_id = %s and portfolio_id = %s and least(accounting_date, cash_date) <= %s
+"""
+
+POSITION_CLASSES = (TransactionClass.BUY, TransactionClass.SELL, TransactionClass.INITIAL_POSITION)
+INITIAL_CLASSES = (TransactionClass.INITIAL_POSITION, TransactionClass.INITIAL_CASH)
+CASH_FLOW_CLASSES = (
+    TransactionClass.CASH_INFLOW,
+    TransactionClass.DISTRIBUTION,
+    TransactionClass.INJECTION,
+    TransactionClass.CASH_OUTFLOW,
+)
+
+
+def get_transaction_balance(transaction: dict, day: date) -> tuple:
+    """
+    Position size and cash of transaction in Balance Report on the day,
+    interim account cases are the same as in BalanceReportBuilderSql
+    """
+    accounting_date = transaction["accounting_date"]
+    cash_date = transaction["cash_date"]
+    min_date = min(accounting_date, cash_date)
+
+    if min_date > day:
+        return 0, 0
+
+    # initial positions are taken only on their own date
+    if transaction["transaction_class_id"] in INITIAL_CLASSES and min_date != day:
+        return 0, 0
+
+    cash = transaction["cash_consideration"] or 0
+    if cash_date <= day < accounting_date:
+        return 0, -cash
+
+    if transaction["transaction_class_id"] not in POSITION_CLASSES:
+        return 0, cash
+
+    return transaction["position_size_with_sign"] or 0, cash
+
+
+def get_transaction_deltas(transaction: dict) -> list:
+    """
+    Changes of position size and cash of transaction by dates, when its balance changes
+    """
+    accounting_date = transaction["accounting_date"]
+    cash_date = transaction["cash_date"]
+    min_date = min(accounting_date, cash_date)
+
+    days = {accounting_date, cash_date}
+    if transaction["transaction_class_id"] in INITIAL_CLASSES:
+        days.add(min_date + timedelta(days=1))
+
+    deltas = []
+    position, cash = 0, 0
+    for day in sorted(days):
+        day_position, day_cash = get_transaction_balance(transaction, day)
+        if day_position != position or day_cash != cash:
+            deltas.append((day, day_position - position, day_cash - cash))
+        position, cash = day_position, day_cash
+
+    return deltas
+
+
+class PortfolioNavEngine:
+    """
+    Calculates NAV and cash flows of portfolio register day by day without building Balance Report
+    for each day. Positions are built once from transactions and then are changed by their deltas,
+    prices and fx rates of the whole period are loaded at once.
+
+    Days must be requested in ascending order.
+    """
+
+    def __init__(self, portfolio_register: PortfolioRegister, date_from: date, date_to: date):
+        self.portfolio_register = portfolio_register
+        self.master_user = portfolio_register.master_user
+        self.pricing_policy_id = portfolio_register.valuation_pricing_policy_id
+        self.report_currency_id = portfolio_register.linked_instrument.pricing_currency_id
+        self.date_from = date_from
+        self.date_to = date_to
+
+        ecosystem_defaults = EcosystemDefault.cache.get_cache(master_user_pk=self.master_user.pk)
+        self.default_currency_id = ecosystem_defaults.currency_id
+
+        self.positions = defaultdict(float)  # instrument_id -> position size
+        self.cash = defaultdict(float)  # settlement_currency_id -> position size
+        self.current_day = None
+
+        self.deltas = self.load_deltas()
+        self.instruments = self.load_instruments()
+        self.prices = self.load_prices()
+        self.fx_rates = self.load_fx_rates()
+        self.cash_flow_transactions = self.load_cash_flow_transactions()
+        self.records = self.load_records()
+        self.record_index = 0
+        self.record = None
+
+    def load_deltas(self) -> list:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                TRANSACTIONS_QUERY,
+                [self.master_user.id, self.portfolio_register.portfolio_id, self.date_to],
+            )
+            transactions = dictfetchall(cursor)
+
+        deltas = []
+        for transaction in transactions:
+            deltas.extend(
+                (day, transaction["instrument_id"], transaction["settlement_currency_id"], position, cash)
+                for day, position, cash in get_transaction_deltas(transaction)
+            )
+
+        deltas.sort(key=lambda delta: delta[0], reverse=True)
+
+        return deltas
+
+    def load_instruments(self) -> dict:
+        instruments_ids = {delta[1] for delta in self.deltas}
+
+        return {
+            instrument["id"]: instrument
+            for instrument in Instrument.objects.filter(id__in=instruments_ids).values(
+                "id",
+                "price_multiplier",
+                "accrued_multiplier",
+                "pricing_currency_id",
+                "accrued_currency_id",
+                "instrument_type__instrument_class_id",
+            )
+        }
+
+    def load_prices(self) -> dict:
+        prices = PriceHistory.objects.filter(
+            instrument_id__in=self.instruments.keys(),
+            pricing_policy_id=self.pricing_policy_id,
+            date__gte=self.date_from,
+            date__lte=self.date_to,
+        ).values_list("instrument_id", "date", "principal_price", "accrued_price")
+
+        return {(instrument_id, day): (principal, accrued) for instrument_id, day, principal, accrued in prices}
+
+    def load_fx_rates(self) -> dict:
+        fx_rates = CurrencyHistory.objects.filter(
+            pricing_policy_id=self.pricing_policy_id,
+            date__gte=self.date_from,
+            date__lte=self.date_to,
+        ).values_list("currency_id", "date", "fx_rate")
+
+        return {(currency_id, day): fx_rate for currency_id, day, fx_rate in fx_rates}
+
+    def load_cash_flow_transactions(self) -> dict:
+        transactions = (
+            Transaction.objects.filter(
+                master_user=self.master_user,
+                portfolio_id=self.portfolio_register.portfolio_id,
+                accounting_date__gte=self.date_from,
+                accounting_date__lte=self.date_to,
+                transaction_class_id__in=CASH_FLOW_CLASSES,
+            )
+            .order_by("accounting_date", "id")
+            .values("id", "accounting_date", "transaction_currency_id", "cash_consideration", "reference_fx_rate")
+        )
+
+        result = defaultdict(list)
+        for transaction in transactions:
+            result[transaction["accounting_date"]].append(transaction)
+
+        return result
+
+    def load_records(self) -> list:
+        # nulls of transaction_code are last, as they are first in descending order
+        return list(
+            PortfolioRegisterRecord.objects.filter(
+                instrument_id=self.portfolio_register.linked_instrument_id,
+                transaction_date__lte=self.date_to,
+            ).order_by("transaction_date", "transaction_code")
+        )
+
+    def move_to(self, day: date):
+        if self.current_day is not None and day < self.current_day:
+            raise ValueError(f"PortfolioNavEngine day {day} is before current day {self.current_day}")
+
+        while self.deltas and self.deltas[-1][0] <= day:
+            _, instrument_id, currency_id, position, cash = self.deltas.pop()
+            self.positions[instrument_id] += position
+            self.cash[currency_id] += cash
+
+        while self.record_index < len(self.records) and self.records[self.record_index].transaction_date <= day:
+            self.record = self.records[self.record_index]
+            self.record_index += 1
+
+        self.current_day = day
+
+    def get_register_record(self, day: date) -> PortfolioRegisterRecord | None:
+        """Last portfolio register record on the day"""
+        self.move_to(day)
+        return self.record
+
+    def get_fx_rate(self, currency_id: int, day: date) -> float | None:
+        """Fx rate as in Balance Report, None if there is no fx rate"""
+        if currency_id == self.default_currency_id:
+            return 1
+
+        return self.fx_rates.get((currency_id, day))
+
+    def is_supported(self, day: date) -> bool:
+        """
+        Market value of contract for difference depends on its cost price,
+        so Balance Report must be built for the days, when it is in portfolio
+        """
+        self.move_to(day)
+
+        for instrument_id, position in self.positions.items():
+            instrument = self.instruments.get(instrument_id)
+            if (
+                position
+                and instrument
+                and instrument["instrument_type__instrument_class_id"] == InstrumentClass.CONTRACT_FOR_DIFFERENCE
+            ):
+                return False
+
+        return True
+
+    def get_market_value(self, instrument_id: int, position: float, day: date, report_fx_rate: float) -> float | None:
+        instrument = self.instruments.get(instrument_id)
+        price = self.prices.get((instrument_id, day))
+        if instrument is None or price is None:
+            return None
+
+        principal_price, accrued_price = price
+        pricing_fx_rate = self.get_fx_rate(instrument["pricing_currency_id"], day)
+        accrued_fx_rate = self.get_fx_rate(instrument["accrued_currency_id"], day)
+
+        values = (
+            principal_price,
+            accrued_price,
+            pricing_fx_rate,
+            accrued_fx_rate,
+            instrument["price_multiplier"],
+            instrument["accrued_multiplier"],
+        )
+        if any(value is None for value in values):
+            return None
+
+        market_value = (
+            position * principal_price * instrument["price_multiplier"] * pricing_fx_rate
+            + position * accrued_price * accrued_fx_rate * instrument["accrued_multiplier"]
+        )
+
+        return market_value / report_fx_rate
+
+    def get_nav(self, day: date) -> float:
+        """Sum of market values of Balance Report items in linked instrument pricing currency"""
+        self.move_to(day)
+
+        report_fx_rate = self.get_fx_rate(self.report_currency_id, day)
+        if report_fx_rate is None:
+            return 0
+
+        nav = 0
+        for instrument_id, position in self.positions.items():
+            if position:
+                market_value = self.get_market_value(instrument_id, position, day, report_fx_rate)
+                if market_value:
+                    nav = nav + market_value
+
+        for currency_id, position in self.cash.items():
+            settlement_fx_rate = self.get_fx_rate(currency_id, day)
+            if settlement_fx_rate is not None:
+                market_value = position * settlement_fx_rate / report_fx_rate
+                if market_value:
+                    nav = nav + market_value
+
+        return nav
+
+    def get_cash_flow(self, day: date) -> float:
+        """The same as calculate_cash_flow, but with preloaded transactions and fx rates"""
+        log = "PortfolioNavEngine.get_cash_flow"
+
+        cash_flow = 0
+        for transaction in self.cash_flow_transactions.get(day, []):
+            if transaction["transaction_currency_id"] == self.report_currency_id:
+                fx_rate = 1
+            else:
+                try:
+                    fx_rate = (
+                        self.fx_rates[(transaction["transaction_currency_id"], day)]
+                        / self.fx_rates[(self.report_currency_id, day)]
+                    )
+                except Exception as e:
+                    err_msg = (
+                        f"{log} fx_rate calculation for transaction {transaction['id']} "
+                        f"portfolio_registry {self.portfolio_register.id} and linked_instrument "
+                        f"{self.portfolio_register.linked_instrument_id} resulted "
+                        f"in error {repr(e)}"
+                    )
+                    raise RuntimeError(err_msg) from e
+
+            cash_flow = cash_flow + (transaction["cash_consideration"] * transaction["reference_fx_rate"] * fx_rate)
+
+        return cash_flow
@@ -29,7 +29,8 @@ from poms.portfolios.models import (
     PortfolioRegister,
     PortfolioRegisterRecord,
 )
-from poms.portfolios.utils import get_price_calculation_type, update_price_histories
+from poms.portfolios.nav_engine import PortfolioNavEngine
+from poms.portfolios.utils import get_price_calculation_type, upsert_price_histories
 from poms.reports.common import Report
 from poms.reports.sql_builders.balance import BalanceReportBuilderSql
 from poms.system_messages.handlers import send_system_message
@@ -619,69 +620,61 @@ def calculate_portfolio_register_price_history(self, task_id: int, *args, **kwar
                 pricing_policy=portfolio_register.valuation_pricing_policy,
             ).delete()
 
+            if not item["dates"]:
+                continue
+
+            nav_engine = PortfolioNavEngine(portfolio_register, item["date_from"], item["date_to"])
+            price_histories = []  # calculated price history objects to be saved
+            failed_price_histories = []  # price history objects of failed days, only error is saved
+
             for day in item["dates"]:
-                pr_record = (
-                    PortfolioRegisterRecord.objects.filter(
-                        instrument=portfolio_register.linked_instrument,
-                        transaction_date__lte=day,
-                    )
-                    .order_by("-transaction_date", "-transaction_code")
-                    .first()
-                )
+                pr_record = nav_engine.get_register_record(day)
                 if not pr_record:
                     continue
 
-                price_histories = []  # price history objects to be updated
-
-                price_history, _ = PriceHistory.objects.get_or_create(
+                price_history = PriceHistory(
                     instrument=portfolio_register.linked_instrument,
                     date=day,
                     pricing_policy=portfolio_register.valuation_pricing_policy,
+                    error_message="",
                 )
-                price_histories.append(price_history)
 
                 try:
-                    balance_report = calculate_simple_balance_report(
-                        day,
-                        portfolio_register,
-                        task.member,
-                    )
-                    nav = 0
-                    for it in balance_report.items:
-                        if it["market_value"]:
-                            nav = nav + it["market_value"]
+                    if nav_engine.is_supported(day):
+                        nav = nav_engine.get_nav(day)
+                    else:
+                        balance_report = calculate_simple_balance_report(
+                            day,
+                            portfolio_register,
+                            task.member,
+                        )
+                        nav = 0
+                        for it in balance_report.items:
+                            if it["market_value"]:
+                                nav = nav + it["market_value"]
 
                 except Exception as e:
-                    err_msg = (
-                        f"{log} {portfolio_register} day {day} calculate_simple_"
-                        f"balance_report func ended in error {repr(e)}"
-                    )
+                    err_msg = f"{log} {portfolio_register} day {day} nav calculation ended in error {repr(e)}"
                     _l.error(f"{err_msg} trace {traceback.format_exc()}")
-                    update_price_histories(price_histories, error_message=err_msg)
+                    price_history.error_message = err_msg
+                    failed_price_histories.append(price_history)
                     continue
 
                 try:
-                    cash_flow = calculate_cash_flow(
-                        master_user,
-                        day,
-                        portfolio_register.valuation_pricing_policy,
-                        portfolio_register,
-                    )
+                    cash_flow = nav_engine.get_cash_flow(day)
                     principal_price = nav / pr_record.rolling_shares_of_the_day
 
                 except Exception as e:
                     err_msg = f"{log} {portfolio_register} day {day} calculate_cash_flow func ended in error {repr(e)}"
                     _l.error(f"{err_msg} trace {traceback.format_exc()}")
-                    update_price_histories(price_histories, error_message=err_msg)
+                    price_history.error_message = err_msg
+                    failed_price_histories.append(price_history)
                     continue
 
-                update_price_histories(
-                    price_histories,
-                    error_message="",
-                    nav=nav,
-                    cash_flow=cash_flow,
-                    principal_price=principal_price,
-                )
+                price_history.nav = nav
+                price_history.cash_flow = cash_flow
+                price_history.principal_price = principal_price
+                price_histories.append(price_history)
 
                 count = count + 1
                 task.update_progress(
@@ -693,6 +686,13 @@ def calculate_portfolio_register_price_history(self, task_id: int, *args, **kwar
                     }
                 )
 
+            upsert_price_histories(
+                price_histories,
+                update_fields=["error_message", "nav", "cash_flow", "principal_price"],
+            )
+            # values of existing prices are kept when their day failed
+            upsert_price_histories(failed_price_histories, update_fields=["error_message"])
+
         # Finish calculation
         send_system_message(
             master_user=master_user,
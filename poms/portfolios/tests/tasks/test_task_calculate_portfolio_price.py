@@ -1,3 +1,5 @@
+from datetime import timedelta
+from types import SimpleNamespace
 from unittest import mock  # , skip
 
 from django.conf import settings
@@ -6,7 +8,7 @@ from poms.celery_tasks.models import CeleryTask
 from poms.common.common_base_test import BIG, BaseTestCase
 from poms.common.exceptions import FinmarsBaseException
 from poms.configuration.utils import get_default_configuration_code
-from poms.instruments.models import PricingPolicy
+from poms.instruments.models import PriceHistory, PricingPolicy
 from poms.portfolios.models import PortfolioRegister
 from poms.portfolios.tasks import calculate_portfolio_register_price_history
 
@@ -107,3 +109,42 @@ class CalculatePortfolioRegisterPriceHistoryTest(BaseTestCase):
         celery_task.refresh_from_db()
         self.assertEqual(celery_task.status, CeleryTask.STATUS_DONE)
         self.assertEqual(system_message.call_count, 2)
+
+    @mock.patch("poms.portfolios.tasks.PortfolioNavEngine")
+    @mock.patch("poms.portfolios.tasks.send_system_message")
+    def test__failed_day_saves_only_error(self, system_message, nav_engine_class):
+        portfolio_register = self.create_portfolio_register()
+        failed_day = self.yesterday() - timedelta(days=1)
+
+        def get_nav(day):
+            if day == failed_day:
+                raise ValueError("no prices")
+            return 100
+
+        nav_engine = nav_engine_class.return_value
+        nav_engine.get_register_record.return_value = SimpleNamespace(rolling_shares_of_the_day=2)
+        nav_engine.is_supported.return_value = True
+        nav_engine.get_nav.side_effect = get_nav
+        nav_engine.get_cash_flow.return_value = 5
+
+        options = {
+            "date_from": failed_day.strftime(settings.API_DATE_FORMAT),
+            "date_to": self.yesterday().strftime(settings.API_DATE_FORMAT),
+            "portfolio_registers": [portfolio_register.user_code],
+        }
+        celery_task = self.create_celery_task(options=options)
+
+        calculate_portfolio_register_price_history(task_id=celery_task.id)
+
+        prices = {
+            price.date: price
+            for price in PriceHistory.objects.filter(
+                instrument=self.instrument,
+                pricing_policy=self.pricing_policy,
+            )
+        }
+        self.assertIn("no prices", prices[failed_day].error_message)
+        self.assertEqual(prices[self.yesterday()].error_message, "")
+        self.assertEqual(prices[self.yesterday()].nav, 100)
+        self.assertEqual(prices[self.yesterday()].cash_flow, 5)
+        self.assertEqual(prices[self.yesterday()].principal_price, 50)
@@ -0,0 +1,133 @@
+from datetime import timedelta
+
+from poms.common.common_base_test import BIG, BaseTestCase
+from poms.currencies.models import CurrencyHistory
+from poms.instruments.models import PriceHistory
+from poms.portfolios.models import PortfolioRegister
+from poms.portfolios.nav_engine import PortfolioNavEngine, get_transaction_deltas
+from poms.portfolios.tasks import calculate_simple_balance_report
+from poms.transactions.models import TransactionClass
+
+
+class PortfolioNavEngineTest(BaseTestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        super().setUp()
+        self.init_test_case()
+        self.portfolio = self.db_data.portfolios[BIG]
+        self.instrument = self.db_data.instruments["Apple"]
+        self.eur = self.get_currency("EUR")
+        self.pricing_policy = self.create_pricing_policy()
+        self.date_from = self.today() - timedelta(days=10)
+        self.date_to = self.today() - timedelta(days=1)
+        self.portfolio_register = PortfolioRegister.objects.create(
+            master_user=self.master_user,
+            owner=self.member,
+            portfolio=self.portfolio,
+            linked_instrument=self.db_data.instruments["Tesla B."],
+            valuation_pricing_policy=self.pricing_policy,
+            valuation_currency=self.db_data.usd,
+        )
+
+        for i in range((self.date_to - self.date_from).days + 1):
+            day = self.date_from + timedelta(days=i)
+            if i != 5:
+                PriceHistory.objects.create(
+                    instrument=self.instrument,
+                    pricing_policy=self.pricing_policy,
+                    date=day,
+                    principal_price=100 + i,
+                    accrued_price=i / 10,
+                )
+            CurrencyHistory.objects.create(
+                currency=self.eur,
+                pricing_policy=self.pricing_policy,
+                date=day,
+                fx_rate=1.1 + i / 100,
+            )
+
+    def create_transaction(self, day, transaction_class, amount, **kwargs):
+        _, transaction = self.db_data.cash_in_transaction(self.portfolio, amount=amount, day=day)
+        transaction.transaction_class_id = transaction_class
+        for name, value in kwargs.items():
+            setattr(transaction, name, value)
+        transaction.save()
+        return transaction
+
+    def get_report_nav(self, day):
+        report = calculate_simple_balance_report(day, self.portfolio_register, self.member)
+        return sum(item["market_value"] for item in report.items if item["market_value"])
+
+    def test_nav_is_equal_to_balance_report(self):
+        self.create_transaction(self.date_from, TransactionClass.CASH_INFLOW, 10000)
+        self.create_transaction(self.date_from + timedelta(days=2), TransactionClass.CASH_INFLOW, 500)
+        self.create_transaction(
+            self.date_from + timedelta(days=1),
+            TransactionClass.CASH_INFLOW,
+            300,
+            settlement_currency=self.eur,
+        )
+        # cash is paid before and after delivery
+        self.create_transaction(
+            self.date_from + timedelta(days=3),
+            TransactionClass.BUY,
+            -2000,
+            instrument=self.instrument,
+            position_size_with_sign=20,
+            cash_date=self.date_from + timedelta(days=1),
+        )
+        self.create_transaction(
+            self.date_from + timedelta(days=4),
+            TransactionClass.SELL,
+            1100,
+            instrument=self.instrument,
+            position_size_with_sign=-10,
+            cash_date=self.date_from + timedelta(days=6),
+        )
+
+        nav_engine = PortfolioNavEngine(self.portfolio_register, self.date_from, self.date_to)
+
+        day = self.date_from
+        while day <= self.date_to:
+            self.assertAlmostEqual(nav_engine.get_nav(day), self.get_report_nav(day), places=6, msg=day)
+            day += timedelta(days=1)
+
+    def test_cash_flow(self):
+        day = self.date_from + timedelta(days=2)
+        self.create_transaction(day, TransactionClass.CASH_INFLOW, 500)
+        self.create_transaction(day, TransactionClass.CASH_OUTFLOW, -200, transaction_currency=self.eur)
+        CurrencyHistory.objects.create(
+            currency=self.db_data.usd,
+            pricing_policy=self.pricing_policy,
+            date=day,
+            fx_rate=1,
+        )
+
+        nav_engine = PortfolioNavEngine(self.portfolio_register, self.date_from, self.date_to)
+
+        self.assertEqual(nav_engine.get_cash_flow(self.date_from), 0)
+        self.assertAlmostEqual(nav_engine.get_cash_flow(day), 500 - 200 * 1.12)
+
+    def test_transaction_deltas(self):
+        day = self.date_from
+        transaction = {
+            "transaction_class_id": TransactionClass.BUY,
+            "position_size_with_sign": 10,
+            "cash_consideration": -100,
+            "accounting_date": day + timedelta(days=2),
+            "cash_date": day,
+        }
+
+        self.assertEqual(
+            get_transaction_deltas(transaction),
+            [(day, 0, 100), (day + timedelta(days=2), 10, -200)],
+        )
+
+        transaction["transaction_class_id"] = TransactionClass.INITIAL_POSITION
+        transaction["cash_date"] = transaction["accounting_date"]
+
+        self.assertEqual(
+            get_transaction_deltas(transaction),
+            [(day + timedelta(days=2), 10, -100), (day + timedelta(days=3), -10, 100)],
+        )
@@ -67,3 +67,24 @@ class UpdatePriceHistoriesTest(BaseTestCase):
             principal_price=value,
         ).count()
         self.assertEqual(count, amount)
+
+    def test__upsert_error_keeps_values(self):
+        self.create_price_history(1)
+        price = PriceHistory.objects.get(instrument=self.instrument, pricing_policy=self.pricing_policy)
+        nav = price.nav
+
+        utils.upsert_price_histories(
+            [
+                PriceHistory(
+                    instrument=self.instrument,
+                    pricing_policy=self.pricing_policy,
+                    date=price.date,
+                    error_message=self.err_msg,
+                )
+            ],
+            update_fields=["error_message"],
+        )
+
+        price.refresh_from_db()
+        self.assertEqual(price.error_message, self.err_msg)
+        self.assertEqual(price.nav, nav)
@@ -25,3 +25,24 @@ def update_price_histories(prices: list[PriceHistory], **kwargs):
     Update PriceHistory objects with given data
     """
     PriceHistory.objects.filter(id__in=[price.id for price in prices]).update(**kwargs)
+
+
+def upsert_price_histories(prices: list[PriceHistory], update_fields: list[str]):
+    """
+    Create PriceHistory objects or update existing ones of the same instrument, pricing policy and date
+    """
+    from poms.reports.report_results import invalidate_report_results
+
+    if not prices:
+        return
+
+    PriceHistory.objects.bulk_create(
+        prices,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=["instrument", "pricing_policy", "date"],
+        update_fields=update_fields,
+    )
+
+    # bulk_create does not send signals
+    invalidate_report_results(prices[0].instrument.master_user, prices_dates=[price.date for price in prices])
@@ -2,7 +2,7 @@ import logging
 
 from django.apps import AppConfig
 from django.db import DEFAULT_DB_ALIAS, connection
-from django.db.models.signals import post_migrate
+from django.db.models.signals import post_delete, post_migrate, post_save
 from django.utils.translation import gettext_lazy
 
 from poms_app import settings
@@ -17,6 +17,26 @@ class ReportsConfig(AppConfig):
     def ready(self):
         post_migrate.connect(self.create_views_for_sql_reports, sender=self)
 
+        from poms.currencies.models import CurrencyHistory
+        from poms.instruments.models import PriceHistory
+        from poms.transactions.models import Transaction
+
+        from .report_results import (
+            REPORT_OBJECTS_MODELS,
+            currency_history_post_save,
+            price_history_post_save,
+            report_object_post_save,
+            transaction_post_save,
+        )
+
+        for signal in (post_save, post_delete):
+            signal.connect(transaction_post_save, sender=Transaction)
+            signal.connect(price_history_post_save, sender=PriceHistory)
+            signal.connect(currency_history_post_save, sender=CurrencyHistory)
+
+            for label in REPORT_OBJECTS_MODELS:
+                signal.connect(report_object_post_save, sender=self.apps.get_model(label))
+
     def create_views_for_sql_reports(self, app_config, verbosity=2, using=DEFAULT_DB_ALIAS, **kwargs):
         _l.debug("Creating views for SQL reports")
 
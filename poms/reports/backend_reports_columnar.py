@@ -0,0 +1,647 @@
+import logging
+from datetime import date
+
+import numpy as np
+from django.conf import settings
+from numpy.dtypes import StringDType
+
+from poms.reports.backend_reports_utils import (
+    BackendReportHelperService,
+    BackendReportSubtotalService,
+)
+
+_l = logging.getLogger("poms.reports")
+
+NUMERIC_CHARS = set("0123456789.-+einfa")
+
+VECTORIZED_OPERATIONS = {
+    "selector",
+    "greater",
+    "greater_equal",
+    "less",
+    "less_equal",
+    "from_to",
+    "out_of_range",
+    "multiselector",
+}
+
+WEIGHTED_KEYS = {
+    2: "market_value",
+    3: "market_value_percent",
+    4: "exposure",
+    5: "exposure_percent",
+    6: "market_value",
+    7: "market_value_percent",
+    8: "exposure",
+    9: "exposure_percent",
+}
+
+
+def _object_array(values, size):
+    array = np.empty(size, dtype=object)
+    array[:] = values
+    return array
+
+
+def _bool_array(values, size):
+    return np.fromiter(values, dtype=bool, count=size)
+
+
+class _Missing:
+    pass
+
+
+MISSING = _Missing()
+
+_type_of = np.frompyfunc(type, 1, 1)
+
+
+def _to_strings(values):
+    """str() of values as numpy variable width strings"""
+    return values.astype(StringDType())
+
+
+def _is_numeric_piece(piece):
+    return set(piece) <= NUMERIC_CHARS
+
+
+class ReportColumns:
+    """
+    Columnar representation of report items. Columns are numpy arrays, extracted lazily
+    from item dicts on first use and shared by all filtered/sorted views of the items.
+    """
+
+    def __init__(self, items):
+        self.items = items
+        self.size = len(items)
+        self._cache = {}
+
+    def _get(self, kind, key, build):
+        cache_key = (kind, key)
+        array = self._cache.get(cache_key)
+        if array is None:
+            array = self._cache[cache_key] = build()
+        return array
+
+    def all_keys(self):
+        def build():
+            keys = {}
+            for item in self.items:
+                keys.update(dict.fromkeys(item))
+            return list(keys)
+
+        return self._get("all_keys", None, build)
+
+    def raw(self, key):
+        """Values of key, MISSING if item has no key"""
+        return self._get("raw", key, lambda: _object_array([item.get(key, MISSING) for item in self.items], self.size))
+
+    def types(self, key):
+        return self._get("types", key, lambda: _type_of(self.raw(key)))
+
+    def has_key(self, key):
+        return self._get("has_key", key, lambda: self.types(key) != _Missing)
+
+    def column(self, key):
+        """Values of key, None if item has no key"""
+        return self._get("column", key, lambda: np.where(self.has_key(key), self.raw(key), None))
+
+    def is_none(self, key):
+        return self._get("is_none", key, lambda: self.types(key) == type(None))  # noqa: E721
+
+    def is_str(self, key):
+        return self._get("is_str", key, lambda: self.types(key) == str)  # noqa: E721
+
+    def is_float(self, key):
+        """Value is exactly int or float, bool and subclasses are not included"""
+        return self._get("is_float", key, lambda: (self.types(key) == int) | (self.types(key) == float))  # noqa: E721
+
+    def is_number(self, key):
+        """Value is int or float, missing key is treated as 0 as in BackendReportSubtotalService"""
+        return self._get("is_number", key, lambda: self.is_float(key) | ~self.has_key(key))
+
+    def floats(self, key):
+        """Float values of numbers, 0 for other values"""
+
+        def build():
+            values = np.zeros(self.size, dtype=float)
+            mask = self.is_float(key)
+            values[mask] = self.raw(key)[mask].astype(float)
+            return values
+
+        return self._get("floats", key, build)
+
+    def lower_str(self, key):
+        """Lowercased str() of values, empty string for None"""
+
+        def build():
+            return np.strings.lower(_to_strings(np.where(self.is_none(key), "", self.column(key))))
+
+        return self._get("lower_str", key, build)
+
+    def is_present(self, key):
+        """Value is truthy or equals zero, as regular filters check it"""
+
+        def build():
+            raw = self.raw(key)
+            is_str = self.is_str(key)
+
+            present = self.is_float(key).copy()
+            present[is_str] = raw[is_str] != ""
+
+            other = np.flatnonzero(~(present | is_str | self.is_none(key)) & self.has_key(key))
+            present[other] = [bool(v) or v == 0 for v in raw[other]]
+            return present
+
+        return self._get("is_present", key, build)
+
+    def contains_any(self, key, positions, pieces):
+        """Lowercased str() of values at positions contains any of pieces, None values never match"""
+        raw = self.raw(key)[positions]
+        result = np.zeros(len(positions), dtype=bool)
+
+        # str(number) can contain only digits, signs, "e", "inf" or "nan"
+        number_pieces = [piece for piece in pieces if _is_numeric_piece(piece)]
+        for mask, searched_pieces in (
+            (self.is_str(key)[positions], pieces),
+            (self.is_float(key)[positions], number_pieces),
+        ):
+            rows = np.flatnonzero(mask)
+            if not len(rows) or not searched_pieces:
+                continue
+
+            values = np.strings.lower(_to_strings(raw[rows]))
+            found = np.zeros(len(rows), dtype=bool)
+            for piece in searched_pieces:
+                found |= np.strings.find(values, piece) >= 0
+            result[rows] = found
+
+        other = np.flatnonzero(
+            ~(self.is_str(key) | self.is_float(key) | self.is_none(key))[positions] & self.has_key(key)[positions]
+        )
+        result[other] = [any(piece in str(v).lower() for piece in pieces) for v in raw[other]]
+
+        return result
+
+    def invalidate(self, key):
+        for cache_key in list(self._cache):
+            if cache_key[1] == key or cache_key[0] == "all_keys":
+                del self._cache[cache_key]
+
+
+class ReportItems(list):
+    """
+    List of report item dicts which keeps positions of its items in ReportColumns,
+    so the following helper calls do not convert items again.
+    """
+
+    def __init__(self, items, columns=None, positions=None):
+        super().__init__(items)
+
+        if columns is None:
+            columns = ReportColumns(list(self))
+            positions = np.arange(len(self))
+
+        self.columns = columns
+        self.positions = positions
+
+    @classmethod
+    def wrap(cls, items):
+        if isinstance(items, ReportItems) and len(items) == len(items.positions):
+            return items
+        return cls(items)
+
+    def take(self, indexes):
+        positions = self.positions[indexes]
+        root = self.columns.items
+        return ReportItems([root[i] for i in positions], self.columns, positions)
+
+    def column(self, key):
+        return self.columns.column(key)[self.positions]
+
+    def get(self, kind, key):
+        return getattr(self.columns, kind)(key)[self.positions]
+
+
+def _factorize(values):
+    """Codes of values and unique values in order of appearance, values are compared as dict keys"""
+    uniques = {}
+    codes = np.fromiter((uniques.setdefault(v, len(uniques)) for v in values), dtype=np.intp, count=len(values))
+    return codes, list(uniques)
+
+
+def _is_exotic(items, key):
+    """Value is not a number and not None, e.g. Decimal or str"""
+    return ~(items.get("is_number", key) | items.get("is_none", key))
+
+
+def _is_scalar(value):
+    return value is None or isinstance(value, str | int | float | date)
+
+
+def _equals(values, value):
+    if _is_scalar(value):
+        return np.asarray(values == value, dtype=bool)
+    return _bool_array((v == value for v in values), len(values))
+
+
+def _first_indexes(codes, size):
+    first = np.empty(size, dtype=np.intp)
+    first[codes[::-1]] = np.arange(len(codes) - 1, -1, -1)
+    return first
+
+
+def _sum_by_groups(codes, groups_count, values, mask=None):
+    if mask is not None:
+        codes = codes[mask]
+        values = values[mask]
+    return np.bincount(codes, weights=values, minlength=groups_count)
+
+
+def _count_by_groups(codes, groups_count, mask):
+    return np.bincount(codes[mask], minlength=groups_count)
+
+
+class BackendReportColumnarSubtotalService:
+    """
+    Same subtotals as BackendReportSubtotalService, calculated for all groups at once.
+    Groups with values other than int, float or None are calculated by BackendReportSubtotalService.
+    """
+
+    @staticmethod
+    def get_formula_id(column):
+        report_settings = column.get("report_settings")
+        if report_settings and "subtotal_formula_id" in report_settings:
+            return report_settings["subtotal_formula_id"]
+        return None
+
+    @staticmethod
+    def calculate_groups(items, codes, groups_count, columns):  # noqa: PLR0912
+        """Return list of subtotals of groups, items of group N have code N"""
+        number_columns = [column for column in columns if column["value_type"] == 20]
+        subtotals = [{} for _ in range(groups_count)]
+        if not number_columns:
+            return subtotals
+
+        service = BackendReportColumnarSubtotalService
+        sizes = np.bincount(codes, minlength=groups_count)
+
+        fallback = np.zeros(groups_count, dtype=bool)
+        for column in number_columns:
+            formula_id = service.get_formula_id(column)
+            for key in {column["key"], WEIGHTED_KEYS.get(formula_id)} - {None}:
+                fallback |= _count_by_groups(codes, groups_count, _is_exotic(items, key)) > 0
+
+        for column in number_columns:
+            formula_id = service.get_formula_id(column)
+            key = column["key"]
+
+            if formula_id == 1:
+                results = service.sum(items, codes, groups_count, key, sizes)
+            elif formula_id in (2, 3, 4, 5):
+                results = service.get_weighted_value(items, codes, groups_count, key, WEIGHTED_KEYS[formula_id])
+            elif formula_id in (6, 7, 8, 9):
+                results = service.get_weighted_average_value(
+                    items, codes, groups_count, key, WEIGHTED_KEYS[formula_id]
+                )
+            else:
+                results = [None] * groups_count
+
+            for subtotal, result in zip(subtotals, results, strict=True):
+                subtotal[key] = result
+
+        for group in np.flatnonzero(fallback):
+            group_items = [items[i] for i in np.flatnonzero(codes == group)]
+            subtotals[group] = BackendReportSubtotalService.calculate(group_items, columns)
+
+        return subtotals
+
+    @staticmethod
+    def sum(items, codes, groups_count, key, sizes):
+        results = _sum_by_groups(codes, groups_count, items.get("floats", key)).tolist()
+        no_data = _count_by_groups(codes, groups_count, items.get("is_none", key)) > 0
+
+        for group in range(groups_count):
+            if no_data[group]:
+                results[group] = "No Data"
+            elif not sizes[group]:
+                results[group] = 0
+        return results
+
+    @staticmethod
+    def get_weighted_value(items, codes, groups_count, key, weighted_key):
+        weights = items.get("floats", weighted_key)
+        values = items.get("floats", key)
+        mask = (weights != 0) & (values != 0)
+
+        results = _sum_by_groups(codes, groups_count, values * weights, mask).tolist()
+        counts = _count_by_groups(codes, groups_count, mask)
+
+        return [result if counts[group] else 0 for group, result in enumerate(results)]
+
+    @staticmethod
+    def get_weighted_average_value(items, codes, groups_count, key, weighted_key):
+        weights = items.get("floats", weighted_key)
+        totals = _sum_by_groups(codes, groups_count, weights, weights != 0)
+
+        weights_numbers = ~items.get("is_none", weighted_key)
+        safe_totals = np.where(totals != 0, totals, 1.0)
+        products = items.get("floats", key) * (weights / safe_totals[codes])
+        results = _sum_by_groups(codes, groups_count, products, weights_numbers).tolist()
+
+        no_data = _count_by_groups(codes, groups_count, items.get("is_none", key)) > 0
+
+        for group in range(groups_count):
+            if not totals[group] or no_data[group]:
+                results[group] = "No Data"
+        return results
+
+
+class BackendReportColumnarHelperService(BackendReportHelperService):
+    """
+    Columnar engine for backend reports with the same contract as BackendReportHelperService:
+    methods take and return lists of item dicts. Returned lists are ReportItems, which keep
+    columnar representation of items, so items are converted once per report.
+    """
+
+    def filter_by_global_table_search(self, items, options):
+        query = options.get("globalTableSearch", "")
+
+        if not query:
+            return items
+
+        items = ReportItems.wrap(items)
+        pieces = {piece.lower() for piece in query.split()}
+
+        matched = np.zeros(len(items), dtype=bool)
+        for key in items.columns.all_keys():
+            rest = np.flatnonzero(~matched)
+            if not len(rest):
+                break
+
+            matched[rest] = items.columns.contains_any(key, items.positions[rest], pieces)
+
+        return items.take(np.flatnonzero(matched))
+
+    def match_values(self, values, filter_by, operation_type):
+        if operation_type == "multiselector":
+            vectorized = isinstance(filter_by, list | tuple | set)
+        elif operation_type in ("from_to", "out_of_range"):
+            vectorized = isinstance(filter_by, dict)
+        else:
+            vectorized = operation_type in VECTORIZED_OPERATIONS and _is_scalar(filter_by)
+
+        if not vectorized:
+            return _bool_array(
+                (self.filter_value_from_table(value, filter_by, operation_type) for value in values),
+                len(values),
+            )
+
+        if operation_type == "selector":
+            result = _equals(values, filter_by)
+        elif operation_type == "greater":
+            result = values > filter_by
+        elif operation_type == "greater_equal":
+            result = values >= filter_by
+        elif operation_type == "less":
+            result = values < filter_by
+        elif operation_type == "less_equal":
+            result = values <= filter_by
+        elif operation_type == "from_to":
+            result = (filter_by["min_value"] <= values) & (values <= filter_by["max_value"])
+        elif operation_type == "out_of_range":
+            result = (values <= filter_by["min_value"]) | (values >= filter_by["max_value"])
+        else:  # multiselector
+            result = np.fromiter((value in filter_by for value in values.tolist()), dtype=bool, count=len(values))
+
+        return np.asarray(result, dtype=bool)
+
+    def filter_table_rows(self, items, options):
+        items = ReportItems.wrap(items)
+        regular_filters = self.get_regular_filters(options)
+
+        matched = np.ones(len(items), dtype=bool)
+        for filter_ in regular_filters:
+            key_property = filter_["key"]
+            value_type = filter_["value_type"]
+            filter_type = filter_["filter_type"]
+            filter_value = filter_["value"]
+
+            if key_property == "ordering":
+                continue
+
+            is_present = items.get("is_present", key_property)
+
+            if filter_type == "empty":
+                matched &= ~is_present
+                continue
+
+            if not self.check_for_empty_regular_filter(filter_value, filter_type):
+                continue
+
+            matched &= is_present
+            rest = np.flatnonzero(matched)
+            values = items.column(key_property)[rest]
+            filter_argument = filter_value
+
+            if value_type in (10, 30) and filter_type != "multiselector":
+                values = _object_array([value.lower() for value in values], len(values))
+                filter_argument = filter_argument[0].lower()
+
+            elif value_type == 20:
+                if filter_type not in ("from_to", "out_of_range"):
+                    filter_argument = filter_argument[0]
+
+            elif value_type == 40:
+                if filter_type not in {"from_to", "out_of_range", "date_tree"}:
+                    filter_argument = filter_argument[0]
+
+            matched[rest] = self.match_values(values, filter_argument, filter_type)
+
+        return items.take(np.flatnonzero(matched))
+
+    def filter_by_groups_filters(self, items, options):
+        groups_types = options.get("groups_types", [])
+        groups_values = options.get("groups_values", [])
+
+        if not groups_types or not groups_values:
+            return items
+
+        if len(groups_types) != len(groups_values):
+            _l.warning("Mismatch between groups_types and groups_values lengths")
+
+        items = ReportItems.wrap(items)
+
+        matched = np.ones(len(items), dtype=bool)
+        # the longer list is truncated
+        for group_type, group_value in zip(groups_types, groups_values, strict=False):
+            key = self.convert_name_key_to_user_code_key(group_type["key"])
+            value = group_value.lower() if isinstance(group_value, str) else group_value
+
+            is_none = ~items.get("has_key", key) | items.get("is_none", key)
+            # not None values are compared as lowered strings, so only str value can match them
+            if isinstance(value, str):
+                is_equal = np.asarray(items.get("lower_str", key) == value, dtype=bool)
+            else:
+                is_equal = False
+
+            matched &= np.where(is_none, value in ("-", None), is_equal)
+
+        return items.take(np.flatnonzero(matched))
+
+    def filter(self, items, options):
+        items = self.filter_by_global_table_search(items, options)
+
+        return self.filter_table_rows(items, options)
+
+    def sort_items_by_property(self, items, property):
+        if property.startswith("-"):
+            reverse = True
+            property = property[1:]
+        else:
+            reverse = False
+
+        items = ReportItems.wrap(items)
+        is_none = ~items.get("has_key", property) | items.get("is_none", property)
+
+        # numbers and strings are sorted as native arrays, other values as objects
+        if np.all(items.get("is_float", property) | is_none):
+            values = items.get("floats", property)
+        elif np.all(items.get("is_str", property) | is_none):
+            values = _to_strings(np.where(is_none, "", items.get("raw", property)))
+        else:
+            values = items.column(property)
+
+        # same order as sorted() with key (value is None, value), which is stable in both directions
+        order = np.arange(len(items))
+        if reverse:
+            order = order[::-1]
+
+        not_none = order[~is_none[order]]
+        ordered = np.concatenate(
+            [
+                not_none[np.argsort(values[not_none], kind="stable")],
+                order[is_none[order]],
+            ]
+        ).astype(np.intp)
+
+        if reverse:
+            ordered = ordered[::-1]
+
+        return items.take(ordered)
+
+    def calculate_value_percent(self, items, group_field, data_field):
+        if not items:
+            return items
+
+        items = ReportItems.wrap(items)
+        percent_field = f"{data_field}_percent"
+
+        if group_field == "no_grouping":
+            codes = np.zeros(len(items), dtype=np.intp)
+            groups_count = 1
+        else:
+            codes, uniques = _factorize(items.column(group_field))
+            groups_count = len(uniques)
+
+        values = items.get("floats", data_field)
+        is_float = items.get("is_float", data_field)
+
+        totals = _sum_by_groups(codes, groups_count, values)
+        valid = (_count_by_groups(codes, groups_count, ~is_float) == 0) & (totals != 0)
+
+        percents = values / np.where(valid, totals, 1.0)[codes]
+        percents = np.where(valid[codes], percents, None).tolist()
+
+        for item, percent in zip(items, percents, strict=True):
+            item[percent_field] = percent
+
+        # groups with values like Decimal or str are calculated as before
+        for group in np.flatnonzero(_count_by_groups(codes, groups_count, _is_exotic(items, data_field)) > 0):
+            group_items = [items[i] for i in np.flatnonzero(codes == group)]
+            super().calculate_value_percent(group_items, "no_grouping", data_field)
+
+        items.columns.invalidate(percent_field)
+
+        return items
+
+    def get_unique_groups(self, items, group_type, columns):
+        items = ReportItems.wrap(items)
+
+        identifier_key = self.convert_name_key_to_user_code_key(group_type["key"])
+
+        codes, uniques = _factorize(items.column(identifier_key))
+        first_indexes = _first_indexes(codes, len(uniques))
+        names = items.column(group_type["key"])
+
+        result_groups = []
+        group_by_identifier = {}
+        # items of group are items with value equal to group identifier
+        group_codes = np.full(len(uniques), -1, dtype=np.intp)
+
+        for code, value in enumerate(uniques):
+            result_group = self.get_result_group(
+                {group_type["key"]: names[first_indexes[code]], identifier_key: value},
+                group_type,
+            )
+            identifier = result_group["___group_identifier"]
+
+            if identifier not in group_by_identifier:
+                group_by_identifier[identifier] = len(result_groups)
+                result_groups.append(result_group)
+
+        for code, value in enumerate(uniques):
+            group = group_by_identifier.get(value) if isinstance(value, str | None) else None
+            if group is not None:
+                group_codes[code] = group
+
+        item_groups = group_codes[codes]
+        in_group = item_groups >= 0
+        group_items = items.take(np.flatnonzero(in_group))
+        item_groups = item_groups[in_group]
+
+        subtotals = BackendReportColumnarSubtotalService.calculate_groups(
+            group_items,
+            item_groups,
+            len(result_groups),
+            columns,
+        )
+
+        for result_group, subtotal in zip(result_groups, subtotals, strict=True):
+            result_group["subtotal"] = subtotal
+
+        for data_field in ("market_value", "exposure"):
+            self._set_groups_percent(result_groups, group_items, item_groups, data_field)
+
+        return result_groups
+
+    def _set_groups_percent(self, result_groups, items, codes, data_field):
+        percent_field = f"{data_field}_percent"
+        groups_count = len(result_groups)
+
+        totals = _sum_by_groups(codes, groups_count, items.get("floats", percent_field)).tolist()
+        invalid = _count_by_groups(codes, groups_count, ~items.get("is_float", percent_field)) > 0
+
+        exotic = _count_by_groups(codes, groups_count, _is_exotic(items, percent_field)) > 0
+
+        for group, result_group in enumerate(result_groups):
+            if not result_group["subtotal"].get(data_field):
+                continue
+
+            if exotic[group]:
+                try:
+                    total_value = sum(items[i][percent_field] for i in np.flatnonzero(codes == group)) or None
+                    result_group["subtotal"][percent_field] = total_value
+                except Exception:
+                    result_group["subtotal"][percent_field] = "No Data"
+            elif invalid[group]:
+                result_group["subtotal"][percent_field] = "No Data"
+            else:
+                result_group["subtotal"][percent_field] = totals[group] or None
+
+
+def get_backend_report_helper_service():
+    if settings.BACKEND_REPORTS_ENGINE == "columnar":
+        return BackendReportColumnarHelperService()
+
+    return BackendReportHelperService()
@@ -3,7 +3,7 @@ import math
 import time
 from datetime import datetime, timedelta
 
-from django.db import models
+from django.db import connection, models, transaction
 from django.utils.translation import gettext_lazy
 
 from poms.common.models import EXPRESSION_FIELD_LENGTH, NamedModel, TimeStampedModel
@@ -1289,20 +1289,40 @@ class ReportSummary:
 
         _l.debug("ReportSummary.build_balance done: %s", f"{time.perf_counter() - st:3.3f}")
 
-    def build_pl_range(self):
+    def build(self):
+        """
+        Build balance and PL reports of the summary in one transaction. PL reports have
+        the same report date, so its part is calculated once and shared between them.
+        """
         st = time.perf_counter()
 
+        is_outermost = not connection.in_atomic_block
+
+        with transaction.atomic():
+            if is_outermost:
+                # all reports see the same data
+                with connection.cursor() as cursor:
+                    cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+
+            self.build_balance()
+            self.build_pl_reports()
+
+        _l.debug("ReportSummary.build done: %s", f"{time.perf_counter() - st:3.3f}")
+
+    def build_pl_report(self, pl_first_date, share_report_date=False):
         from poms.reports.serializers import PLReportSerializer
+        from poms.reports.sql_builders.pl import PLReportBuilderSql
 
         serializer = PLReportSerializer(
             data={
-                "pl_first_date": self.date_from,
+                "pl_first_date": pl_first_date,
                 "report_date": self.date_to,
                 "pricing_policy": self.pricing_policy.id,
                 "report_currency": self.currency.id,
                 "portfolios": self.portfolio_ids,
                 "cost_method": CostMethod.AVCO,
                 "allocation_mode": self.allocation_mode,
+                "only_numbers": True,
             },
             context=self.context,
         )
@@ -1310,40 +1330,49 @@ class ReportSummary:
         serializer.is_valid(raise_exception=True)
         instance = serializer.save()
 
-        from poms.reports.sql_builders.pl import PLReportBuilderSql
-
-        self.pl_report_range = PLReportBuilderSql(instance=instance).build_report()
+        _l.debug(f"build_pl_report.instance.pl_first_date {instance.pl_first_date} report_date {instance.report_date}")
 
-        _l.debug("ReportSummary.build_pl_daily done: %s", f"{time.perf_counter() - st:3.3f}")
+        return PLReportBuilderSql(instance=instance, share_report_date=share_report_date).build_report()
 
-    def build_pl_daily(self):
+    def build_pl_reports(self):
+        """
+        Build range, daily, mtd and ytd PL reports, reports with the same pl first date are built once
+        """
         st = time.perf_counter()
 
-        from poms.reports.serializers import PLReportSerializer
+        reports = {}
 
-        pl_first_date = get_last_business_day(self.date_to - timedelta(days=1))
+        for name, pl_first_date in (
+            ("pl_report_range", self.date_from),
+            ("pl_report_daily", self.pl_first_date_for_daily),
+            ("pl_report_mtd", self.pl_first_date_for_mtd),
+            ("pl_report_ytd", self.pl_first_date_for_ytd),
+        ):
+            key = str(pl_first_date)
+            if key not in reports:
+                reports[key] = self.build_pl_report(pl_first_date, share_report_date=True)
 
-        _l.debug("build_pl_daily %s", pl_first_date)
+            setattr(self, name, reports[key])
 
-        serializer = PLReportSerializer(
-            data={
-                "pl_first_date": pl_first_date,
-                "report_date": self.date_to,
-                "pricing_policy": self.pricing_policy.id,
-                "report_currency": self.currency.id,
-                "portfolios": self.portfolio_ids,
-                "cost_method": CostMethod.AVCO,
-                "allocation_mode": self.allocation_mode,
-            },
-            context=self.context,
-        )
+        _l.debug("ReportSummary.build_pl_reports done: %s", f"{time.perf_counter() - st:3.3f}")
 
-        serializer.is_valid(raise_exception=True)
-        instance = serializer.save()
+    def build_pl_range(self):
+        st = time.perf_counter()
 
-        from poms.reports.sql_builders.pl import PLReportBuilderSql
+        self.pl_report_range = self.build_pl_report(self.date_from)
+
+        _l.debug("ReportSummary.build_pl_range done: %s", f"{time.perf_counter() - st:3.3f}")
+
+    @property
+    def pl_first_date_for_daily(self):
+        return get_last_business_day(self.date_to - timedelta(days=1))
+
+    def build_pl_daily(self):
+        st = time.perf_counter()
 
-        self.pl_report_daily = PLReportBuilderSql(instance=instance).build_report()
+        _l.debug("build_pl_daily %s", self.pl_first_date_for_daily)
+
+        self.pl_report_daily = self.build_pl_report(self.pl_first_date_for_daily)
 
         _l.debug("ReportSummary.build_pl_daily done: %s", f"{time.perf_counter() - st:3.3f}")
 
@@ -1366,31 +1395,9 @@ class ReportSummary:
     def build_pl_mtd(self):
         st = time.perf_counter()
 
-        from poms.reports.serializers import PLReportSerializer
-
         _l.debug("pl_first_date_for_mtd %s", self.pl_first_date_for_mtd)
 
-        serializer = PLReportSerializer(
-            data={
-                "pl_first_date": self.pl_first_date_for_mtd,
-                "report_date": self.date_to,
-                "pricing_policy": self.pricing_policy.id,
-                "report_currency": self.currency.id,
-                "portfolios": self.portfolio_ids,
-                "cost_method": CostMethod.AVCO,
-                "allocation_mode": self.allocation_mode,
-            },
-            context=self.context,
-        )
-
-        serializer.is_valid(raise_exception=True)
-        instance = serializer.save()
-
-        _l.debug(f"build_pl_mtd.instance.pl_first_date {instance.pl_first_date} report_date {instance.report_date}")
-
-        from poms.reports.sql_builders.pl import PLReportBuilderSql
-
-        self.pl_report_mtd = PLReportBuilderSql(instance=instance).build_report()
+        self.pl_report_mtd = self.build_pl_report(self.pl_first_date_for_mtd)
 
         _l.debug("ReportSummary.build_pl_mtd done: %s", f"{time.perf_counter() - st:3.3f}")
 
@@ -1412,29 +1419,9 @@ class ReportSummary:
     def build_pl_ytd(self):
         st = time.perf_counter()
 
-        from poms.reports.serializers import PLReportSerializer
-
         _l.debug("pl_first_date_for_ytd %s", self.pl_first_date_for_ytd)
 
-        serializer = PLReportSerializer(
-            data={
-                "pl_first_date": self.pl_first_date_for_ytd,
-                "report_date": self.date_to,
-                "pricing_policy": self.pricing_policy.id,
-                "report_currency": self.currency.id,
-                "portfolios": self.portfolio_ids,
-                "cost_method": CostMethod.AVCO,
-                "allocation_mode": self.allocation_mode,
-            },
-            context=self.context,
-        )
-
-        serializer.is_valid(raise_exception=True)
-        instance = serializer.save()
-
-        from poms.reports.sql_builders.pl import PLReportBuilderSql
-
-        self.pl_report_ytd = PLReportBuilderSql(instance=instance).build_report()
+        self.pl_report_ytd = self.build_pl_report(self.pl_first_date_for_ytd)
 
         _l.debug("ReportSummary.build_pl_ytd done: %s", f"{time.perf_counter() - st:3.3f}")
 
@@ -1757,6 +1744,7 @@ class ReportInstanceModel:
         self.strategy3_mode = kwargs["strategy3_mode"]
         self.allocation_mode = kwargs["allocation_mode"]
         self.calculate_pl = kwargs.get("calculate_pl", False)
+        self.share_report_date = kwargs.get("share_report_date", False)
 
         self.master_user = kwargs["master_user"]
 
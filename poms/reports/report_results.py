@@ -0,0 +1,269 @@
+import hashlib
+import json
+import logging
+import uuid
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ObjectDoesNotExist
+
+from poms.common.db import get_current_schema_name, on_commit_once
+from poms.common.utils import get_last_business_day
+from poms.reports.utils import generate_unique_key
+
+_l = logging.getLogger("poms.reports")
+
+# fields of report data which depend on the request, not on the report result
+REQUEST_FIELDS = ("frontend_request_options", "page", "page_size", "auth_time", "ignore_cache")
+
+# markers must outlive entries, otherwise an expired marker invalidates fresh entries
+MARKERS_TTL_MULTIPLIER = 24
+
+# models of objects, which report items are built from, -> relation to the object with master user,
+# change of any of them invalidates all report results of the space
+REPORT_OBJECTS_MODELS = {
+    "instruments.Instrument": None,
+    "instruments.InstrumentType": None,
+    "instruments.PricingPolicy": None,
+    "instruments.AccrualCalculationSchedule": "instrument",
+    "instruments.InstrumentFactorSchedule": "instrument",
+    "instruments.EventSchedule": "instrument",
+    "portfolios.Portfolio": None,
+    "accounts.Account": None,
+    "accounts.AccountType": None,
+    "currencies.Currency": None,
+    "strategies.Strategy1": None,
+    "strategies.Strategy2": None,
+    "strategies.Strategy3": None,
+    "counterparties.Counterparty": None,
+    "counterparties.Responsible": None,
+    "obj_attrs.GenericAttributeType": None,
+    "obj_attrs.GenericAttribute": "attribute_type",
+    "obj_attrs.GenericClassifier": "attribute_type",
+}
+
+# ids are unique only in schema of the space, so schema is a part of keys
+_space_codes = {}  # (schema, master_user_id) -> space_code
+_master_users_ids = {}  # (schema, model name, id) -> master_user_id of instrument or currency
+
+
+def _get_space_code(master_user_id):
+    from poms.users.models import MasterUser
+
+    key = (get_current_schema_name(), master_user_id)
+    space_code = _space_codes.get(key)
+    if space_code is None:
+        space_code = MasterUser.objects.values_list("space_code", flat=True).get(pk=master_user_id)
+        _space_codes[key] = space_code
+
+    return space_code
+
+
+def _get_related_space_code(instance, field_name):
+    """
+    Space code of master user of related instrument or currency of instance,
+    related object is not loaded, if it is not loaded yet
+    """
+    field = instance._meta.get_field(field_name)
+    if field.is_cached(instance):
+        return _get_space_code(getattr(instance, field_name).master_user_id)
+
+    related_id = getattr(instance, field.attname)
+    key = (get_current_schema_name(), field.related_model.__name__, related_id)
+    master_user_id = _master_users_ids.get(key)
+    if master_user_id is None:
+        master_user_id = field.related_model.objects.values_list("master_user_id", flat=True).get(pk=related_id)
+        _master_users_ids[key] = master_user_id
+
+    return _get_space_code(master_user_id)
+
+
+def _get_custom_fields_settings(custom_fields) -> list:
+    """Ids and expressions of custom fields, so changed expressions do not use cached results"""
+    from poms.reports.models import BalanceReportCustomField
+
+    custom_fields = list(custom_fields)
+    ids = [cf for cf in custom_fields if not hasattr(cf, "expr")]
+    if ids:
+        custom_fields = [cf for cf in custom_fields if hasattr(cf, "expr")]
+        custom_fields.extend(BalanceReportCustomField.objects.filter(id__in=ids).only("id", "expr", "value_type"))
+
+    return sorted((cf.id, cf.expr, cf.value_type) for cf in custom_fields)
+
+
+def get_objects_marker_key(space_code):
+    return f"{space_code}_report_results_objects"
+
+
+def get_portfolio_marker_key(space_code, portfolio_id):
+    return f"{space_code}_report_results_portfolio_{portfolio_id}"
+
+
+def get_prices_marker_key(space_code, date):
+    return f"{space_code}_report_results_prices_{date}"
+
+
+def get_fx_rates_marker_key(space_code, date):
+    return f"{space_code}_report_results_fx_rates_{date}"
+
+
+def _get_markers_ttl():
+    return settings.REPORT_RESULTS_CACHE_TTL * MARKERS_TTL_MULTIPLIER
+
+
+def _bump_marker(key):
+    cache.set(key, uuid.uuid4().hex, _get_markers_ttl())
+
+
+def _bump_markers(keys):
+    """
+    Markers are bumped after commit, once per transaction. Report built before the commit
+    has taken the old markers, so it is not cached under the new ones with not committed data.
+    """
+    for key in keys:
+        on_commit_once(key, partial(_bump_marker, key))
+
+
+def invalidate_report_results(master_user, portfolios=(), prices_dates=(), fx_rates_dates=()):
+    """
+    Invalidate cached report results depending on transactions of portfolios,
+    prices or fx rates of dates. Must be called after bulk operations, which do not send signals.
+    """
+    space_code = master_user.space_code
+
+    keys = [get_portfolio_marker_key(space_code, getattr(p, "pk", p)) for p in portfolios]
+    keys.extend(get_prices_marker_key(space_code, date) for date in set(prices_dates))
+    keys.extend(get_fx_rates_marker_key(space_code, date) for date in set(fx_rates_dates))
+
+    _bump_markers(keys)
+
+
+class ReportResultCache:
+    """
+    Stores serialized report data (before grouping, filtering and paging) in the shared cache,
+    so consecutive groups/items requests of the same report do not rebuild it.
+
+    Entry is valid while markers of its dependencies are unchanged: transactions of
+    report portfolios, prices and fx rates of report date and of the previous business day,
+    objects of the space, see REPORT_OBJECTS_MODELS.
+    """
+
+    def __init__(self, instance, report_type):
+        self.instance = instance
+        self.report_type = report_type
+        self.space_code = instance.master_user.space_code
+
+        report_settings, unique_key = generate_unique_key(instance, report_type)
+        extra_settings = json.dumps(
+            {
+                "member": instance.member.id,
+                "accounts_position": sorted(a.user_code for a in instance.accounts_position),
+                "accounts_cash": sorted(a.user_code for a in instance.accounts_cash),
+                "custom_fields": _get_custom_fields_settings(instance.custom_fields),
+                "expression_iterations_count": instance.expression_iterations_count,
+                "date_field": instance.date_field,
+                "only_numbers": instance.only_numbers,
+            },
+            sort_keys=True,
+            default=str,
+        )
+        extra_key = hashlib.md5(extra_settings.encode()).hexdigest()
+
+        self.settings = report_settings
+        self.unique_key = unique_key
+        self.cache_key = f"{self.space_code}_report_results_{report_type}_{unique_key}_{extra_key}"
+        self.markers = None
+
+    def get_dependencies(self):
+        report_date = self.instance.report_date
+        dates = {report_date, get_last_business_day(report_date - timedelta(days=1))}
+
+        keys = [get_objects_marker_key(self.space_code)]
+        keys.extend(get_portfolio_marker_key(self.space_code, p.id) for p in self.instance.portfolios)
+        for date in sorted(dates):
+            keys.append(get_prices_marker_key(self.space_code, date))
+            keys.append(get_fx_rates_marker_key(self.space_code, date))
+
+        return keys
+
+    def get_markers(self):
+        keys = self.get_dependencies()
+        markers = cache.get_many(keys)
+
+        for key in keys:
+            if key in markers:
+                continue
+
+            marker = uuid.uuid4().hex
+            # do not overwrite marker, which is set concurrently
+            if not cache.add(key, marker, _get_markers_ttl()):
+                marker = cache.get(key)
+            markers[key] = marker
+
+        return markers
+
+    def get(self):
+        """
+        Return cached report data or None. On a miss markers are taken before the report is built,
+        so changes made while building invalidate the stored entry.
+        """
+        self.markers = self.get_markers()
+
+        if self.instance.ignore_cache:
+            return None
+
+        entry = cache.get(self.cache_key)
+        if entry is None:
+            return None
+
+        if entry["markers"] != self.markers:
+            _l.debug("ReportResultCache.get outdated %s", self.cache_key)
+            return None
+
+        data = entry["data"]
+        for field in REQUEST_FIELDS:
+            data[field] = getattr(self.instance, field, None)
+
+        _l.debug("ReportResultCache.get hit %s", self.cache_key)
+
+        return data
+
+    def set(self, data):
+        markers = self.markers if self.markers is not None else self.get_markers()
+
+        cache.set(self.cache_key, {"markers": markers, "data": data}, settings.REPORT_RESULTS_CACHE_TTL)
+
+        _l.debug("ReportResultCache.set %s", self.cache_key)
+
+
+def transaction_post_save(sender, instance, **kwargs):
+    if not instance.portfolio_id:
+        return
+
+    space_code = _get_space_code(instance.master_user_id)
+    _bump_markers([get_portfolio_marker_key(space_code, instance.portfolio_id)])
+
+
+def price_history_post_save(sender, instance, **kwargs):
+    space_code = _get_related_space_code(instance, "instrument")
+    _bump_markers([get_prices_marker_key(space_code, instance.date)])
+
+
+def currency_history_post_save(sender, instance, **kwargs):
+    space_code = _get_related_space_code(instance, "currency")
+    _bump_markers([get_fx_rates_marker_key(space_code, instance.date)])
+
+
+def report_object_post_save(sender, instance, **kwargs):
+    related_field = REPORT_OBJECTS_MODELS[sender._meta.label]
+    try:
+        if related_field:
+            space_code = _get_related_space_code(instance, related_field)
+        else:
+            space_code = _get_space_code(instance.master_user_id)
+    except ObjectDoesNotExist:  # deleted with its related object, which invalidates results itself
+        return
+
+    _bump_markers([get_objects_marker_key(space_code)])
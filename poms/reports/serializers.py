@@ -35,7 +35,7 @@ from poms.instruments.models import CostMethod
 from poms.instruments.serializers import PricingPolicyViewSerializer
 from poms.portfolios.fields import PortfolioField
 from poms.portfolios.serializers import PortfolioViewSerializer
-from poms.reports.backend_reports_utils import BackendReportHelperService
+from poms.reports.backend_reports_columnar import get_backend_report_helper_service
 from poms.reports.base_serializers import (
     ReportAccountSerializer,
     ReportAccountTypeSerializer,
@@ -76,7 +76,7 @@ from poms.reports.serializers_helpers import (
     serialize_report_item_instrument,
     serialize_transaction_report_item,
 )
-from poms.reports.utils import generate_unique_key
+from poms.reports.utils import calculate_custom_fields, generate_unique_key, prefetch_report_market_data
 from poms.strategies.fields import Strategy1Field, Strategy2Field, Strategy3Field
 from poms.strategies.serializers import (
     Strategy1ViewSerializer,
@@ -505,20 +505,16 @@ class ReportSerializer(ReportSerializerWithLogs):
     def create(self, validated_data):
         return Report(**validated_data)
 
-    def _extract_names(self, item, data):
-        names = item.copy()
-        names.update(
-            {
-                "report_currency": data["report_currency"],
-                "report_date": data["report_date"],
-                "pl_first_date": data["pl_first_date"],
-                "cost_method": data["cost_method"],
-                "pricing_policy": data["pricing_policy"],
-                "portfolio_mode": data["portfolio_mode"],
-                "account_mode": data["account_mode"],
-            }
-        )
-        return names
+    def _extract_names(self, data):
+        return {
+            "report_currency": data["report_currency"],
+            "report_date": data["report_date"],
+            "pl_first_date": data["pl_first_date"],
+            "cost_method": data["cost_method"],
+            "pricing_policy": data["pricing_policy"],
+            "portfolio_mode": data["portfolio_mode"],
+            "account_mode": data["account_mode"],
+        }
 
     def _get_item_dict(self, data, key):
         return {o["id"]: o for o in data[key]}
@@ -565,7 +561,7 @@ class ReportSerializer(ReportSerializerWithLogs):
         instance.is_report = True
         data = super().to_representation(instance)
 
-        helper_service = BackendReportHelperService()
+        helper_service = get_backend_report_helper_service()
 
         full_items = helper_service.convert_report_items_to_full_items(data)
 
@@ -605,46 +601,42 @@ class ReportSerializer(ReportSerializerWithLogs):
         custom_fields = data.get("custom_fields_object", [])
         custom_fields_to_calculate = data.get("custom_fields_to_calculate", [])
 
-        # index = 0
         if custom_fields_to_calculate and custom_fields:
             calc_st = time.perf_counter()
+
+            report_names = self._extract_names(data)
+            items_names = []
             for item in full_items:
-                item_st = time.perf_counter()
-                names = self._extract_names(item, data)
+                names = item.copy()
+                for name in report_names:
+                    names.pop(name, None)
 
                 for name, item_dict in item_dicts.items():
                     self._set_object(names, name, item_dict)
 
-                # if index == 0:
-                #     _l.info('names %s' % names)
+                items_names.append(formula.value_prepare(names))
 
-                # index = index + 1
+            prefetch_report_market_data(
+                self.context,
+                instance,
+                instruments=[o["id"] for o in data["item_instruments"]],
+                currencies=[o["id"] for o in data["item_currencies"]],
+            )
 
-                names = formula.value_prepare(names)
-                custom_fields_names = {}
+            custom_fields_values = calculate_custom_fields(
+                [cf for cf in custom_fields if cf["name"] in custom_fields_to_calculate],
+                items_names,
+                names=formula.value_prepare(report_names),
+                iterations_count=data["expression_iterations_count"],
+                context=self.context,
+            )
 
-                for _ in range(data["expression_iterations_count"]):
-                    for cf in custom_fields:
-                        if cf["name"] in custom_fields_to_calculate:
-                            expr = cf.get("expr")
-                            value = self.evaluate_expression(expr, names, context=self.context) if expr else None
-                            if cf["user_code"] not in custom_fields_names:
-                                custom_fields_names[cf["user_code"]] = value
-
-                # Processing custom fields
-                cfv = []  # noqa: F841
+            # Processing custom fields
+            for item, custom_fields_names in zip(full_items, custom_fields_values, strict=True):
                 for key, value in custom_fields_names.items():
                     for cf in custom_fields:
                         if cf["user_code"] == key:
-                            value = self.process_custom_field(cf, value)  # noqa: PLW2901
-
-                            item[f"custom_fields.{cf['user_code']}"] = value
-                            # cfv.append(
-                            #     {"custom_field": cf["id"], "user_code": cf["user_code"], "value": value}
-                            # )
-                # item["custom_fields"] = cfv
-
-                _l.debug("Processed item in: %s seconds", time.perf_counter() - item_st)
+                            item[f"custom_fields.{cf['user_code']}"] = self.process_custom_field(cf, value)
 
             _l.info(
                 "Custom field calculation completed in: %s seconds",
@@ -1102,7 +1094,7 @@ class TransactionReportSerializer(ReportSerializerWithLogs):
 
         st = time.perf_counter()  # noqa: F841
 
-        helper_service = BackendReportHelperService()
+        helper_service = get_backend_report_helper_service()
 
         full_items = helper_service.convert_report_items_to_full_items(data)
         custom_fields = data["custom_fields_object"]
@@ -1130,6 +1122,7 @@ class TransactionReportSerializer(ReportSerializerWithLogs):
                         names[f"{pk_attr}_object"] = objs[pk]
                         # names[pk_attr] = objs[pk]
 
+            items_names = []
             for item in full_items:
                 names = {}
 
@@ -1157,31 +1150,16 @@ class TransactionReportSerializer(ReportSerializerWithLogs):
                 _set_object(names, "allocation_balance", item_instruments)
                 _set_object(names, "allocation_pl", item_instruments)
 
-                names = formula.value_prepare(names)
-                custom_fields_names = {}
-
-                for i in range(data["expression_iterations_count"]):  # noqa: B007
-                    for cf in custom_fields:
-                        if cf["name"] in data["custom_fields_to_calculate"]:
-                            expr = cf["expr"]
-
-                            if expr:
-                                try:
-                                    value = formula.safe_eval(expr, names=names, context=self.context)
-                                except formula.InvalidExpression:
-                                    value = gettext_lazy("Invalid expression")
-                            else:
-                                value = None
-
-                            if (
-                                cf["user_code"] not in custom_fields_names
-                                or custom_fields_names[cf["user_code"]] is None
-                                or custom_fields_names[cf["user_code"]] == gettext_lazy("Invalid expression")
-                            ):
-                                custom_fields_names[cf["user_code"]] = value
+                items_names.append(formula.value_prepare(names))
 
-                    names["custom_fields"] = custom_fields_names
+            custom_fields_values = calculate_custom_fields(
+                [cf for cf in custom_fields if cf["name"] in data["custom_fields_to_calculate"]],
+                items_names,
+                iterations_count=data["expression_iterations_count"],
+                context=self.context,
+            )
 
+            for item, custom_fields_names in zip(full_items, custom_fields_values, strict=True):
                 for key, value in custom_fields_names.items():
                     for cf in custom_fields:
                         if cf["user_code"] == key:
@@ -1487,6 +1465,24 @@ class PriceHistoryCheckSerializer(ReportSerializerWithLogs):
         return Report(**validated_data)
 
 
+def get_balance_report_data(instance, to_representation):
+    """
+    Return report data from the result cache if views found it there,
+    otherwise serialize built report and store it in the cache
+    """
+    data = getattr(instance, "report_data", None)
+    if data is not None:
+        return data
+
+    data = to_representation(instance)
+
+    report_cache = getattr(instance, "report_result_cache", None)
+    if report_cache is not None:
+        report_cache.set(data)
+
+    return data
+
+
 class BackendBalanceReportGroupsSerializer(BalanceReportSerializer):
     def to_representation(self, instance):
         if not instance.frontend_request_options:
@@ -1498,90 +1494,13 @@ class BackendBalanceReportGroupsSerializer(BalanceReportSerializer):
             elapsed_time = time.perf_counter() - to_representation_st
             _l.debug(f"{message} | Elapsed time: {elapsed_time:.3f} seconds")
 
-        helper_service = BackendReportHelperService()
+        helper_service = get_backend_report_helper_service()
 
         _l.debug("BackendBalanceReportGroupsSerializer.to_representation")
 
-        # settings, unique_key = generate_unique_key(instance, "balance")
-
-        data = super().to_representation(instance)
+        data = get_balance_report_data(instance, super().to_representation)
         log_with_time("Report items are received from parent class")
 
-        log_with_time("Report items converted to full items")
-
-        # if instance.ignore_cache:
-        #
-        #     data = super(BackendBalanceReportGroupsSerializer, self).to_representation(
-        #         instance
-        #     )
-        #
-        #     full_items = helper_service.convert_report_items_to_full_items(data)
-        #
-        # else:
-        #
-        #     try:
-        #
-        #         report_instance = BalanceReportInstance.objects.get(unique_key=unique_key)
-        #
-        #         data = report_instance.data
-        #
-        #         full_items = report_instance.data["items"]
-        #
-        #         data["execution_time"] = float(
-        #             "{:3.3f}".format(time.perf_counter() - to_representation_st)
-        #         )
-        #
-        #     except ObjectDoesNotExist:
-        #
-        #         data = super(BackendBalanceReportGroupsSerializer, self).to_representation(
-        #             instance
-        #         )
-        #
-        #         report_uuid = str(uuid.uuid4())
-        #
-        #         report_instance_name = ""
-        #         if self.instance.report_instance_name:
-        #             report_instance_name = self.instance.report_instance_name
-        #         else:
-        #             report_instance_name = report_uuid
-        #
-        #         report_instance = BalanceReportInstance(
-        #             unique_key=unique_key,
-        #             settings=settings,
-        #             master_user=instance.master_user,
-        #             member=instance.member,
-        #             owner=instance.member,
-        #             user_code=report_instance_name,
-        #             name=report_instance_name,
-        #             short_name=report_instance_name,
-        #             report_date=instance.report_date,
-        #             report_currency=instance.report_currency,
-        #             pricing_policy=instance.pricing_policy,
-        #             cost_method=instance.cost_method,
-        #         )
-        #
-        #         report_instance.report_date = instance.report_date
-        #         report_instance.report_currency = instance.report_currency
-        #         report_instance.pricing_policy = instance.pricing_policy
-        #         report_instance.cost_method = instance.cost_method
-        #
-        #         report_instance.report_uuid = report_uuid
-        #
-        #         data["report_uuid"] = report_uuid
-        #
-        #         full_items = helper_service.convert_report_items_to_full_items(data)
-        #
-        #         data["items"] = full_items
-        #
-        #         report_instance.data = json.loads(json.dumps(data, default=str))
-        #
-        #         if report_instance.data:
-        #             report_instance.save()
-        #
-        #         data["execution_time"] = float(
-        #             "{:3.3f}".format(time.perf_counter() - to_representation_st)
-        #         )
-
         full_items = data["items"]
 
         full_items = helper_service.calculate_value_percent(full_items, instance.calculation_group, "market_value")
@@ -1623,10 +1542,6 @@ class BackendBalanceReportGroupsSerializer(BalanceReportSerializer):
         )
         log_with_time("helper_service.paginate_items")
 
-        # if not instance.ignore_cache:
-        #     data["report_instance_id"] = report_instance.id
-        #     data["created_at"] = report_instance.created_at
-
         data["items"] = groups
         data.pop("item_currencies", [])
         data.pop("item_portfolios", [])
@@ -1660,74 +1575,13 @@ class BackendBalanceReportItemsSerializer(BalanceReportSerializer):
             elapsed_time = time.perf_counter() - to_representation_st
             _l.debug(f"{message} | Elapsed time: {elapsed_time:.3f} seconds")
 
-        helper_service = BackendReportHelperService()
+        helper_service = get_backend_report_helper_service()
         log_with_time("Starting BackendBalanceReportItemsSerializer.to_representation")
 
-        settings, unique_key = generate_unique_key(instance, "balance")
-        log_with_time("Unique key generated")
+        data = get_balance_report_data(instance, super().to_representation)
+        log_with_time("Report data retrieved")
 
-        data = super().to_representation(instance)
-        log_with_time("Data retrieved without cache")
-
-        # full_items = helper_service.convert_report_items_to_full_items(data)
         full_items = data["items"]
-        log_with_time("Report items converted to full items without cache")
-
-        # if instance.ignore_cache:
-        #     data = super(BackendBalanceReportItemsSerializer, self).to_representation(instance)
-        #     log_with_time("Data retrieved without cache")
-        #
-        #     full_items = helper_service.convert_report_items_to_full_items(data)
-        #     log_with_time("Report items converted to full items without cache")
-        #
-        # else:
-        #     try:
-        #         report_instance = BalanceReportInstance.objects.get(unique_key=unique_key)
-        #         log_with_time("Report instance retrieved from cache")
-        #
-        #         data = report_instance.data
-        #         full_items = report_instance.data["items"]
-        #         log_with_time("Data and full items loaded from report instance")
-        #
-        #         data["execution_time"] = float("{:3.3f}".format(time.perf_counter() - to_representation_st))
-        #         log_with_time("Execution time added to data from cache")
-        #
-        #     except ObjectDoesNotExist:
-        #         log_with_time("Report instance not found in cache, generating new data")
-        #
-        #         data = super(BackendBalanceReportItemsSerializer, self).to_representation(instance)
-        #         report_uuid = str(uuid.uuid4())
-        #         report_instance_name = self.instance.report_instance_name or report_uuid
-        #
-        #         report_instance = BalanceReportInstance(
-        #             unique_key=unique_key,
-        #             settings=settings,
-        #             master_user=instance.master_user,
-        #             member=instance.member,
-        #             owner=instance.member,
-        #             user_code=report_instance_name,
-        #             name=report_instance_name,
-        #             short_name=report_instance_name,
-        #             report_date=instance.report_date,
-        #             report_currency=instance.report_currency,
-        #             pricing_policy=instance.pricing_policy,
-        #             cost_method=instance.cost_method,
-        #         )
-        #
-        #         data["report_uuid"] = report_uuid
-        #         full_items = helper_service.convert_report_items_to_full_items(data)
-        #         data["items"] = full_items
-        #         log_with_time("New report instance data and items prepared")
-        #
-        #         report_instance.data = json.loads(json.dumps(data, default=str))
-        #         log_with_time("Data serialized to JSON")
-        #
-        #         if report_instance.data:
-        #             report_instance.save()
-        #             log_with_time("Report instance saved to database")
-        #
-        #         data["execution_time"] = float("{:3.3f}".format(time.perf_counter() - to_representation_st))
-        #         log_with_time("Execution time added to newly generated data")
 
         # Processing full_items with various helper_service methods
         full_items = helper_service.calculate_value_percent(full_items, instance.calculation_group, "market_value")
@@ -1748,11 +1602,6 @@ class BackendBalanceReportItemsSerializer(BalanceReportSerializer):
         data["count"] = len(full_items)
         log_with_time("Item count added to data")
 
-        # if not instance.ignore_cache:
-        #     data["report_instance_id"] = report_instance.id
-        #     data["created_at"] = report_instance.created_at
-        #     log_with_time("Report instance ID and creation date added to data")
-
         data["items"] = helper_service.paginate_items(
             full_items, {"page_size": instance.page_size, "page": instance.page}
         )
@@ -1788,7 +1637,7 @@ class BackendPLReportGroupsSerializer(PLReportSerializer):
 
         to_representation_st = time.perf_counter()
 
-        helper_service = BackendReportHelperService()
+        helper_service = get_backend_report_helper_service()
 
         settings, unique_key = generate_unique_key(instance, "pnl")
 
@@ -1922,7 +1771,7 @@ class BackendPLReportItemsSerializer(PLReportSerializer):
 
         to_representation_st = time.perf_counter()
 
-        helper_service = BackendReportHelperService()
+        helper_service = get_backend_report_helper_service()
 
         settings, unique_key = generate_unique_key(instance, "pnl")
 
@@ -2043,7 +1892,7 @@ class BackendTransactionReportGroupsSerializer(TransactionReportSerializer):
 
         to_representation_st = time.perf_counter()
 
-        helper_service = BackendReportHelperService()
+        helper_service = get_backend_report_helper_service()
 
         data = super().to_representation(instance)
 
@@ -2112,7 +1961,7 @@ class BackendTransactionReportItemsSerializer(TransactionReportSerializer):
 
         to_representation_st = time.perf_counter()
 
-        helper_service = BackendReportHelperService()
+        helper_service = get_backend_report_helper_service()
 
         data = super().to_representation(instance)
         report_uuid = str(uuid.uuid4())
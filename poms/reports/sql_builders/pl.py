@@ -1,3 +1,4 @@
+import hashlib
 import logging
 import os
 import time
@@ -40,10 +41,12 @@ _l = logging.getLogger("poms.reports")
 
 
 class PLReportBuilderSql:
-    def __init__(self, instance=None):
+    def __init__(self, instance=None, share_report_date=False):
         _l.debug("ReportBuilderSql init")
 
         self.instance = instance
+        # reuse report date part of reports built in the same transaction, see get_shared_query
+        self.share_report_date = share_report_date
 
         self.ecosystem_defaults = EcosystemDefault.cache.get_cache(master_user_pk=self.instance.master_user.pk)
 
@@ -157,7 +160,8 @@ class PLReportBuilderSql:
 
         relation_prefetch_st = time.perf_counter()
 
-        self.add_data_items()
+        if not self.instance.only_numbers:
+            self.add_data_items()
 
         self.instance.relation_prefetch_time = float(f"{time.perf_counter() - relation_prefetch_st:3.3f}")
 
@@ -3339,6 +3343,22 @@ class PLReportBuilderSql:
 
         return query
 
+    @staticmethod
+    def get_shared_query(cursor, query):
+        """
+        Reports with the same settings and report date, but different pl first dates
+        (e.g. daily, mtd and ytd PL) have the same report date query. Its result is stored
+        in temporary table, which is dropped at the end of transaction
+        """
+        if not connection.in_atomic_block:
+            return query
+
+        table_name = f"pl_report_date_{hashlib.md5(query.encode()).hexdigest()}"
+
+        cursor.execute(f"create temporary table if not exists {table_name} on commit drop as {query}")
+
+        return f"select * from {table_name}"
+
     @finmars_task(name="reports.build_pl_report", bind=True)
     def build(self, task_id, *args, **kwargs):
         try:
@@ -3354,6 +3374,9 @@ class PLReportBuilderSql:
                 query_1 = PLReportBuilderSql.get_query_for_first_date(instance)
                 query_2 = PLReportBuilderSql.get_query_for_second_date(instance)
 
+                if instance.share_report_date:
+                    query_2 = PLReportBuilderSql.get_shared_query(cursor, query_2)
+
                 ecosystem_defaults = EcosystemDefault.objects.get(master_user=celery_task.master_user)
 
                 st = time.perf_counter()
@@ -4585,6 +4608,7 @@ class PLReportBuilderSql:
                 "strategy2_mode": self.instance.strategy2_mode,
                 "strategy3_mode": self.instance.strategy3_mode,
                 "allocation_mode": self.instance.allocation_mode,
+                "share_report_date": self.share_report_date,
             },
         )
 
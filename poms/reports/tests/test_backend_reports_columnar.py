@@ -0,0 +1,129 @@
+import copy
+from decimal import Decimal
+
+from django.test import TestCase, override_settings
+
+from poms.reports.backend_reports_columnar import (
+    BackendReportColumnarHelperService,
+    get_backend_report_helper_service,
+)
+from poms.reports.backend_reports_utils import BackendReportHelperService
+
+COLUMNS = [
+    {"key": "market_value", "value_type": 20, "report_settings": {"subtotal_formula_id": 1}},
+    {"key": "exposure", "value_type": 20, "report_settings": {"subtotal_formula_id": 2}},
+    {"key": "position_size", "value_type": 20, "report_settings": {"subtotal_formula_id": 6}},
+    {"key": "name", "value_type": 10},
+]
+
+
+def get_items():
+    names = ["Apple", "Bond X", "cash", None]
+    portfolios = ["p1", "p2", "-", None]
+    market_values = [10.5, 0, None, 5, -3.25, Decimal("2.5")]
+    position_sizes = [1, 2.5, None, 0]
+
+    items = []
+    for i in range(48):
+        item = {
+            "id": i,
+            "name": names[i % 4],
+            "portfolio.user_code": portfolios[i % 3],
+            "portfolio.name": portfolios[i % 3],
+            "market_value": market_values[i % 6],
+            "exposure": i * 1.5,
+            "position_size": position_sizes[i % 4],
+        }
+        if i % 7 == 0:
+            del item["position_size"]
+        items.append(item)
+
+    return items
+
+
+class BackendReportColumnarHelperServiceTest(TestCase):
+    def run_service(self, service, options, group_field):
+        items = copy.deepcopy(get_items())
+
+        items = service.calculate_value_percent(items, group_field, "market_value")
+        items = service.calculate_value_percent(items, group_field, "exposure")
+        items = service.filter(items, options)
+        items = service.filter_by_groups_filters(items, options)
+        items = service.sort_items(items, options)
+
+        groups = service.get_unique_groups(items, options["groups_types"][-1], COLUMNS)
+        groups = service.sort_groups(groups, options)
+
+        return list(groups), [dict(item) for item in items]
+
+    def assertSameResult(self, options):
+        for group_field in ("no_grouping", "portfolio.name"):
+            with self.subTest(group_field=group_field):
+                self.assertEqual(
+                    self.run_service(BackendReportHelperService(), options, group_field),
+                    self.run_service(BackendReportColumnarHelperService(), options, group_field),
+                )
+
+    def test_global_table_search(self):
+        self.assertSameResult(
+            {
+                "globalTableSearch": "app p1",
+                "filter_settings": [],
+                "groups_types": [{"key": "portfolio.name"}],
+                "groups_values": [],
+                "ordering": "market_value",
+                "items_order": "desc",
+            }
+        )
+
+    def test_filters_and_groups_values(self):
+        self.assertSameResult(
+            {
+                "filter_settings": [
+                    {"key": "name", "value_type": 10, "filter_type": "contains", "value": ["b"]},
+                    {"key": "exposure", "value_type": 20, "filter_type": "greater", "value": [3]},
+                ],
+                "groups_types": [{"key": "portfolio.name"}, {"key": "name"}],
+                "groups_values": ["p1"],
+                "ordering": "name",
+                "items_order": "asc",
+                "groups_order": "desc",
+            }
+        )
+
+    def test_empty_and_range_filters(self):
+        self.assertSameResult(
+            {
+                "filter_settings": [
+                    {"key": "position_size", "value_type": 20, "filter_type": "empty", "value": []},
+                    {
+                        "key": "exposure",
+                        "value_type": 20,
+                        "filter_type": "from_to",
+                        "value": {"min_value": 10, "max_value": 50},
+                    },
+                ],
+                "groups_types": [{"key": "name"}],
+                "groups_values": [],
+                "ordering": "position_size",
+                "items_order": "asc",
+            }
+        )
+
+    def test_multiselector_filter(self):
+        self.assertSameResult(
+            {
+                "filter_settings": [
+                    {"key": "name", "value_type": 10, "filter_type": "multiselector", "value": ["Apple", "cash"]},
+                ],
+                "groups_types": [{"key": "portfolio.name"}],
+                "groups_values": [],
+            }
+        )
+
+    def test_get_backend_report_helper_service(self):
+        with override_settings(BACKEND_REPORTS_ENGINE="python"):
+            self.assertIs(type(get_backend_report_helper_service()), BackendReportHelperService)
+
+        with override_settings(BACKEND_REPORTS_ENGINE="columnar"):
+            self.assertIsInstance(get_backend_report_helper_service(), BackendReportColumnarHelperService)
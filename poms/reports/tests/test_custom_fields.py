@@ -0,0 +1,105 @@
+from datetime import timedelta
+from types import SimpleNamespace
+
+from poms.common.common_base_test import BaseTestCase
+from poms.currencies.models import CurrencyHistory
+from poms.expressions_engine.market_data import get_market_data_cache
+from poms.instruments.models import PriceHistory
+from poms.reports.utils import calculate_custom_fields, prefetch_report_market_data, sort_custom_fields
+
+
+def _cf(user_code, expr, value_type=20):
+    return {"user_code": user_code, "name": user_code, "expr": expr, "value_type": value_type}
+
+
+class CustomFieldsCalculationTest(BaseTestCase):
+    def test_sort_custom_fields(self):
+        custom_fields = [
+            _cf("total", "custom_fields.price * custom_fields['qty']"),
+            _cf("price", "price"),
+            _cf("qty", "position_size"),
+            _cf("loop_a", "custom_fields.loop_b"),
+            _cf("loop_b", "custom_fields.loop_a"),
+        ]
+
+        ordered, unresolved = sort_custom_fields(custom_fields)
+
+        self.assertEqual([cf["user_code"] for cf in ordered], ["price", "qty", "total"])
+        self.assertEqual([cf["user_code"] for cf in unresolved], ["loop_a", "loop_b"])
+
+    def test_calculate_custom_fields(self):
+        custom_fields = [
+            _cf("total", "custom_fields.price * custom_fields.qty + fee"),
+            _cf("price", "price"),
+            _cf("qty", "position_size"),
+            _cf("empty", ""),
+            _cf("invalid", "unknown_name"),
+        ]
+        items_names = [
+            {"price": 10, "position_size": 2},
+            {"price": 5, "position_size": 3},
+        ]
+
+        values = calculate_custom_fields(custom_fields, items_names, names={"fee": 1})
+
+        self.assertEqual([v["total"] for v in values], [21, 16])
+        self.assertEqual([v["empty"] for v in values], [None, None])
+        self.assertEqual([str(v["invalid"]) for v in values], ["Invalid expression"] * 2)
+
+    def test_calculate_cyclic_custom_fields_with_iterations(self):
+        custom_fields = [
+            _cf("first", "custom_fields.second + 1"),
+            _cf("second", "try:\n    r = custom_fields.first\nexcept:\n    r = None\n1"),
+        ]
+
+        values = calculate_custom_fields(custom_fields, [{}], iterations_count=2)
+
+        self.assertEqual(values, [{"first": 2, "second": 1}])
+
+
+class PrefetchReportMarketDataTest(BaseTestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        super().setUp()
+        self.init_test_case()
+        self.pricing_policy = self.create_pricing_policy()
+        self.instrument = self.create_instrument()
+        self.report = SimpleNamespace(
+            report_date=self.yesterday(),
+            pl_first_date=self.yesterday() - timedelta(days=30),
+            pricing_policy=self.pricing_policy,
+        )
+
+    def test_prefetch_report_market_data(self):
+        CurrencyHistory.objects.create(
+            currency=self.eur,
+            pricing_policy=self.pricing_policy,
+            fx_rate=1.1,
+            date=self.report.report_date,
+        )
+        PriceHistory.objects.bulk_create(
+            [
+                PriceHistory(
+                    instrument=self.instrument,
+                    pricing_policy=self.pricing_policy,
+                    principal_price=101,
+                    accrued_price=0,
+                    date=self.report.pl_first_date,
+                )
+            ]
+        )
+
+        context = {"master_user": self.master_user, "member": self.member}
+        with self.assertNumQueries(4):
+            prefetch_report_market_data(context, self.report, [self.instrument.id], [self.eur.id])
+
+        cache = get_market_data_cache(context)
+        with self.assertNumQueries(0):
+            self.assertEqual(cache.get_fx_rate(self.eur, self.pricing_policy, self.report.report_date).fx_rate, 1.1)
+            self.assertIsNone(cache.get_fx_rate(self.eur, self.pricing_policy, self.report.pl_first_date))
+            self.assertEqual(
+                cache.get_price(self.instrument, self.pricing_policy, self.report.pl_first_date).principal_price,
+                101,
+            )
+            self.assertIsNone(cache.get_price(self.instrument, self.pricing_policy, self.report.report_date))
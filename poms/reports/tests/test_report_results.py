@@ -0,0 +1,150 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+
+from poms.common.common_base_test import BaseTestCase
+from poms.instruments.models import InstrumentFactorSchedule, PriceHistory
+from poms.portfolios.models import Portfolio
+from poms.reports.common import Report
+from poms.reports.models import BalanceReportCustomField
+from poms.reports.report_results import ReportResultCache, invalidate_report_results, price_history_post_save
+
+
+class ReportResultCacheTest(BaseTestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        super().setUp()
+        self.init_test_case()
+        cache.clear()
+        self.portfolio = Portfolio.objects.filter(master_user=self.master_user).first()
+        self.pricing_policy = self.create_pricing_policy()
+        self.instrument = self.create_instrument()
+        self.report_date = self.yesterday()
+        self.data = {"items": [{"id": 1, "market_value": 10}], "page": 1}
+
+    def create_report(self, **kwargs) -> Report:
+        options = {
+            "master_user": self.master_user,
+            "member": self.member,
+            "report_date": self.report_date,
+            "pricing_policy": self.pricing_policy,
+            "portfolios": [self.portfolio],
+        }
+        options.update(kwargs)
+        return Report(**options)
+
+    def store(self):
+        report_cache = ReportResultCache(self.create_report(), "balance")
+        self.assertIsNone(report_cache.get())
+        report_cache.set(self.data)
+
+    def create_price(self, date):
+        PriceHistory.objects.create(
+            instrument=self.instrument,
+            pricing_policy=self.pricing_policy,
+            principal_price=100,
+            accrued_price=0,
+            date=date,
+        )
+
+    def test_get_cached_data(self):
+        self.store()
+
+        data = ReportResultCache(self.create_report(page=3), "balance").get()
+
+        self.assertEqual(data["items"], self.data["items"])
+        self.assertEqual(data["page"], 3)
+
+    def test_ignore_cache(self):
+        self.store()
+
+        self.assertIsNone(ReportResultCache(self.create_report(ignore_cache=True), "balance").get())
+
+    def test_other_report_options(self):
+        self.store()
+
+        report = self.create_report(report_date=self.report_date - timedelta(days=7))
+
+        self.assertIsNone(ReportResultCache(report, "balance").get())
+
+    def test_invalidated_by_price_of_report_date(self):
+        self.store()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_price(self.report_date + timedelta(days=7))
+        self.assertIsNotNone(ReportResultCache(self.create_report(), "balance").get())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_price(self.report_date)
+        self.assertIsNone(ReportResultCache(self.create_report(), "balance").get())
+
+    def test_invalidated_after_commit(self):
+        self.store()
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.create_price(self.report_date)
+
+        # report built before commit does not see the new price, so its result is still valid
+        self.assertIsNotNone(ReportResultCache(self.create_report(), "balance").get())
+
+        for callback in callbacks:
+            callback()
+        self.assertIsNone(ReportResultCache(self.create_report(), "balance").get())
+
+    def test_invalidated_by_portfolio_transactions(self):
+        self.store()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_report_results(self.master_user, portfolios=[self.portfolio.id + 1000])
+        self.assertIsNotNone(ReportResultCache(self.create_report(), "balance").get())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_report_results(self.master_user, portfolios=[self.portfolio])
+        self.assertIsNone(ReportResultCache(self.create_report(), "balance").get())
+
+    def test_invalidated_by_report_objects(self):
+        factor_schedule = InstrumentFactorSchedule.objects.create(instrument=self.instrument, factor_value=0.5)
+        for instance in (self.instrument, factor_schedule, self.portfolio, self.usd):
+            self.store()
+
+            # objects of setUp are saved in the test savepoint, their callbacks are never run
+            with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+                instance.save()
+            self.assertIsNone(ReportResultCache(self.create_report(), "balance").get(), instance)
+
+    def test_invalidated_by_custom_field_expr(self):
+        custom_field = BalanceReportCustomField.objects.create(
+            master_user=self.master_user,
+            owner=self.member,
+            user_code="custom_field",
+            configuration_code="custom_field",
+            name="custom_field",
+            expr="1",
+        )
+        report_cache = ReportResultCache(self.create_report(custom_fields=[custom_field]), "balance")
+        report_cache.get()
+        report_cache.set(self.data)
+
+        self.assertIsNotNone(ReportResultCache(self.create_report(custom_fields=[custom_field.id]), "balance").get())
+
+        custom_field.expr = "2"
+        custom_field.save()
+
+        self.assertIsNone(ReportResultCache(self.create_report(custom_fields=[custom_field]), "balance").get())
+
+    def test_price_signal_does_not_load_instrument(self):
+        price = PriceHistory.objects.create(
+            instrument=self.instrument,
+            pricing_policy=self.pricing_policy,
+            principal_price=100,
+            accrued_price=0,
+            date=self.report_date,
+        )
+        price_history_post_save(PriceHistory, PriceHistory.objects.get(pk=price.pk))
+        loaded_price = PriceHistory.objects.get(pk=price.pk)
+
+        with self.assertNumQueries(0):
+            price_history_post_save(PriceHistory, price)
+            price_history_post_save(PriceHistory, loaded_price)
@@ -0,0 +1,77 @@
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+from poms.common.common_base_test import BIG, BaseTestCase
+from poms.currencies.models import CurrencyHistory
+from poms.reports.models import ReportSummary
+from poms.transactions.models import TransactionClass
+
+
+class ReportSummaryTest(BaseTestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        super().setUp()
+        self.init_test_case()
+        self.portfolio = self.db_data.portfolios[BIG]
+        self.eur = self.get_currency("EUR")
+        self.pricing_policy = self.create_pricing_policy()
+        self.date_to = date(2024, 3, 14)
+        self.date_from = date(2024, 3, 1)
+
+        day = date(2023, 12, 20)
+        while day <= self.date_to:
+            CurrencyHistory.objects.create(
+                currency=self.eur,
+                pricing_policy=self.pricing_policy,
+                date=day,
+                fx_rate=1 + (day - date(2023, 12, 20)).days / 1000,
+            )
+            day += timedelta(days=1)
+
+        for day, amount in ((date(2023, 12, 21), 1000), (date(2024, 2, 1), 500), (date(2024, 3, 5), 200)):
+            _, transaction = self.db_data.cash_in_transaction(self.portfolio, amount=amount, day=day)
+            transaction.settlement_currency = self.eur
+            transaction.transaction_class_id = TransactionClass.CASH_INFLOW
+            transaction.save()
+
+    def get_totals(self, report_summary):
+        return {
+            "nav": report_summary.get_nav(),
+            "pl_range": report_summary.get_total_pl_range(),
+            "pl_daily": report_summary.get_total_pl_daily(),
+            "pl_mtd": report_summary.get_total_pl_mtd(),
+            "pl_ytd": report_summary.get_total_pl_ytd(),
+        }
+
+    def create_report_summary(self):
+        request = SimpleNamespace(user=SimpleNamespace(master_user=self.master_user, member=self.member))
+
+        return ReportSummary(
+            self.date_from,
+            self.date_to,
+            [self.portfolio],
+            [],
+            self.db_data.usd,
+            self.pricing_policy,
+            0,
+            self.master_user,
+            self.member,
+            {"request": request},
+        )
+
+    def test_shared_build_is_equal_to_separate_builds(self):
+        report_summary = self.create_report_summary()
+        report_summary.build_balance()
+        report_summary.build_pl_range()
+        report_summary.build_pl_daily()
+        report_summary.build_pl_mtd()
+        report_summary.build_pl_ytd()
+        expected = self.get_totals(report_summary)
+
+        self.assertNotEqual(expected["pl_ytd"], 0)
+
+        report_summary = self.create_report_summary()
+        report_summary.build()
+
+        self.assertEqual(self.get_totals(report_summary), expected)
@@ -1,8 +1,11 @@
+import ast
 import hashlib
 import json
 import logging
 from datetime import date, timedelta
 
+from django.utils.translation import gettext_lazy
+
 from poms.accounts.models import Account
 from poms.common.utils import (
     get_last_business_day,
@@ -10,6 +13,8 @@ from poms.common.utils import (
     get_last_business_day_of_previous_month,
     get_last_business_day_of_previous_year,
 )
+from poms.expressions_engine import formula
+from poms.expressions_engine.market_data import get_market_data_cache
 from poms.iam.utils import get_allowed_queryset
 from poms.portfolios.models import Portfolio
 
@@ -224,3 +229,137 @@ def generate_unique_key(instance, report_type):
     unique_key = hashlib.md5(settings.encode()).hexdigest()
 
     return settings, unique_key
+
+
+def get_custom_field_dependencies(expr, user_codes):
+    """
+    Return user codes of custom fields referenced by expression
+    as custom_fields.<user_code> or custom_fields['<user_code>']
+    """
+    try:
+        tree = formula.compile_expression(expr).tree
+    except formula.InvalidExpression:
+        return set()
+
+    dependencies = set()
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Attribute | ast.Subscript):
+            continue
+        if not (isinstance(node.value, ast.Name) and node.value.id == "custom_fields"):
+            continue
+
+        if isinstance(node, ast.Attribute):
+            user_code = node.attr
+        elif isinstance(node.slice, ast.Constant):
+            user_code = node.slice.value
+        else:
+            # dynamic key, could be any custom field
+            dependencies.update(user_codes)
+            continue
+
+        if user_code in user_codes:
+            dependencies.add(user_code)
+
+    return dependencies
+
+
+def sort_custom_fields(custom_fields):
+    """
+    Order custom fields so that every field goes after the fields it references.
+    Returns (ordered, unresolved), unresolved are fields in (or depending on) reference cycles,
+    in their original order.
+    """
+    user_codes = {cf["user_code"] for cf in custom_fields}
+    dependencies = {
+        cf["user_code"]: get_custom_field_dependencies(cf["expr"], user_codes) if cf["expr"] else set()
+        for cf in custom_fields
+    }
+
+    ordered = []
+    resolved = set()
+    pending = list(custom_fields)
+    while pending:
+        ready = [cf for cf in pending if dependencies[cf["user_code"]] <= resolved]
+        if not ready:
+            break
+
+        ordered.extend(ready)
+        resolved.update(cf["user_code"] for cf in ready)
+        pending = [cf for cf in pending if cf["user_code"] not in resolved]
+
+    unresolved = [cf for cf in custom_fields if cf["user_code"] not in resolved]
+
+    return ordered, unresolved
+
+
+def prefetch_report_market_data(context, report, instruments, currencies):
+    """
+    Load prices of report instruments and FX rates of report currencies on report dates
+    into market data cache of evaluator context, so custom fields don't query them per item.
+    """
+    market_data_cache = get_market_data_cache(context)
+    pricing_policies = [report.pricing_policy] if report.pricing_policy else None
+
+    dates = {report.report_date}
+    if getattr(report, "pl_first_date", None):
+        dates.add(report.pl_first_date)
+
+    for d in sorted(dates):
+        market_data_cache.prefetch(
+            d,
+            d,
+            currencies=currencies,
+            instruments=instruments,
+            pricing_policies=pricing_policies,
+        )
+
+
+def calculate_custom_fields(custom_fields, items_names, names=None, iterations_count=1, context=None):
+    """
+    Evaluate report custom fields for all report items at once.
+
+    Every custom field expression is evaluated with one batch call over all items, names are
+    shared by all items. Fields are evaluated in dependency order, so each one is calculated once
+    and can reference already calculated fields through custom_fields.<user_code>; only fields
+    in reference cycles are re-evaluated up to iterations_count times.
+    Returns list of {user_code: value} dicts, one per item.
+    """
+    invalid_expression = gettext_lazy("Invalid expression")
+
+    values = [{} for _ in items_names]
+    for item_names, item_values in zip(items_names, values, strict=True):
+        item_names["custom_fields"] = item_values
+
+    def _calculate(cf, indexes):
+        if cf["expr"]:
+            results = formula.safe_eval_batch(
+                cf["expr"],
+                [items_names[i] for i in indexes],
+                names=names,
+                context=context,
+                default=invalid_expression,
+            )
+        else:
+            results = [None] * len(indexes)
+
+        for i, value in zip(indexes, results, strict=True):
+            values[i][cf["user_code"]] = value
+
+    ordered, unresolved = sort_custom_fields(custom_fields)
+
+    all_indexes = range(len(items_names))
+    for cf in ordered:
+        _calculate(cf, all_indexes)
+
+    for iteration in range(max(iterations_count, 1)):
+        for cf in unresolved:
+            user_code = cf["user_code"]
+            indexes = [
+                i
+                for i in all_indexes
+                if not iteration or values[i].get(user_code) is None or values[i][user_code] == invalid_expression
+            ]
+            if indexes:
+                _calculate(cf, indexes)
+
+    return values
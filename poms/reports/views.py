@@ -22,6 +22,7 @@ from poms.reports.models import (
     TransactionReportCustomField,
 )
 from poms.reports.performance_report import PerformanceReportBuilder
+from poms.reports.report_results import ReportResultCache
 from poms.reports.serializers import (
     BackendBalanceReportGroupsSerializer,
     BackendBalanceReportItemsSerializer,
@@ -708,11 +709,7 @@ class SummaryViewSet(AbstractViewSet):
                 context,
             )
 
-            report_summary.build_balance()
-            report_summary.build_pl_range()
-            report_summary.build_pl_daily()
-            report_summary.build_pl_mtd()
-            report_summary.build_pl_ytd()
+            report_summary.build()
 
             result = {
                 "total": {
@@ -1104,27 +1101,13 @@ class BackendBalanceReportViewSet(AbstractViewSet):
         instance.portfolios = transform_to_allowed_portfolios(instance)
         instance.accounts = transform_to_allowed_accounts(instance)
 
-        # settings, unique_key = generate_unique_key(instance, "balance")
+        report_cache = ReportResultCache(instance, "balance")
+        instance.report_result_cache = report_cache
+        instance.report_data = report_cache.get()
 
-        # _l.info("unique_key %s" % unique_key)
-
-        builder = BalanceReportBuilderSql(instance=instance)
-        instance = builder.build_balance()
-
-        # try:
-        #
-        #     if instance.ignore_cache:
-        #         raise ObjectDoesNotExist
-        #
-        #     balance_report_instance = BalanceReportInstance.objects.get(
-        #         unique_key=unique_key
-        #     )
-        #
-        # except ObjectDoesNotExist:
-        #
-        #     # Check to_representation comments to find why is that
-        #     builder = BalanceReportBuilderSql(instance=instance)
-        #     instance = builder.build_balance()
+        if instance.report_data is None:
+            builder = BalanceReportBuilderSql(instance=instance)
+            instance = builder.build_balance()
 
         serializer = self.get_serializer(instance=instance, many=False)
 
@@ -1150,27 +1133,13 @@ class BackendBalanceReportViewSet(AbstractViewSet):
         instance.portfolios = transform_to_allowed_portfolios(instance)
         instance.accounts = transform_to_allowed_accounts(instance)
 
-        # settings, unique_key = generate_unique_key(instance, "balance")
-        #
-        # _l.info("unique_key %s" % unique_key)
-
-        builder = BalanceReportBuilderSql(instance=instance)
-        instance = builder.build_balance()
+        report_cache = ReportResultCache(instance, "balance")
+        instance.report_result_cache = report_cache
+        instance.report_data = report_cache.get()
 
-        # try:
-        #
-        #     if instance.ignore_cache:
-        #         raise ObjectDoesNotExist
-        #
-        #     balance_report_instance = BalanceReportInstance.objects.get(
-        #         unique_key=unique_key
-        #     )
-        #
-        # except ObjectDoesNotExist:
-        #
-        #     # Check to_representation comments to find why is that
-        #     builder = BalanceReportBuilderSql(instance=instance)
-        #     instance = builder.build_balance()
+        if instance.report_data is None:
+            builder = BalanceReportBuilderSql(instance=instance)
+            instance = builder.build_balance()
 
         serialize_report_st = time.perf_counter()
         serializer = self.get_serializer(instance=instance, many=False)
@@ -119,6 +119,13 @@ class SchedulesConfig(AppConfig):
                 "crontab": crontabs["daily_morning"],
                 "kwargs": json.dumps({"context": {"space_code": master.space_code}}),
             },
+            {
+                "id": 9,
+                "name": "SYSTEM: Limit amount of tasks",
+                "task": "celery_tasks.limit_tasks_amount",
+                "crontab": crontabs["every_30_min"],
+                "kwargs": json.dumps({"context": {"space_code": master.space_code}}),
+            },
         ]
 
         periodic_tasks_exists = PeriodicTask.objects.using(
@@ -1,14 +1,19 @@
 import csv
 import json
 import logging
-import os
+import math
 import re
+import shutil
 import time
 import traceback
+from collections import Counter, defaultdict
+from contextlib import contextmanager
 from copy import deepcopy
 from datetime import date
+from itertools import islice
 from tempfile import NamedTemporaryFile
 
+from django.conf import settings
 from django.utils.timezone import now
 from openpyxl import load_workbook
 from openpyxl.utils import column_index_from_string
@@ -47,9 +52,12 @@ from poms.transaction_import.models import (
     TransactionImportProcessPreprocessItem,
     TransactionImportResult,
 )
-from poms.transaction_import.serializers import TransactionImportResultSerializer
+from poms.transaction_import.serializers import (
+    TransactionImportProcessItemSerializer,
+    TransactionImportResultSerializer,
+)
 from poms.transactions.handlers import TransactionTypeProcess
-from poms.transactions.models import TransactionType, TransactionTypeInput
+from poms.transactions.models import TransactionType, TransactionTypeInput, deferred_related_saves
 from poms.users.models import EcosystemDefault
 
 storage = get_storage()
@@ -75,8 +83,21 @@ props_map = {
 }
 
 
+def to_row_ranges(indexes) -> list:
+    """Sorted row indexes as list of [start, end) ranges of consecutive rows"""
+    ranges = []
+
+    for index in indexes:
+        if ranges and ranges[-1][1] == index:
+            ranges[-1][1] = index + 1
+        else:
+            ranges.append([index, index + 1])
+
+    return ranges
+
+
 class TransactionImportProcess:
-    def __init__(self, task_id, procedure_instance_id=None):
+    def __init__(self, task_id, procedure_instance_id=None):  # noqa: PLR0915
         self.task = CeleryTask.objects.get(pk=task_id)
         self.parent_task = self.task.parent
 
@@ -110,8 +131,7 @@ class TransactionImportProcess:
 
         self.ecosystem_default = EcosystemDefault.cache.get_cache(master_user_pk=self.master_user.pk)
 
-        self.find_default_rule_scenario()
-        self.find_error_rule_scenario()
+        self.build_rule_scenarios_index()
 
         self.result = TransactionImportResult()
         self.result.task = self.task
@@ -120,12 +140,27 @@ class TransactionImportProcess:
         self.process_type = ProcessType.CSV  # default type
         self.find_process_type()
 
+        # parallel import is split into parts, which are imported by sub tasks and
+        # merged by the parent task, part is given by ranges of rows of the file
+        self.row_ranges = self.task.options_object.get("row_ranges")
+        self.parallel = self.is_parallel()
+
         self.file_items = []  # items from provider  (json, csv, excel)
         self.raw_items = []  # items from provider  (json, csv, excel)
         self.conversion_items = []  # items with applied converions
         self.preprocessed_items = []  # items with calculated variables applied
         self.items = []  # result items that will be passed to TransactionTypeProcess
 
+        # in streaming import rows are processed by chunks, results of rows are written to files
+        self.streaming = self.is_streaming()
+        self.row_offset = 0  # rows of previous chunks
+        self.row_numbers = []  # rows of the file of part of parallel import
+        self.parts_results = []  # results of parts of parallel import, merged by the parent task
+        self.rows_counts = Counter()  # statuses of rows of previous chunks
+        self.report_rows_file = None
+        self.json_items_file = None
+        self.local_file_name = None
+
         self.context = {
             "master_user": self.master_user,
             "member": self.member,
@@ -139,17 +174,20 @@ class TransactionImportProcess:
             import_system_message_performed_by = "System"
             import_system_message_title = "Transaction import from broker (start)"
 
+        # parent task of parallel import does not book transactions itself
         self.prefetched_relations = {}
-        self.prefetch_relations()
+        if not self.parallel:
+            self.prefetch_relations()
 
-        send_system_message(
-            master_user=self.master_user,
-            performed_by=import_system_message_performed_by,
-            section="import",
-            type="success",
-            title=import_system_message_title,
-            description=f"{self.member.username} started import with scheme {self.scheme.name}",
-        )
+        if self.row_ranges is None and "parallel_parts" not in self.task.options_object:
+            send_system_message(
+                master_user=self.master_user,
+                performed_by=import_system_message_performed_by,
+                section="import",
+                type="success",
+                title=import_system_message_title,
+                description=f"{self.member.username} started import with scheme {self.scheme.name}",
+            )
 
         _l.info(f"self.scheme.book_uniqueness_settings {self.scheme.book_uniqueness_settings}")
 
@@ -182,10 +220,89 @@ class TransactionImportProcess:
             f"{time.perf_counter() - st:3.3f}",
         )
 
+    def is_streaming(self) -> bool:
+        """
+        Csv and excel files are imported by chunks of rows, if the whole file is not needed
+        for data preprocess expression. Parent task of parallel import only merges results of parts.
+        """
+        return bool(
+            not self.parallel
+            and self.task.options_object.get("streaming", settings.TRANSACTION_IMPORT_STREAMING)
+            and self.process_type in (ProcessType.CSV, ProcessType.EXCEL)
+            and not self.scheme.data_preprocess_expression
+        )
+
+    def is_parallel(self) -> bool:
+        """Csv and excel files of parent task are split into parts, imported by sub tasks"""
+        return bool(
+            self.row_ranges is None
+            and self.task.options_object.get("parallel", settings.TRANSACTION_IMPORT_PARALLEL)
+            and self.process_type in (ProcessType.CSV, ProcessType.EXCEL)
+            and not self.scheme.data_preprocess_expression
+        )
+
+    def get_row_number(self, index) -> int:
+        """Number of row of the file of item with index in the current items"""
+        if self.row_numbers:
+            return self.row_numbers[index]
+
+        return self.row_offset + index + 1
+
+    def get_total_rows(self) -> int:
+        return self.result.total_rows if self.streaming else len(self.items)
+
+    @staticmethod
+    def count_rows(items) -> Counter:
+        counts = Counter()
+
+        for item in items:
+            counts["rows"] += 1
+
+            if item.status == "error":
+                counts["error"] += 1
+
+            if item.status == "success":
+                counts["success"] += 1
+
+            if "skip" in item.status:
+                counts["skip"] += 1
+
+            if item.booked_transactions:
+                counts["booked"] += len(item.booked_transactions)
+
+        return counts
+
+    def get_rows_counts(self) -> Counter:
+        if self.streaming or self.parallel:
+            return self.rows_counts
+
+        return self.count_rows(self.result.items or [])
+
     def items_has_error(self):
-        return any(result_item.status == "error" for result_item in self.result.items)
+        return bool(self.get_rows_counts()["error"])
 
-    def generate_file_report(self):
+    @staticmethod
+    def get_file_report_row(result_item) -> str:
+        content = []
+
+        content.append(str(result_item.row_number))
+        content.append(result_item.status)
+
+        if result_item.error_message:
+            content.append(result_item.error_message)
+        elif result_item.message:
+            content.append(result_item.message)
+        else:
+            content.append("")
+
+        content_row_list = []
+
+        for item in content:
+            content_row_list.append('"' + str(item) + '"')
+
+        return ",".join(content_row_list)
+
+    def get_file_report_header(self) -> list:
         _l.info("TransactionImportProcess.generate_file_report error_handler %s", self.scheme.error_handler)
         _l.info(
             "TransactionImportProcess.generate_file_report missing_data_handler %s", self.scheme.missing_data_handler
@@ -203,24 +320,12 @@ class TransactionImportProcess:
 
         result.append("Import Rules - if object is not found, " + self.scheme.missing_data_handler)
 
-        success_rows_count = 0
-        error_rows_count = 0
-        skip_rows_count = 0
-
-        for result_item in self.result.items:
-            if result_item.status == "error":
-                error_rows_count = error_rows_count + 1
-
-            if result_item.status == "success":
-                success_rows_count = success_rows_count + 1
-
-            if "skip" in result_item.status:
-                skip_rows_count = skip_rows_count + 1
+        rows_counts = self.get_rows_counts()
 
         result.append(f"Rows total, {self.result.total_rows}")
-        result.append(f"Rows success import, {success_rows_count}")
-        result.append(f"Rows fail import, {error_rows_count}")
-        result.append(f"Rows skipped import, {skip_rows_count}")
+        result.append(f"Rows success import, {rows_counts['success']}")
+        result.append(f"Rows fail import, {rows_counts['error']}")
+        result.append(f"Rows skipped import, {rows_counts['skip']}")
 
         columns = ["Row Number", "Status", "Message"]
 
@@ -233,52 +338,48 @@ class TransactionImportProcess:
 
         result.append(column_row)
 
-        for result_item in self.result.items:
-            content = []
-
-            content.append(str(result_item.row_number))
-            content.append(result_item.status)
+        return result
 
-            if result_item.error_message:
-                content.append(result_item.error_message)
-            elif result_item.message:
-                content.append(result_item.message)
-            else:
-                content.append("")
+    def save_file_report(self, file_name, name, content_type, text=None, local_file=None):
+        file_report = FileReport()
 
-            content_row_list = []
+        if local_file is None:
+            file_report.upload_file(file_name=file_name, text=text, master_user=self.master_user)
+        else:
+            file_report.upload_local_file(file_name=file_name, local_file=local_file, master_user=self.master_user)
 
-            for item in content:
-                content_row_list.append('"' + str(item) + '"')
+        file_report.master_user = self.master_user
+        file_report.name = name
+        file_report.file_name = file_name
+        file_report.type = "transaction_import.import"
+        file_report.notes = "System File"
+        file_report.content_type = content_type
 
-            content_row = ",".join(content_row_list)
+        file_report.save()
 
-            result.append(content_row)
+        return file_report
 
-        result = "\n".join(result)
+    def generate_file_report(self):
+        result = self.get_file_report_header()
 
         current_date_time = now().strftime("%Y-%m-%d-%H-%M")
-
         file_name = f"file_report_{current_date_time}_task_{self.task.id}.csv"
+        name = f"Transaction Import {current_date_time} (Task {self.task.id}).csv"
 
-        file_report = FileReport()
+        if not self.streaming:
+            for result_item in self.result.items:
+                result.append(self.get_file_report_row(result_item))
 
-        # _l.info('TransactionImportProcess.generate_file_report uploading file')
+            return self.save_file_report(file_name, name, "text/csv", text="\n".join(result))
 
-        file_report.upload_file(file_name=file_name, text=result, master_user=self.master_user)
-        file_report.master_user = self.master_user
-        file_report.name = f"Transaction Import {current_date_time} (Task {self.task.id}).csv"
-        file_report.file_name = file_name
-        file_report.type = "transaction_import.import"
-        file_report.notes = "System File"
-        file_report.content_type = "text/csv"
+        with NamedTemporaryFile() as report_file:
+            report_file.write("\n".join(result).encode("utf-8"))
 
-        file_report.save()
-
-        # _l.info('TransactionImportProcess.file_report %s' % file_report)
-        # _l.info('TransactionImportProcess.file_report %s' % file_report.file_url)
+            self.report_rows_file.seek(0)
+            shutil.copyfileobj(self.report_rows_file, report_file)
 
-        return file_report
+            report_file.seek(0)
+            return self.save_file_report(file_name, name, "text/csv", local_file=report_file)
 
     def generate_json_report(self):
         serializer = TransactionImportResultSerializer(instance=self.result, context=self.context)
@@ -291,31 +392,45 @@ class TransactionImportProcess:
 
         current_date_time = now().strftime("%Y-%m-%d-%H-%M")
         file_name = f"file_report_{current_date_time}_task_{self.task.id}.json"
-
-        file_report = FileReport()
+        name = f"Transaction Import {current_date_time} (Task {self.task.id}).json"
 
         _l.info("TransactionImportProcess.generate_json_report uploading file")
 
-        # _l.info('Uploading result len %s' % len(result))
+        if not self.streaming:
+            return self.save_file_report(
+                file_name,
+                name,
+                "application/json",
+                text=json.dumps(result, indent=4, default=str),
+            )
 
-        file_report.upload_file(
-            file_name=file_name,
-            text=json.dumps(result, indent=4, default=str),
-            master_user=self.master_user,
-        )
-        file_report.master_user = self.master_user
-        file_report.name = f"Transaction Import {current_date_time} (Task {self.task.id}).json"
-        file_report.file_name = file_name
-        file_report.type = "transaction_import.import"
-        file_report.notes = "System File"
-        file_report.content_type = "application/json"
+        # items of rows are written to json_items_file after each chunk
+        with NamedTemporaryFile() as report_file:
+            report_file.write(b"{\n")
+            for key, value in result.items():
+                if key != "items":
+                    report_file.write(f"{json.dumps(key)}: {json.dumps(value, default=str)},\n".encode())
 
-        file_report.save()
+            report_file.write(b'"items": [\n')
+            self.json_items_file.seek(0)
+            shutil.copyfileobj(self.json_items_file, report_file)
+            report_file.write(b"\n]\n}\n")
 
-        # _l.info('TransactionImportProcess.json_report %s' % file_report)
-        # _l.info('TransactionImportProcess.json_report %s' % file_report.file_url)
+            report_file.seek(0)
+            return self.save_file_report(file_name, name, "application/json", local_file=report_file)
 
-        return file_report
+    def write_items_results(self):
+        """Write results of rows of the chunk to temporary report files of streaming import"""
+        for item in self.items:
+            if self.json_items_file.tell():
+                self.json_items_file.write(b",\n")
+
+            self.report_rows_file.write(f"\n{self.get_file_report_row(item)}".encode())
+            self.json_items_file.write(
+                json.dumps(TransactionImportProcessItemSerializer(instance=item).data, default=str).encode()
+            )
+
+        self.rows_counts += self.count_rows(self.items)
 
     def find_process_type(self):
         if self.task.options_object and "items" in self.task.options_object or ".json" in self.file_path:
@@ -346,24 +461,35 @@ class TransactionImportProcess:
 
         return v
 
-    def find_default_rule_scenario(self):
-        rule_scenarios = self.scheme.rule_scenarios.prefetch_related("fields").all()
+    def build_rule_scenarios_index(self):
+        """
+        Load rule scenarios of scheme with their fields and selector values once per import
+        and index them by selector value: value -> list of scenarios in the scheme order.
+        Scenario is listed once per its matching selector value, as it is booked by the row loop.
+        """
+        rule_scenarios = self.scheme.rule_scenarios.prefetch_related("fields", "selector_values").all()
 
         self.default_rule_scenario = None
+        self.error_rule_scenario = None
+        self.rule_scenarios_index = defaultdict(list)
 
         for scenario in rule_scenarios:
             if scenario.is_default_rule_scenario:
                 self.default_rule_scenario = scenario
 
-    def find_error_rule_scenario(self):
-        rule_scenarios = self.scheme.rule_scenarios.prefetch_related("fields").all()
-
-        self.error_rule_scenario = None
-
-        for scenario in rule_scenarios:
             if scenario.is_error_rule_scenario:
                 self.error_rule_scenario = scenario
 
+            for selector_value in scenario.selector_values.all():
+                self.rule_scenarios_index[selector_value.value].append(scenario)
+
+    def get_rule_scenarios(self, rule_value) -> list:
+        # selector values are strings, other rule values could not match them
+        if not isinstance(rule_value, str):
+            return []
+
+        return self.rule_scenarios_index.get(rule_value, [])
+
     def get_rule_value_for_item(self, item):
         try:
             return formula.safe_eval(self.scheme.rule_expr, names=item.inputs, context=self.context)
@@ -523,8 +649,8 @@ class TransactionImportProcess:
                     self.task.update_progress(
                         {
                             "current": self.result.processed_rows,
-                            "total": len(self.items),
-                            "percent": round(self.result.processed_rows / (len(self.items) / 100)),
+                            "total": self.get_total_rows(),
+                            "percent": round(self.result.processed_rows / (self.get_total_rows() / 100)),
                             "description": f"Going to skip {rule_scenario.transaction_type}",
                         }
                     )
@@ -565,8 +691,8 @@ class TransactionImportProcess:
                 self.task.update_progress(
                     {
                         "current": self.result.processed_rows,
-                        "total": len(self.items),
-                        "percent": round(self.result.processed_rows / (len(self.items) / 100)),
+                        "total": self.get_total_rows(),
+                        "percent": round(self.result.processed_rows / (self.get_total_rows() / 100)),
                         "description": f"Going to book {rule_scenario.transaction_type}",
                     }
                 )
@@ -587,6 +713,99 @@ class TransactionImportProcess:
 
                 raise BookUnhandledException(code=500, error_message=str(e)) from e
 
+    @contextmanager
+    def open_local_file(self, suffix=""):
+        """Name of local temporary copy of the imported file"""
+        if self.local_file_name:
+            # file is already downloaded for the whole streaming import
+            yield self.local_file_name
+            return
+
+        with storage.open(self.file_path, "rb") as f, NamedTemporaryFile(suffix=suffix) as tmpf:
+            for chunk in f.chunks():
+                tmpf.write(chunk)
+            tmpf.flush()
+
+            yield tmpf.name
+
+    def iter_csv_rows(self):
+        # TODO check encoding (maybe should be taken from scheme)
+        with self.open_local_file() as file_name, open(file_name, encoding="utf_8_sig", errors="ignore") as cf:
+            # TODO check quotechar (maybe should be taken from scheme)
+            yield from csv.reader(
+                cf,
+                delimiter=self.scheme.delimiter,
+                quotechar='"',
+                strict=False,
+                skipinitialspace=True,
+            )
+
+    def iter_excel_rows(self, read_only=False):
+        """
+        Rows of spreadsheet from its start cell, in read only mode rows are
+        read one by one, not loading the whole workbook in memory
+        """
+        with self.open_local_file(suffix=".xlsx") as file_name:
+            wb = load_workbook(filename=file_name, read_only=read_only)
+
+            try:
+                if (
+                    self.scheme.spreadsheet_active_tab_name
+                    and self.scheme.spreadsheet_active_tab_name in wb.sheetnames
+                ):
+                    ws = wb[self.scheme.spreadsheet_active_tab_name]
+                else:
+                    ws = wb.active
+
+                if self.scheme.spreadsheet_start_cell == "A1":
+                    for r in ws.rows:
+                        yield [cell.value for cell in r]
+                    return
+
+                start_cell_row_number = int(re.search(r"\d+", self.scheme.spreadsheet_start_cell)[0])
+                start_cell_letter = self.scheme.spreadsheet_start_cell.split(str(start_cell_row_number))[0]
+
+                start_cell_column_number = column_index_from_string(start_cell_letter)
+
+                if read_only:
+                    for r in ws.iter_rows(
+                        min_row=start_cell_row_number,
+                        min_col=start_cell_column_number,
+                        values_only=True,
+                    ):
+                        yield list(r)
+                    return
+
+                for row_number, r in enumerate(ws.rows, start=1):
+                    if row_number >= start_cell_row_number:
+                        yield [cell.value for cell in r if cell.column >= start_cell_column_number]
+
+            finally:
+                if read_only:
+                    wb.close()
+
+    def iter_file_items(self, read_only=False):
+        """Items of csv or excel file, the first row is the row of column names"""
+        if self.process_type == ProcessType.CSV:
+            rows = self.iter_csv_rows()
+        else:
+            rows = self.iter_excel_rows(read_only=read_only)
+
+        column_row = None
+
+        for row_index, row in enumerate(rows):
+            if row_index == 0:
+                column_row = row
+
+            else:
+                file_item = {}
+
+                for column_index, value in enumerate(row):
+                    key = column_row[column_index]
+                    file_item[key] = value
+
+                yield file_item
+
     def fill_with_file_items(self):  # noqa: PLR0912, PLR0915
         _l.info("TransactionImportProcess.Task %s. fill_with_raw_items INIT %s", self.task, self.process_type)
 
@@ -611,102 +830,12 @@ class TransactionImportProcess:
             if self.process_type == ProcessType.CSV:
                 _l.info("ProcessType.CSV self.file_path %s", self.file_path)
 
-                with storage.open(self.file_path, "rb") as f, NamedTemporaryFile() as tmpf:
-                    for chunk in f.chunks():
-                        tmpf.write(chunk)
-                    tmpf.flush()
-
-                    # TODO check encoding (maybe should be taken from scheme)
-                    with open(tmpf.name, encoding="utf_8_sig", errors="ignore") as cf:
-                        # TODO check quotechar (maybe should be taken from scheme)
-                        reader = csv.reader(
-                            cf,
-                            delimiter=self.scheme.delimiter,
-                            quotechar='"',
-                            strict=False,
-                            skipinitialspace=True,
-                        )
-
-                        column_row = None
-
-                        for row_index, row in enumerate(reader):
-                            if row_index == 0:
-                                column_row = row
-
-                            else:
-                                file_item = {}
-
-                                for column_index, value in enumerate(row):
-                                    key = column_row[column_index]
-                                    file_item[key] = value
-
-                                self.file_items.append(file_item)
-
-                        self.result.total_rows = len(self.file_items)
+                self.file_items = list(self.iter_file_items())
+                self.result.total_rows = len(self.file_items)
 
             if self.process_type == ProcessType.EXCEL:
-                with storage.open(self.file_path, "rb") as f, NamedTemporaryFile() as tmpf:
-                    for chunk in f.chunks():
-                        tmpf.write(chunk)
-                    tmpf.flush()
-
-                    os.link(tmpf.name, tmpf.name + ".xlsx")
-
-                    # _l.info('self.file_path %s' % self.file_path)
-                    # _l.info('tmpf.name %s' % tmpf.name)
-
-                    wb = load_workbook(filename=tmpf.name + ".xlsx")
-
-                    if (
-                        self.scheme.spreadsheet_active_tab_name
-                        and self.scheme.spreadsheet_active_tab_name in wb.sheetnames
-                    ):
-                        ws = wb[self.scheme.spreadsheet_active_tab_name]
-                    else:
-                        ws = wb.active
-
-                    reader = []
-
-                    if self.scheme.spreadsheet_start_cell == "A1":
-                        for r in ws.rows:
-                            reader.append([cell.value for cell in r])
-
-                    else:
-                        start_cell_row_number = int(re.search(r"\d+", self.scheme.spreadsheet_start_cell)[0])
-                        start_cell_letter = self.scheme.spreadsheet_start_cell.split(str(start_cell_row_number))[0]
-
-                        start_cell_column_number = column_index_from_string(start_cell_letter)
-
-                        row_number = 1
-
-                        for r in ws.rows:
-                            row_values = []
-
-                            if row_number >= start_cell_row_number:
-                                for cell in r:
-                                    if cell.column >= start_cell_column_number:
-                                        row_values.append(cell.value)
-
-                                reader.append(row_values)
-
-                            row_number = row_number + 1
-
-                    column_row = None
-
-                    for row_index, row in enumerate(reader):
-                        if row_index == 0:
-                            column_row = row
-
-                        else:
-                            file_item = {}
-
-                            for column_index, value in enumerate(row):
-                                key = column_row[column_index]
-                                file_item[key] = value
-
-                            self.file_items.append(file_item)
-
-                    self.result.total_rows = len(self.file_items)
+                self.file_items = list(self.iter_file_items())
+                self.result.total_rows = len(self.file_items)
 
             _l.info(
                 "TransactionImportProcess.Task %s. fill_with_raw_items %s DONE items %s",
@@ -768,13 +897,12 @@ class TransactionImportProcess:
 
         st = time.perf_counter()
 
-        row_number = 1
-        for raw_item in self.raw_items:
+        for index, raw_item in enumerate(self.raw_items):
             conversion_item = TransactionImportConversionItem()
-            conversion_item.file_inputs = self.file_items[row_number - 1]
+            conversion_item.file_inputs = self.file_items[index]
             conversion_item.raw_inputs = raw_item
             conversion_item.conversion_inputs = {}
-            conversion_item.row_number = row_number
+            conversion_item.row_number = self.get_row_number(index)
 
             for scheme_input in self.scheme.inputs.all():
                 ## passing first column from shema page
@@ -795,8 +923,6 @@ class TransactionImportProcess:
 
             self.conversion_items.append(conversion_item)
 
-            row_number = row_number + 1
-
         _l.info(
             "TransactionImportProcess: apply_conversion_to_raw_items done: %s",
             f"{time.perf_counter() - st:3.3f}",
@@ -807,20 +933,16 @@ class TransactionImportProcess:
     # so it means, in first iterations we will got errors in that inputs
     def recursive_preprocess(self, deep=1, current_level=0):
         if len(self.preprocessed_items) == 0:
-            row_number = 1
-
             for conversion_item in self.conversion_items:
                 preprocess_item = TransactionImportProcessPreprocessItem()
                 preprocess_item.file_inputs = conversion_item.file_inputs
                 preprocess_item.raw_inputs = conversion_item.raw_inputs
                 preprocess_item.conversion_inputs = conversion_item.conversion_inputs
-                preprocess_item.row_number = row_number
+                preprocess_item.row_number = conversion_item.row_number
                 preprocess_item.inputs = {}
 
                 self.preprocessed_items.append(preprocess_item)
 
-                row_number = row_number + 1
-
         for preprocess_item in self.preprocessed_items:
             # CREATE SCHEME INPUTS
 
@@ -947,58 +1069,46 @@ class TransactionImportProcess:
                 )
 
                 if rule_value:
-                    found = False
+                    rule_scenarios = self.get_rule_scenarios(rule_value)
+                    found = bool(rule_scenarios)
 
-                    for rule_scenario in self.scheme.rule_scenarios.all():
+                    for rule_scenario in rule_scenarios:
+                        # scenario in skip mode only marks selector value as found
                         if rule_scenario.status != "skip":
-                            selector_values = rule_scenario.selector_values.all()
-
-                            for selector_value in selector_values:
-                                if selector_value.value == rule_value:
-                                    # sid = transaction.savepoint()
-                                    # _l.info("Create checkpoint for %s" % index)
-
-                                    found = True
-                                    try:
-                                        self.book(item, rule_scenario)
-
-                                        # _l.info("Savepoint commit for %s" % index)
-                                        # _l.error("Could not book error scenario %s" % e)
-                                        # transaction.savepoint_commit(sid)
-
-                                    except BookSkipException:
-                                        # _l.info("BookSkipException")
-                                        # transaction.savepoint_rollback(sid)
-                                        continue
-
-                                    except (
-                                        Exception,
-                                        BookUnhandledException,
-                                        BookException,
-                                    ) as e:
-                                        # transaction.savepoint_rollback(sid)
-
-                                        _l.error(
-                                            f"Catch BookUnhandledException trying to book error_rule_scenario {e}"
-                                        )
-
-                                        try:
-                                            self.book(item, self.error_rule_scenario, error=e)
-                                            # _l.info("Error Handler Savepoint commit for %s" % index)
-                                            # transaction.savepoint_commit(sid)
-
-                                        except Exception as e:
-                                            # any exception will work on error scenario
-                                            _l.error(f"Could not book error scenario {e}")
-                                            # _l.info("Error Handler Savepoint rollback for %s" % index)
-                                            # transaction.savepoint_rollback(sid)
-                        else:
-                            """For case when its actually skip mode"""
-                            selector_values = rule_scenario.selector_values.all()
-
-                            for selector_value in selector_values:
-                                if selector_value.value == rule_value:
-                                    found = True
+                            # sid = transaction.savepoint()
+                            # _l.info("Create checkpoint for %s" % index)
+
+                            try:
+                                self.book(item, rule_scenario)
+
+                                # _l.info("Savepoint commit for %s" % index)
+                                # _l.error("Could not book error scenario %s" % e)
+                                # transaction.savepoint_commit(sid)
+
+                            except BookSkipException:
+                                # _l.info("BookSkipException")
+                                # transaction.savepoint_rollback(sid)
+                                continue
+
+                            except (
+                                Exception,
+                                BookUnhandledException,
+                                BookException,
+                            ) as e:
+                                # transaction.savepoint_rollback(sid)
+
+                                _l.error(f"Catch BookUnhandledException trying to book error_rule_scenario {e}")
+
+                                try:
+                                    self.book(item, self.error_rule_scenario, error=e)
+                                    # _l.info("Error Handler Savepoint commit for %s" % index)
+                                    # transaction.savepoint_commit(sid)
+
+                                except Exception as e:
+                                    # any exception will work on error scenario
+                                    _l.error(f"Could not book error scenario {e}")
+                                    # _l.info("Error Handler Savepoint rollback for %s" % index)
+                                    # transaction.savepoint_rollback(sid)
 
                     if not found:
                         # sid = transaction.savepoint()
@@ -1035,8 +1145,8 @@ class TransactionImportProcess:
                 self.task.update_progress(
                     {
                         "current": self.result.processed_rows,
-                        "total": len(self.items),
-                        "percent": round(self.result.processed_rows / (len(self.items) / 100)),
+                        "total": self.get_total_rows(),
+                        "percent": round(self.result.processed_rows / (self.get_total_rows() / 100)),
                         "description": f"Row {self.result.processed_rows} processed",
                     }
                 )
@@ -1062,26 +1172,238 @@ class TransactionImportProcess:
         )
 
     def get_verbose_result(self):
-        booked_count = 0
-        error_count = 0
-
-        for item in self.result.items:
-            if item.status == "error":
-                error_count = error_count + 1
-
-            if item.booked_transactions:
-                booked_count = booked_count + len(item.booked_transactions)
+        rows_counts = self.get_rows_counts()
 
         result = (
-            f"Processed {len(self.items)} rows and successfully booked {booked_count} "
-            f"transactions. Error rows {error_count}"
+            f"Processed {rows_counts['rows']} rows and successfully booked {rows_counts['booked']} "
+            f"transactions. Error rows {rows_counts['error']}"
         )
 
         return result
 
+    def process_chunks(self):
+        """
+        Streaming import: rows of file are read, preprocessed and booked by chunks,
+        results of rows are written to report files after each chunk, so memory used
+        by the import does not depend on size of the file. Calculated inputs see only
+        items of their chunk in transaction_import context.
+        """
+        _l.info(f"TransactionImportProcess.Task {self.task}. process_chunks INIT")
+        st = time.perf_counter()
+
+        suffix = ".xlsx" if self.process_type == ProcessType.EXCEL else ""
+        with self.open_local_file(suffix=suffix) as local_file_name:
+            self.local_file_name = local_file_name
+
+            try:
+                # rows are counted by a separate read of the local file, total is needed for the progress
+                self.result.total_rows = sum(1 for _ in self.iter_file_items(read_only=True))
+
+                file_items = self.iter_file_items(read_only=True)
+                while chunk := list(islice(file_items, settings.TRANSACTION_IMPORT_CHUNK_SIZE)):
+                    self.file_items = chunk
+                    self.raw_items = []
+                    self.conversion_items = []
+                    self.preprocessed_items = []
+                    self.items = []
+
+                    self.fill_with_raw_items()
+                    self.apply_conversion_to_raw_items()
+                    self.preprocess()
+                    self.process_items()
+
+                    self.write_items_results()
+                    self.row_offset = self.row_offset + len(chunk)
+
+            finally:
+                self.local_file_name = None
+
+        self.result.items = []
+
+        _l.info(
+            "TransactionImportProcess: process_chunks done: %s",
+            f"{time.perf_counter() - st:3.3f}",
+        )
+
+    def get_partition_key(self, index, file_item):
+        """
+        Rows with the same key are imported by the same part in order of the file,
+        key is the converted value of scheme input, e.g. portfolio.
+        Without the partition input every row is its own partition.
+        """
+        if self.partition_input is None:
+            return index
+
+        raw_item = {
+            scheme_input.name: file_item.get(scheme_input.column_name) for scheme_input in self.scheme.inputs.all()
+        }
+
+        try:
+            value = formula.safe_eval(self.partition_input.name_expr, names=raw_item, context=self.context)
+        except Exception:
+            value = raw_item[self.partition_input.name]
+
+        return str(value)
+
+    def get_parallel_chunk_size(self, total_rows) -> int:
+        """Rows are spread over workers, but parts are neither too small nor too large"""
+        chunk_size = math.ceil(total_rows / max(settings.TRANSACTION_IMPORT_PARALLEL_WORKERS, 1))
+
+        return max(
+            settings.TRANSACTION_IMPORT_PARALLEL_MIN_CHUNK_SIZE,
+            min(chunk_size, settings.TRANSACTION_IMPORT_CHUNK_SIZE),
+        )
+
+    def partition_rows(self) -> list:
+        """
+        Read the file once and split its rows into parts: list of row ranges of each part.
+        Rows of one partition are never split between parts, so their order is kept.
+        """
+        partition_by = self.task.options_object.get("partition_by", settings.TRANSACTION_IMPORT_PARALLEL_PARTITION_BY)
+        self.partition_input = self.scheme.inputs.filter(name=partition_by).first() if partition_by else None
+
+        partitions = defaultdict(list)  # key -> row indexes, in order of first rows of partitions
+        total_rows = 0
+
+        for index, file_item in enumerate(self.iter_file_items(read_only=True)):
+            partitions[self.get_partition_key(index, file_item)].append(index)
+            total_rows = index + 1
+
+        self.result.total_rows = total_rows
+        chunk_size = self.get_parallel_chunk_size(total_rows)
+
+        chunks = []
+        chunk = []
+        for indexes in partitions.values():
+            if chunk and len(chunk) + len(indexes) > chunk_size:
+                chunks.append(chunk)
+                chunk = []
+
+            chunk.extend(indexes)
+
+        if chunk:
+            chunks.append(chunk)
+
+        return [to_row_ranges(sorted(chunk)) for chunk in chunks]
+
+    def create_parts(self) -> list:
+        """Sub tasks of parallel import, they read only their ranges of rows of the same file"""
+        st = time.perf_counter()
+
+        parts = []
+        for row_ranges in self.partition_rows():
+            part = CeleryTask.objects.create(
+                master_user=self.master_user,
+                member=self.member,
+                parent=self.task,
+                type=self.task.type,
+                verbose_name=self.task.verbose_name,
+            )
+            part.options_object = {**self.task.options_object, "row_ranges": row_ranges}
+            part.save()
+
+            parts.append(part)
+
+        options_object = self.task.options_object
+        options_object["total_rows"] = self.result.total_rows
+        options_object["parallel_parts"] = [part.id for part in parts]
+        self.task.options_object = options_object
+        self.task.save()
+
+        _l.info(
+            f"TransactionImportProcess.Task {self.task}. create_parts {len(parts)} parts of "
+            f"{self.result.total_rows} rows done: {time.perf_counter() - st:3.3f}"
+        )
+
+        return parts
+
+    def iter_part_file_items(self):
+        """Index and item of rows of the file within row ranges of the part"""
+        ranges = iter(self.row_ranges)
+        start, end = next(ranges, (None, None))
+
+        for index, file_item in enumerate(self.iter_file_items(read_only=True)):
+            while end is not None and index >= end:
+                start, end = next(ranges, (None, None))
+
+            if end is None:
+                return
+
+            if index >= start:
+                yield index, file_item
+
+    def process_part(self) -> dict:
+        """Import rows of the part of parallel import, results of rows are merged by the parent task"""
+        try:
+            for index, file_item in self.iter_part_file_items():
+                self.file_items.append(file_item)
+                self.row_numbers.append(index + 1)
+
+            self.result.total_rows = len(self.file_items)
+
+            self.fill_with_raw_items()
+            self.apply_conversion_to_raw_items()
+            self.preprocess()
+
+            with deferred_related_saves():
+                self.process_items()
+
+        except Exception as e:
+            _l.error(
+                f"TransactionImportProcess.Task {self.task}. process_part Exception {e} "
+                f"Traceback {traceback.format_exc()}"
+            )
+
+            self.result.error_message = f"General Import Error. Exception {e}"
+
+        return {
+            "error_message": self.result.error_message,
+            "processed_rows": self.result.processed_rows,
+            "rows_counts": self.count_rows(self.items),
+            "items": TransactionImportProcessItemSerializer(instance=self.items, many=True).data,
+        }
+
+    def collect_parts_results(self):
+        """
+        Merge results of rows of parts of parallel import in order of rows of the file,
+        results of parts are passed to the parent task by the chord of parts
+        """
+        items = []
+        error_messages = []
+
+        for part_result in self.parts_results:
+            if part_result.get("error_message"):
+                error_messages.append(part_result["error_message"])
+
+            self.rows_counts.update(part_result.get("rows_counts", {}))
+            self.result.processed_rows = self.result.processed_rows + part_result.get("processed_rows", 0)
+
+            for item_data in part_result.get("items", []):
+                item = TransactionImportProcessItem()
+                for key, value in item_data.items():
+                    setattr(item, key, value)
+
+                items.append(item)
+
+        self.result.total_rows = self.task.options_object["total_rows"]
+        self.result.items = sorted(items, key=lambda item: item.row_number)
+
+        if error_messages:
+            self.result.error_message = "\n".join(error_messages)
+
     def process(self):
+        if self.streaming:
+            self.report_rows_file = NamedTemporaryFile()  # noqa: SIM115
+            self.json_items_file = NamedTemporaryFile()  # noqa: SIM115
+
         try:
-            self.process_items()
+            with deferred_related_saves():
+                if self.parallel:
+                    self.collect_parts_results()
+                elif self.streaming:
+                    self.process_chunks()
+                else:
+                    self.process_items()
 
         except Exception as e:
             _l.error(
@@ -1107,23 +1429,23 @@ class TransactionImportProcess:
             self.result.reports.append(self.generate_file_report())
             self.result.reports.append(self.generate_json_report())
 
-            if self.items_has_error():
-                error_rows_count = 0
-                for result_item in self.result.items:
-                    if result_item.status == "error":
-                        error_rows_count = error_rows_count + 1
-
-                if error_rows_count != 0:
-                    send_system_message(
-                        master_user=self.master_user,
-                        action_status="required",
-                        type="warning",
-                        title=f"Transaction Import Partially Failed. Task id: {self.task.id}",
-                        description=f"Error rows {error_rows_count}/{len(self.result.items)}",
-                    )
+            if self.streaming:
+                self.report_rows_file.close()
+                self.json_items_file.close()
+
+            rows_counts = self.get_rows_counts()
+
+            if rows_counts["error"]:
+                send_system_message(
+                    master_user=self.master_user,
+                    action_status="required",
+                    type="warning",
+                    title=f"Transaction Import Partially Failed. Task id: {self.task.id}",
+                    description=f"Error rows {rows_counts['error']}/{rows_counts['rows']}",
+                )
 
             system_message_description = (
-                f"New transactions created (Import scheme - {str(self.scheme.name)}) - {len(self.items)}"
+                f"New transactions created (Import scheme - {str(self.scheme.name)}) - {rows_counts['rows']}"
             )
 
             import_system_message_title = "Transaction import (finished)"
@@ -2,6 +2,9 @@ import json
 import logging
 import traceback
 
+from celery import chord
+from django.db import transaction
+
 from poms.celery_tasks import finmars_task
 from poms.transaction_import.handlers import TransactionImportProcess
 
@@ -16,6 +19,47 @@ def transaction_import(self, task_id, procedure_instance_id=None, *args, **kwarg
             procedure_instance_id=procedure_instance_id,
         )
 
+        if instance.row_ranges is not None:
+            # part of parallel import, its results are merged by transaction_import_parallel_finish
+            return json.dumps(instance.process_part(), default=str)
+
+        if instance.parallel:
+            parts = instance.create_parts()
+            context = {
+                "space_code": instance.master_user.space_code,
+                "realm_code": instance.master_user.realm_code,
+            }
+
+            # parent task is pending until its parts are merged by transaction_import_parallel_finish
+            self.finish_by_other_task()
+            self.finmars_task.update_progress(
+                {
+                    "current": 0,
+                    "total": len(parts),
+                    "percent": 0,
+                    "description": f"Import is split into {len(parts)} parts",
+                }
+            )
+
+            transaction.on_commit(
+                lambda: chord(
+                    [transaction_import.si(task_id=part.id, context=context) for part in parts],
+                    transaction_import_parallel_finish.s(
+                        task_id=task_id,
+                        procedure_instance_id=procedure_instance_id,
+                        context=context,
+                    ),
+                ).apply_async()
+            )
+
+            return json.dumps({"message": f"Import is split into {len(parts)} parts"})
+
+        if instance.streaming:
+            # file is read, preprocessed and booked by chunks of rows
+            instance.process()
+
+            return json.dumps(instance.import_result, default=str)
+
         self.finmars_task.update_progress(
             {
                 "current": 0,
@@ -85,3 +129,23 @@ def transaction_import(self, task_id, procedure_instance_id=None, *args, **kwarg
     except Exception as e:
         _l.error(f"transaction_import error {repr(e)} traceback {traceback.format_exc()}")
         raise e
+
+
+@finmars_task(name="transaction_import.transaction_import_parallel_finish", bind=True)
+def transaction_import_parallel_finish(self, parts_results, task_id, procedure_instance_id=None, *args, **kwargs):
+    try:
+        instance = TransactionImportProcess(
+            task_id=task_id,
+            procedure_instance_id=procedure_instance_id,
+        )
+
+        # results of rows of parts, returned by transaction_import of parts to the chord,
+        # are merged into reports of the parent task
+        instance.parts_results = [json.loads(part_result) for part_result in parts_results]
+        instance.process()
+
+        return json.dumps(instance.import_result, default=str)
+
+    except Exception as e:
+        _l.error(f"transaction_import_parallel_finish error {repr(e)} traceback {traceback.format_exc()}")
+        raise e
@@ -0,0 +1,157 @@
+import csv
+import io
+import os
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from openpyxl import Workbook
+
+from poms.celery_tasks.models import CeleryTask
+from poms.integrations.models import (
+    ComplexTransactionImportScheme,
+    ComplexTransactionImportSchemeInput,
+    ComplexTransactionImportSchemeRuleScenario,
+    ComplexTransactionImportSchemeSelectorValue,
+)
+from poms.transaction_import.exceptions import BookException
+from poms.transaction_import.handlers import TransactionImportProcess
+from poms.transaction_import.models import TransactionImportBookedTransaction
+
+COLUMNS = ["type", "portfolio", "amount"]
+
+
+# noinspection PyUnresolvedReferences
+class TransactionImportTestMixin:
+    """
+    Transaction import with files kept in memory and fake booking of rows:
+    rows with amount "bad" fail, other rows are booked by their rule scenario
+    """
+
+    def init_transaction_import(self):
+        self.files = {}  # file path -> content of imported file
+        self.reports = {}  # file name -> content of saved report
+        self.booked = []  # (row number, rule scenario name) of booked rows
+
+        self.storage = self.start_patch("poms.transaction_import.handlers.storage")
+        self.storage.open.side_effect = lambda path, *args, **kwargs: ContentFile(self.files[path])
+
+        reports_storage = self.start_patch("poms.file_reports.models.storage")
+        reports_storage.save.side_effect = self.save_report
+
+        self.start_patch("poms.transaction_import.handlers.send_system_message")
+        self.start_patch("poms.transaction_import.handlers.TransactionImportProcess.book", self.book)
+
+        self.scheme = ComplexTransactionImportScheme.objects.create(
+            user_code=self.random_string(),
+            master_user=self.master_user,
+            owner=self.member,
+            rule_expr="type",
+        )
+        for column, name in enumerate(COLUMNS):
+            ComplexTransactionImportSchemeInput.objects.create(
+                scheme=self.scheme,
+                name=name,
+                column=column,
+                column_name=name,
+                name_expr=name,
+            )
+
+    def start_patch(self, target, new=mock.DEFAULT):
+        patcher = mock.patch(target, new)
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def save_report(self, path, content):
+        self.reports[os.path.basename(path)] = content.read().decode()
+        return path
+
+    def get_report(self, task, extension) -> str:
+        return next(content for name, content in self.reports.items() if name.endswith(f"_task_{task.id}.{extension}"))
+
+    def book(self, item, rule_scenario, error=None):
+        if rule_scenario is None:
+            raise RuntimeError("Rule scenario is not set")
+
+        item.processed_rule_scenarios.append(rule_scenario)
+
+        if error is not None:
+            item.status = "error"
+            item.error_message = str(error)
+            return
+
+        if item.inputs["amount"] == "bad":
+            item.status = "error"
+            raise BookException(code=400, error_message="Invalid amount")
+
+        item.status = "success"
+        item.booked_transactions.append(
+            TransactionImportBookedTransaction(code=item.row_number, text=rule_scenario.name)
+        )
+        self.booked.append((item.row_number, rule_scenario.name))
+
+    def add_rule_scenario(self, name, values, **kwargs) -> ComplexTransactionImportSchemeRuleScenario:
+        rule_scenario = ComplexTransactionImportSchemeRuleScenario.objects.create(
+            scheme=self.scheme,
+            name=name,
+            transaction_type=name,
+            **kwargs,
+        )
+        for value in values:
+            rule_scenario.selector_values.add(
+                ComplexTransactionImportSchemeSelectorValue.objects.create(scheme=self.scheme, value=value)
+            )
+
+        return rule_scenario
+
+    @staticmethod
+    def csv_content(rows) -> bytes:
+        content = io.StringIO()
+        csv.writer(content).writerows([COLUMNS, *rows])
+        return content.getvalue().encode()
+
+    @staticmethod
+    def excel_content(rows) -> bytes:
+        wb = Workbook()
+        for row in [COLUMNS, *rows]:
+            wb.active.append(row)
+
+        content = io.BytesIO()
+        wb.save(content)
+        return content.getvalue()
+
+    def create_import_task(self, file_path, rows, **options) -> CeleryTask:
+        if file_path.endswith(".xlsx"):
+            self.files[file_path] = self.excel_content(rows)
+        else:
+            self.files[file_path] = self.csv_content(rows)
+
+        task = CeleryTask.objects.create(
+            master_user=self.master_user,
+            member=self.member,
+            verbose_name="Transaction Import",
+            type="transaction_import",
+            status=CeleryTask.STATUS_PENDING,
+        )
+        task.options_object = {
+            "scheme_id": self.scheme.id,
+            "execution_context": None,
+            "file_path": file_path,
+            **options,
+        }
+        task.save()
+
+        return task
+
+    def run_import(self, task) -> TransactionImportProcess:
+        """Import file of the task in the same way as transaction_import task does"""
+        instance = TransactionImportProcess(task_id=task.id)
+
+        if not instance.streaming:
+            instance.fill_with_file_items()
+            instance.fill_with_raw_items()
+            instance.apply_conversion_to_raw_items()
+            instance.preprocess()
+
+        instance.process()
+
+        return instance
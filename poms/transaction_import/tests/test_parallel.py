@@ -0,0 +1,139 @@
+import json
+from unittest import mock
+
+from django.test import override_settings
+
+from poms.celery_tasks.models import CeleryTask
+from poms.common.common_base_test import BaseTestCase
+from poms.transaction_import.handlers import TransactionImportProcess, to_row_ranges
+from poms.transaction_import.tasks import transaction_import, transaction_import_parallel_finish
+from poms.transaction_import.tests.mixin import TransactionImportTestMixin
+
+ROWS = [
+    ["BUY", "p1", "10"],
+    ["BUY", "p2", "bad"],
+    ["BUY", "p1", "20"],
+    ["SELL", "p3", "5"],
+    ["BUY", "p2", "7"],
+    ["BUY", "p1", "bad"],
+]
+
+
+@override_settings(TRANSACTION_IMPORT_PARALLEL_WORKERS=2, TRANSACTION_IMPORT_PARALLEL_MIN_CHUNK_SIZE=1)
+class ParallelImportTest(TransactionImportTestMixin, BaseTestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        super().setUp()
+        self.init_test_case()
+        self.init_transaction_import()
+
+        self.add_rule_scenario("buy", ["BUY"])
+        self.add_rule_scenario("default", [], is_default_rule_scenario=True)
+        self.add_rule_scenario("error", [], is_error_rule_scenario=True)
+
+    def test_to_row_ranges(self):
+        self.assertEqual(to_row_ranges([]), [])
+        self.assertEqual(to_row_ranges([0, 1, 2, 5, 6, 9]), [[0, 3], [5, 7], [9, 10]])
+
+    def test_partition_rows(self):
+        task = self.create_import_task("import.csv", ROWS, parallel=True, partition_by="portfolio")
+        instance = TransactionImportProcess(task_id=task.id)
+
+        # rows of portfolio p1 are not split, p2 and p3 fill the second part
+        self.assertEqual(
+            instance.partition_rows(),
+            [[[0, 1], [2, 3], [5, 6]], [[1, 2], [3, 5]]],
+        )
+        self.assertEqual(instance.result.total_rows, 6)
+
+    def test_partition_rows_without_partition_input(self):
+        task = self.create_import_task("import.csv", ROWS, parallel=True)
+        instance = TransactionImportProcess(task_id=task.id)
+
+        self.assertEqual(instance.partition_rows(), [[[0, 3]], [[3, 6]]])
+
+    def test_streaming_is_off_in_parent_task(self):
+        task = self.create_import_task("import.csv", ROWS, parallel=True, streaming=True)
+        instance = TransactionImportProcess(task_id=task.id)
+
+        self.assertTrue(instance.parallel)
+        self.assertFalse(instance.streaming)
+
+    def test_parts_are_merged_in_order_of_rows(self):
+        task = self.create_import_task("import.csv", ROWS, streaming=False)
+        instance = self.run_import(task)
+        booked = sorted(self.booked)
+        self.booked = []
+
+        parallel_task = self.create_import_task(
+            "import.csv",
+            ROWS,
+            parallel=True,
+            streaming=True,
+            partition_by="portfolio",
+        )
+        parts = TransactionImportProcess(task_id=parallel_task.id).create_parts()
+        self.assertEqual(len(parts), 2)
+
+        parts_results = [
+            json.dumps(TransactionImportProcess(task_id=part.id).process_part(), default=str) for part in parts
+        ]
+        # booked by parts in order of rows of each part
+        self.assertEqual(self.booked, [(1, "buy"), (3, "buy"), (4, "default"), (5, "buy")])
+        self.assertEqual(sorted(self.booked), booked)
+
+        parallel_instance = TransactionImportProcess(task_id=parallel_task.id)
+        parallel_instance.parts_results = [json.loads(part_result) for part_result in parts_results]
+        parallel_instance.process()
+
+        self.assertEqual([item.row_number for item in parallel_instance.result.items], [1, 2, 3, 4, 5, 6])
+        self.assertEqual(parallel_instance.result.total_rows, 6)
+        self.assertEqual(parallel_instance.result.processed_rows, 6)
+        self.assertEqual(parallel_instance.get_rows_counts(), instance.get_rows_counts())
+        self.assertEqual(
+            dict(parallel_instance.get_rows_counts()),
+            {"rows": 6, "success": 4, "error": 2, "booked": 4},
+        )
+        self.assertEqual(self.get_report(parallel_task, "csv"), self.get_report(task, "csv"))
+
+    def test_part_errors_are_merged(self):
+        task = self.create_import_task("import.csv", ROWS, parallel=True, partition_by="portfolio")
+        instance = TransactionImportProcess(task_id=task.id)
+        instance.create_parts()
+
+        instance.parts_results = [
+            {"error_message": "first part error", "processed_rows": 0, "rows_counts": {}, "items": []},
+            {"error_message": "", "processed_rows": 0, "rows_counts": {}, "items": []},
+            {"error_message": "third part error", "processed_rows": 0, "rows_counts": {}, "items": []},
+        ]
+        instance.collect_parts_results()
+
+        self.assertEqual(instance.result.error_message, "first part error\nthird part error")
+
+    def test_parts_results_are_passed_to_finish_task(self):
+        task = self.create_import_task("import.csv", ROWS, parallel=True, partition_by="portfolio")
+
+        with mock.patch("poms.transaction_import.tasks.chord") as chord, self.captureOnCommitCallbacks(execute=True):
+            transaction_import.apply(kwargs={"task_id": task.id})
+
+        # parent task is pending until the parts are merged
+        task.refresh_from_db()
+        self.assertEqual(task.status, CeleryTask.STATUS_PENDING)
+        self.assertEqual(task.progress_object["description"], "Import is split into 2 parts")
+
+        header, callback = chord.call_args.args
+        self.assertEqual(len(header), 2)
+        self.assertEqual(callback.task, "transaction_import.transaction_import_parallel_finish")
+        # results of parts are passed to the callback, not read from parts tasks
+        self.assertFalse(callback.immutable)
+
+        parts_results = [
+            json.dumps(TransactionImportProcess(task_id=part.kwargs["task_id"]).process_part(), default=str)
+            for part in header
+        ]
+        transaction_import_parallel_finish(parts_results, task_id=task.id)
+
+        task.refresh_from_db()
+        self.assertEqual(task.verbose_result, "Processed 6 rows and successfully booked 4 transactions. Error rows 2")
+        self.assertEqual([item["row_number"] for item in task.result_object["items"]], [1, 2, 3, 4, 5, 6])
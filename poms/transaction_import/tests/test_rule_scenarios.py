@@ -0,0 +1,70 @@
+from poms.common.common_base_test import BaseTestCase
+from poms.transaction_import.handlers import TransactionImportProcess
+from poms.transaction_import.tests.mixin import TransactionImportTestMixin
+
+
+class RuleScenariosIndexTest(TransactionImportTestMixin, BaseTestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        super().setUp()
+        self.init_test_case()
+        self.init_transaction_import()
+
+        self.add_rule_scenario("buy", ["BUY", "PURCHASE"])
+        self.add_rule_scenario("fee", ["FEE", "BUY"])
+        self.add_rule_scenario("buy_again", ["BUY", "BUY"])
+        self.add_rule_scenario("ignored", ["IGNORE"], status="skip")
+        self.default_rule_scenario = self.add_rule_scenario("default", [], is_default_rule_scenario=True)
+        self.error_rule_scenario = self.add_rule_scenario("error", [], is_error_rule_scenario=True)
+
+    def get_linear_rule_scenarios(self, rule_value) -> list:
+        """Scenarios matching rule value as found by the loop over scenarios of scheme"""
+        rule_scenarios = []
+
+        for rule_scenario in self.scheme.rule_scenarios.all():
+            for selector_value in rule_scenario.selector_values.all():
+                if selector_value.value == rule_value:
+                    rule_scenarios.append(rule_scenario)
+
+        return rule_scenarios
+
+    def test_index_matches_linear_lookup(self):
+        instance = TransactionImportProcess(task_id=self.create_import_task("import.csv", []).id)
+
+        self.assertEqual(instance.default_rule_scenario, self.default_rule_scenario)
+        self.assertEqual(instance.error_rule_scenario, self.error_rule_scenario)
+
+        for rule_value in ("BUY", "PURCHASE", "FEE", "IGNORE", "SELL", "buy", 1, None):
+            self.assertEqual(
+                [rule_scenario.name for rule_scenario in instance.get_rule_scenarios(rule_value)],
+                [rule_scenario.name for rule_scenario in self.get_linear_rule_scenarios(rule_value)],
+                rule_value,
+            )
+
+        self.assertEqual(
+            [rule_scenario.name for rule_scenario in instance.get_rule_scenarios("BUY")],
+            ["buy", "fee", "buy_again", "buy_again"],
+        )
+
+    def test_rows_are_booked_in_scheme_order(self):
+        rows = [
+            ["BUY", "p1", "10"],
+            ["IGNORE", "p1", "10"],
+            ["SELL", "p1", "10"],
+            ["FEE", "p1", "bad"],
+        ]
+        instance = self.run_import(self.create_import_task("import.csv", rows))
+
+        self.assertEqual(
+            self.booked,
+            [(1, "buy"), (1, "fee"), (1, "buy_again"), (1, "buy_again"), (3, "default")],
+        )
+        self.assertEqual(
+            [(item.row_number, item.status) for item in instance.result.items],
+            [(1, "success"), (2, "init"), (3, "success"), (4, "error")],
+        )
+        self.assertEqual(
+            [rule_scenario.name for rule_scenario in instance.result.items[3].processed_rule_scenarios],
+            ["fee", "error"],
+        )
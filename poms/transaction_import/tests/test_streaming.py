@@ -0,0 +1,85 @@
+import json
+
+from django.test import override_settings
+
+from poms.common.common_base_test import BaseTestCase
+from poms.transaction_import.handlers import TransactionImportProcess
+from poms.transaction_import.tests.mixin import TransactionImportTestMixin
+
+ROWS = [
+    ["BUY", "p1", "10"],
+    ["BUY", "p1", "bad"],
+    ["SELL", "p1", "5"],
+    ["BUY", "p2", "7"],
+    ["BUY", "p2", "8"],
+]
+
+
+@override_settings(TRANSACTION_IMPORT_CHUNK_SIZE=2)
+class StreamingImportTest(TransactionImportTestMixin, BaseTestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        super().setUp()
+        self.init_test_case()
+        self.init_transaction_import()
+
+        self.add_rule_scenario("buy", ["BUY"])
+        self.add_rule_scenario("default", [], is_default_rule_scenario=True)
+        self.add_rule_scenario("error", [], is_error_rule_scenario=True)
+
+    def get_json_report(self, task) -> dict:
+        report = json.loads(self.get_report(task, "json"))
+        report.pop("task")
+        report.pop("reports")
+        return report
+
+    def assert_streaming_import_equal_to_whole_file_import(self, file_path):
+        task = self.create_import_task(file_path, ROWS, streaming=False)
+        instance = self.run_import(task)
+        self.assertFalse(instance.streaming)
+        booked = self.booked
+        self.booked = []
+
+        streaming_task = self.create_import_task(file_path, ROWS, streaming=True)
+        self.storage.open.reset_mock()
+        streaming_instance = self.run_import(streaming_task)
+
+        self.assertTrue(streaming_instance.streaming)
+        self.storage.open.assert_called_once()
+        self.assertEqual(self.booked, booked)
+        self.assertEqual(self.booked, [(1, "buy"), (3, "default"), (4, "buy"), (5, "buy")])
+
+        self.assertEqual(streaming_instance.result.total_rows, 5)
+        self.assertEqual(streaming_instance.result.processed_rows, 5)
+        self.assertEqual(streaming_instance.get_rows_counts(), instance.get_rows_counts())
+        self.assertEqual(
+            dict(streaming_instance.get_rows_counts()),
+            {"rows": 5, "success": 4, "error": 1, "booked": 4},
+        )
+        self.assertEqual(streaming_instance.get_verbose_result(), instance.get_verbose_result())
+
+        self.assertEqual(self.get_report(streaming_task, "csv"), self.get_report(task, "csv"))
+        self.assertIn('"2","error"', self.get_report(streaming_task, "csv"))
+
+        json_report = self.get_json_report(streaming_task)
+        self.assertEqual(json_report, self.get_json_report(task))
+        self.assertEqual([item["row_number"] for item in json_report["items"]], [1, 2, 3, 4, 5])
+        self.assertEqual(json_report["total_rows"], 5)
+
+    def test_csv(self):
+        self.assert_streaming_import_equal_to_whole_file_import("import.csv")
+
+    def test_excel(self):
+        self.assert_streaming_import_equal_to_whole_file_import("import.xlsx")
+
+    def test_excel_rows_from_start_cell(self):
+        self.scheme.spreadsheet_start_cell = "B2"
+        self.scheme.save()
+        task = self.create_import_task("import.xlsx", ROWS)
+        instance = TransactionImportProcess(task_id=task.id)
+
+        rows = list(instance.iter_excel_rows())
+
+        self.assertEqual(rows, [["p1", "10"], ["p1", "bad"], ["p1", "5"], ["p2", "7"], ["p2", "8"]])
+        self.assertEqual(list(instance.iter_excel_rows(read_only=True)), rows)
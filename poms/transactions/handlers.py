@@ -3,13 +3,14 @@ import json
 import logging
 import time
 import traceback
+from collections import defaultdict
 from datetime import date, datetime
 
 from django.apps import apps
 
 # from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist
-from django.db import DatabaseError, IntegrityError
+from django.db import DatabaseError, IntegrityError, transaction
 from django.utils.translation import gettext_lazy
 from rest_framework.exceptions import ValidationError
 
@@ -34,6 +35,7 @@ from poms.instruments.models import (
 )
 from poms.portfolios.models import Portfolio
 from poms.reconciliation.models import TransactionTypeReconField
+from poms.reports.report_results import invalidate_report_results
 from poms.strategies.models import Strategy1, Strategy2, Strategy3
 from poms.system_messages.handlers import send_system_message
 from poms.transactions.models import (
@@ -44,7 +46,9 @@ from poms.transactions.models import (
     RebookReactionChoice,
     Transaction,
     TransactionType,
+    TransactionTypeActionTransaction,
     TransactionTypeInput,
+    deferred_related_saves,
 )
 from poms.transactions.utils import generate_user_fields
 from poms.users.models import EcosystemDefault
@@ -52,6 +56,29 @@ from poms.users.models import EcosystemDefault
 _l = logging.getLogger("poms.transactions")
 
 
+# relations of transaction actions, which are set by user code
+TRANSACTION_ACTION_RELATIONS = {
+    "instrument": Instrument,
+    "transaction_currency": Currency,
+    "settlement_currency": Currency,
+    "portfolio": Portfolio,
+    "account_position": Account,
+    "account_cash": Account,
+    "account_interim": Account,
+    "strategy1_position": Strategy1,
+    "strategy1_cash": Strategy1,
+    "strategy2_position": Strategy2,
+    "strategy2_cash": Strategy2,
+    "strategy3_position": Strategy3,
+    "strategy3_cash": Strategy3,
+    "responsible": Responsible,
+    "counterparty": Counterparty,
+    "linked_instrument": Instrument,
+    "allocation_balance": Instrument,
+    "allocation_pl": Instrument,
+}
+
+
 class UniqueCodeError(ValidationError):
     message = "Unique code already exists"
 
@@ -109,6 +136,8 @@ class TransactionTypeProcess:
         clear_execution_log=True,
         record_execution_log=True,
         linked_import_task=None,
+        relations_cache=None,  # (model, user_code) -> object, shared between processes of one batch
+        bulk=False,  # transactions and inputs are saved by TransactionTypeBulkProcess
     ):
         _l.info(
             f"TransactionTypeProcess transaction_type={transaction_type} "
@@ -143,6 +172,9 @@ class TransactionTypeProcess:
         self.next_transaction_order = transaction_order_gen or self._next_transaction_order_default
         self.next_fake_id = fake_id_gen or self._next_fake_id_default
         self.uniqueness_status = None
+        self.relations_cache = relations_cache
+        self.bulk = bulk
+        self.complex_transaction_inputs = []
 
         # set complex-transaction params
         self.complex_transaction: ComplexTransaction = complex_transaction
@@ -205,6 +237,13 @@ class TransactionTypeProcess:
     def is_recalculate(self):
         return self.process_mode == self.MODE_RECALCULATE
 
+    def get_transactions(self):
+        # in bulk mode transactions are not inserted yet
+        if self.bulk:
+            return self.transactions
+
+        return self.complex_transaction.transactions.all()
+
     def _next_fake_id_default(self):
         self._id_seq -= 1
         return self._id_seq
@@ -2179,7 +2218,10 @@ class TransactionTypeProcess:
                 try:
                     transaction.owner = self.member
                     # transaction.transaction_date = min(transaction.accounting_date, transaction.cash_date)
-                    transaction.save()
+                    if self.bulk:
+                        transaction.prepare_to_save()
+                    else:
+                        transaction.save()
 
                     self.record_execution_progress(f"Create Transaction {transaction}")
 
@@ -2204,7 +2246,8 @@ class TransactionTypeProcess:
                         self.transactions_errors.append(errors)
 
     def _save_inputs(self):
-        self.complex_transaction.inputs.all().delete()
+        if not self.bulk:
+            self.complex_transaction.inputs.all().delete()
 
         inputs_to_create = []
 
@@ -2238,11 +2281,14 @@ class TransactionTypeProcess:
 
             inputs_to_create.append(ci)
 
-        ComplexTransactionInput.objects.bulk_create(inputs_to_create)
+        if self.bulk:
+            self.complex_transaction_inputs = inputs_to_create
+        else:
+            ComplexTransactionInput.objects.bulk_create(inputs_to_create)
 
     def execute_user_fields_expressions(self):
         ctrn = formula.value_prepare(self.complex_transaction)
-        trns = self.complex_transaction.transactions.all()
+        trns = self.get_transactions()
 
         names = {
             "complex_transaction": ctrn,
@@ -2280,7 +2326,7 @@ class TransactionTypeProcess:
             from poms.reconciliation.models import ReconciliationComplexTransactionField
 
             ctrn = formula.value_prepare(self.complex_transaction)
-            trns = self.complex_transaction.transactions.all()
+            trns = self.get_transactions()
 
             names = {
                 "complex_transaction": ctrn,
@@ -2375,7 +2421,7 @@ class TransactionTypeProcess:
     def _prepare_names(self):
         names = {
             "complex_transaction": formula.value_prepare(self.complex_transaction),
-            "transactions": self.complex_transaction.transactions.all(),
+            "transactions": self.get_transactions(),
         }
 
         for key, value in self.values.items():
@@ -2639,7 +2685,7 @@ class TransactionTypeProcess:
                 description=system_message_description,
             )
 
-    def process(self):  # noqa: PLR0915
+    def process(self):  # noqa: PLR0912, PLR0915
         if self.process_mode == self.MODE_RECALCULATE:
             return self.process_recalculate()
 
@@ -2808,20 +2854,22 @@ class TransactionTypeProcess:
         Creating base transactions
         """
         delete_old_transactions_st = time.perf_counter()
-        self.complex_transaction.transactions.all().delete()
+        if not self.bulk:
+            self.complex_transaction.transactions.all().delete()
         _l.debug(
             "TransactionTypeProcess: delete_old_transactions done: %s",
             f"{time.perf_counter() - delete_old_transactions_st:3.3f}",
         )
 
         book_create_transactions_st = time.perf_counter()
-        self.book_create_transactions(actions, master_user, instrument_map)
+        with deferred_related_saves():
+            self.book_create_transactions(actions, master_user, instrument_map)
         _l.debug(
             "TransactionTypeProcess: book_create_transactions_st done: %s",
             f"{time.perf_counter() - book_create_transactions_st:3.3f}",
         )
 
-        is_canceled = any(trn.is_canceled for trn in self.complex_transaction.transactions.all())
+        is_canceled = any(trn.is_canceled for trn in self.get_transactions())
         if is_canceled:
             self.record_execution_progress("Complex Transaction is canceled")
 
@@ -2860,15 +2908,20 @@ class TransactionTypeProcess:
         self.run_procedures_after_book()
 
         if self.complex_transaction.status_id == ComplexTransaction.PENDING:
-            self.complex_transaction.transactions.all().delete()
+            if self.bulk:
+                self.transactions = []
+            else:
+                self.complex_transaction.transactions.all().delete()
 
         if self.complex_transaction.transaction_type.type == TransactionType.TYPE_PROCEDURE:
             self.complex_transaction.fake_delete()
             self.complex_transaction = None
+            if self.bulk:
+                self.transactions = []
 
         self.record_execution_progress(f"Process time: {time.perf_counter() - process_st:3.3f}")
 
-        if self.complex_transaction and not self.has_errors:
+        if self.complex_transaction and not self.has_errors and not self.bulk:
             self.complex_transaction.owner = self.member
             self.complex_transaction.save()  # save executed text and date expression
 
@@ -3058,21 +3111,7 @@ class TransactionTypeProcess:
         if user_code:
             # convert to id
             if model:
-                # _l.debug('_set_rel model %s ' % model)
-                # _l.debug('_set_rel value %s ' % user_code)
-
-                try:
-                    if model._meta.get_field("master_user"):
-                        value = model.objects.get(
-                            master_user=self.transaction_type.master_user,
-                            user_code=user_code,
-                        )
-
-                except Exception:
-                    try:
-                        value = model.objects.get(user_code=user_code)
-                    except Exception as e:
-                        _l.debug(f"User code for default value is not found {e}")
+                value = self.get_relation(model, user_code)
         else:
             from_input = getattr(source, f"{source_attr_name}_input")
             if from_input:
@@ -3087,6 +3126,30 @@ class TransactionTypeProcess:
             if object_data:
                 object_data[target_attr_name] = value.id
 
+    def get_relation(self, model, user_code):
+        if self.relations_cache is not None and (model, user_code) in self.relations_cache:
+            return self.relations_cache[(model, user_code)]
+
+        value = None
+        try:
+            if model._meta.get_field("master_user"):
+                value = model.objects.get(
+                    master_user=self.transaction_type.master_user,
+                    user_code=user_code,
+                )
+
+        except Exception:
+            try:
+                value = model.objects.get(user_code=user_code)
+            except Exception as e:
+                _l.debug(f"User code for default value is not found {e}")
+
+        # not found relations are not cached, as they can be created by the next processes of batch
+        if value is not None and self.relations_cache is not None:
+            self.relations_cache[(model, user_code)] = value
+
+        return value
+
     def _set_eval_error(self, errors, attr_name, expression, exc=None):
         msg = gettext_lazy('Invalid expression "%(expression)s".') % {
             "expression": expression,
@@ -3099,3 +3162,154 @@ class TransactionTypeProcess:
             msgs.append(msg)
             errors[key] = msgs
         return msgs
+
+
+class TransactionTypeBulkProcess:
+    """
+    Books complex transactions of one transaction type for many sets of input values.
+    Relations of transaction actions are loaded with one query per model for the whole batch,
+    transactions and complex transaction inputs are inserted with bulk_create, and first transactions
+    dates of portfolios and instruments are recalculated once per batch instead of on each transaction save.
+    """
+
+    def __init__(
+        self,
+        transaction_type,
+        default_values_list,
+        member,
+        context,
+        sources=None,
+        execution_context="import",
+        **kwargs,
+    ):
+        self.transaction_type = transaction_type
+        self.default_values_list = default_values_list
+        self.member = member
+        self.context = context
+        self.sources = sources or [None] * len(default_values_list)
+        self.execution_context = execution_context
+        self.process_kwargs = kwargs  # the rest of TransactionTypeProcess params
+        self.processes = []
+
+    def load_relations(self) -> dict:
+        names = list(TRANSACTION_ACTION_RELATIONS)
+        actions = TransactionTypeActionTransaction.objects.filter(transaction_type=self.transaction_type)
+
+        user_codes = defaultdict(set)
+        for row in actions.values_list(*names):
+            for name, user_code in zip(names, row, strict=True):
+                if user_code:
+                    user_codes[TRANSACTION_ACTION_RELATIONS[name]].add(user_code)
+
+        relations = {}
+        for model, model_user_codes in user_codes.items():
+            for obj in model.objects.filter(
+                master_user=self.transaction_type.master_user, user_code__in=model_user_codes
+            ):
+                relations[(model, obj.user_code)] = obj
+
+        return relations
+
+    def process(self) -> list:
+        """
+        Book all input sets, return TransactionTypeProcess of each of them.
+        Each input set is booked in its own savepoint, so a failed one is rolled back alone
+        and its error is recorded in transactions_errors of its process.
+        """
+        process_st = time.perf_counter()
+
+        relations_cache = self.load_relations()
+
+        for default_values, source in zip(self.default_values_list, self.sources, strict=True):
+            process = TransactionTypeProcess(
+                process_mode=TransactionTypeProcess.MODE_BOOK,
+                transaction_type=self.transaction_type,
+                default_values=default_values,
+                context=self.context,
+                member=self.member,
+                source=source,
+                execution_context=self.execution_context,
+                relations_cache=relations_cache,
+                bulk=True,
+                **self.process_kwargs,
+            )
+
+            try:
+                with transaction.atomic():
+                    process.process()
+
+            except Exception as e:
+                _l.error(f"TransactionTypeBulkProcess: book error {repr(e)} traceback {traceback.format_exc()}")
+                self.discard(process, e)
+
+            self.processes.append(process)
+
+        self.save()
+
+        _l.info(
+            "TransactionTypeBulkProcess: %s input sets of %s done: %s",
+            len(self.processes),
+            self.transaction_type.user_code,
+            f"{time.perf_counter() - process_st:3.3f}",
+        )
+
+        return self.processes
+
+    @staticmethod
+    def discard(process, error):
+        """Record error of failed input set, nothing of it is left in the database"""
+        process.transactions_errors.append({"non_field_errors": [str(error)]})
+        process.transactions = []
+        process.complex_transaction_inputs = []
+
+        if process.complex_transaction is not None and process.complex_transaction.pk:
+            ComplexTransaction.objects.filter(pk=process.complex_transaction.pk).delete()
+        process.complex_transaction = None
+
+    def save(self):
+        processes = [process for process in self.processes if process.complex_transaction is not None]
+
+        try:
+            with transaction.atomic():
+                self.bulk_save(processes)
+
+        except Exception as e:
+            # find failed input sets, their transactions and inputs are not saved
+            _l.error(f"TransactionTypeBulkProcess: bulk save error {repr(e)}, saving input sets one by one")
+
+            for process in processes:
+                try:
+                    with transaction.atomic():
+                        self.bulk_save([process])
+
+                except Exception as process_error:
+                    self.discard(process, process_error)
+
+        portfolios_ids = {
+            trn.portfolio_id for process in processes for trn in process.transactions if trn.portfolio_id
+        }
+        invalidate_report_results(self.transaction_type.master_user, portfolios=portfolios_ids)
+
+    def bulk_save(self, processes: list):
+        complex_transactions = []
+        transactions = []
+        inputs = []
+
+        for process in processes:
+            transactions.extend(process.transactions)
+            inputs.extend(process.complex_transaction_inputs)
+
+            if not process.has_errors:
+                complex_transactions.append(process.complex_transaction)
+
+        ComplexTransactionInput.objects.bulk_create(inputs)
+        Transaction.objects.bulk_create(transactions)
+
+        # the same as the last save of complex transaction in TransactionTypeProcess.process
+        fields = [field.name for field in ComplexTransaction._meta.concrete_fields if not field.primary_key]
+        ComplexTransaction.objects.bulk_update(complex_transactions, fields)
+
+        # recalculate first_transactions_dates, as Transaction.save does
+        with deferred_related_saves():
+            for trn in transactions:
+                trn.save_related()
@@ -1,7 +1,9 @@
 import json
 import logging
+import threading
 import time
 import traceback
+from contextlib import contextmanager
 from datetime import date
 from math import isnan
 
@@ -37,6 +39,40 @@ from poms.users.models import EcosystemDefault, FakeSequence, MasterUser
 
 _l = logging.getLogger("poms.transactions")
 
+_deferred = threading.local()
+
+
+@contextmanager
+def deferred_related_saves():
+    """
+    Portfolios and instruments of transactions, which are saved or deleted inside the block,
+    are saved (and recalculate their first transactions dates) once on exit,
+    not after each transaction
+    """
+    if getattr(_deferred, "related", None) is not None:
+        # nested block, related objects are saved by the outer one
+        yield
+        return
+
+    _deferred.related = set()
+    try:
+        yield
+    finally:
+        related = _deferred.related
+        _deferred.related = None
+
+    # objects are not saved, if the block raised, its transaction could be broken
+    models_ids = {}
+    for model, pk in related:
+        models_ids.setdefault(model, set()).add(pk)
+
+    # objects are reloaded, as they could be changed after transactions were saved
+    for model, ids in models_ids.items():
+        for obj in model.objects.filter(pk__in=ids):
+            obj.save()
+
+    _l.debug(f"deferred_related_saves: saved {len(related)} portfolios and instruments")
+
 
 class TransactionClass(AbstractClassModel):
     BUY = 1
@@ -3490,11 +3526,8 @@ class Transaction(models.Model):
 
         return ytm
 
-    def save(self, *args, **kwargs):
-        _l.debug(f"Transaction.save: {self}")
-
-        kwargs.pop("calc_cash", None)
-
+    def prepare_to_save(self):
+        """Set dates, transaction code and ytm at cost before the transaction is inserted"""
         if not self.accounting_date:
             self.accounting_date = date_now()
 
@@ -3518,32 +3551,40 @@ class Transaction(models.Model):
 
         _l.debug(f"Transaction.save: ytm is {self.ytm_at_cost}")
 
-        super().save(*args, **kwargs)
+    def save(self, *args, **kwargs):
+        _l.debug(f"Transaction.save: {self}")
+
+        kwargs.pop("calc_cash", None)
+
+        self.prepare_to_save()
 
-        if self.portfolio:
-            # force run of calculate_first_transactions_dates and update portfolio
-            _l.debug("Transaction.save: recalculate first_transactions_dates in portfolio")
-            self.portfolio.save()
+        super().save(*args, **kwargs)
 
-        if self.instrument:
-            # force run of calculate_first_transactions_dates and update instrument
-            _l.debug("Transaction.save: recalculate first_transactions_dates in instrument")
-            self.instrument.save()
+        self.save_related()
 
     def delete(self, *args, **kwargs):
         _l.debug(f"Transaction.delete: {self.id}")
 
         super().delete(*args, **kwargs)
 
-        if self.portfolio:
-            # force run of calculate_first_transactions_dates and update portfolio
-            _l.debug("Transaction.delete: recalculate first_transactions_dates in portfolio")
-            self.portfolio.save()
+        self.save_related()
 
-        if self.instrument:
-            # force run of calculate_first_transactions_dates and update instrument
-            _l.debug("Transaction.save: recalculate first_transactions_dates in instrument")
-            self.instrument.save()
+    def save_related(self):
+        """
+        Force run of calculate_first_transactions_dates and update portfolio and instrument,
+        inside deferred_related_saves block they are saved once on its exit
+        """
+        related = getattr(_deferred, "related", None)
+
+        for obj in (self.portfolio, self.instrument):
+            if not obj:
+                continue
+
+            if related is None:
+                _l.debug(f"Transaction.save_related: recalculate first_transactions_dates in {obj}")
+                obj.save()
+            else:
+                related.add((type(obj), obj.pk))
 
     def is_can_calc_cash_by_formulas(self):
         return (
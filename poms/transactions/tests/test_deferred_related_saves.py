@@ -0,0 +1,62 @@
+from datetime import timedelta
+from unittest import mock
+
+from poms.common.common_base_test import BIG, BaseTestCase
+from poms.portfolios.models import Portfolio
+from poms.transactions.models import deferred_related_saves
+
+
+class DeferredRelatedSavesTest(BaseTestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        super().setUp()
+        self.init_test_case()
+        self.portfolio = self.db_data.portfolios[BIG]
+        Portfolio.objects.filter(id=self.portfolio.id).update(first_transaction_date=None)
+
+    def get_first_transaction_date(self):
+        return Portfolio.objects.get(id=self.portfolio.id).first_transaction_date
+
+    def test_portfolio_is_saved_once_on_exit(self):
+        days = [self.today() - timedelta(days=i) for i in range(3)]
+
+        save = mock.patch.object(Portfolio, "save", autospec=True, side_effect=Portfolio.save)
+        with save as save_mock, deferred_related_saves():
+            for day in days:
+                self.db_data.cash_in_transaction(self.portfolio, amount=100, day=day)
+
+            self.assertEqual(save_mock.call_count, 0)
+            self.assertIsNone(self.get_first_transaction_date())
+
+        self.assertEqual(save_mock.call_count, 1)
+        self.assertEqual(self.get_first_transaction_date(), min(days))
+
+    def test_nested_blocks(self):
+        with deferred_related_saves():
+            with deferred_related_saves():
+                self.db_data.cash_in_transaction(self.portfolio, amount=100, day=self.today())
+
+            self.assertIsNone(self.get_first_transaction_date())
+
+        self.assertEqual(self.get_first_transaction_date(), self.today())
+
+    def test_transaction_save_without_block(self):
+        self.db_data.cash_in_transaction(self.portfolio, amount=100, day=self.today())
+
+        self.assertEqual(self.get_first_transaction_date(), self.today())
+
+    def test_error_in_block(self):
+        save = mock.patch.object(Portfolio, "save", autospec=True, side_effect=Portfolio.save)
+        with save as save_mock, self.assertRaisesMessage(ValueError, "booking error"), deferred_related_saves():
+            self.db_data.cash_in_transaction(self.portfolio, amount=100, day=self.today())
+            raise ValueError("booking error")
+
+        # objects are not saved after error, the original exception is raised
+        save_mock.assert_not_called()
+        self.assertIsNone(self.get_first_transaction_date())
+
+        with deferred_related_saves():
+            self.db_data.cash_in_transaction(self.portfolio, amount=100, day=self.today())
+
+        self.assertEqual(self.get_first_transaction_date(), self.today())
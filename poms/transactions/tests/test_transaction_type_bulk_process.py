@@ -0,0 +1,186 @@
+from unittest import mock
+
+from django.db import IntegrityError
+
+from poms.common.common_base_test import BIG, BaseTestCase
+from poms.configuration.utils import get_default_configuration_code
+from poms.transactions.handlers import TransactionTypeBulkProcess, TransactionTypeProcess
+from poms.transactions.models import (
+    ComplexTransaction,
+    ComplexTransactionInput,
+    Transaction,
+    TransactionClass,
+    TransactionType,
+    TransactionTypeActionTransaction,
+    TransactionTypeInput,
+)
+
+TRANSACTION_FIELDS = (
+    "transaction_class_id",
+    "portfolio_id",
+    "instrument_id",
+    "transaction_currency_id",
+    "settlement_currency_id",
+    "position_size_with_sign",
+    "cash_consideration",
+    "accounting_date",
+    "cash_date",
+    "transaction_date",
+    "is_canceled",
+)
+
+
+class TransactionTypeBulkProcessTest(BaseTestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        super().setUp()
+        self.init_test_case()
+        self.portfolio = self.db_data.portfolios[BIG]
+        self.instrument = self.db_data.instruments["Apple"]
+        self.transaction_type = TransactionType.objects.create(
+            master_user=self.master_user,
+            owner=self.member,
+            configuration_code=get_default_configuration_code(),
+            user_code="bulk_buy",
+            name="bulk_buy",
+            type=TransactionType.TYPE_DEFAULT,
+            display_expr="'Buy ' + str(amount)",
+        )
+        for name, value_type in (("amount", TransactionTypeInput.NUMBER), ("trade_date", TransactionTypeInput.DATE)):
+            TransactionTypeInput.objects.create(
+                transaction_type=self.transaction_type,
+                name=name,
+                value_type=value_type,
+            )
+        TransactionTypeActionTransaction.objects.create(
+            transaction_type=self.transaction_type,
+            order=1,
+            transaction_class_id=TransactionClass.BUY,
+            instrument=self.instrument.user_code,
+            portfolio=self.portfolio.user_code,
+            transaction_currency=self.db_data.usd.user_code,
+            settlement_currency=self.db_data.usd.user_code,
+            position_size_with_sign="amount",
+            cash_consideration="-amount * 10",
+            accounting_date="trade_date",
+            cash_date="trade_date",
+        )
+
+    def get_default_values_list(self):
+        return [{"amount": amount, "trade_date": self.today()} for amount in (10, 20, 30)]
+
+    def get_booked(self, complex_transactions):
+        return [
+            (
+                complex_transaction.text,
+                list(Transaction.objects.filter(complex_transaction=complex_transaction).values(*TRANSACTION_FIELDS)),
+                list(
+                    ComplexTransactionInput.objects.filter(complex_transaction=complex_transaction)
+                    .order_by("transaction_type_input__name")
+                    .values("value_float", "value_date")
+                ),
+            )
+            for complex_transaction in complex_transactions
+        ]
+
+    def test_bulk_book_is_equal_to_book(self):
+        complex_transactions = []
+        for default_values in self.get_default_values_list():
+            process = TransactionTypeProcess(
+                transaction_type=self.transaction_type,
+                default_values=default_values,
+                context={},
+                member=self.member,
+                execution_context="import",
+            )
+            process.process()
+            complex_transactions.append(process.complex_transaction)
+        expected = self.get_booked(complex_transactions)
+
+        ComplexTransaction.objects.all().delete()
+        type(self.portfolio).objects.filter(id=self.portfolio.id).update(first_transaction_date=None)
+
+        processes = TransactionTypeBulkProcess(
+            transaction_type=self.transaction_type,
+            default_values_list=self.get_default_values_list(),
+            member=self.member,
+            context={},
+        ).process()
+
+        self.assertFalse(any(process.has_errors for process in processes))
+        complex_transactions = [ComplexTransaction.objects.get(id=p.complex_transaction.id) for p in processes]
+        self.assertEqual(self.get_booked(complex_transactions), expected)
+        self.assertEqual(complex_transactions[0].text, "Buy 10")
+
+        self.portfolio.refresh_from_db()
+        self.assertEqual(self.portfolio.first_transaction_date, self.today())
+
+    def test_relations_are_loaded_once(self):
+        bulk_process = TransactionTypeBulkProcess(
+            transaction_type=self.transaction_type,
+            default_values_list=self.get_default_values_list(),
+            member=self.member,
+            context={},
+        )
+
+        relations = bulk_process.load_relations()
+
+        self.assertEqual(relations[(type(self.portfolio), self.portfolio.user_code)], self.portfolio)
+        self.assertEqual(relations[(type(self.instrument), self.instrument.user_code)], self.instrument)
+
+    def assert_failed_input_set(self, processes):
+        self.assertEqual([process.has_errors for process in processes], [False, True, False])
+        self.assertIn("amount 20", str(processes[1].transactions_errors))
+        self.assertIsNone(processes[1].complex_transaction)
+        self.assertEqual(
+            sorted(Transaction.objects.values_list("position_size_with_sign", flat=True)),
+            [10, 30],
+        )
+        self.assertEqual(
+            sorted(ComplexTransaction.objects.filter(is_deleted=False).values_list("text", flat=True)),
+            ["Buy 10", "Buy 30"],
+        )
+
+    def test_failed_input_set_is_rolled_back_alone(self):
+        original_method = TransactionTypeProcess.execute_complex_transaction_main_expressions
+
+        def execute_complex_transaction_main_expressions(process):
+            if process.values["amount"] == 20:
+                raise ValueError("Invalid amount 20")
+
+            return original_method(process)
+
+        with mock.patch.object(
+            TransactionTypeProcess,
+            "execute_complex_transaction_main_expressions",
+            autospec=True,
+            side_effect=execute_complex_transaction_main_expressions,
+        ):
+            processes = TransactionTypeBulkProcess(
+                transaction_type=self.transaction_type,
+                default_values_list=self.get_default_values_list(),
+                member=self.member,
+                context={},
+            ).process()
+
+        self.assert_failed_input_set(processes)
+
+    def test_failed_bulk_insert_is_mapped_to_input_set(self):
+        original_bulk_create = Transaction.objects.bulk_create
+
+        def bulk_create(transactions, *args, **kwargs):
+            if any(trn.position_size_with_sign == 20 for trn in transactions):
+                raise IntegrityError("Invalid amount 20")
+
+            return original_bulk_create(transactions, *args, **kwargs)
+
+        with mock.patch.object(Transaction.objects, "bulk_create", side_effect=bulk_create):
+            processes = TransactionTypeBulkProcess(
+                transaction_type=self.transaction_type,
+                default_values_list=self.get_default_values_list(),
+                member=self.member,
+                context={},
+            ).process()
+
+        self.assert_failed_input_set(processes)
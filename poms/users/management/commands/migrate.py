@@ -1,5 +1,6 @@
 from django.core.management.commands.migrate import Command as OriginalMigrateCommand
-from django.db import connection
+
+from poms.common.db import set_search_path
 
 
 class Command(OriginalMigrateCommand):
@@ -9,6 +10,5 @@ class Command(OriginalMigrateCommand):
 
     def handle(self, *args, **options):
         if space_code := options.get("space_code"):
-            with connection.cursor() as cursor:
-                cursor.execute(f"SET search_path TO {space_code};")
+            set_search_path(space_code)
         super().handle(*args, **options)
@@ -0,0 +1,18 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from poms.common.authentication import clear_auth_caches
+from poms.users.models import MasterUser, Member
+from poms.users.utils import clear_members_cache
+
+
+@receiver(post_save, dispatch_uid="clear_auth_caches_on_save", sender=User)
+@receiver(post_save, dispatch_uid="clear_members_cache_on_member_save", sender=Member)
+@receiver(post_save, dispatch_uid="clear_members_cache_on_master_user_save", sender=MasterUser)
+@receiver(post_delete, dispatch_uid="clear_auth_caches_on_delete", sender=User)
+@receiver(post_delete, dispatch_uid="clear_members_cache_on_member_delete", sender=Member)
+def clear_auth_caches_on_change(sender, **kwargs):
+    """Users and members are cached by each worker, other workers get changes after AUTH_USER_CACHE_TTL"""
+    clear_auth_caches()
+    clear_members_cache()
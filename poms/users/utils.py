@@ -1,17 +1,46 @@
 import logging
 
+from django.conf import settings
 from rest_framework.exceptions import NotFound, PermissionDenied
 
-from poms.users.models import Member
+from poms.common.db import get_current_schema_name
+from poms.common.local_cache import LocalCache, get_model_from_values, get_model_values
+from poms.users.models import MasterUser, Member
 
 _l = logging.getLogger("poms.users")
 
+_members = LocalCache(max_size=settings.AUTH_CACHE_SIZE)  # (schema, user id) -> values of member and master user
+
+
+def get_member_with_master_user(user) -> Member:
+    """
+    Member of user with its master user, their values are cached for AUTH_USER_CACHE_TTL seconds.
+    New instances are returned for each request, so they are not shared by requests.
+    """
+    key = (get_current_schema_name(), user.id)
+    cached = _members.get(key)
+    if cached is not None:
+        member = get_model_from_values(Member, cached[0])
+        member.master_user = get_model_from_values(MasterUser, cached[1])
+        return member
+
+    member = Member.objects.filter(user=user).select_related("master_user").first()
+    if member:
+        values = (get_model_values(member), get_model_values(member.master_user))
+        _members.set(key, values, ttl=settings.AUTH_USER_CACHE_TTL)
+
+    return member
+
+
+def clear_members_cache():
+    _members.clear()
+
 
 def get_master_user_and_member(request) -> tuple:
     if not request.user.is_authenticated:
         raise PermissionDenied("User is not authenticated")
 
-    member = Member.objects.filter(user=request.user).first()
+    member = get_member_with_master_user(request.user)
     if not member:
         raise NotFound(f"Member not found for user {request.user.username}")
 
@@ -0,0 +1,359 @@
+import datetime
+import logging
+from collections import defaultdict
+
+import numpy
+from numpy.lib.stride_tricks import sliding_window_view
+
+from poms.common.utils import get_last_bdays_of_months_between_two_dates
+from poms.currencies.models import CurrencyHistory
+from poms.instruments.models import PriceHistory
+from poms.portfolios.models import PortfolioBundle, PortfolioRegisterRecord
+from poms.transactions.models import TransactionClass
+from poms.users.models import EcosystemDefault
+
+_l = logging.getLogger("poms.widgets")
+
+CASH_FLOW_CLASSES = (
+    TransactionClass.CASH_INFLOW,
+    TransactionClass.CASH_OUTFLOW,
+    TransactionClass.INJECTION,
+    TransactionClass.DISTRIBUTION,
+)
+DRAWDOWN_WINDOW_DAYS = 365
+# month ends, which can be inside of drawdown window
+DRAWDOWN_WINDOW_MONTHS = 12
+
+
+def to_days(dates) -> numpy.ndarray:
+    return numpy.array(dates, dtype="datetime64[D]")
+
+
+def to_last_business_days(dates: numpy.ndarray) -> numpy.ndarray:
+    """The same as get_last_business_day for array of dates"""
+    return numpy.busday_offset(dates, 0, roll="backward")
+
+
+def get_return_index(navs: numpy.ndarray, cash_flows: numpy.ndarray) -> numpy.ndarray:
+    """
+    Time weighted return index of daily NAV series, cash flow of the day is excluded from its return
+    as in time weighted Performance Report. Index starts from 1 on the first day of series.
+    """
+    if not len(navs):
+        return numpy.ones(0)
+
+    previous = navs[:-1]
+    returns = numpy.divide(
+        navs[1:] - cash_flows[1:] - previous,
+        previous,
+        out=numpy.zeros(len(previous)),
+        where=previous != 0,
+    )
+
+    return numpy.concatenate(([1.0], numpy.cumprod(1 + returns)))
+
+
+def get_values_on_dates(dates: numpy.ndarray, values: numpy.ndarray, on_dates: numpy.ndarray, default: float):
+    """Last known values on or before the dates, default for the dates before the series"""
+    positions = numpy.searchsorted(dates, on_dates, side="right") - 1
+    known = positions >= 0
+
+    result = numpy.full(len(on_dates), default, dtype=float)
+    result[known] = values[positions[known]]
+
+    return result
+
+
+def get_period_returns(values: numpy.ndarray) -> numpy.ndarray:
+    """Returns between neighbour values, zero if previous value is zero"""
+    previous = values[:-1]
+
+    return numpy.divide(values[1:] - previous, previous, out=numpy.zeros(len(previous)), where=previous != 0)
+
+
+def get_windows_lowest_returns(starts: numpy.ndarray, ends: numpy.ndarray, start_values, end_values) -> numpy.ndarray:
+    """
+    Lowest cumulative return of each window, which starts on month end and is split by the next month ends
+    as Performance Report with monthly segmentation. The last period of window ends on its end date
+    instead of the month end. Zero if cumulative return is never negative.
+    """
+    padding = DRAWDOWN_WINDOW_MONTHS
+    next_dates = numpy.concatenate((starts[1:], numpy.full(padding, numpy.datetime64("9999-12-31"))))
+    next_values = numpy.concatenate((start_values[1:], numpy.full(padding, numpy.nan)))
+
+    window_dates = sliding_window_view(next_dates, padding)[: len(starts)]
+    window_values = sliding_window_view(next_values, padding)[: len(starts)]
+
+    # month end of the window end month is replaced by the window end itself
+    end_months = ends.astype("datetime64[M]").astype("datetime64[D]")
+    in_window = window_dates < end_months[:, None]
+
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        month_returns = numpy.where(in_window, window_values / start_values[:, None] - 1, numpy.inf)
+        end_returns = end_values / start_values - 1
+
+    lowest = numpy.fmin(month_returns.min(axis=1, initial=0), end_returns)
+
+    return numpy.nan_to_num(numpy.minimum(lowest, 0), nan=0, neginf=0)
+
+
+class PortfolioStatsEngine:
+    """
+    Risk statistics of portfolio bundle and benchmark. Daily NAV series of bundle registers, their cash flows
+    and benchmark prices are loaded once for the whole period, and all statistics are calculated
+    from them with NumPy instead of building Performance Report for each month.
+    """
+
+    def __init__(
+        self,
+        bundle: PortfolioBundle,
+        report_currency,
+        date_from: datetime.date,
+        date_to: datetime.date,
+        benchmark: str | None = None,
+        benchmark_pricing_policy=None,
+    ):
+        self.bundle = bundle
+        self.report_currency_id = report_currency.id
+        self.date_from = date_from
+        self.date_to = date_to
+        self.benchmark = benchmark
+        self.benchmark_pricing_policy = benchmark_pricing_policy
+
+        ecosystem_defaults = EcosystemDefault.cache.get_cache(master_user_pk=bundle.master_user_id)
+        self.default_currency_id = ecosystem_defaults.currency_id
+
+        self.registers = list(
+            bundle.registers.filter(linked_instrument__isnull=False).select_related("linked_instrument")
+        )
+        self.fx_rates = self.load_fx_rates()
+
+        self.dates, navs, cash_flows = self.load_nav_series()
+        self.index = get_return_index(navs, cash_flows)
+
+        self.periods = self.get_periods()
+        self.returns = get_period_returns(self.get_index_on_dates(self.periods))
+
+        self.benchmark_dates, self.benchmark_prices = self.load_benchmark_prices()
+
+    def load_fx_rates(self) -> dict:
+        currencies_ids = {self.report_currency_id}
+        pricing_policies_ids = set()
+        for register in self.registers:
+            currencies_ids.add(register.linked_instrument.pricing_currency_id)
+            currencies_ids.add(register.valuation_currency_id)
+            pricing_policies_ids.add(register.valuation_pricing_policy_id)
+
+        fx_rates = CurrencyHistory.objects.filter(
+            currency_id__in=currencies_ids,
+            pricing_policy_id__in=pricing_policies_ids,
+            date__gte=self.date_from,
+            date__lte=self.date_to,
+        ).values_list("currency_id", "pricing_policy_id", "date", "fx_rate")
+
+        return {(currency_id, policy_id, day): fx_rate for currency_id, policy_id, day, fx_rate in fx_rates}
+
+    def get_fx_rate(self, currency_id: int, pricing_policy_id: int, day: datetime.date) -> float | None:
+        """Fx rate to report currency as in Performance Report, None if there is no fx rate"""
+        if currency_id == self.report_currency_id:
+            return 1
+
+        rates = []
+        for rate_currency_id in (currency_id, self.report_currency_id):
+            if rate_currency_id == self.default_currency_id:
+                rates.append(1)
+            else:
+                rates.append(self.fx_rates.get((rate_currency_id, pricing_policy_id, day)))
+
+        if not rates[0] or not rates[1]:
+            return None
+
+        return rates[0] / rates[1]
+
+    def load_nav_series(self) -> tuple:
+        """NAV and cash flows of all bundle registers in report currency summed by dates"""
+        registers = {
+            (register.linked_instrument_id, register.valuation_pricing_policy_id): register
+            for register in self.registers
+        }
+
+        prices = PriceHistory.objects.filter(
+            instrument_id__in={instrument_id for instrument_id, _ in registers},
+            date__gte=self.date_from,
+            date__lte=self.date_to,
+            nav__isnull=False,
+        ).values_list("instrument_id", "pricing_policy_id", "date", "nav")
+
+        navs = defaultdict(float)
+        for instrument_id, pricing_policy_id, day, nav in prices:
+            register = registers.get((instrument_id, pricing_policy_id))
+            if register is None:
+                continue
+
+            fx_rate = self.get_fx_rate(register.linked_instrument.pricing_currency_id, pricing_policy_id, day)
+            if fx_rate is None:
+                _l.error("PortfolioStatsEngine could not calculate nav of %s on %s", register, day)
+                continue
+
+            navs[day] += nav * fx_rate
+
+        dates = to_days(sorted(navs))
+        nav_values = numpy.array([navs[day] for day in sorted(navs)], dtype=float)
+
+        records = PortfolioRegisterRecord.objects.filter(
+            portfolio_register__in=self.registers,
+            transaction_date__gt=self.date_from,
+            transaction_date__lte=self.date_to,
+            transaction_class__in=CASH_FLOW_CLASSES,
+        ).values_list(
+            "portfolio_register__valuation_pricing_policy_id",
+            "transaction_date",
+            "valuation_currency_id",
+            "cash_amount_valuation_currency",
+        )
+
+        cash_flows_dates = []
+        cash_flows_values = []
+        for pricing_policy_id, day, currency_id, cash_amount in records:
+            fx_rate = self.get_fx_rate(currency_id, pricing_policy_id, day)
+            if fx_rate is None:
+                _l.error("PortfolioStatsEngine could not calculate fx_rate of cash flow on %s", day)
+                fx_rate = 1
+
+            cash_flows_dates.append(day)
+            cash_flows_values.append((cash_amount or 0) * fx_rate)
+
+        # cash flow is taken in return of the first NAV date on or after it
+        positions = numpy.searchsorted(dates, to_days(cash_flows_dates))
+        in_series = positions < len(dates)
+        cash_flows = numpy.bincount(
+            positions[in_series],
+            weights=numpy.array(cash_flows_values, dtype=float)[in_series],
+            minlength=len(dates),
+        )
+
+        return dates, nav_values, cash_flows
+
+    def load_benchmark_prices(self) -> tuple:
+        if not self.benchmark:
+            return to_days([]), numpy.zeros(0)
+
+        prices = list(
+            PriceHistory.objects.filter(
+                instrument__user_code=self.benchmark,
+                pricing_policy=self.benchmark_pricing_policy,
+                date__gte=self.date_from,
+                date__lte=self.date_to,
+            )
+            .order_by("date")
+            .values_list("date", "principal_price")
+        )
+
+        return to_days([day for day, _ in prices]), numpy.array([price for _, price in prices], dtype=float)
+
+    def get_index_on_dates(self, dates: numpy.ndarray) -> numpy.ndarray:
+        return get_values_on_dates(self.dates, self.index, dates, 1.0)
+
+    def get_periods(self) -> numpy.ndarray:
+        """Dates between monthly periods of Performance Report from date_from to date_to"""
+        month_ends = to_days(get_last_bdays_of_months_between_two_dates(self.date_from, self.date_to)[:-1])
+        month_ends = month_ends[month_ends >= numpy.datetime64(self.date_from)]
+
+        return numpy.concatenate(
+            (
+                to_days([self.date_from]),
+                month_ends,
+                to_last_business_days(to_days([self.date_to])),
+            )
+        )
+
+    def get_cumulative_return(self) -> float:
+        index = self.get_index_on_dates(self.periods[[0, -1]])
+        return float(index[1] / index[0] - 1) if index[0] else 0
+
+    def get_volatility(self) -> float:
+        """Standard deviation of monthly returns"""
+        if len(self.returns) > 2:
+            return float(numpy.std(self.returns, ddof=1))
+
+        return 0
+
+    def get_max_drawdown(self, yesterday: datetime.date) -> tuple:
+        """
+        Lowest cumulative return in windows of one year, which start on each month end since date_from,
+        and the month of the window
+        """
+        starts = to_days(get_last_bdays_of_months_between_two_dates(self.date_from, self.date_to))
+        ends = numpy.minimum(starts + DRAWDOWN_WINDOW_DAYS, numpy.datetime64(yesterday))
+        ends = to_last_business_days(ends)
+
+        lowest = get_windows_lowest_returns(
+            starts,
+            ends,
+            self.get_index_on_dates(starts),
+            self.get_index_on_dates(ends),
+        )
+
+        if not len(lowest) or lowest.min() >= 0:
+            return 0, None
+
+        month = lowest.argmin()
+
+        return float(lowest[month]), starts[month].item()
+
+    def get_benchmark_returns(self) -> numpy.ndarray:
+        """Benchmark returns of the same monthly periods, empty if benchmark has no price on some period date"""
+        positions = numpy.searchsorted(self.benchmark_dates, self.periods)
+        found = positions < len(self.benchmark_dates)
+        found[found] = self.benchmark_dates[positions[found]] == self.periods[found]
+
+        if not found.all():
+            _l.error("Not enough Prices for benchmark_returns")
+            return numpy.zeros(0)
+
+        return get_period_returns(self.benchmark_prices[positions])
+
+    def get_benchmark_return(self) -> float | None:
+        """Benchmark return from date_from to date_to, None if there are no prices on these dates"""
+        dates = to_days([self.date_from, self.date_to])
+        positions = numpy.searchsorted(self.benchmark_dates, dates)
+
+        if (positions >= len(self.benchmark_dates)).any() or (self.benchmark_dates[positions] != dates).any():
+            return None
+
+        begin_price, end_price = self.benchmark_prices[positions]
+
+        return float((end_price - begin_price) / begin_price) if begin_price else None
+
+    def get_beta(self) -> float:
+        benchmark_returns = self.get_benchmark_returns()
+
+        if len(benchmark_returns) < 2 or len(benchmark_returns) != len(self.returns):
+            _l.error("PortfolioStatsEngine.get_beta not enough returns %s", len(benchmark_returns))
+            return 0
+
+        variance = numpy.var(benchmark_returns, ddof=1)
+        if not variance:
+            return 0
+
+        return float(numpy.cov(self.returns, benchmark_returns)[0][1] / variance)
+
+    def get_alpha(self) -> float:
+        benchmark_return = self.get_benchmark_return()
+        if benchmark_return is None:
+            _l.error("PortfolioStatsEngine.get_alpha no benchmark prices on %s or %s", self.date_from, self.date_to)
+            return 0
+
+        return self.get_cumulative_return() - self.get_beta() * benchmark_return
+
+    def get_correlation(self) -> float:
+        benchmark_returns = self.get_benchmark_returns()
+
+        if len(benchmark_returns) < 2 or len(benchmark_returns) != len(self.returns):
+            _l.error("PortfolioStatsEngine.get_correlation not enough returns %s", len(benchmark_returns))
+            return 0
+
+        if not numpy.std(self.returns) or not numpy.std(benchmark_returns):
+            return 0
+
+        return float(numpy.corrcoef(self.returns, benchmark_returns)[0, 1])
@@ -0,0 +1,137 @@
+import math
+import statistics
+from datetime import date, timedelta
+
+import numpy
+
+from poms.common.common_base_test import BIG, BaseTestCase
+from poms.common.utils import get_last_bdays_of_months_between_two_dates, get_last_business_day
+from poms.instruments.models import PriceHistory
+from poms.portfolios.models import PortfolioBundle, PortfolioRegister
+from poms.widgets.stats_engine import PortfolioStatsEngine, get_return_index
+
+
+def get_nav(i: int) -> float:
+    return 100 + 10 * math.sin(i / 15) + i / 10
+
+
+def get_benchmark_price(i: int) -> float:
+    return 50 + 5 * math.cos(i / 20) + i / 50
+
+
+class PortfolioStatsEngineTest(BaseTestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        super().setUp()
+        self.init_test_case()
+        self.portfolio = self.db_data.portfolios[BIG]
+        self.pricing_policy = self.create_pricing_policy()
+        self.linked_instrument = self.db_data.instruments["Tesla B."]
+        self.benchmark = self.db_data.instruments["Apple"]
+        self.date_from = date(2023, 10, 2)
+        self.date_to = date(2024, 6, 14)
+
+        PortfolioRegister.objects.create(
+            master_user=self.master_user,
+            owner=self.member,
+            user_code="stats_engine_register",
+            portfolio=self.portfolio,
+            linked_instrument=self.linked_instrument,
+            valuation_pricing_policy=self.pricing_policy,
+            valuation_currency=self.linked_instrument.pricing_currency,
+        )
+        self.bundle = PortfolioBundle.objects.get(user_code="stats_engine_register")
+
+        prices = []
+        for i in range((self.date_to - self.date_from).days + 1):
+            day = self.date_from + timedelta(days=i)
+            if day.weekday() < 5:
+                prices.append(
+                    PriceHistory(
+                        instrument=self.linked_instrument,
+                        pricing_policy=self.pricing_policy,
+                        date=day,
+                        principal_price=1,
+                        nav=get_nav(i),
+                    )
+                )
+            prices.append(
+                PriceHistory(
+                    instrument=self.benchmark,
+                    pricing_policy=self.pricing_policy,
+                    date=day,
+                    principal_price=get_benchmark_price(i),
+                )
+            )
+        PriceHistory.objects.bulk_create(prices)
+
+    def create_engine(self) -> PortfolioStatsEngine:
+        return PortfolioStatsEngine(
+            bundle=self.bundle,
+            report_currency=self.linked_instrument.pricing_currency,
+            date_from=self.date_from,
+            date_to=self.date_to,
+            benchmark=self.benchmark.user_code,
+            benchmark_pricing_policy=self.pricing_policy,
+        )
+
+    def get_value(self, function, day: date) -> float:
+        return function((get_last_business_day(day) - self.date_from).days)
+
+    def get_returns(self, function, days: list) -> list:
+        values = [self.get_value(function, day) for day in days]
+        return [value / previous - 1 for previous, value in zip(values, values[1:], strict=False)]
+
+    def test_portfolio_returns(self):
+        engine = self.create_engine()
+        periods = [self.date_from] + get_last_bdays_of_months_between_two_dates(self.date_from, self.date_to)
+        expected = self.get_returns(get_nav, periods)
+
+        numpy.testing.assert_allclose(engine.returns, expected)
+        self.assertAlmostEqual(engine.get_cumulative_return(), self.get_value(get_nav, self.date_to) / get_nav(0) - 1)
+        self.assertAlmostEqual(engine.get_volatility(), statistics.stdev(expected))
+
+    def test_max_drawdown(self):
+        engine = self.create_engine()
+
+        # the same windows as in Performance Report for each month end
+        expected = (0, None)
+        for start in get_last_bdays_of_months_between_two_dates(self.date_from, self.date_to):
+            end = min(start + timedelta(days=365), self.date_to)
+            days = [start] + get_last_bdays_of_months_between_two_dates(start, end)
+            lowest = min(0, *(self.get_value(get_nav, day) / self.get_value(get_nav, start) - 1 for day in days))
+            if lowest < expected[0]:
+                expected = (lowest, start)
+
+        drawdown, month = engine.get_max_drawdown(self.date_to)
+
+        self.assertLess(drawdown, 0)
+        self.assertAlmostEqual(drawdown, expected[0])
+        self.assertEqual(month, expected[1])
+
+    def test_benchmark_stats(self):
+        engine = self.create_engine()
+        periods = [self.date_from] + get_last_bdays_of_months_between_two_dates(self.date_from, self.date_to)
+        portfolio_returns = self.get_returns(get_nav, periods)
+        benchmark_returns = self.get_returns(get_benchmark_price, periods)
+        beta = numpy.cov(portfolio_returns, benchmark_returns)[0][1] / statistics.variance(benchmark_returns)
+        benchmark_return = get_benchmark_price(256) / get_benchmark_price(0) - 1
+
+        self.assertAlmostEqual(engine.get_beta(), beta)
+        self.assertAlmostEqual(engine.get_correlation(), numpy.corrcoef(portfolio_returns, benchmark_returns)[0, 1])
+        self.assertAlmostEqual(engine.get_alpha(), engine.get_cumulative_return() - beta * benchmark_return)
+
+    def test_benchmark_stats_without_prices(self):
+        PriceHistory.objects.filter(instrument=self.benchmark, date=date(2024, 1, 31)).delete()
+        engine = self.create_engine()
+
+        self.assertEqual(len(engine.get_benchmark_returns()), 0)
+        self.assertEqual(engine.get_beta(), 0)
+        self.assertEqual(engine.get_correlation(), 0)
+
+    def test_return_index_excludes_cash_flows(self):
+        navs = numpy.array([100, 110, 160, 80])
+        cash_flows = numpy.array([100, 0, 50, -100])
+
+        numpy.testing.assert_allclose(get_return_index(navs, cash_flows), [1, 1.1, 1.1, 1.2375])
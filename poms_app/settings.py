@@ -662,6 +662,22 @@ CELERY_ACKS_LATE = True
 # Make sure your tasks are safe to be retried in such cases (idempotent).
 CELERY_TASK_REJECT_ON_WORKER_LOST = False  # Make tasks rejected
 
+# progress of CeleryTask is written at most every N seconds or N percents
+TASK_PROGRESS_FLUSH_INTERVAL = ENV_INT("TASK_PROGRESS_FLUSH_INTERVAL", 2)  # seconds
+TASK_PROGRESS_FLUSH_PERCENT = ENV_INT("TASK_PROGRESS_FLUSH_PERCENT", 5)
+# amount of CeleryTasks, which are kept by celery_tasks.limit_tasks_amount
+TASKS_MAX_AMOUNT = ENV_INT("TASKS_MAX_AMOUNT", 3000)
+
+# existing tenant schemas are cached by workers for N seconds
+TENANT_SCHEMA_CACHE_TTL = ENV_INT("TENANT_SCHEMA_CACHE_TTL", 300)
+
+# history journal entries are written by history.write_historical_records tasks of N entries
+HISTORY_JOURNAL_BATCH_SIZE = ENV_INT("HISTORY_JOURNAL_BATCH_SIZE", 500)
+# more entries of one model and action in a task are written as one summary record, 0 - never
+HISTORY_JOURNAL_BULK_THRESHOLD = ENV_INT("HISTORY_JOURNAL_BULK_THRESHOLD", 0)
+# content type key -> "full", "summary" or "skip", models are fully journaled by default
+HISTORY_JOURNAL_MODEL_POLICIES = {}
+
 # ===================
 # = Django Storages =
 # ===================
@@ -775,6 +791,15 @@ if USE_DEBUGGER:
 
 
 ACCESS_POLICY_CACHE_TTL = ENV_INT("ACCESS_POLICY_CACHE_TTL", 300)  # 5 mins
+REPORT_RESULTS_CACHE_TTL = ENV_INT("REPORT_RESULTS_CACHE_TTL", 60 * 60)  # 1 hour
+BACKEND_REPORTS_ENGINE = ENV_STR("BACKEND_REPORTS_ENGINE", "python")  # python, columnar
+QUANTLIB_BOND_CACHE_SIZE = ENV_INT("QUANTLIB_BOND_CACHE_SIZE", 5000)  # bonds per process
+TRANSACTION_IMPORT_STREAMING = ENV_BOOL("TRANSACTION_IMPORT_STREAMING", False)
+TRANSACTION_IMPORT_CHUNK_SIZE = ENV_INT("TRANSACTION_IMPORT_CHUNK_SIZE", 1000)  # rows of streaming import
+TRANSACTION_IMPORT_PARALLEL = ENV_BOOL("TRANSACTION_IMPORT_PARALLEL", False)
+TRANSACTION_IMPORT_PARALLEL_WORKERS = ENV_INT("TRANSACTION_IMPORT_PARALLEL_WORKERS", 4)
+TRANSACTION_IMPORT_PARALLEL_MIN_CHUNK_SIZE = ENV_INT("TRANSACTION_IMPORT_PARALLEL_MIN_CHUNK_SIZE", 300)
+TRANSACTION_IMPORT_PARALLEL_PARTITION_BY = ENV_STR("TRANSACTION_IMPORT_PARALLEL_PARTITION_BY", "")  # scheme input
 
 # ========================
 # = KEYCLOAK INTEGRATION =
@@ -789,6 +814,14 @@ KEYCLOAK_CLIENT_ID = os.environ.get("KEYCLOAK_CLIENT_ID", "finmars")
 # not required anymore, api works in Bearer-only mod
 KEYCLOAK_CLIENT_SECRET_KEY = os.environ.get("KEYCLOAK_CLIENT_SECRET_KEY", None)
 
+# public keys of realm are cached for N seconds, tokens are verified locally by them
+KEYCLOAK_JWKS_CACHE_TTL = ENV_INT("KEYCLOAK_JWKS_CACHE_TTL", 3600)
+# userinfo and introspection of token are cached until its expiration, but not longer than N seconds
+KEYCLOAK_TOKEN_CACHE_TTL = ENV_INT("KEYCLOAK_TOKEN_CACHE_TTL", 60)
+# users and members of authenticated requests are cached by workers for N seconds
+AUTH_USER_CACHE_TTL = ENV_INT("AUTH_USER_CACHE_TTL", 30)
+AUTH_CACHE_SIZE = ENV_INT("AUTH_CACHE_SIZE", 10000)
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=60),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=7),